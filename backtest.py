@@ -2,54 +2,119 @@
 # Tên file: backtest.py
 
 import os
+import numpy as np
 import pandas as pd
 import logging
-from typing import Optional
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta 
 
 # Import các file "Cốt lõi"
 from core.logger_setup import setup_logging
 from core.trade_manager import TradeManager 
+from core.cache_manager import (
+    DiskCache, hash_files, make_key, get_config_hash,
+    get_indicator_cache, get_result_cache, get_checkpoint_cache
+)
+from core.resampler import load_timeframes, get_base_data_path, parse_timeframe_to_minutes
+from core.data_quality import apply_quality_policy
+from core.result_export import BarTraceRecorder, export_backtest_outputs
+from core.shared_data import SharedDataset
+from core.mtf_data import AlignedMTF, as_float64
+from core.column_store import ColumnStore
+from core.strategy_params import StrategyParams, as_strategy_params
+from core.indicator_graph import IndicatorGraph, get_indicator_executor
+from core.excursion import add_trade_excursions, log_excursion_report
 
 # Import các file "Bộ não"
 from signals.signal_generator import get_signal 
+from signals.adx import get_adx_value
+from signals.indicator_arrays import (
+    rolling_atr_last, rolling_ema_last, rolling_supertrend_last,
+    rolling_swing_points, rolling_apply_last, entry_candidate_mask
+)
 
 # Import file config
 import config
 
 logger = logging.getLogger("ExnessBot") 
 
-def _load_and_sync_data() -> Optional[pd.DataFrame]:
+CHECKPOINT_VERSION = 1 # (MỚI) Phiên bản định dạng checkpoint engine backtest
+
+def _build_config_dict(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Chuyển module config sang dict (có thể ghi đè một số tham số, ví dụ khi quét tham số)."""
+    config_dict = {key: getattr(config, key) 
+                   for key in dir(config) 
+                   if not key.startswith('__')}
+    if overrides:
+        config_dict.update(overrides)
+    return config_dict
+
+def _get_data_paths(config_dict: Dict[str, Any]) -> List[str]:
+    """Đường dẫn các file CSV nguồn (1 file gốc nếu dùng Resample, ngược lại 2 file Trend + Entry)."""
+    if config_dict.get("USE_RESAMPLED_TIMEFRAMES", False):
+        return [get_base_data_path(config_dict)]
+    path_h1 = os.path.join(config_dict["DATA_DIR"], f"{config_dict['SYMBOL']}_{config_dict['trend_timeframe']}.csv")
+    path_m15 = os.path.join(config_dict["DATA_DIR"], f"{config_dict['SYMBOL']}_{config_dict['entry_timeframe']}.csv")
+    return [path_h1, path_m15]
+
+def _get_data_fingerprint(config_dict: Dict[str, Any]) -> str:
+    """
+    Hash nội dung data + cặp khung thời gian (cùng file gốc, khác khung -> khác chỉ báo)
+    + chế độ kiểm tra chất lượng (REPAIR làm thay đổi dữ liệu thực tế được dùng)
+    + chế độ gọn float32 (giá bị làm tròn -> chỉ báo khác).
+    """
+    return make_key(hash_files(_get_data_paths(config_dict)),
+                    config_dict["trend_timeframe"], config_dict["entry_timeframe"],
+                    config_dict.get("DATA_QUALITY_MODE", "WARN"), config_dict.get("BACKTEST_COMPACT_DTYPES", False))
+
+def _load_frames(config_dict: Dict[str, Any]) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
     """
-    Tải 2 file CSV và đồng bộ H1 vào M15.
+    (MỚI) Tải dữ liệu 2 khung (Trend, Entry) CHƯA đồng bộ (dùng chung cho backtest.py và replay.py).
+    Trả về (df_h1, df_m15) hoặc None nếu dữ liệu bị từ chối. Raise FileNotFoundError nếu chưa có file.
+    """
+    if config_dict.get("USE_RESAMPLED_TIMEFRAMES", False):
+        # (MỚI) Dựng cả 2 khung từ dữ liệu gốc (Resample Pyramid)
+        trend_tf, entry_tf = config_dict["trend_timeframe"], config_dict["entry_timeframe"]
+        frames = load_timeframes(config_dict, [trend_tf, entry_tf])
+        return frames[trend_tf], frames[entry_tf]
+
+    path_h1, path_m15 = _get_data_paths(config_dict)
+    df_h1 = pd.read_csv(path_h1, index_col='timestamp', parse_dates=True)
+    df_m15 = pd.read_csv(path_m15, index_col='timestamp', parse_dates=True)
+
+    # (MỚI) Kiểm tra chất lượng dữ liệu (dùng báo cáo đã lưu nếu có)
+    df_h1 = apply_quality_policy(df_h1, path_h1, parse_timeframe_to_minutes(config_dict["trend_timeframe"]), config_dict)
+    df_m15 = apply_quality_policy(df_m15, path_m15, parse_timeframe_to_minutes(config_dict["entry_timeframe"]), config_dict)
+    if df_h1 is None or df_m15 is None:
+        return None
+    return df_h1, df_m15
+
+def _load_and_sync_data(config_dict: Optional[Dict[str, Any]] = None) -> Optional[AlignedMTF]:
+    """
+    Tải 2 file CSV và căn chỉnh H1 với M15.
     (SỬA LỖI LOOKAHEAD BIAS)
+    (MỚI) Trả về AlignedMTF: mỗi khung giữ 1 lần + map int32 nến M15 -> nến H1 đã đóng
+    (thay cho concat + ffill các cột H1 vào từng dòng M15).
     """
+    config_dict = config_dict or _build_config_dict()
     try:
-        path_h1 = os.path.join(config.DATA_DIR, f"{config.SYMBOL}_{config.trend_timeframe}.csv")
-        path_m15 = os.path.join(config.DATA_DIR, f"{config.SYMBOL}_{config.entry_timeframe}.csv")
-
-        df_h1 = pd.read_csv(path_h1, index_col='timestamp', parse_dates=True)
-        df_m15 = pd.read_csv(path_m15, index_col='timestamp', parse_dates=True)
-        
-        # --- (THAY ĐỔI) SỬA LỖI LOOKAHEAD BIAS ---
-        # 1. Thêm prefix
-        df_h1_prefixed = df_h1.add_prefix('h1_')
-        # 2. Dịch chuyển (shift) dữ liệu H1 về quá khứ 1 nến
-        df_h1_shifted = df_h1_prefixed.shift(1)
-        
-        # 3. Concat với dữ liệu H1 đã dịch chuyển (shifted)
-        df_synced = pd.concat([df_m15, df_h1_shifted], axis=1).ffill()
-        # --- (HẾT THAY ĐỔI) ---
+        frames = _load_frames(config_dict)
+        if frames is None:
+            return None
+        df_h1, df_m15 = frames
         
-        # 4. Xóa các hàng M15 đầu tiên (không có dữ liệu H1 tương ứng)
-        df_synced = df_synced.dropna(subset=['h1_open'])
+        # Nến M15 đầu tiên (chưa có nến H1 nào đã đóng) bị bỏ
+        # (MỚI) BACKTEST_COMPACT_DTYPES: giá float32 + volume uint32 (xem core/mtf_data.py)
+        data = AlignedMTF.build(df_h1, df_m15, compact=config_dict.get("BACKTEST_COMPACT_DTYPES", False))
         
-        if df_synced.empty:
+        if data.empty:
             logger.error("Dữ liệu sau khi đồng bộ bị rỗng.")
             return None
             
-        logger.info(f"Đã tải và đồng bộ {len(df_synced)} nến M15 (đã sửa lỗi Lookahead Bias).")
-        return df_synced
+        logger.info(f"Đã tải và căn chỉnh {len(data)} nến M15 + {len(data.trend)} nến H1 (đã sửa lỗi Lookahead Bias) | "
+                    f"{data.nbytes / 1024 / 1024:.1f} MB{' (gọn float32)' if data.compact else ''} "
+                    f"(cách cũ ~{data.synced_nbytes() / 1024 / 1024:.1f} MB).")
+        return data
         
     except FileNotFoundError:
         logger.critical(f"LỖI: Không tìm thấy file data. Vui lòng chạy 'download_data.py' trước.")
@@ -58,70 +123,226 @@ def _load_and_sync_data() -> Optional[pd.DataFrame]:
         logger.critical(f"Lỗi nghiêm trọng khi tải dữ liệu: {e}", exc_info=True)
         return None
 
-def run_backtest():
+# Tên mảng map nến M15 -> nến H1 trong SharedDataset
+MTF_MAP_ARRAY = "trend_idx"
+
+def _get_data_key(config_dict: Dict[str, Any]) -> str:
+    """Khóa các tham số quyết định dữ liệu được tải (không đọc file - dùng để so khớp dữ liệu dùng chung)."""
+    return make_key(config_dict["DATA_DIR"], config_dict["SYMBOL"], config_dict["trend_timeframe"],
+                    config_dict["entry_timeframe"], config_dict.get("USE_RESAMPLED_TIMEFRAMES", False),
+                    config_dict.get("DATA_QUALITY_MODE", "WARN"), config_dict.get("BACKTEST_COMPACT_DTYPES", False))
+
+def _get_indicator_signature(config_dict: Dict[str, Any]) -> str:
+    """Khóa bộ tham số quyết định các mảng chỉ báo tính trước (cùng khóa -> dùng chung được)."""
+    return make_key(config_dict.get("atr_period", 14), config_dict["swing_period"],
+                    config_dict["NUM_M15_BARS"], config_dict["NUM_H1_BARS"],
+                    config_dict.get("ADX_PERIOD", 14), config_dict.get("DI_PERIOD", 14),
+                    config_dict["TREND_EMA_PERIOD"], config_dict["ST_ATR_PERIOD"], config_dict["ST_MULTIPLIER"])
+
+
+def _cached(cache: Optional[DiskCache], key: str, compute_fn):
+    """Helper: Dùng cache nếu bật, ngược lại tính trực tiếp."""
+    if cache is None:
+        return compute_fn()
+    return cache.get_or_compute(key, compute_fn)
+
+def _precompute_indicators(data: AlignedMTF, config_dict: Dict[str, Any], start_index: int,
+                           cache: Optional[DiskCache] = None, data_fp: str = "") -> Dict[str, np.ndarray]:
     """
-    Hàm chính để chạy vòng lặp Backtest "trên giấy".
+    (MỚI) Tính trước chỉ báo cho MỌI nến M15 (giá trị giống hệt khi tính trên từng cửa sổ).
+    Mỗi mảng được cache theo (hash data, tên chỉ báo, bộ tham số liên quan),
+    nên các lần quét tham số dùng chung chỉ báo sẽ không phải tính lại.
+    (MỚI) Luôn tính bằng float64; chế độ gọn chỉ lưu kết quả dạng float32.
+    (MỚI) Các chỉ báo độc lập (M15: ATR, Swing; H1: ADX, EMA, Supertrend) chạy song song
+    trên thread pool (INDICATOR_WORKERS) theo đồ thị phụ thuộc, có đo thời gian từng chỉ báo.
     """
-    logger.info("--- BẮT ĐẦU CHẠY BACKTEST (Chế độ 'trên giấy') ---")
-    
-    # === Chuyển đổi sang dict ===
-    config_dict = {key: getattr(config, key) 
-                   for key in dir(config) 
-                   if not key.startswith('__')}
+    params = as_strategy_params(config_dict)
+    m15_window = config_dict["NUM_M15_BARS"] + 1 # (Cửa sổ iloc[i - NUM_M15_BARS : i + 1])
+    h1_window = config_dict["NUM_H1_BARS"]
+    h1_pos = data.trend_idx # Vị trí nến H1 đã đóng tương ứng với từng nến M15
+    h1_start = int(h1_pos[start_index]) if start_index < len(h1_pos) else len(data.trend)
 
-    # 1. Tải và đồng bộ dữ liệu
-    df_synced = _load_and_sync_data()
-    if df_synced is None:
-        return
+    atr_period = config_dict.get("atr_period", 14)
+    swing_period = config_dict["swing_period"]
+    adx_period = config_dict.get("ADX_PERIOD", 14)
+    ema_period = config_dict["TREND_EMA_PERIOD"]
+    st_period, st_mult = config_dict["ST_ATR_PERIOD"], config_dict["ST_MULTIPLIER"]
 
-    # 2. Khởi tạo các mô-đun
+    def _ohlc(frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return tuple(frame[col].to_numpy(dtype=np.float64) for col in ('high', 'low', 'close'))
+
+    graph = IndicatorGraph()
+    # --- 1. Chỉ báo M15 (ATR, Swing) cho SL/TSL ---
+    graph.add("m15.ohlc", lambda: _ohlc(data.entry))
+    graph.add("m15.atr", lambda m15: _cached(cache, make_key(data_fp, "atr_m15", atr_period, m15_window),
+                                             lambda: rolling_atr_last(*m15, atr_period, m15_window)),
+              deps=("m15.ohlc",))
+    graph.add("m15.swing", lambda m15: _cached(cache, make_key(data_fp, "swing_m15", swing_period, m15_window),
+                                               lambda: rolling_swing_points(m15[0], m15[1], swing_period, m15_window)),
+              deps=("m15.ohlc",))
+
+    # --- 2. Chỉ báo H1 (ADX, EMA, Supertrend) - tính trên từng nến H1 (mỗi nến 1 lần) ---
+    graph.add("h1.frame", lambda: as_float64(data.trend))
+    graph.add("h1.ohlc", _ohlc, deps=("h1.frame",))
+    graph.add("h1.adx", lambda h1_frame: _cached(cache, make_key(data_fp, "adx_h1", adx_period, h1_window, h1_start),
+                                                 lambda: rolling_apply_last(h1_frame, h1_window,
+                                                                            lambda w: get_adx_value(w, params), start=h1_start)),
+              deps=("h1.frame",))
+    graph.add("h1.ema_trend", lambda h1: _cached(cache, make_key(data_fp, "ema_trend_h1", ema_period, h1_window),
+                                                 lambda: np.where(h1[2] > rolling_ema_last(h1[2], ema_period, h1_window), 1, -1).astype(np.int8)),
+              deps=("h1.ohlc",))
+    graph.add("h1.supertrend", lambda h1: _cached(cache, make_key(data_fp, "supertrend_h1", st_period, st_mult, h1_window),
+                                                  lambda: rolling_supertrend_last(*h1, st_period, st_mult, h1_window)),
+              deps=("h1.ohlc",))
+
+    results = graph.run(get_indicator_executor(config_dict.get("INDICATOR_WORKERS", 1)))
+    logger.info(f"[Indicators] Thời gian tính chỉ báo: {graph.describe_timings()}")
+
+    swing_high, swing_low = results["m15.swing"]
+    indicators = {
+        "atr": results["m15.atr"],
+        "swing_high": swing_high,
+        "swing_low": swing_low,
+        "trend_adx": results["h1.adx"][h1_pos],
+        "trend_ema": results["h1.ema_trend"][h1_pos],
+        "trend_st": results["h1.supertrend"][h1_pos],
+    }
+    if data.compact:
+        indicators = {name: arr.astype(np.float32) if arr.dtype == np.float64 else arr
+                      for name, arr in indicators.items()}
+    return indicators
+
+def _get_precomputed_for_bar(indicators: Dict[str, np.ndarray], i: int) -> Dict[str, Any]:
+    """
+    Helper: Lấy giá trị chỉ báo của nến thứ i (định dạng giống các hàm signals/).
+    (Đổi sang float Python: giá trị float32 của chế độ gọn không kéo phép tính SL/Lot xuống float32.)
+    """
+    swing_high = float(indicators["swing_high"][i])
+    swing_low = float(indicators["swing_low"][i])
+    return {
+        "atr": float(indicators["atr"][i]),
+        "swing_high": None if np.isnan(swing_high) else swing_high,
+        "swing_low": None if np.isnan(swing_low) else swing_low,
+        "trend_adx": float(indicators["trend_adx"][i]),
+        "trend_ema": "UP" if indicators["trend_ema"][i] > 0 else "DOWN",
+        "trend_st": "UP" if indicators["trend_st"][i] > 0 else "DOWN",
+    }
+
+def publish_shared_dataset(config_dict: Optional[Dict[str, Any]] = None) -> Optional[SharedDataset]:
+    """
+    (MỚI) Tải + đồng bộ dữ liệu và tính trước chỉ báo MỘT lần, rồi xuất bản vào shared memory.
+    Các process con gọi run_backtest(..., dataset=SharedDataset.attach(handle)) -> không copy dữ liệu.
+    Người gọi phải close() dataset khi xong.
+    """
+    config_dict = config_dict or _build_config_dict()
     try:
-        trade_manager = TradeManager(
-            config=config_dict, 
-            mode="backtest", 
-            initial_capital=config_dict["BACKTEST_INITIAL_CAPITAL"]
-        )
+        data_fp = _get_data_fingerprint(config_dict)
+    except FileNotFoundError:
+        logger.critical("LỖI: Không tìm thấy file data. Vui lòng chạy 'download_data.py' trước.")
+        return None
+    data = _load_and_sync_data(config_dict)
+    if data is None:
+        return None
+
+    start_index = max(config_dict["NUM_H1_BARS"], config_dict["NUM_M15_BARS"])
+    indicators = {}
+    try:
+        indicators = _precompute_indicators(data, config_dict, start_index,
+                                            get_indicator_cache(config_dict), data_fp)
     except Exception as e:
-        logger.critical(f"Lỗi khi khởi tạo TradeManager (Backtest): {e}")
-        return
+        logger.error(f"Lỗi khi tính trước chỉ báo: {e}. Process con sẽ tự tính.", exc_info=True)
 
-    # 3. Vòng lặp chính (Mô phỏng 24/7)
-    
-    # === [THÊM DÒNG GỠ LỖI] ===
-    # In ra các key mà nó tìm thấy để chúng ta chẩn đoán
-    print(f"DEBUG: Keys found in config: {list(config_dict.keys())}")
-    # === [HẾT DÒNG GỠ LỖI] ===
-    
-    min_data_h1 = config_dict["NUM_H1_BARS"] # (Dòng này sẽ lỗi)
-    min_data_m15 = config_dict["NUM_M15_BARS"]
-    
-    logger.info("Bắt đầu lặp qua từng nến M15...")
-    
-    # Lấy giá trị Cooldown từ config_dict
-    cooldown_minutes = config_dict.get("COOLDOWN_MINUTES", 60)
+    meta = {"data_fp": data_fp, "data_key": _get_data_key(config_dict),
+            "indicator_signature": _get_indicator_signature(config_dict) if indicators else None}
+    arrays = dict(indicators, **{MTF_MAP_ARRAY: data.trend_idx})
+    return SharedDataset.publish({"entry": data.entry, "trend": data.trend}, arrays, meta)
+
+def _open_column_store(config_dict: Dict[str, Any], data_fp: str) -> Optional[ColumnStore]:
+    """
+    (MỚI) Mở kho cột trên đĩa (CACHE_DIR/column_store/<data fingerprint>) cho BACKTEST_STREAMING.
+    Lần đầu: tải + căn chỉnh dữ liệu 1 lần và ghi kho; các lần sau chỉ memmap.
+    """
+    if not data_fp:
+        logger.critical("LỖI: Không tìm thấy file data. Vui lòng chạy 'download_data.py' trước.")
+        return None
+    root = os.path.join(config_dict.get("CACHE_DIR", "data/cache"), "column_store")
+    try:
+        return ColumnStore.open_or_build(root, data_fp, lambda: _load_and_sync_data(config_dict))
+    except Exception as e:
+        logger.critical(f"Lỗi khi mở kho cột (Streaming): {e}", exc_info=True)
+        return None
+
+def _compute_indicators(data: AlignedMTF, config_dict: Dict[str, Any], start_index: int,
+                        cache: Optional[DiskCache], data_fp: str) -> Optional[Dict[str, np.ndarray]]:
+    """Helper: _precompute_indicators, lỗi -> None (vòng lặp tự tính từng nến)."""
+    try:
+        return _precompute_indicators(data, config_dict, start_index, cache, data_fp)
+    except Exception as e:
+        logger.error(f"Lỗi khi tính trước chỉ báo: {e}. Dùng cách tính từng nến.", exc_info=True)
+        return None
+
+def _get_candidate_mask(data: AlignedMTF, params: StrategyParams) -> np.ndarray:
+    """(MỚI) Mặt nạ nến ứng viên (điều kiện Entry thô, vector hóa) cho mọi nến Entry của 'data'."""
+    entry = data.entry
+    return entry_candidate_mask(entry['open'].to_numpy(), entry['high'].to_numpy(), entry['low'].to_numpy(),
+                                entry['close'].to_numpy(), params.ENTRY_LOGIC_MODE, params.ENTRY_EMA_PERIOD,
+                                params.NUM_M15_BARS + 1)
+
+def _run_bar_loop(trade_manager: TradeManager, data: AlignedMTF, indicators: Optional[Dict[str, np.ndarray]],
+                  start: int, end: int, config_dict: Dict[str, Any],
+                  trace: Optional[BarTraceRecorder] = None, offset: int = 0) -> None:
+    """
+    (MỚI) Chạy vòng lặp backtest trên các nến Entry [start, end) của 'data'.
+    offset: vị trí toàn cục của dòng đầu 'data' (chế độ streaming: data là 1 khối) - dùng cho trace.
+    """
+    params = trade_manager.params # (MỚI) Tham số đã biên dịch - không tra dict trong vòng lặp
+    min_data_h1 = params.NUM_H1_BARS
+    min_data_m15 = params.NUM_M15_BARS
+
+    # Lấy giá trị Cooldown
+    cooldown_minutes = params.COOLDOWN_MINUTES
     cooldown_delta = timedelta(minutes=cooldown_minutes)
-    
+
+    # (MỚI) Lọc trước nến ứng viên: nến không thể cho tín hiệu -> không gọi get_signal;
+    # không có lệnh mở + không phải ứng viên -> bỏ qua cả nến (trừ khi ghi trace từng nến)
+    candidates = _get_candidate_mask(data, params) if config_dict.get("BACKTEST_SIGNAL_PREFILTER", True) else None
+    next_candidate = None
+    if candidates is not None and trace is None:
+        positions = np.where(candidates, np.arange(len(candidates)), len(candidates))
+        next_candidate = np.minimum.accumulate(positions[::-1])[::-1]
+    skip_until = start
+
     # Lặp từ nến thứ X trở đi
-    for i in range(max(min_data_h1, min_data_m15), len(df_synced)):
+    for i in range(start, end):
+        if i < skip_until:
+            continue
+        if next_candidate is not None and not trade_manager.open_trades_sim:
+            skip_until = int(next_candidate[i])
+            if skip_until > i:
+                continue
         
         # 3.1. Lấy dữ liệu lịch sử
-        current_m15_data = df_synced.iloc[i - min_data_m15 : i + 1]
+        current_m15_data = data.entry_window(i, min_data_m15)
         
-        h1_subset = df_synced.iloc[: i + 1][['h1_open', 'h1_high', 'h1_low', 'h1_close', 'h1_volume']]
-        h1_unique = h1_subset.drop_duplicates(keep='last')
-        current_h1_data = h1_unique.iloc[-min_data_h1:]
-        current_h1_data.columns = ['open', 'high', 'low', 'close', 'volume']
+        # (MỚI) NUM_H1_BARS nến H1 đã đóng cuối cùng - tra qua map, O(1)
+        current_h1_data = data.trend_window(i, min_data_h1)
         
         current_time = current_m15_data.index[-1] 
         current_time_py = current_time.to_pydatetime() 
 
+        precomputed = _get_precomputed_for_bar(indicators, i) if indicators is not None else None
+
         # 3.2. CẬP NHẬT TRƯỚC (Chế độ Backtest)
         try:
-            trade_manager.update_all_trades(current_h1_data, current_m15_data)
+            trade_manager.update_all_trades(current_h1_data, current_m15_data, precomputed)
         except Exception as e:
             logger.error(f"[{current_time}] Lỗi khi update_all_trades (Backtest): {e}", exc_info=False)
 
 
+        adx_state = None
+        if trace is not None and precomputed and not pd.isna(precomputed["trend_adx"]):
+            adx_state = trade_manager.get_adx_state(precomputed["trend_adx"])
+
         # --- [LOGIC MỚI] KIỂM TRA COOLDOWN CHO BACKTEST ---
         is_in_cooldown = False
         if trade_manager.last_trade_close_time_str:
@@ -137,6 +358,8 @@ def run_backtest():
                 trade_manager.last_trade_close_time_str = None 
         
         if is_in_cooldown:
+            if trace is not None:
+                trace.record(i + offset, trade_manager, current_m15_data['close'].iloc[-1], None, adx_state)
             continue
         # --- [HẾT LOGIC MỚI] ---
         
@@ -145,9 +368,11 @@ def run_backtest():
         
         if trade_manager._get_open_trade_count() >= trade_manager.max_trade:
             signal = None
+        elif candidates is not None and not candidates[i]:
+            signal = None
         else:
             try:
-                signal = get_signal(current_h1_data, current_m15_data, config_dict) 
+                signal = get_signal(current_h1_data, current_m15_data, params, precomputed) 
             except Exception as e:
                 logger.error(f"[{current_time}] Lỗi khi get_signal: {e}", exc_info=False)
                 signal = None
@@ -155,15 +380,229 @@ def run_backtest():
         # 3.4. HÀNH ĐỘNG (Chế độ Backtest)
         if signal:
             try:
-                trade_manager.open_trade(signal, current_h1_data, current_m15_data)
+                trade_manager.open_trade(signal, current_h1_data, current_m15_data, precomputed)
             except Exception as e:
                 logger.error(f"[{current_time}] Lỗi khi open_trade ({signal}) (Backtest): {e}", exc_info=False)
 
+        if trace is not None:
+            trace.record(i + offset, trade_manager, current_m15_data['close'].iloc[-1], signal, adx_state)
+
+def _resume_from_checkpoint(cache: Optional[DiskCache], key: Optional[str], trade_manager: TradeManager,
+                            data: AlignedMTF, start_index: int, end_index: int) -> int:
+    """
+    (MỚI) Nạp checkpoint engine (nếu khớp) vào trade_manager. Trả về nến bắt đầu vòng lặp.
+    Chỉ dùng khi phần dữ liệu lần trước đã chạy KHÔNG đổi (dữ liệu mới chỉ nối thêm vào cuối).
+    """
+    if cache is None:
+        return start_index
+    checkpoint = cache.get(key)
+    if not checkpoint or checkpoint.get("version") != CHECKPOINT_VERSION:
+        return start_index
+    resume_index = checkpoint["end_index"]
+    if not (start_index <= resume_index <= end_index) or data.prefix_digest(resume_index) != checkpoint["data_digest"]:
+        logger.info("[Checkpoint] Dữ liệu cũ đã thay đổi (không chỉ nối thêm nến). Chạy lại toàn bộ.")
+        return start_index
+    trade_manager.restore_backtest_state(checkpoint["state"])
+    logger.info(f"[Checkpoint] Chạy tiếp từ nến {checkpoint['last_bar']} "
+                f"({len(trade_manager.closed_trades_sim)} lệnh đã đóng, {len(trade_manager.open_trades_sim)} lệnh đang mở): "
+                f"chỉ xử lý {end_index - resume_index} nến mới.")
+    return resume_index
+
+def run_backtest(config_overrides: Optional[Dict[str, Any]] = None,
+                 dataset: Optional[SharedDataset] = None) -> Optional[pd.DataFrame]:
+    """
+    Hàm chính để chạy vòng lặp Backtest "trên giấy".
+    (MỚI) config_overrides: Ghi đè tham số config (dùng khi quét tham số).
+    (MỚI) dataset: Dữ liệu + chỉ báo dùng chung (shared memory, xem publish_shared_dataset).
+          Bỏ qua nếu không khớp cấu hình dữ liệu của lần chạy này.
+    Trả về DataFrame kết quả (hoặc None nếu lỗi).
+    """
+    logger.info("--- BẮT ĐẦU CHẠY BACKTEST (Chế độ 'trên giấy') ---")
+    
+    # === Chuyển đổi sang dict ===
+    config_dict = _build_config_dict(config_overrides)
+
+    # (MỚI) Biên dịch tham số chiến lược 1 lần (kiểm tra kiểu + miền giá trị trước khi tải dữ liệu)
+    try:
+        params = StrategyParams.from_config(config_dict)
+    except ValueError as e:
+        logger.critical(f"Lỗi cấu hình: {e}")
+        return None
+
+    if dataset is not None and dataset.meta.get("data_key") != _get_data_key(config_dict):
+        logger.warning("[SharedData] Dữ liệu dùng chung không khớp cấu hình dữ liệu. Tải lại từ file.")
+        dataset = None
+
+    # --- (MỚI) Cache kết quả theo (hash data + hash tham số chiến lược + hash toàn bộ config) ---
+    result_cache = None
+    result_key = None
+    data_fp = ""
+    try:
+        data_fp = dataset.meta["data_fp"] if dataset is not None else _get_data_fingerprint(config_dict)
+        result_cache = get_result_cache(config_dict)
+        result_key = make_key(data_fp, params.digest, get_config_hash(config_dict))
+    except FileNotFoundError:
+        pass # (Sẽ báo lỗi rõ ràng ở bước tải dữ liệu)
+    except Exception as e:
+        logger.warning(f"Không khởi tạo được cache kết quả: {e}. Chạy không cache.")
+        result_cache = None
+
+    use_trace = config_dict.get("BACKTEST_TRACE", False)
+    if result_cache is not None and not use_trace: # (Trace cần chạy lại vòng lặp)
+        cached_results = result_cache.get(result_key)
+        if cached_results is not None:
+            logger.info(f"[Cache] Dùng lại kết quả backtest đã lưu ({len(cached_results)} lệnh).")
+            if config_dict.get("BACKTEST_EXPORT_RESULTS", True):
+                _export_results(cached_results, config_dict)
+            return cached_results
+
+    # 1. Tải và đồng bộ dữ liệu (hoặc dùng bản trong shared memory)
+    # (MỚI) BACKTEST_STREAMING: đọc dữ liệu theo từng khối từ kho cột trên đĩa (memmap)
+    store = None
+    data = None
+    if dataset is not None:
+        data = AlignedMTF(dataset.frames["entry"], dataset.frames["trend"], dataset.arrays[MTF_MAP_ARRAY])
+    elif config_dict.get("BACKTEST_STREAMING", False):
+        store = _open_column_store(config_dict, data_fp)
+        if store is None:
+            return None
+    else:
+        data = _load_and_sync_data(config_dict)
+        if data is None:
+            return None
+    total_bars = len(store) if store is not None else len(data)
+
+    # 2. Khởi tạo các mô-đun
+    try:
+        trade_manager = TradeManager(
+            config=params, 
+            mode="backtest", 
+            initial_capital=params.BACKTEST_INITIAL_CAPITAL
+        )
+    except Exception as e:
+        logger.critical(f"Lỗi khi khởi tạo TradeManager (Backtest): {e}")
+        return None
+
+    # 3. Vòng lặp chính (Mô phỏng 24/7)
+    min_data_h1 = config_dict["NUM_H1_BARS"]
+    min_data_m15 = config_dict["NUM_M15_BARS"]
+    
+    logger.info("Bắt đầu lặp qua từng nến M15...")
+    
+    start_index = max(min_data_h1, min_data_m15)
+
+    # (MỚI) Chỉ chạy trên 1 phần đầu lịch sử (optimize.py đánh giá dần theo "nấc" dữ liệu).
+    # Chỉ báo vẫn tính trên toàn bộ data (dùng chung cache) - giá trị tại mỗi nến không đổi.
+    data_fraction = config_dict.get("BACKTEST_DATA_FRACTION", 1.0)
+    end_index = total_bars
+    if data_fraction < 1.0:
+        end_index = start_index + int((total_bars - start_index) * max(0.0, data_fraction))
+
+    # (MỚI) Trace từng nến (tùy chọn)
+    trace = None
+    if use_trace:
+        trace = BarTraceRecorder(store.entry_index if store is not None else data.index, start_index)
+
+    if store is not None:
+        # (MỚI) Từng khối BACKTEST_CHUNK_BARS nến: đọc khối + phần khởi động, tính chỉ báo, chạy.
+        # TradeManager giữ nguyên qua các khối (lệnh đang mở, vốn, cooldown).
+        chunk_bars = max(1, int(config_dict.get("BACKTEST_CHUNK_BARS", 50000)))
+        indicator_cache = get_indicator_cache(config_dict)
+        for lo in range(start_index, end_index, chunk_bars):
+            hi = min(lo + chunk_bars, end_index)
+            chunk, offset = store.load_chunk(lo, hi, min_data_m15, min_data_h1)
+            indicators = _compute_indicators(chunk, config_dict, lo - offset, indicator_cache,
+                                             make_key(data_fp, "chunk", offset, hi))
+            _run_bar_loop(trade_manager, chunk, indicators, lo - offset, hi - offset, config_dict, trace, offset)
+            logger.debug(f"[Streaming] Xong khối nến {lo}-{hi} / {end_index}.")
+    else:
+        # (MỚI) Checkpoint của lần chạy trước (cùng tham số + config): chỉ chạy các nến MỚI nối thêm
+        checkpoint_cache, checkpoint_key = None, None
+        loop_start = start_index
+        if trace is None and data_fraction >= 1.0:
+            checkpoint_cache = get_checkpoint_cache(config_dict)
+            checkpoint_key = make_key(params.digest, get_config_hash(config_dict))
+            loop_start = _resume_from_checkpoint(checkpoint_cache, checkpoint_key, trade_manager, data, start_index, end_index)
+
+        # (MỚI) Tính trước (hoặc tải từ cache) toàn bộ chỉ báo
+        if dataset is not None and dataset.meta.get("indicator_signature") == _get_indicator_signature(config_dict):
+            indicators = {name: arr for name, arr in dataset.arrays.items() if name != MTF_MAP_ARRAY}
+        else:
+            indicators = _compute_indicators(data, config_dict, loop_start,
+                                             get_indicator_cache(config_dict), data_fp)
+        if checkpoint_cache is None:
+            _run_bar_loop(trade_manager, data, indicators, loop_start, end_index, config_dict, trace)
+        else:
+            # Checkpoint tại nến cuối có map Entry -> Trend ổn định (các nến sau đó có thể đổi khi nối thêm nến Trend)
+            checkpoint_index = max(loop_start, min(end_index, data.stable_length()))
+            _run_bar_loop(trade_manager, data, indicators, loop_start, checkpoint_index, config_dict, trace)
+            if checkpoint_index > loop_start:
+                checkpoint_cache.set(checkpoint_key, {"version": CHECKPOINT_VERSION, "end_index": checkpoint_index,
+                                                      "last_bar": str(data.index[checkpoint_index - 1]),
+                                                      "data_digest": data.prefix_digest(checkpoint_index),
+                                                      "state": trade_manager.get_backtest_state()})
+            _run_bar_loop(trade_manager, data, indicators, checkpoint_index, end_index, config_dict, trace)
+
     logger.info("--- HOÀN TẤT VÒNG LẶP BACKTEST ---")
     
     # 4. Xuất kết quả
+    results_df = trade_manager.get_backtest_results_df()
+    if config_dict.get("BACKTEST_EXCURSIONS", True) and not results_df.empty:
+        # (MỚI) MAE / MFE từng lệnh: truy vấn min/max theo khoảng trên mảng high/low nến Entry
+        if store is not None:
+            bar_times, high, low = store.entry_ts.view("datetime64[ns]"), store.entry_cols["high"], store.entry_cols["low"]
+        else:
+            bar_times, high, low = data.index.to_numpy(), data.entry["high"].to_numpy(), data.entry["low"].to_numpy()
+        results_df = add_trade_excursions(results_df, bar_times, high, low)
+    if result_cache is not None:
+        result_cache.set(result_key, results_df)
+    if config_dict.get("BACKTEST_EXPORT_RESULTS", True):
+        _export_results(results_df, config_dict, trace)
+    return results_df
+
+def run_compact_parity_check(config_overrides: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    (MỚI) Kiểm tra chế độ gọn (BACKTEST_COMPACT_DTYPES): chạy backtest float64 và float32
+    trên cùng dữ liệu, so sánh QUYẾT ĐỊNH giao dịch (thời điểm vào, chiều lệnh, thời điểm + lý do đóng).
+    Giá/PnL được phép lệch trong phạm vi sai số float32 (in ra để đối chiếu).
+    Trả về True nếu mọi quyết định trùng khớp.
+    """
+    results = {}
+    for compact in (False, True):
+        overrides = dict(config_overrides or {}, BACKTEST_COMPACT_DTYPES=compact,
+                         BACKTEST_EXPORT_RESULTS=False, BACKTEST_TRACE=False)
+        results[compact] = run_backtest(overrides)
+        if results[compact] is None:
+            logger.error("[Compact] Không chạy được backtest để so sánh.")
+            return False
+
+    full, compact = results[False], results[True]
+    decision_cols = ["entry_time", "type", "close_time", "close_reason"]
+    if full.empty or compact.empty:
+        same = full.empty and compact.empty
+    else:
+        same = len(full) == len(compact) and full[decision_cols].equals(compact[decision_cols])
+
+    logger.info("--- KIỂM TRA CHẾ ĐỘ GỌN (float32) ---")
+    logger.info(f"  Số lệnh: float64 = {len(full)} | float32 = {len(compact)} | "
+                f"Quyết định giao dịch: {'TRÙNG KHỚP' if same else 'KHÁC NHAU'}")
+    if same and not full.empty:
+        for col in ("entry_price", "close_price", "pnl_usd"):
+            diff = (full[col] - compact[col]).abs()
+            logger.info(f"  Lệch {col}: tối đa {diff.max():.6g} | trung bình {diff.mean():.6g}")
+    elif not same:
+        merged = pd.merge(full[decision_cols], compact[decision_cols], how="outer", indicator=True)
+        logger.warning(f"  Lệnh khác nhau:\n{merged[merged['_merge'] != 'both'].head(10)}")
+    return same
+
+def _export_results(results_df: pd.DataFrame, config_dict: Dict[str, Any],
+                    trace: Optional[BarTraceRecorder] = None):
+    """Helper: Ghi kết quả backtest ra file CSV (+ Parquet có kiểu, trace từng nến nếu bật)."""
     try:
-        results_df = trade_manager.get_backtest_results_df()
+        if config_dict.get("EXPORT_PARQUET", False) or trace is not None:
+            export_backtest_outputs(results_df if config_dict.get("EXPORT_PARQUET", False) else None,
+                                    config_dict, trace)
+
         if results_df.empty:
             logger.warning("Backtest hoàn tất. Không có lệnh nào được thực hiện.")
             return
@@ -174,6 +613,13 @@ def run_backtest():
         results_df.to_csv(output_path, index=False)
         logger.info(f"Đã lưu kết quả Backtest ( {len(results_df)} lệnh) vào: {output_path}")
 
+        # (MỚI) Phân phối MAE / MFE (nếu bảng lệnh có cột excursion)
+        excursion_summary = log_excursion_report(results_df, config_dict)
+        if excursion_summary is not None:
+            report_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("EXCURSION_REPORT_FILE", "excursion_report.csv"))
+            excursion_summary.to_csv(report_path, index=False)
+            logger.info(f"Đã lưu phân phối MAE / MFE vào: {report_path}")
+
     except Exception as e:
         logger.error(f"Lỗi khi xuất kết quả backtest: {e}", exc_info=True)
 
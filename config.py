@@ -3,6 +3,14 @@
 
 # === 1. HỆ THỐNG ===
 LOOP_SLEEP_SECONDS = 5      # (Giây) Thời gian nghỉ của luồng TSL
+RECONCILE_IDLE_SECONDS = 60 # (Giây) Chu kỳ đối chiếu tối đa khi KHÔNG có lệnh (giãn dần từ LOOP_SLEEP_SECONDS)
+RECONCILE_BACKOFF_FACTOR = 2.0 # Hệ số giãn chu kỳ đối chiếu khi không có lệnh
+CANDLE_POLL_INTERVAL = 0.25 # (Giây) Chu kỳ hỏi server xem nến mới đã xuất hiện chưa (sau mốc đóng nến)
+CANDLE_POLL_TIMEOUT = 30    # (Giây) Hết thời gian này chưa có nến mới -> bỏ qua mốc (thị trường đóng cửa)
+LOG_USE_QUEUE = True        # Ghi log qua hàng đợi (luồng nền ghi file, luồng giao dịch không bị chặn)
+METRICS_ENABLED = False     # Bật endpoint metrics (định dạng text Prometheus) khi chạy LIVE
+METRICS_HOST = "127.0.0.1"  # Chỉ mở trên localhost
+METRICS_PORT = 9108         # Cổng endpoint: http://127.0.0.1:9108/metrics
 NUM_H1_BARS = 70            # Số nến 1H (Trend) cần tải
 NUM_M15_BARS = 70           # Số nến 15M (Entry) cần tải
 
@@ -17,6 +25,7 @@ ALLOW_SHORT_TRADES = True   # Cho phép lệnh Short
 
 # === 3. QUẢN LÝ VỐN & RỦI RO (RiskManager) ===
 BACKTEST_INITIAL_CAPITAL = 1000.0  # Vốn khởi điểm (Backtest)
+BACKTEST_ENTRY_SLIPPAGE = 0.0       # Trượt giá bất lợi khi vào lệnh (đơn vị giá) so với giá đóng nến - lấy từ execution_report.py
 RISK_MANAGEMENT_MODE = "FIXED_LOT"  # Chế độ QLV: "FIXED_LOT", "RISK_PERCENT", "DYNAMIC"
 fixed_lot = 5.0                     # Lô cố định (cho "FIXED_LOT" hoặc "DYNAMIC")
 RISK_PERCENT_PER_TRADE = 2.0        # % rủi ro/lệnh (cho "RISK_PERCENT" hoặc "DYNAMIC")
@@ -87,4 +96,100 @@ ENTRY_EMA_PERIOD = 21           # Chu kỳ EMA (Entry 15M)
 DATA_DIR = "data"               # Thư mục chứa file CSV, logs, state
 OUTPUT_DIR = "data"             # Thư mục lưu kết quả backtest
 RESULTS_CSV_FILE = "backtest_results.csv" # Tên file CSV kết quả
-MONTHS_TO_DOWNLOAD = 6          # Số tháng tải dữ liệu
\ No newline at end of file
+EXPORT_PARQUET = True           # Ghi thêm bảng lệnh dạng cột (Parquet nén, cần 'pyarrow'; không có -> .csv.gz)
+RESULTS_TABLE_FILE = "backtest_results.parquet" # Tên file bảng lệnh (có kiểu dữ liệu)
+BACKTEST_TRACE = False          # Ghi trace từng nến (tín hiệu, ADX, SL, equity) - tắt cache kết quả khi bật
+BAR_TRACE_FILE = "backtest_trace.parquet" # Tên file trace từng nến
+EXPORT_COMPRESSION = "zstd"     # Thuật toán nén Parquet ("zstd", "snappy", "gzip")
+MONTHS_TO_DOWNLOAD = 6          # Số tháng tải dữ liệu
+USE_RESAMPLED_TIMEFRAMES = True # Chỉ tải 1 khung gốc, dựng Trend/Entry (1H, 4H, 1D...) bằng Resample
+BASE_TIMEFRAME = "15M"          # Khung gốc được tải (phải nhỏ hơn/bằng entry_timeframe và chia hết các khung khác)
+DATA_QUALITY_MODE = "WARN"      # Kiểm tra data khi tải: "OFF", "WARN" (cảnh báo), "REFUSE" (từ chối), "REPAIR" (tự sửa)
+BACKTEST_COMPACT_DTYPES = False # Lịch sử dài: giá + chỉ báo float32, volume uint32 (~1/2 RAM, sai số giá <= 6e-8 tương đối)
+                                # Kiểm tra trước khi dùng: backtest.run_compact_parity_check()
+BACKTEST_STREAMING = False      # Lịch sử rất dài: đọc dữ liệu theo khối từ kho cột memmap (CACHE_DIR/column_store), RAM không đổi
+BACKTEST_CHUNK_BARS = 50000     # Số nến Entry mỗi khối khi BACKTEST_STREAMING (kết quả giống hệt chạy trong RAM)
+BACKTEST_SIGNAL_PREFILTER = True # Chỉ gọi get_signal ở nến "ứng viên" (cắt EMA / nhấn chìm, tính trước bằng numpy); bỏ qua nến không có lệnh mở (kết quả giống hệt)
+BACKTEST_RESUME = True          # Lưu trạng thái engine cuối mỗi lần chạy (cần USE_BACKTEST_CACHE); dữ liệu chỉ nối thêm nến -> chỉ chạy các nến mới
+BACKTEST_EXCURSIONS = True      # Gắn MAE / MFE (giá + R) cho từng lệnh (sparse table min/max trên high/low) + báo cáo phân phối để chỉnh SL/TSL
+EXCURSION_REPORT_FILE = "excursion_report.csv" # Bảng phân phối MAE / MFE (trong OUTPUT_DIR)
+
+# === 9. CACHE (Backtest) ===
+USE_BACKTEST_CACHE = True       # Bật/Tắt cache đĩa (chỉ báo + kết quả backtest)
+CACHE_DIR = "data/cache"        # Thư mục cache (tự xóa khi code signals/ thay đổi)
+CACHE_MAX_SIZE_MB = 512         # Dung lượng tối đa (MB), vượt quá -> xóa file ít dùng nhất (LRU)
+
+# === 10. MONTE CARLO (Phân tích rủi ro sau Backtest) ===
+MC_MODE = "BOOTSTRAP"           # "BOOTSTRAP" (lấy mẫu có hoàn lại) hoặc "SHUFFLE" (hoán vị thứ tự lệnh)
+MC_NUM_PATHS = 10000            # Số đường vốn mô phỏng
+MC_BATCH_SIZE = 20000           # Số đường mỗi lô (giới hạn RAM)
+MC_NUM_WORKERS = 1              # Số tiến trình (>1 = chia shard qua ProcessPool)
+MC_RUIN_DRAWDOWN_PERCENT = 50.0 # Ngưỡng "cháy" (%): vốn sụt >= X% so với vốn đầu
+MC_SEED = 42                    # Seed ngẫu nhiên (để tái lập kết quả)
+
+# === 11. TỐI ƯU THAM SỐ (optimize.py) ===
+OPT_METHOD = "TPE"              # Phương pháp: "RANDOM", "TPE" (Bayesian), "HALVING" (Successive Halving)
+OPT_NUM_TRIALS = 60             # Tổng số bộ tham số được thử
+OPT_NUM_WORKERS = 4             # Số process chạy song song
+OPT_SHARED_MEMORY = True        # Tải dữ liệu + tính chỉ báo 1 lần, chia sẻ cho các worker qua shared memory (không copy)
+OPT_RUNG_FRACTIONS = [0.25, 0.5, 1.0] # Các "nấc" dữ liệu (tỉ lệ lịch sử) - đánh giá dần, cắt sớm ứng viên kém
+OPT_REDUCTION_FACTOR = 3        # HALVING: Mỗi nấc chỉ giữ 1/X ứng viên tốt nhất
+OPT_PRUNE_MIN_TRIALS = 5        # RANDOM/TPE: Cần ít nhất X trial ở 1 nấc mới bắt đầu cắt (dưới trung vị -> cắt)
+OPT_TPE_STARTUP_TRIALS = 10     # TPE: Số trial ngẫu nhiên ban đầu trước khi dùng mô hình
+OPT_TPE_GAMMA = 0.25            # TPE: Tỉ lệ trial được coi là "tốt"
+OPT_OBJECTIVE = "PNL"           # Hàm mục tiêu: "PNL", "PROFIT_FACTOR", "PNL_DD" (PnL / Max Drawdown)
+OPT_MIN_TRADES = 10             # Số lệnh tối thiểu (trên toàn bộ dữ liệu, tự co theo nấc) để trial hợp lệ
+OPT_STUDY_FILE = "optimize_study.jsonl" # File lưu mọi trial (trong OUTPUT_DIR) - chạy lại để tiếp tục
+OPT_SEED = 42                   # Seed ngẫu nhiên (để tái lập kết quả)
+OPT_SEARCH_SPACE = {            # Tham số: (kiểu, min, max)
+    "ADX_WEAK": ("int", 14, 22),
+    "ADX_STRONG": ("int", 20, 30),
+    "DYN_ATR_MIN_CAP_RATIO": ("float", 0.5, 1.0),
+    "DYN_ATR_MAX_CAP_RATIO": ("float", 1.5, 3.0),
+    "volume_sd_multiplier": ("float", 0.0, 2.0),
+    "min_body_percent": ("float", 30.0, 70.0),
+    "be_atr_buffer": ("float", 0.2, 1.5),
+    "trail_atr_buffer": ("float", 0.1, 1.0),
+}
+
+# === 12. REPLAY CODE LIVE (replay.py) ===
+REPLAY_START = None             # Mốc bắt đầu (ví dụ "2024-01-01"), None = từ đầu dữ liệu
+REPLAY_END = None               # Mốc kết thúc, None = hết dữ liệu
+REPLAY_INCLUDE_FORMING_BAR = True # Giống MT5: dữ liệu tải về gồm cả nến ĐANG CHẠY -> get_signal xét nến 1 tick (False = chỉ nến đã đóng, như backtest)
+REPLAY_SPREAD_POINTS = 0        # Spread giả lập (point)
+REPLAY_POINT = 0.01             # Giá trị 1 point của symbol
+REPLAY_VOLUME_MIN = 0.01        # Lot tối thiểu của sàn giả lập
+REPLAY_VOLUME_MAX = 100.0       # Lot tối đa của sàn giả lập
+REPLAY_VOLUME_STEP = 0.01       # Bước nhảy lot của sàn giả lập
+REPLAY_COMPARE_BACKTEST = True  # Chạy backtest.py trên cùng dữ liệu và so sánh từng lệnh
+REPLAY_LOG_LEVEL = "WARNING"    # Mức log trong lúc replay (code LIVE log rất nhiều mỗi nến)
+REPLAY_RESULTS_FILE = "replay_results.csv"      # Lệnh đã đóng trên sàn giả lập (trong OUTPUT_DIR)
+REPLAY_COMPARE_FILE = "replay_vs_backtest.csv"  # Bảng so sánh từng lệnh với backtest
+REPLAY_STATE_FILE = "replay_state.json"         # File trạng thái riêng (không đụng trades_state.json thật)
+REPLAY_RECORDING_FILE = None    # File ghi MT5 (từ MT5_RECORD_FILE) -> replay.py phát lại file này thay vì dữ liệu nến
+REPLAY_RECORDING_SPEED = 0      # 0 = nhanh nhất (đồng hồ ảo), 1 = đúng nhịp gốc, 10 = nhanh gấp 10
+
+# === 13. GHI LẠI MT5 (CHẾ ĐỘ LIVE) ===
+MT5_RECORD_FILE = None          # Ví dụ "data/mt5_session.mt5rec.gz": ghi mọi request/response MT5 (None = tắt)
+
+# === 14. CHẤT LƯỢNG KHỚP LỆNH (CHẾ ĐỘ LIVE) ===
+EXECUTION_LOG_FILE = "data/execution_log.jsonl" # Ghi giá yêu cầu/khớp, spread, retcode, độ trễ của MỌI lệnh gửi lên sàn (None = tắt)
+EXECUTION_REPORT_FILE = "execution_report.csv"  # Bảng tổng hợp trượt giá / độ trễ (trong OUTPUT_DIR) - execution_report.py
+
+# === 15. KHỞI ĐỘNG LẠI NHANH (CHẾ ĐỘ LIVE) ===
+LIVE_BARS_STATE_FILE = "live_bars_state.json" # Checkpoint nến đã đóng (cùng thư mục trades_state.json): mỗi vòng/khởi động lại chỉ tải phần thiếu (None = tải lại đủ cửa sổ mỗi vòng)
+
+# === 16. TÍNH CHỈ BÁO SONG SONG ===
+INDICATOR_WORKERS = 4           # Số luồng tính chỉ báo (đồ thị phụ thuộc ATR/EMA/ADX/Swing/Supertrend) - LIVE mỗi vòng + Backtest tính trước (1 = tuần tự)
+
+# === 17. CHẠY GIẤY NHIỀU BIẾN THỂ (SHADOW) ===
+SHADOW_STRATEGIES = {}          # {"tên": {"KEY": giá trị ghi đè, ...}} - chạy giấy (SimTrade) song song bot thật, dùng chung nến + chỉ báo
+                                # Ví dụ: {"tsl_1_5R": {"tsl_trigger_R": 1.5}, "no_adx": {"USE_ADX_FILTER": False}}
+SHADOW_DIR = "data/shadow"      # Kết quả riêng từng biến thể: <SHADOW_DIR>/<tên>/state.pkl + trades.csv
+SHADOW_MAX_INSTANCES = 8        # Số biến thể tối đa (giới hạn chi phí mỗi vòng Luồng 1)
+
+# === 18. CỔNG MT5 (CHẾ ĐỘ LIVE) ===
+MT5_GATEWAY = True              # Mọi lời gọi MT5 chạy trên 1 luồng duy nhất (MetaTrader5 không an toàn đa luồng), hàng đợi ưu tiên: lệnh > truy vấn > tải nến
+MT5_GATEWAY_TIMEOUT_ORDER = 5.0 # Thời gian chờ tối đa TRONG HÀNG ĐỢI (giây) của lệnh gửi/sửa/đóng - quá hạn chưa chạy -> hủy (0 = không giới hạn)
+MT5_GATEWAY_TIMEOUT_QUERY = 10.0 # ... của truy vấn nhẹ (tick, positions, account, symbol_info)
+MT5_GATEWAY_TIMEOUT_BULK = 30.0 # ... của tải nến (copy_rates)
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/cache_manager.py
+
+import os
+import glob
+import json
+import shutil
+import pickle
+import ast
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger("ExnessBot")
+
+# Xác định đường dẫn gốc (giống storage_manager.py)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+
+# Các file code ảnh hưởng tới GIÁ TRỊ chỉ báo
+SIGNALS_CODE_GLOB = os.path.join(PROJECT_ROOT, "signals", "*.py")
+# Điểm vào của backtest: mọi module core/*.py mà nó import (trực tiếp hoặc gián tiếp) đều ảnh hưởng
+# tới KẾT QUẢ backtest -> tự dò theo lệnh import, không phải giữ tay 1 danh sách file (dễ sót file mới)
+BACKTEST_ENTRY_FILE = os.path.join(PROJECT_ROOT, "backtest.py")
+BACKTEST_CODE_PACKAGE = "core"
+
+# Nhóm config KHÔNG ảnh hưởng kết quả backtest (Monte Carlo, tối ưu, live, xuất file...)
+CONFIG_HASH_IGNORED_PREFIXES = ("MC_", "OPT_", "METRICS_", "CANDLE_", "RECONCILE_", "LOG_", "REPLAY_", "MT5_RECORD", "MT5_GATEWAY",
+                                "EXPORT_", "BACKTEST_EXPORT_", "BACKTEST_STREAMING", "BACKTEST_CHUNK_",
+                                "BACKTEST_SIGNAL_PREFILTER", "BACKTEST_RESUME",
+                                "EXECUTION_", "EXCURSION_", "LIVE_", "INDICATOR_", "SHADOW_")
+
+# Bộ nhớ tạm cho hash file: {path: ((size, mtime_ns), sha)}
+_FILE_HASH_MEMO: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+# ==============================================================================
+# HÀM HASH (CONTENT-ADDRESSED)
+# ==============================================================================
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hash SHA-256 nội dung file.
+    Kết quả được nhớ theo (size, mtime) để không phải đọc lại file lớn.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    memo = _FILE_HASH_MEMO.get(path)
+    if memo and memo[0] == signature:
+        return memo[1]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    _FILE_HASH_MEMO[path] = (signature, digest)
+    return digest
+
+
+def hash_files(paths: Iterable[str]) -> str:
+    """Hash gộp của nhiều file (theo thứ tự truyền vào)."""
+    sha = hashlib.sha256()
+    for path in paths:
+        sha.update(os.path.basename(path).encode("utf-8"))
+        sha.update(hash_file(path).encode("ascii"))
+    return sha.hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """Tạo key ổn định (stable) từ các phần tử (dict, tuple, số, chuỗi...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def get_config_hash(config_dict: Dict[str, Any]) -> str:
+    """
+    Hash TOÀN BỘ config (chỉ các giá trị đơn giản: số, chuỗi, bool, list/tuple).
+    Bỏ qua module/hàm lọt vào khi quét dir(config)
+    và các nhóm config không ảnh hưởng kết quả backtest (CONFIG_HASH_IGNORED_PREFIXES).
+    """
+    simple = {
+        key: value for key, value in config_dict.items()
+        if isinstance(value, (int, float, str, bool, list, tuple, type(None)))
+        and not key.startswith(CONFIG_HASH_IGNORED_PREFIXES)
+    }
+    return make_key(simple)
+
+
+def get_signals_code_version() -> str:
+    """Phiên bản code của thư mục signals/ (đổi code -> cache chỉ báo tự mất hiệu lực)."""
+    return hash_files(sorted(glob.glob(SIGNALS_CODE_GLOB)))[:12]
+
+
+def _imported_package_modules(path: str, package: str) -> Iterable[str]:
+    """Tên module '<package>.x' được import trong file (from core.x import ... / import core.x / from core import x)."""
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError):
+        return []
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            if node.module == package:
+                names.extend(f"{package}.{alias.name}" for alias in node.names)
+            elif node.module.startswith(f"{package}."):
+                names.append(node.module)
+        elif isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names if alias.name.startswith(f"{package}."))
+    return names
+
+
+def get_backtest_code_files() -> list:
+    """backtest.py + mọi file core/*.py nó import (bắc cầu qua các module core/ khác), theo thứ tự ổn định."""
+    files, pending = set(), [BACKTEST_ENTRY_FILE]
+    while pending:
+        path = pending.pop()
+        if path in files or not os.path.exists(path):
+            continue
+        files.add(path)
+        for module in _imported_package_modules(path, BACKTEST_CODE_PACKAGE):
+            pending.append(os.path.join(PROJECT_ROOT, *module.split(".")) + ".py")
+    return sorted(files)
+
+
+def get_backtest_code_version() -> str:
+    """Phiên bản code ảnh hưởng tới kết quả backtest (signals/ + backtest.py + các module core/ nó dùng)."""
+    files = sorted(glob.glob(SIGNALS_CODE_GLOB)) + get_backtest_code_files()
+    return hash_files(files)[:12]
+
+# ==============================================================================
+# LỚP CACHE ĐĨA (LRU, GIỚI HẠN DUNG LƯỢNG)
+# ==============================================================================
+
+class DiskCache:
+    """
+    Cache đĩa đơn giản: mỗi key là 1 file pickle.
+    - Thư mục con theo 'code_version': đổi code -> thư mục cũ bị xóa (invalidation).
+    - LRU: mỗi lần đọc trúng sẽ "chạm" (touch) mtime; khi vượt dung lượng
+      sẽ xóa các file có mtime cũ nhất.
+    """
+    def __init__(self, cache_dir: str, code_version: str, max_size_mb: float = 512.0, namespace: str = "default"):
+        self.root_dir = os.path.join(cache_dir, namespace)
+        self.code_version = code_version
+        self.cache_dir = os.path.join(self.root_dir, code_version)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._evict_lock = threading.Lock() # (MỚI) Nhiều luồng tính chỉ báo cùng ghi cache
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._purge_old_versions()
+
+    def _purge_old_versions(self):
+        """Xóa các thư mục cache của phiên bản code cũ."""
+        try:
+            for name in os.listdir(self.root_dir):
+                path = os.path.join(self.root_dir, name)
+                if name != self.code_version and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    logger.info(f"[Cache] Đã xóa cache phiên bản code cũ: {name}")
+        except Exception as e:
+            logger.warning(f"[Cache] Lỗi khi dọn cache phiên bản cũ: {e}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path, None) # (LRU) Đánh dấu vừa được dùng
+            self.hits += 1
+            return value
+        except Exception as e:
+            logger.warning(f"[Cache] File cache lỗi ({key}), sẽ tính lại: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path) # Ghi nguyên tử (atomic)
+        except Exception as e:
+            logger.warning(f"[Cache] Không ghi được cache ({key}): {e}")
+            self._remove(tmp_path)
+            return
+        with self._evict_lock:
+            self._evict()
+
+    def get_or_compute(self, key: str, compute_fn: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute_fn()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def _evict(self):
+        """Xóa file cũ nhất (LRU) cho tới khi tổng dung lượng <= giới hạn."""
+        try:
+            entries = []
+            total = 0
+            for path in glob.glob(os.path.join(self.cache_dir, "*.pkl")):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total <= self.max_size_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_size_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                logger.debug(f"[Cache] LRU xóa: {os.path.basename(path)}")
+        except Exception as e:
+            logger.warning(f"[Cache] Lỗi khi dọn cache (LRU): {e}")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+# ==============================================================================
+# HÀM TIỆN ÍCH (Dùng cho backtest.py)
+# ==============================================================================
+
+def get_indicator_cache(config: Dict[str, Any]) -> Optional[DiskCache]:
+    """Cache chỉ báo (theo phiên bản code signals/). Trả về None nếu tắt."""
+    if not config.get("USE_BACKTEST_CACHE", False):
+        return None
+    return DiskCache(
+        config.get("CACHE_DIR", os.path.join("data", "cache")),
+        get_signals_code_version(),
+        config.get("CACHE_MAX_SIZE_MB", 512),
+        namespace="indicators",
+    )
+
+
+def get_result_cache(config: Dict[str, Any]) -> Optional[DiskCache]:
+    """Cache kết quả backtest (theo phiên bản code signals/ + core/). Trả về None nếu tắt."""
+    if not config.get("USE_BACKTEST_CACHE", False):
+        return None
+    return DiskCache(
+        config.get("CACHE_DIR", os.path.join("data", "cache")),
+        get_backtest_code_version(),
+        config.get("CACHE_MAX_SIZE_MB", 512),
+        namespace="results",
+    )
+
+
+def get_checkpoint_cache(config: Dict[str, Any]) -> Optional[DiskCache]:
+    """(MỚI) Checkpoint engine backtest (chạy tiếp khi dữ liệu được nối thêm). None nếu tắt cache / BACKTEST_RESUME."""
+    if not config.get("USE_BACKTEST_CACHE", False) or not config.get("BACKTEST_RESUME", False):
+        return None
+    return DiskCache(
+        config.get("CACHE_DIR", os.path.join("data", "cache")),
+        get_backtest_code_version(),
+        config.get("CACHE_MAX_SIZE_MB", 512),
+        namespace="checkpoints",
+    )
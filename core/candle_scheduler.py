@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/candle_scheduler.py
+
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from core.metrics import METRICS
+from core.clock import SYSTEM_CLOCK
+from core.resampler import parse_timeframe_to_minutes
+
+logger = logging.getLogger("ExnessBot")
+
+class CandleScheduler:
+    """
+    Bộ hẹn giờ đóng nến theo GIỜ SERVER của sàn (không phụ thuộc đồng hồ máy).
+    - Học độ lệch giờ server (offset) từ timestamp của tick.
+    - Mốc đóng nến = bội số của chu kỳ trên trục thời gian server (không lỗi qua giờ / qua ngày).
+    - Sau mốc đóng: hỏi copy_rates_from_pos liên tục (mỗi CANDLE_POLL_INTERVAL giây)
+      tới khi nến MỚI xuất hiện -> nến cũ chắc chắn đã đóng.
+    - Hỗ trợ nhiều khung (ví dụ 15M + 1H): trả về danh sách khung vừa đóng.
+    - (MỚI) clock: Đồng hồ (mặc định giờ máy thật; replay.py dùng VirtualClock).
+    """
+    def __init__(self, connector, config: Dict[str, Any], timeframes: List[str], clock=None):
+        self.connector = connector
+        self.clock = clock or SYSTEM_CLOCK
+        self.symbol = config["SYMBOL"]
+        self.timeframes = list(dict.fromkeys(timeframes))
+        self.steps = {tf: parse_timeframe_to_minutes(tf) * 60 for tf in self.timeframes}
+        # Khung nhỏ nhất dùng để phát hiện nến mới
+        self.base_tf = min(self.timeframes, key=lambda tf: self.steps[tf])
+
+        self.poll_interval = float(config.get("CANDLE_POLL_INTERVAL", 0.25))
+        self.poll_timeout = float(config.get("CANDLE_POLL_TIMEOUT", 30))
+
+        # Các mẫu offset gần nhất (giây). Tick luôn "cũ" hơn giờ server thật một chút
+        # -> lấy mẫu LỚN NHẤT làm ước lượng.
+        self._offset_samples = deque(maxlen=int(config.get("CANDLE_OFFSET_SAMPLES", 20)))
+        self.offset: Optional[float] = None
+        self.last_close_ts: Optional[float] = None # Mốc đóng nến (giờ server) của lần chờ gần nhất
+
+    # ==========================================================
+    # GIỜ SERVER
+    # ==========================================================
+    def update_offset(self) -> Optional[float]:
+        """Lấy 1 mẫu offset (giờ server - giờ máy) từ tick mới nhất."""
+        server_ts = self.connector.get_server_time(self.symbol)
+        if server_ts is None:
+            return self.offset
+        self._offset_samples.append(server_ts - self.clock.time())
+        self.offset = max(self._offset_samples)
+        METRICS.set_gauge("server_time_offset_seconds", self.offset)
+        return self.offset
+
+    def server_now(self) -> float:
+        """Giờ server hiện tại (epoch giây, theo múi giờ server như timestamp nến MT5)."""
+        if self.offset is None:
+            self.update_offset()
+        return self.clock.time() + (self.offset or 0.0)
+
+    def next_close(self, timeframe: str, server_ts: Optional[float] = None) -> float:
+        """Mốc đóng nến tiếp theo (giờ server) của 'timeframe'."""
+        step = self.steps[timeframe]
+        now = self.server_now() if server_ts is None else server_ts
+        return (int(now // step) + 1) * step
+
+    # ==========================================================
+    # CHỜ NẾN ĐÓNG
+    # ==========================================================
+    def wait_for_next_close(self) -> List[str]:
+        """
+        Ngủ tới mốc đóng nến gần nhất, sau đó chờ nến mới xuất hiện trên server.
+        Trả về các khung vừa đóng ([] nếu hết thời gian chờ - ví dụ thị trường đóng cửa).
+        """
+        self.update_offset()
+        close_ts = min(self.next_close(tf) for tf in self.timeframes)
+        closed = [tf for tf in self.timeframes if close_ts % self.steps[tf] == 0]
+
+        sleep_sec = close_ts - self.server_now()
+        logger.info(f"[Scheduler] Ngủ {sleep_sec:.1f}s chờ nến {', '.join(closed)} đóng "
+                    f"(offset server {self.offset or 0.0:+.1f}s).")
+        if sleep_sec > 0:
+            self.clock.sleep(sleep_sec)
+
+        # Hỏi server tới khi nến mới (mở tại close_ts) xuất hiện
+        deadline = self.clock.time() + self.poll_timeout
+        while True:
+            bar_ts = self.connector.get_current_bar_time(self.symbol, self.base_tf)
+            if bar_ts is not None and bar_ts >= close_ts:
+                break
+            if self.clock.time() >= deadline:
+                logger.warning(f"[Scheduler] Hết {self.poll_timeout:.0f}s chưa thấy nến mới "
+                               f"(thị trường đóng cửa / mất kết nối). Bỏ qua mốc này.")
+                return []
+            self.clock.sleep(self.poll_interval)
+
+        self.last_close_ts = close_ts
+        METRICS.observe("candle_detect_seconds", self.server_now() - close_ts)
+        return closed
+
+    def record_lateness(self, close_ts: float) -> float:
+        """Ghi độ trễ từ lúc nến đóng tới lúc xét tín hiệu xong (giây)."""
+        lateness = self.server_now() - close_ts
+        METRICS.observe("signal_candle_lag_seconds", lateness)
+        return lateness
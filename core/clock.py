@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/clock.py
+
+import time
+from datetime import datetime, timezone
+
+# ==============================================================================
+# ĐỒNG HỒ (THẬT / ẢO)
+# ------------------------------------------------------------------------------
+# Code LIVE lấy giờ và ngủ qua 1 đối tượng Clock thay vì gọi thẳng time/datetime.
+# - SystemClock: giờ máy thật (mặc định, hành vi giống hệt trước đây).
+# - VirtualClock: giờ ảo cho replay.py - sleep() chỉ cộng giờ, không chờ thật
+#   -> chạy lại nhiều tuần LIVE trong vài giây.
+# - ScaledClock: giờ chạy nhanh gấp 'speed' lần giờ thật (phát lại file ghi MT5 theo nhịp nén).
+# ==============================================================================
+
+class SystemClock:
+    """Đồng hồ thật (giờ máy)."""
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Đồng hồ ảo (epoch giây, cùng trục thời gian với timestamp nến).
+    sleep() / advance_to() chỉ dời giờ về phía trước.
+    """
+    def __init__(self, start_ts: float):
+        self._now = float(start_ts)
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self) -> datetime:
+        # Timestamp nến là giờ "naive" (không múi giờ) -> giữ nguyên dạng naive
+        return datetime.fromtimestamp(self._now, timezone.utc).replace(tzinfo=None)
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self._now += seconds
+
+    def advance_to(self, ts: float):
+        """Dời đồng hồ tới mốc 'ts' (không lùi)."""
+        if ts > self._now:
+            self._now = float(ts)
+
+
+class ScaledClock:
+    """
+    Đồng hồ tua nhanh: bắt đầu tại 'start_ts', mỗi giây thật = 'speed' giây.
+    sleep(s) chờ thật s / speed giây.
+    """
+    def __init__(self, start_ts: float, speed: float):
+        if speed <= 0:
+            raise ValueError("speed phải > 0 (dùng VirtualClock để chạy nhanh nhất).")
+        self.start_ts = float(start_ts)
+        self.speed = float(speed)
+        self._t0 = time.perf_counter()
+
+    def time(self) -> float:
+        return self.start_ts + (time.perf_counter() - self._t0) * self.speed
+
+    def now(self) -> datetime:
+        # Giờ UTC dạng naive - cùng quy ước với VirtualClock
+        return datetime.fromtimestamp(self.time(), timezone.utc).replace(tzinfo=None)
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+
+# Đồng hồ mặc định của bot LIVE
+SYSTEM_CLOCK = SystemClock()
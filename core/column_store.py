@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/column_store.py
+
+import os
+import json
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Optional, Tuple
+
+from core.mtf_data import AlignedMTF
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# KHO DỮ LIỆU DẠNG CỘT TRÊN ĐĨA (BACKTEST THEO TỪNG KHỐI)
+# ------------------------------------------------------------------------------
+# Lưu AlignedMTF (khung Entry, khung Trend, map trend_idx) thành các file .npy,
+# mỗi cột 1 file (thời gian: int64 epoch ns, đọc ra lại đúng đơn vị gốc của index), đọc bằng memmap:
+# backtest chỉ nạp vào RAM khối nến đang chạy (+ phần "khởi động" chỉ báo)
+# -> bộ nhớ không phụ thuộc độ dài lịch sử.
+# Kho được dựng 1 lần cho mỗi data fingerprint (xem backtest._get_data_fingerprint).
+# ==============================================================================
+
+STORE_VERSION = 2 # 2: lưu đơn vị thời gian gốc của index (index_unit)
+_META_FILE = "meta.json"
+
+
+class ColumnStore:
+    """Kho cột (memmap, chỉ đọc) của 1 bộ dữ liệu AlignedMTF."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.entry_ts = self._load("entry_ts")
+        self.trend_ts = self._load("trend_ts")
+        self.trend_idx = self._load("trend_idx")
+        self.entry_cols = {col: self._load(f"entry_{col}") for col in self.meta["columns"]}
+        self.trend_cols = {col: self._load(f"trend_{col}") for col in self.meta["columns"]}
+        # Đơn vị thời gian của index gốc (ns / us...) -> kết quả streaming cùng dtype với backtest trong RAM
+        self.time_dtype = np.dtype(f"datetime64[{self.meta.get('index_unit', 'ns')}]")
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    @classmethod
+    def write(cls, path: str, data: AlignedMTF) -> "ColumnStore":
+        """Ghi AlignedMTF ra thư mục 'path' (ghi vào thư mục tạm rồi đổi tên -> không để lại kho dở dang)."""
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            arrays = {
+                "entry_ts": data.entry.index.to_numpy(dtype="datetime64[ns]").view(np.int64),
+                "trend_ts": data.trend.index.to_numpy(dtype="datetime64[ns]").view(np.int64),
+                "trend_idx": data.trend_idx,
+            }
+            for col in data.entry.columns:
+                arrays[f"entry_{col}"] = data.entry[col].to_numpy()
+                arrays[f"trend_{col}"] = data.trend[col].to_numpy()
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(arr))
+
+            meta = {"version": STORE_VERSION, "columns": list(data.entry.columns),
+                    "index_name": data.entry.index.name,
+                    "index_unit": np.datetime_data(data.entry.index.dtype)[0], "entry_rows": len(data.entry),
+                    "trend_rows": len(data.trend), "compact": bool(data.compact)}
+            with open(os.path.join(tmp_path, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            if os.path.exists(path):
+                shutil.rmtree(path) # (Kho cũ hỏng / khác phiên bản)
+            os.replace(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return cls(path)
+
+    @classmethod
+    def open_or_build(cls, root: str, key: str, load_fn: Callable[[], Optional[AlignedMTF]]) -> Optional["ColumnStore"]:
+        """Mở kho theo khóa (data fingerprint); chưa có thì tải dữ liệu 1 lần bằng load_fn và ghi kho."""
+        path = os.path.join(root, key)
+        meta_path = os.path.join(path, _META_FILE)
+        if os.path.exists(meta_path):
+            try:
+                store = cls(path)
+                if store.meta.get("version") == STORE_VERSION:
+                    return store
+            except Exception as e:
+                logger.warning(f"[ColumnStore] Kho '{path}' bị lỗi ({e}). Dựng lại.")
+
+        data = load_fn()
+        if data is None:
+            return None
+        os.makedirs(root, exist_ok=True)
+        store = cls.write(path, data)
+        logger.info(f"[ColumnStore] Đã dựng kho cột {len(data)} nến Entry + {len(data.trend)} nến Trend tại: {path}")
+        return store
+
+    def __len__(self) -> int:
+        return len(self.entry_ts)
+
+    @property
+    def entry_index(self) -> pd.DatetimeIndex:
+        """Thời gian TẤT CẢ nến Entry (8 byte/nến - chỉ dùng khi cần, ví dụ trace)."""
+        return self._index(self.entry_ts, 0, len(self.entry_ts))
+
+    def _index(self, ts: np.ndarray, lo: int, hi: int) -> pd.DatetimeIndex:
+        """Dòng [lo, hi) của cột thời gian (int64 epoch ns) -> DatetimeIndex theo đơn vị gốc."""
+        values = np.array(ts[lo:hi]).view("datetime64[ns]").astype(self.time_dtype)
+        return pd.DatetimeIndex(values, name=self.meta["index_name"])
+
+    def _frame(self, ts: np.ndarray, cols: Dict[str, np.ndarray], lo: int, hi: int) -> pd.DataFrame:
+        """Đọc dòng [lo, hi) vào RAM (copy khỏi memmap)."""
+        return pd.DataFrame({col: np.array(arr[lo:hi]) for col, arr in cols.items()}, index=self._index(ts, lo, hi))
+
+    def load_chunk(self, lo: int, hi: int, entry_lookback: int, trend_lookback: int) -> Tuple[AlignedMTF, int]:
+        """
+        Đọc khối nến Entry [lo, hi) + phần khởi động:
+        - entry_lookback nến Entry trước 'lo' (cửa sổ M15 / chỉ báo M15),
+        - trend_lookback nến Trend tính tới nến Trend của 'lo' (cửa sổ H1 / chỉ báo H1).
+        Trả về (AlignedMTF của khối, offset) - nến Entry toàn cục g = vị trí trong khối + offset.
+        Map trend_idx của các nến khởi động (trước 'lo') có thể trỏ sai (bị chặn về 0) - không được dùng.
+        """
+        offset = max(0, lo - entry_lookback)
+        trend_lo = max(0, int(self.trend_idx[lo]) - trend_lookback + 1)
+        trend_hi = int(self.trend_idx[hi - 1]) + 1
+        entry = self._frame(self.entry_ts, self.entry_cols, offset, hi)
+        trend = self._frame(self.trend_ts, self.trend_cols, trend_lo, trend_hi)
+        trend_idx = np.maximum(np.asarray(self.trend_idx[offset:hi]) - trend_lo, 0).astype(np.int32)
+        return AlignedMTF(entry, trend, trend_idx), offset
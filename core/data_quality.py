@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/data_quality.py
+
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, Any
+
+from core.cache_manager import hash_file
+
+logger = logging.getLogger("ExnessBot")
+
+REPORT_VERSION = 1
+MAX_SAMPLES = 100               # Số mẫu tối đa lưu cho mỗi loại lỗi (zero-volume, outlier...)
+OUTLIER_MAD_THRESHOLD = 12.0    # Ngưỡng |lợi suất| / MAD để coi là "giá bất thường"
+OUTLIER_RANGE_MULTIPLIER = 20.0 # Range nến > X lần range trung vị -> bất thường
+
+# ==============================================================================
+# QUÉT DỮ LIỆU (1 LƯỢT, VECTOR HÓA)
+# ==============================================================================
+
+def _samples(timestamps: np.ndarray, mask: np.ndarray) -> list:
+    """Helper: Lấy tối đa MAX_SAMPLES timestamp (ISO) thỏa mask."""
+    picked = timestamps[mask][:MAX_SAMPLES]
+    return [pd.Timestamp(t).isoformat() for t in picked]
+
+def scan_ohlcv(df: pd.DataFrame, timeframe_minutes: int) -> Dict[str, Any]:
+    """
+    Quét chất lượng dữ liệu OHLCV trong 1 lượt:
+    - Timestamp trùng / không tăng dần.
+    - Khoảng trống (gap): tách gap cuối tuần và gap bất thường -> lập "gap index".
+    - Nến volume = 0, nến sai cấu trúc OHLC (high < low, high < open/close...), NaN.
+    - Giá bất thường (outlier) theo MAD của lợi suất và theo range nến.
+    """
+    size = len(df)
+    report: Dict[str, Any] = {
+        "version": REPORT_VERSION,
+        "timeframe_minutes": int(timeframe_minutes),
+        "num_bars": int(size),
+    }
+    if size == 0:
+        report.update({"first_bar": None, "last_bar": None, "num_duplicates": 0, "num_unsorted": 0,
+                       "num_nan_rows": 0, "num_invalid_ohlc": 0, "num_zero_volume": 0, "num_outliers": 0,
+                       "num_gaps": 0, "num_weekend_gaps": 0, "missing_bars": 0, "gaps": [],
+                       "samples": {}, "is_clean": True})
+        return report
+
+    timestamps = df.index.to_numpy(dtype="datetime64[ns]")
+    ts_sec = timestamps.astype("datetime64[s]").astype(np.int64)
+    o = df['open'].to_numpy(dtype=np.float64)
+    h = df['high'].to_numpy(dtype=np.float64)
+    l = df['low'].to_numpy(dtype=np.float64)
+    c = df['close'].to_numpy(dtype=np.float64)
+    v = df['volume'].to_numpy(dtype=np.float64)
+
+    # 1. Thứ tự thời gian
+    step = timeframe_minutes * 60
+    diffs = np.diff(ts_sec)
+    is_dup = np.zeros(size, dtype=bool)
+    is_dup[1:] = diffs == 0
+    is_unsorted = np.zeros(size, dtype=bool)
+    is_unsorted[1:] = diffs < 0
+
+    # 2. Gap index (chỉ tính trên các bước tăng)
+    gap_pos = np.nonzero(diffs > step)[0] # Gap nằm giữa nến gap_pos và gap_pos + 1
+    gap_start = ts_sec[gap_pos] + step    # Nến đầu tiên bị thiếu
+    gap_end = ts_sec[gap_pos + 1]         # Nến đầu tiên có lại dữ liệu
+    missing = (gap_end - gap_start) // step
+    # Thứ (0 = Thứ 2 ... 6 = Chủ nhật) - epoch 1970-01-01 là Thứ 5 (3)
+    start_dow = ((gap_start // 86400) + 3) % 7
+    end_dow = ((gap_end // 86400) + 3) % 7
+    is_weekend = np.isin(start_dow, (4, 5, 6)) & np.isin(end_dow, (5, 6, 0)) & ((gap_end - gap_start) <= 3 * 86400)
+
+    # 3. Cấu trúc nến
+    is_nan = np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c) | np.isnan(v)
+    with np.errstate(invalid="ignore"):
+        is_invalid = (~is_nan) & (
+            (h < l) | (h < np.maximum(o, c)) | (l > np.minimum(o, c)) | (l <= 0) | (v < 0)
+        )
+        is_zero_vol = v == 0
+
+        # 4. Outlier: lợi suất log so với MAD (robust), và range nến so với trung vị
+        is_outlier = np.zeros(size, dtype=bool)
+        valid = ~(is_nan | is_invalid)
+        if valid.sum() > 2:
+            log_c = np.log(np.where(valid, c, np.nan))
+            ret = np.diff(log_c)
+            med = np.nanmedian(ret)
+            mad = np.nanmedian(np.abs(ret - med))
+            if mad > 0:
+                is_outlier[1:] |= np.abs(ret - med) > OUTLIER_MAD_THRESHOLD * mad
+            rng = h - l
+            med_rng = np.nanmedian(np.where(valid, rng, np.nan))
+            if med_rng > 0:
+                is_outlier |= valid & (rng > OUTLIER_RANGE_MULTIPLIER * med_rng)
+
+    report.update({
+        "first_bar": pd.Timestamp(timestamps[0]).isoformat(),
+        "last_bar": pd.Timestamp(timestamps[-1]).isoformat(),
+        "num_duplicates": int(is_dup.sum()),
+        "num_unsorted": int(is_unsorted.sum()),
+        "num_nan_rows": int(is_nan.sum()),
+        "num_invalid_ohlc": int(is_invalid.sum()),
+        "num_zero_volume": int(is_zero_vol.sum()),
+        "num_outliers": int(is_outlier.sum()),
+        "num_gaps": int(len(gap_pos)),
+        "num_weekend_gaps": int(is_weekend.sum()),
+        "missing_bars": int(missing.sum()),
+        # Gap index: [epoch nến thiếu đầu tiên, epoch có dữ liệu lại, số nến thiếu, cờ cuối tuần]
+        "gaps": np.column_stack([gap_start, gap_end, missing, is_weekend.astype(np.int64)]).tolist(),
+        "samples": {
+            "duplicates": _samples(timestamps, is_dup),
+            "unsorted": _samples(timestamps, is_unsorted),
+            "invalid_ohlc": _samples(timestamps, is_invalid),
+            "zero_volume": _samples(timestamps, is_zero_vol),
+            "outliers": _samples(timestamps, is_outlier),
+        },
+    })
+    report["is_clean"] = (report["num_duplicates"] == 0 and report["num_unsorted"] == 0
+                          and report["num_nan_rows"] == 0 and report["num_invalid_ohlc"] == 0)
+    return report
+
+# ==============================================================================
+# LƯU / TẢI BÁO CÁO (CẠNH FILE DATA)
+# ==============================================================================
+
+def get_report_path(data_path: str) -> str:
+    """Báo cáo được lưu cạnh file data: ETHUSD_15M.csv -> ETHUSD_15M.quality.json"""
+    return f"{os.path.splitext(data_path)[0]}.quality.json"
+
+def save_report(data_path: str, report: Dict[str, Any]):
+    """Lưu báo cáo kèm hash file data (để biết báo cáo còn đúng với file hay không)."""
+    report = dict(report)
+    report["data_sha256"] = hash_file(data_path)
+    try:
+        with open(get_report_path(data_path), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"[DataQuality] Không lưu được báo cáo cho {data_path}: {e}")
+
+def load_report(data_path: str) -> Optional[Dict[str, Any]]:
+    """Tải báo cáo đã lưu. Trả về None nếu chưa có / phiên bản cũ / file data đã thay đổi."""
+    report_path = get_report_path(data_path)
+    if not os.path.exists(report_path):
+        return None
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        if report.get("version") != REPORT_VERSION or report.get("data_sha256") != hash_file(data_path):
+            return None
+        return report
+    except (json.JSONDecodeError, OSError):
+        return None
+
+def build_report(data_path: str, df: pd.DataFrame, timeframe_minutes: int) -> Dict[str, Any]:
+    """Quét và lưu báo cáo (gọi sau khi tải dữ liệu xong)."""
+    report = scan_ohlcv(df, timeframe_minutes)
+    save_report(data_path, report)
+    _log_summary(os.path.basename(data_path), report)
+    return report
+
+# ==============================================================================
+# SỬA DỮ LIỆU & CHÍNH SÁCH KHI TẢI
+# ==============================================================================
+
+def repair_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sửa các lỗi "chắc chắn sai" (không bịa thêm nến cho gap):
+    - Sắp xếp theo thời gian, bỏ timestamp trùng (giữ bản cuối).
+    - Bỏ hàng NaN.
+    - Kẹp high/low cho bao trùm open/close.
+    - Bỏ nến giá <= 0.
+    """
+    fixed = df[~df.index.duplicated(keep='last')].sort_index()
+    fixed = fixed.dropna(subset=['open', 'high', 'low', 'close', 'volume'])
+    fixed = fixed.copy()
+    fixed['high'] = fixed[['open', 'high', 'low', 'close']].max(axis=1)
+    fixed['low'] = fixed[['open', 'high', 'low', 'close']].min(axis=1)
+    fixed = fixed[fixed['low'] > 0]
+    return fixed
+
+def apply_quality_policy(df: pd.DataFrame, data_path: str, timeframe_minutes: int,
+                         config: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """
+    Áp dụng chính sách DATA_QUALITY_MODE khi tải dữ liệu:
+    - "OFF": Không kiểm tra.
+    - "WARN": Chỉ ghi log cảnh báo.
+    - "REFUSE": Trả về None nếu dữ liệu có lỗi nghiêm trọng (trùng, lộn xộn, NaN, OHLC sai).
+    - "REPAIR": Tự sửa lỗi nghiêm trọng (repair_ohlcv).
+    Dùng báo cáo đã lưu nếu còn hợp lệ (không phải quét lại).
+    """
+    mode = config.get("DATA_QUALITY_MODE", "WARN")
+    if mode == "OFF":
+        return df
+
+    report = load_report(data_path)
+    if report is None or report.get("timeframe_minutes") != timeframe_minutes:
+        report = build_report(data_path, df, timeframe_minutes)
+
+    if report["is_clean"]:
+        return df
+
+    name = os.path.basename(data_path)
+    if mode == "REFUSE":
+        logger.critical(f"[DataQuality] TỪ CHỐI dữ liệu {name}: {_issues_text(report)}. "
+                        f"Xem {os.path.basename(get_report_path(data_path))}.")
+        return None
+    if mode == "REPAIR":
+        fixed = repair_ohlcv(df)
+        logger.warning(f"[DataQuality] Đã sửa dữ liệu {name} ({_issues_text(report)}): {len(df)} -> {len(fixed)} nến.")
+        return fixed
+
+    logger.warning(f"[DataQuality] Dữ liệu {name} có lỗi: {_issues_text(report)}.")
+    return df
+
+def _issues_text(report: Dict[str, Any]) -> str:
+    return (f"trùng={report['num_duplicates']}, lộn xộn={report['num_unsorted']}, "
+            f"NaN={report['num_nan_rows']}, OHLC sai={report['num_invalid_ohlc']}")
+
+def _log_summary(name: str, report: Dict[str, Any]):
+    """Helper: In tóm tắt báo cáo."""
+    logger.info(f"[DataQuality] {name}: {report['num_bars']} nến | {_issues_text(report)} | "
+                f"gap={report['num_gaps']} (cuối tuần {report['num_weekend_gaps']}, thiếu {report['missing_bars']} nến) | "
+                f"volume=0: {report['num_zero_volume']} | bất thường: {report['num_outliers']}")
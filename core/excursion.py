@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/excursion.py
+
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# MAE / MFE CỦA TỪNG LỆNH (TRUY VẤN MIN/MAX THEO KHOẢNG - SPARSE TABLE)
+# ------------------------------------------------------------------------------
+# MAE (Max Adverse Excursion): giá đi NGƯỢC lệnh xa nhất khi lệnh đang mở.
+# MFE (Max Favorable Excursion): giá đi THUẬN lệnh xa nhất khi lệnh đang mở.
+# Cách tính (khớp với engine backtest):
+# - Lệnh mở ở giá đóng cửa nến vào lệnh -> xét từ nến KẾ TIẾP.
+# - Nến đóng lệnh: engine kiểm tra SL trước (giả định xấu nhất) -> nến này chỉ đóng góp
+#   giá đóng lệnh (close_price), không dùng high/low của nó.
+# - Đơn vị: giá và R (R = |entry_price - initial_sl_price|).
+# Sparse table: dựng O(n log n) 1 lần, mỗi truy vấn min/max trên [lo, hi] là O(1)
+# (2 khối 2^k chồng lên nhau) -> mọi lệnh được tính cùng lúc bằng numpy, không lặp Python theo nến.
+# ==============================================================================
+
+EXCURSION_COLUMNS = ["mae_price", "mfe_price", "mae_r", "mfe_r"]
+EXCURSION_PERCENTILES = [25, 50, 75, 90]
+
+
+class SparseTable:
+    """Bảng thưa cho truy vấn min hoặc max trên đoạn [lo, hi] (chỉ số bao gồm 2 đầu)."""
+    def __init__(self, values: np.ndarray, op: np.ufunc):
+        self.op = op
+        self.levels = [np.asarray(values)]
+        span = 1
+        while span * 2 <= len(values):
+            prev = self.levels[-1]
+            self.levels.append(op(prev[:-span], prev[span:]))
+            span *= 2
+
+    def query(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """Kết quả cho từng cặp (lo[j], hi[j]) với lo[j] <= hi[j]. Nhóm theo bậc k để vẫn là phép toán mảng."""
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        out = np.empty(len(lo), dtype=self.levels[0].dtype)
+        if len(lo) == 0:
+            return out
+        k = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+        for level in np.unique(k):
+            sel = k == level
+            table = self.levels[level]
+            out[sel] = self.op(table[lo[sel]], table[hi[sel] - (1 << int(level)) + 1])
+        return out
+
+
+def add_trade_excursions(results_df: pd.DataFrame, bar_times: np.ndarray,
+                         high: np.ndarray, low: np.ndarray) -> pd.DataFrame:
+    """
+    Gắn các cột mae_price, mfe_price, mae_r, mfe_r (>= 0) vào bảng lệnh.
+    bar_times: thời gian mở nến Entry (datetime64, tăng dần) - cùng độ dài với high / low.
+    Lệnh không tìm thấy nến vào / đóng lệnh -> NaN.
+    """
+    df = results_df.copy()
+    if df.empty:
+        for col in EXCURSION_COLUMNS:
+            df[col] = pd.Series(dtype=np.float64)
+        return df
+
+    times = np.asarray(bar_times, dtype="datetime64[ns]")
+    entry_pos = np.searchsorted(times, pd.DatetimeIndex(df["entry_time"]).to_numpy(dtype="datetime64[ns]"))
+    close_pos = np.searchsorted(times, pd.DatetimeIndex(df["close_time"]).to_numpy(dtype="datetime64[ns]"))
+    entry_pos = np.minimum(entry_pos, len(times) - 1)
+    close_pos = np.minimum(close_pos, len(times) - 1)
+    found = (times[entry_pos] == pd.DatetimeIndex(df["entry_time"]).to_numpy(dtype="datetime64[ns]")) & \
+            (times[close_pos] == pd.DatetimeIndex(df["close_time"]).to_numpy(dtype="datetime64[ns]"))
+
+    entry_price = df["entry_price"].to_numpy(dtype=np.float64)
+    close_price = df["close_price"].to_numpy(dtype=np.float64)
+    is_buy = (df["type"] == "BUY").to_numpy()
+
+    # Cực trị trong các nến [vào lệnh + 1, đóng lệnh - 1]; lệnh không có nến ở giữa -> chỉ dùng giá đóng lệnh
+    lo = entry_pos + 1
+    hi = close_pos - 1
+    has_bars = found & (lo <= hi)
+    highest = close_price.copy()
+    lowest = close_price.copy()
+    if has_bars.any():
+        highest[has_bars] = np.maximum(highest[has_bars],
+                                       SparseTable(high, np.maximum).query(lo[has_bars], hi[has_bars]))
+        lowest[has_bars] = np.minimum(lowest[has_bars],
+                                      SparseTable(low, np.minimum).query(lo[has_bars], hi[has_bars]))
+
+    adverse = np.where(is_buy, entry_price - lowest, highest - entry_price)
+    favorable = np.where(is_buy, highest - entry_price, entry_price - lowest)
+    df["mae_price"] = np.where(found, np.maximum(adverse, 0.0), np.nan)
+    df["mfe_price"] = np.where(found, np.maximum(favorable, 0.0), np.nan)
+
+    risk_price = np.abs(entry_price - df["initial_sl_price"].to_numpy(dtype=np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["mae_r"] = np.where(risk_price > 0, df["mae_price"] / risk_price, np.nan)
+        df["mfe_r"] = np.where(risk_price > 0, df["mfe_price"] / risk_price, np.nan)
+    return df
+
+# ==============================================================================
+# BÁO CÁO PHÂN PHỐI (ĐỂ CHỈNH SL / TSL)
+# ==============================================================================
+
+def summarize_excursions(results_df: pd.DataFrame) -> pd.DataFrame:
+    """Phân phối MAE / MFE (theo R) cho nhóm ALL / WIN / LOSS: số lệnh, trung bình, các phân vị, lớn nhất."""
+    if results_df is None or results_df.empty or "mae_r" not in results_df.columns:
+        return pd.DataFrame()
+    groups = {
+        "ALL": results_df,
+        "WIN": results_df[results_df["pnl_usd"] > 0],
+        "LOSS": results_df[results_df["pnl_usd"] <= 0],
+    }
+    rows = []
+    for group, frame in groups.items():
+        for metric in ("mae_r", "mfe_r"):
+            values = frame[metric].dropna().to_numpy(dtype=np.float64)
+            row = {"group": group, "metric": metric, "trades": len(values)}
+            if len(values):
+                row["mean"] = values.mean()
+                row.update({f"p{p}": v for p, v in zip(EXCURSION_PERCENTILES, np.percentile(values, EXCURSION_PERCENTILES))})
+                row["max"] = values.max()
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def log_excursion_report(results_df: pd.DataFrame, config: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """In phân phối MAE / MFE + vài gợi ý chỉnh SL / TSL. Trả về bảng tổng hợp (None nếu không có cột MAE/MFE)."""
+    summary = summarize_excursions(results_df)
+    if summary.empty:
+        return None
+
+    logger.info(f"--- MAE / MFE ({len(results_df)} lệnh, đơn vị R = khoảng cách SL ban đầu) ---")
+    for row in summary.itertuples(index=False):
+        if not row.trades:
+            continue
+        quantiles = " | ".join(f"P{p} {getattr(row, f'p{p}'):.2f}" for p in EXCURSION_PERCENTILES)
+        logger.info(f"  {row.group:<4} {row.metric.upper():<5} ({row.trades} lệnh): TB {row.mean:.2f} | {quantiles} | Max {row.max:.2f}")
+
+    winners = results_df[results_df["pnl_usd"] > 0]
+    losers = results_df[results_df["pnl_usd"] <= 0]
+    if len(winners):
+        logger.info(f"  Gợi ý SL: 90% lệnh thắng có MAE <= {np.nanpercentile(winners['mae_r'], 90):.2f}R "
+                    f"(SL ban đầu = 1R).")
+    if len(losers):
+        trigger_r = config.get("tsl_trigger_R", 1.0)
+        reached = float((losers["mfe_r"] >= trigger_r).mean()) * 100
+        logger.info(f"  Gợi ý TSL: {reached:.1f}% lệnh thua từng có MFE >= tsl_trigger_R ({trigger_r}R) trước khi đóng.")
+    return summary
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/execution_log.py
+
+import os
+import json
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# NHẬT KÝ CHẤT LƯỢNG KHỚP LỆNH (EXECUTION TELEMETRY)
+# ------------------------------------------------------------------------------
+# Mỗi lệnh gửi lên sàn (mở / đóng / sửa SL-TP) ghi 1 dòng JSON (JSONL, chỉ ghi thêm):
+#   giá tham chiếu (giá đóng nến M15 dùng tính Lot), giá yêu cầu, bid/ask + spread lúc gửi,
+#   retcode, giá/khối lượng khớp, trượt giá và độ trễ order_send (ms).
+#   latency_ms chỉ đo lời gọi order_send (trên luồng cổng MT5); thời gian chờ hàng đợi cổng MT5 ghi riêng (queue_ms).
+# Trượt giá có DẤU theo hướng BẤT LỢI: > 0 = khớp tệ hơn (BUY khớp cao hơn / SELL khớp thấp hơn).
+# summarize_execution() / suggest_cost_model() tổng hợp lại để chỉnh mô hình chi phí backtest
+# (BACKTEST_ENTRY_SLIPPAGE) - xem execution_report.py.
+# ==============================================================================
+
+ACTIONS = ("open", "close", "modify")
+
+
+def adverse_slippage(side: str, expected: Optional[float], filled: Optional[float]) -> Optional[float]:
+    """Trượt giá (đơn vị giá) theo hướng bất lợi cho lệnh 'side' ("BUY"/"SELL"); thiếu giá -> None."""
+    if not expected or not filled:
+        return None
+    return (filled - expected) if side == "BUY" else (expected - filled)
+
+
+class ExecutionLog:
+    """Ghi nhật ký khớp lệnh ra file JSONL (an toàn khi nhiều luồng cùng ghi)."""
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        logger.info(f"[Execution] Ghi nhật ký khớp lệnh vào: {path}")
+
+    def record(self, event: Dict[str, Any]):
+        """Ghi 1 sự kiện (tự thêm thời gian UTC). Lỗi ghi không được làm hỏng luồng giao dịch."""
+        event = dict(event, time=datetime.now(timezone.utc).isoformat(timespec="milliseconds"))
+        try:
+            line = json.dumps(event, ensure_ascii=False, default=str)
+            with self._lock:
+                self._file.write(line + "\n")
+                self._file.flush()
+        except Exception as e:
+            logger.warning(f"[Execution] Không ghi được nhật ký khớp lệnh: {e}")
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+# ==============================================================================
+# TỔNG HỢP (BÁO CÁO)
+# ==============================================================================
+
+def load_execution_log(path: str) -> pd.DataFrame:
+    """Đọc file JSONL (bỏ qua dòng hỏng, ví dụ dòng cuối bị cắt khi tắt bot đột ngột)."""
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"[Execution] Bỏ qua dòng {line_no} bị lỗi trong {path}.")
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df["time"] = pd.to_datetime(df["time"], utc=True)
+    return df
+
+
+def _describe(values: pd.Series, prefix: str) -> Dict[str, float]:
+    values = values.dropna().astype(np.float64)
+    if values.empty:
+        return {f"{prefix}_mean": np.nan, f"{prefix}_p50": np.nan, f"{prefix}_p95": np.nan, f"{prefix}_max": np.nan}
+    return {f"{prefix}_mean": values.mean(), f"{prefix}_p50": values.quantile(0.5),
+            f"{prefix}_p95": values.quantile(0.95), f"{prefix}_max": values.max()}
+
+
+def summarize_execution(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bảng tổng hợp theo (action, side): số lệnh, tỉ lệ thành công, spread,
+    trượt giá so với giá yêu cầu / giá tham chiếu (nến M15) và độ trễ order_send.
+    """
+    if df.empty:
+        return pd.DataFrame()
+    rows = []
+    for (action, side), group in df.groupby(["action", "side"], dropna=False, sort=True):
+        ok = group[group["ok"]]
+        row = {"action": action, "side": side, "orders": len(group), "filled": len(ok),
+               "fill_rate": len(ok) / len(group)}
+        row.update(_describe(group["spread"], "spread"))
+        row.update(_describe(ok["slippage"], "slippage"))
+        row.update(_describe(ok["slippage_vs_reference"], "slippage_vs_ref"))
+        row.update(_describe(group["latency_ms"], "latency_ms"))
+        if "queue_ms" in group:
+            row.update(_describe(group["queue_ms"], "queue_ms"))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def suggest_cost_model(df: pd.DataFrame) -> Dict[str, float]:
+    """
+    Tham số chi phí cho backtest từ các lệnh MỞ đã khớp:
+    BACKTEST_ENTRY_SLIPPAGE = trượt giá bất lợi TRUNG BÌNH so với giá đóng nến M15
+    (backtest vào lệnh tại giá đóng nến -> gồm cả spread, giá chạy trong lúc tính Lot và trượt giá khi khớp).
+    """
+    if df.empty:
+        return {}
+    opens = df[(df["action"] == "open") & df["ok"]]["slippage_vs_reference"].dropna()
+    if opens.empty:
+        return {}
+    return {"BACKTEST_ENTRY_SLIPPAGE": float(opens.mean())}
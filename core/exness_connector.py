@@ -9,10 +9,27 @@ CHANGELOG (v2.0.1):
 """
 from __future__ import annotations
 
-import MetaTrader5 as mt5
 import pandas as pd
 import logging
-from typing import Optional, Dict, List, Tuple
+import time
+import threading
+from typing import Optional, Dict, List, Tuple, Callable, Any
+
+from core.metrics import METRICS
+from core.execution_log import ExecutionLog, adverse_slippage
+from core.mt5_gateway import MT5Gateway, GatewayStopped
+
+# (MỚI) MetaTrader5 chỉ có trên Windows: import tùy chọn để replay.py / SimBroker chạy được ở mọi nơi
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    mt5 = None
+
+# Lời gọi MT5 không trả về giá trị (None không phải lỗi)
+_NO_RESULT_CALLS = frozenset({"shutdown"})
+
+# (MỚI) Mã lỗi khi lời gọi không tới được MT5 (quá hạn trong hàng đợi / cổng MT5 đã dừng)
+MT5_GATEWAY_ERROR = -20001
 
 # Lấy logger được cấu hình bởi file chính, nếu không có thì tạo logger cơ bản
 logger = logging.getLogger("ExnessBot")
@@ -22,28 +39,131 @@ if not logger.hasHandlers():
 class ExnessConnector:
     """
     Lớp quản lý kết nối và tương tác với terminal MetaTrader 5.
+    (MỚI) backend: Đối tượng thay cho module MetaTrader5 (ví dụ SimBroker khi replay).
+    (MỚI) execution_log: Ghi giá yêu cầu/khớp, spread, retcode, độ trễ của mọi lệnh gửi lên sàn.
+    (MỚI) gateway: Cổng MT5 dùng chung - mọi lời gọi MT5 chạy trên 1 luồng duy nhất (hàng đợi ưu tiên).
+    None -> gọi trực tiếp trên luồng hiện tại (backtest / replay).
     """
-    def __init__(self):
+    def __init__(self, backend=None, execution_log: Optional[ExecutionLog] = None,
+                 gateway: Optional[MT5Gateway] = None):
+        self.mt5 = backend if backend is not None else mt5
+        self.execution_log = execution_log
+        self.gateway = gateway
+        # Lỗi MT5 của lời gọi gần nhất - riêng cho từng luồng gọi (đọc trong cùng tác vụ với lời gọi lỗi)
+        self._local = threading.local()
+        if self.mt5 is None:
+            raise ImportError("Chưa cài 'MetaTrader5'. Cài đặt: pip install MetaTrader5 (chỉ hỗ trợ Windows).")
         self._is_connected: bool = False
         self._timeframe_mapping: Dict[str, int] = {
-            '1m': mt5.TIMEFRAME_M1, '5m': mt5.TIMEFRAME_M5, '15m': mt5.TIMEFRAME_M15,
-            '30m': mt5.TIMEFRAME_M30, '1h': mt5.TIMEFRAME_H1, '4h': mt5.TIMEFRAME_H4,
-            '1d': mt5.TIMEFRAME_D1,
+            '1m': self.mt5.TIMEFRAME_M1, '5m': self.mt5.TIMEFRAME_M5, '15m': self.mt5.TIMEFRAME_M15,
+            '30m': self.mt5.TIMEFRAME_M30, '1h': self.mt5.TIMEFRAME_H1, '4h': self.mt5.TIMEFRAME_H4,
+            '1d': self.mt5.TIMEFRAME_D1,
         }
         logger.info("Exness Connector v2.0.1 (Patched) khởi tạo. Sẵn sàng kết nối...")
 
+    def _mt5_call(self, name: str, fn: Callable, *args) -> Any:
+        """
+        Gọi 1 hàm MT5, ghi độ trễ và lỗi (ngoại lệ / trả về None) vào metrics.
+        (MỚI) Có gateway: chạy trên luồng cổng MT5. Chờ quá hạn trong hàng đợi / cổng đã dừng (lúc tắt bot)
+        -> coi như lời gọi lỗi: trả về None, _last_error() = (MT5_GATEWAY_ERROR, lý do).
+        _last_timing_ms(): (thời gian chạy lời gọi MT5, thời gian chờ trong hàng đợi) của lời gọi này.
+        """
+        self._local.last_error = None
+        start = time.perf_counter()
+        if self.gateway is None:
+            result, self._local.last_error, seconds = self._timed_call(name, fn, *args)
+            self._local.timing = (seconds, 0.0)
+            return result
+        try:
+            result, self._local.last_error, seconds = self.gateway.call(name, self._timed_call, name, fn, *args)
+        except (TimeoutError, GatewayStopped) as e:
+            METRICS.inc("mt5_call_errors", labels={"call": name})
+            logger.error(str(e))
+            self._local.last_error = (MT5_GATEWAY_ERROR, str(e))
+            self._local.timing = (0.0, time.perf_counter() - start)
+            return None
+        self._local.timing = (seconds, max(0.0, time.perf_counter() - start - seconds))
+        return result
+
+    def _last_error(self) -> Any:
+        """Lỗi MT5 của lời gọi gần nhất trên luồng hiện tại (đọc cùng tác vụ với lời gọi đó)."""
+        return getattr(self._local, "last_error", None)
+
+    def _last_timing_ms(self) -> Tuple[float, float]:
+        """(ms chạy lời gọi MT5, ms chờ trong hàng đợi cổng MT5) của lời gọi gần nhất trên luồng hiện tại."""
+        seconds, queued = getattr(self._local, "timing", (0.0, 0.0))
+        return seconds * 1000.0, queued * 1000.0
+
+    def _timed_call(self, name: str, fn: Callable, *args) -> Tuple[Any, Any, float]:
+        """
+        Chạy trên luồng cổng MT5 (hoặc luồng gọi nếu không có gateway). Trả về (kết quả, lỗi MT5, giây chạy lời gọi).
+        Lời gọi thất bại -> đọc last_error() NGAY trong cùng tác vụ (không lẫn lỗi của luồng khác).
+        """
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            METRICS.inc("mt5_call_errors", labels={"call": name})
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            METRICS.observe("mt5_call_seconds", seconds, {"call": name})
+        if result is None and name not in _NO_RESULT_CALLS:
+            METRICS.inc("mt5_call_errors", labels={"call": name})
+        return result, self._read_error(name, result), seconds
+
+    def _read_error(self, name: str, result: Any) -> Any:
+        """last_error() nếu lời gọi thất bại (None / False / retcode khác DONE), ngược lại None."""
+        if name in _NO_RESULT_CALLS:
+            return None
+        retcode = getattr(result, "retcode", None)
+        if result is not None and result is not False and (retcode is None or retcode == self.mt5.TRADE_RETCODE_DONE):
+            return None
+        try:
+            return self.mt5.last_error()
+        except Exception as e:
+            return (MT5_GATEWAY_ERROR, f"last_error() lỗi: {e}")
+
+    def _log_execution(self, action: str, side: str, symbol: str, request: Dict[str, Any], tick,
+                       result, reference_price: Optional[float] = None, ticket: Optional[int] = None):
+        """
+        (MỚI) Ghi 1 dòng nhật ký khớp lệnh (nếu bật execution_log) - gọi NGAY sau order_send.
+        latency_ms: chỉ thời gian order_send trên sàn; queue_ms: thời gian chờ trong hàng đợi cổng MT5.
+        """
+        if self.execution_log is None:
+            return
+        latency_ms, queue_ms = self._last_timing_ms()
+        ok = bool(result) and result.retcode == self.mt5.TRADE_RETCODE_DONE
+        request_price = request.get("price")
+        fill_price = result.price if ok and result.price else None
+        bid, ask = (tick.bid, tick.ask) if tick else (None, None)
+        self.execution_log.record({
+            "action": action, "symbol": symbol, "side": side,
+            "ticket": ticket if ticket is not None else (result.order if ok else None),
+            "volume": request.get("volume"), "fill_volume": result.volume if ok else None,
+            "reference_price": reference_price, "request_price": request_price, "fill_price": fill_price,
+            "bid": bid, "ask": ask, "spread": (ask - bid) if tick else None,
+            "server_time": (getattr(tick, "time_msc", 0) / 1000.0 or float(tick.time)) if tick else None,
+            "slippage": adverse_slippage(side, request_price, fill_price),
+            "slippage_vs_reference": adverse_slippage(side, reference_price, fill_price),
+            "sl": request.get("sl"), "tp": request.get("tp"),
+            "retcode": result.retcode if result else None, "ok": ok,
+            "comment": result.comment if result else None, "latency_ms": round(latency_ms, 3),
+            "queue_ms": round(queue_ms, 3),
+        })
+
     def connect(self) -> bool:
         if self._is_connected:
             return True
         logger.info("Đang tìm và kết nối tới terminal MetaTrader 5...")
         try:
-            if not mt5.initialize():
-                logger.error(f"Lỗi initialize(): {mt5.last_error()}")
+            if not self._mt5_call("initialize", self.mt5.initialize):
+                logger.error(f"Lỗi initialize(): {self._last_error()}")
                 return False
-            account_info = mt5.account_info()
+            account_info = self._mt5_call("account_info", self.mt5.account_info)
             if not account_info:
-                logger.error(f"Không thể lấy thông tin tài khoản: {mt5.last_error()}")
-                mt5.shutdown()
+                logger.error(f"Không thể lấy thông tin tài khoản: {self._last_error()}")
+                self._mt5_call("shutdown", self.mt5.shutdown)
                 return False
             logger.info(f"Đã kết nối thành công tới tài khoản #{account_info.login} trên server {account_info.server}")
             self._is_connected = True
@@ -55,12 +175,12 @@ class ExnessConnector:
     def shutdown(self):
         if self._is_connected:
             logger.info("Đang đóng kết nối MetaTrader 5...")
-            mt5.shutdown()
+            self._mt5_call("shutdown", self.mt5.shutdown)
             self._is_connected = False
 
     def get_account_info(self) -> Optional[Dict]:
         if not self._is_connected: return None
-        info = mt5.account_info()
+        info = self._mt5_call("account_info", self.mt5.account_info)
         return info._asdict() if info else None
 
     def get_historical_data(self, symbol: str, timeframe: str, count: int) -> Optional[pd.DataFrame]:
@@ -70,7 +190,7 @@ class ExnessConnector:
             logger.error(f"Lỗi: Khung thời gian '{timeframe}' không được hỗ trợ.")
             return None
         try:
-            rates = mt5.copy_rates_from_pos(symbol, mt5_timeframe, 0, count)
+            rates = self._mt5_call("copy_rates_from_pos", self.mt5.copy_rates_from_pos, symbol, mt5_timeframe, 0, count)
             if rates is None or len(rates) == 0:
                 logger.warning(f"Không có dữ liệu lịch sử cho {symbol} trên khung {timeframe}.")
                 return None
@@ -83,12 +203,38 @@ class ExnessConnector:
             logger.error(f"Lỗi ngoại lệ khi lấy dữ liệu lịch sử cho {symbol}: {e}", exc_info=True)
             return None
 
-    def get_all_open_positions(self) -> List:
-        if not self._is_connected: return []
-        positions = mt5.positions_get()
-        return positions if positions else []
+    def get_server_time(self, symbol: str) -> Optional[float]:
+        """Giờ server (epoch giây, múi giờ server) theo tick mới nhất của symbol."""
+        if not self._is_connected: return None
+        tick = self._mt5_call("symbol_info_tick", self.mt5.symbol_info_tick, symbol)
+        if not tick: return None
+        time_msc = getattr(tick, 'time_msc', 0)
+        return time_msc / 1000.0 if time_msc else float(tick.time)
 
-    def place_order(self, symbol: str, order_type: int, lot_size: float, sl_price: float, tp_price: float, magic_number: int, comment: str) -> Optional[mt5.TradeResult]:
+    def get_current_bar_time(self, symbol: str, timeframe: str) -> Optional[int]:
+        """Thời điểm MỞ (epoch giây, giờ server) của nến mới nhất (đang chạy) trên khung 'timeframe'."""
+        if not self._is_connected: return None
+        mt5_timeframe = self._timeframe_mapping.get(timeframe.lower())
+        if not mt5_timeframe: return None
+        rates = self._mt5_call("copy_rates_from_pos", self.mt5.copy_rates_from_pos, symbol, mt5_timeframe, 0, 1)
+        if rates is None or len(rates) == 0: return None
+        return int(rates[0]['time'])
+
+    def get_all_open_positions(self) -> Optional[List]:
+        """
+        Các lệnh đang mở trên sàn. (MỚI) None = KHÔNG BIẾT (chưa kết nối / MT5 lỗi / quá hạn trong hàng đợi)
+        - khác hẳn [] (tài khoản không có lệnh): bên gọi phải bỏ qua vòng này, không được xóa lệnh đang quản lý.
+        """
+        if not self._is_connected: return None
+        positions = self._mt5_call("positions_get", self.mt5.positions_get)
+        if positions is None:
+            logger.warning(f"Không lấy được danh sách lệnh trên sàn: {self._last_error()}")
+            return None
+        return list(positions)
+
+    def place_order(self, symbol: str, order_type: int, lot_size: float, sl_price: float, tp_price: float, magic_number: int, comment: str,
+                    reference_price: Optional[float] = None) -> Optional[mt5.TradeResult]:
+        """(MỚI) reference_price: Giá dùng tính Lot (giá đóng nến M15) - để đo trượt giá thực tế so với backtest."""
         if not self._is_connected: return None
         
         # Kiểm tra lệnh lần cuối trước khi gửi
@@ -99,59 +245,67 @@ class ExnessConnector:
             logger.error(f"Dữ liệu thị trường tại thời điểm lỗi: {market_data}")
             return None
 
-        tick = mt5.symbol_info_tick(symbol)
-        price = tick.ask if order_type == mt5.ORDER_TYPE_BUY else tick.bid
+        tick = self._mt5_call("symbol_info_tick", self.mt5.symbol_info_tick, symbol)
+        if not tick:
+            logger.error(f"Không thể lấy giá tick cho {symbol} để đặt lệnh. Hủy đặt lệnh.")
+            return None
+        price = tick.ask if order_type == self.mt5.ORDER_TYPE_BUY else tick.bid
         request = {
-            "action": mt5.TRADE_ACTION_DEAL, "symbol": symbol, "volume": lot_size,
+            "action": self.mt5.TRADE_ACTION_DEAL, "symbol": symbol, "volume": lot_size,
             "type": order_type, "price": price, "sl": sl_price, "tp": tp_price,
             "magic": magic_number, "comment": comment,
-            "type_time": mt5.ORDER_TIME_GTC, "type_filling": mt5.ORDER_FILLING_FOK,
+            "type_time": self.mt5.ORDER_TIME_GTC, "type_filling": self.mt5.ORDER_FILLING_FOK,
         }
-        result = mt5.order_send(request)
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
+        result = self._mt5_call("order_send", self.mt5.order_send, request)
+        side = "BUY" if order_type == self.mt5.ORDER_TYPE_BUY else "SELL"
+        self._log_execution("open", side, symbol, request, tick, result, reference_price)
+        if result and result.retcode == self.mt5.TRADE_RETCODE_DONE:
             logger.info(f"✅ Lệnh {symbol} đã được đặt thành công. Ticket: {result.order}, Comment: '{comment}'")
             return result
-        logger.error(f"❌ Đặt lệnh {symbol} thất bại. Retcode: {result.retcode if result else 'N/A'}, Comment: '{result.comment if result else 'N/A'}' Error: {mt5.last_error()}")
+        logger.error(f"❌ Đặt lệnh {symbol} thất bại. Retcode: {result.retcode if result else 'N/A'}, Comment: '{result.comment if result else 'N/A'}' Error: {self._last_error()}")
         return None
 
     def close_position(self, position, volume_to_close: Optional[float] = None, comment: str = "exness_bot_close") -> Optional[mt5.TradeResult]:
         if not self._is_connected: return None
-        tick = mt5.symbol_info_tick(position.symbol)
+        tick = self._mt5_call("symbol_info_tick", self.mt5.symbol_info_tick, position.symbol)
         if not tick:
             logger.error(f"Không thể lấy giá tick cho {position.symbol} để đóng lệnh.")
             return None
-        order_type = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-        price = tick.bid if position.type == mt5.ORDER_TYPE_BUY else tick.ask
+        order_type = self.mt5.ORDER_TYPE_SELL if position.type == self.mt5.ORDER_TYPE_BUY else self.mt5.ORDER_TYPE_BUY
+        price = tick.bid if position.type == self.mt5.ORDER_TYPE_BUY else tick.ask
         volume = volume_to_close if volume_to_close is not None and volume_to_close > 0 else position.volume
         request = {
-            "action": mt5.TRADE_ACTION_DEAL, "symbol": position.symbol, "volume": volume,
+            "action": self.mt5.TRADE_ACTION_DEAL, "symbol": position.symbol, "volume": volume,
             "type": order_type, "position": position.ticket, "price": price, "comment": comment,
-            "type_time": mt5.ORDER_TIME_GTC, "type_filling": mt5.ORDER_FILLING_FOK,
+            "type_time": self.mt5.ORDER_TIME_GTC, "type_filling": self.mt5.ORDER_FILLING_FOK,
         }
-        result = mt5.order_send(request)
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
+        result = self._mt5_call("order_send", self.mt5.order_send, request)
+        side = "BUY" if order_type == self.mt5.ORDER_TYPE_BUY else "SELL"
+        self._log_execution("close", side, position.symbol, request, tick, result, ticket=position.ticket)
+        if result and result.retcode == self.mt5.TRADE_RETCODE_DONE:
             logger.info(f"✅ Lệnh đóng {volume:.2f} lot cho ticket #{position.ticket} đã được gửi thành công.")
             return result
-        logger.error(f"❌ Đóng lệnh cho ticket #{position.ticket} thất bại. Retcode: {result.retcode if result else 'N/A'}, Error: {mt5.last_error()}")
+        logger.error(f"❌ Đóng lệnh cho ticket #{position.ticket} thất bại. Retcode: {result.retcode if result else 'N/A'}, Error: {self._last_error()}")
         return None
 
     def modify_position(self, ticket_id: int, sl_price: float, tp_price: float) -> bool:
         if not self._is_connected: return False
         request = {
-            "action": mt5.TRADE_ACTION_SLTP, "position": ticket_id,
+            "action": self.mt5.TRADE_ACTION_SLTP, "position": ticket_id,
             "sl": float(sl_price), "tp": float(tp_price),
         }
-        result = mt5.order_send(request)
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
+        result = self._mt5_call("order_send", self.mt5.order_send, request)
+        self._log_execution("modify", None, None, request, None, result, ticket=ticket_id)
+        if result and result.retcode == self.mt5.TRADE_RETCODE_DONE:
             logger.info(f"Sửa lệnh #{ticket_id} thành công. SL mới: {sl_price:.5f}, TP mới: {tp_price:.5f}")
             return True
-        logger.error(f"Sửa lệnh #{ticket_id} thất bại. Retcode: {result.retcode if result else 'N/A'}, Error: {mt5.last_error()}")
+        logger.error(f"Sửa lệnh #{ticket_id} thất bại. Retcode: {result.retcode if result else 'N/A'}, Error: {self._last_error()}")
         return False
 
     def calculate_profit(self, symbol: str, order_type_str: str, volume: float, entry_price: float, current_price: float) -> Optional[float]:
         if not self._is_connected: return None
-        mt5_order_type = mt5.ORDER_TYPE_BUY if order_type_str == "LONG" else mt5.ORDER_TYPE_SELL
-        profit = mt5.order_calc_profit(mt5_order_type, symbol, volume, entry_price, current_price)
+        mt5_order_type = self.mt5.ORDER_TYPE_BUY if order_type_str == "LONG" else self.mt5.ORDER_TYPE_SELL
+        profit = self._mt5_call("order_calc_profit", self.mt5.order_calc_profit, mt5_order_type, symbol, volume, entry_price, current_price)
         return profit
 
     # --- (THAY ĐỔI) Sửa Lỗi 2 (Phần 1) ---
@@ -166,18 +320,18 @@ class ExnessConnector:
         
         try:
             # BƯỚC 1: Lấy thông tin symbol và validate
-            symbol_info = mt5.symbol_info(symbol)
+            symbol_info = self._mt5_call("symbol_info", self.mt5.symbol_info, symbol)
             if not symbol_info:
                 logger.error(f"Không lấy được thông tin symbol {symbol}")
                 return None, 0.0 # (THAY ĐỔI)
 
-            tick = mt5.symbol_info_tick(symbol)
+            tick = self._mt5_call("symbol_info_tick", self.mt5.symbol_info_tick, symbol)
             if not tick:
                 logger.error(f"Không lấy được tick data của {symbol}")
                 return None, 0.0 # (THAY ĐỔI)
             
             # BƯỚC 2: Xác định giá vào lệnh và các tham số cơ bản
-            entry_price = tick.ask if order_type == mt5.ORDER_TYPE_BUY else tick.bid
+            entry_price = tick.ask if order_type == self.mt5.ORDER_TYPE_BUY else tick.bid
             min_vol, max_vol, vol_step = symbol_info.volume_min, symbol_info.volume_max, symbol_info.volume_step
 
             # BƯỚC 3: Validate và tự động điều chỉnh khoảng cách SL
@@ -187,11 +341,11 @@ class ExnessConnector:
                 logger.warning(f"SL quá gần cho {symbol}. Khoảng cách hiện tại: {abs(entry_price - sl_price):.5f} < Yêu cầu: {min_distance:.5f}")
                 # Thêm một khoảng đệm an toàn 20%
                 buffer = min_distance * 1.2
-                sl_price = entry_price - buffer if order_type == mt5.ORDER_TYPE_BUY else entry_price + buffer
+                sl_price = entry_price - buffer if order_type == self.mt5.ORDER_TYPE_BUY else entry_price + buffer
                 logger.info(f"Tự động điều chỉnh SL cho {symbol} về mức an toàn: {sl_price:.5f}")
 
             # BƯỚC 4: Tính mức lỗ, ưu tiên hàm của MT5 (dùng sl_price đã điều chỉnh)
-            loss_per_lot = mt5.order_calc_profit(order_type, symbol, 1.0, entry_price, sl_price)
+            loss_per_lot = self._mt5_call("order_calc_profit", self.mt5.order_calc_profit, order_type, symbol, 1.0, entry_price, sl_price)
 
             # BƯỚC 5: Validate kết quả tính mức lỗ và fallback khẩn cấp
             if loss_per_lot is None or loss_per_lot >= 0:
@@ -226,7 +380,7 @@ class ExnessConnector:
         except Exception as e:
             logger.error(f"Lỗi ngoại lệ nghiêm trọng trong calculate_lot_size cho {symbol}: {e}", exc_info=True)
             try:
-                symbol_info = mt5.symbol_info(symbol)
+                symbol_info = self._mt5_call("symbol_info", self.mt5.symbol_info, symbol)
                 if symbol_info:
                     logger.critical(f"FALLBACK NGOẠI LỆ: Sử dụng lot size tối thiểu cho {symbol} do lỗi không xác định.")
                     return symbol_info.volume_min, 0.0 # (THAY ĐỔI)
@@ -241,11 +395,11 @@ class ExnessConnector:
         Kiểm tra các tham số của lệnh một cách toàn diện trước khi gửi lên server MT5.
         """
         try:
-            symbol_info = mt5.symbol_info(symbol)
+            symbol_info = self._mt5_call("symbol_info", self.mt5.symbol_info, symbol)
             if not symbol_info:
                 return False, f"Symbol không hợp lệ: {symbol}"
                 
-            tick = mt5.symbol_info_tick(symbol)
+            tick = self._mt5_call("symbol_info_tick", self.mt5.symbol_info_tick, symbol)
             if not tick:
                 return False, f"Không có tick data cho {symbol}"
                 
@@ -258,21 +412,21 @@ class ExnessConnector:
                  return False, f"Lot size {lot_size} không đúng bước nhảy {symbol_info.volume_step}"
 
             # Kiểm tra giá và khoảng cách SL/TP
-            entry_price = tick.ask if order_type == mt5.ORDER_TYPE_BUY else tick.bid
+            entry_price = tick.ask if order_type == self.mt5.ORDER_TYPE_BUY else tick.bid
             # stops_level là khoảng cách tối thiểu tính bằng point mà sàn yêu cầu
             min_distance_points = getattr(symbol_info, 'trade_stops_level', 0)
             min_distance_price = min_distance_points * symbol_info.point
 
             if sl_price > 0:
-                if order_type == mt5.ORDER_TYPE_BUY and entry_price - sl_price < min_distance_price:
+                if order_type == self.mt5.ORDER_TYPE_BUY and entry_price - sl_price < min_distance_price:
                     return False, f"SL quá gần. Khoảng cách {entry_price - sl_price:.5f} < yêu cầu {min_distance_price:.5f}"
-                if order_type == mt5.ORDER_TYPE_SELL and sl_price - entry_price < min_distance_price:
+                if order_type == self.mt5.ORDER_TYPE_SELL and sl_price - entry_price < min_distance_price:
                     return False, f"SL quá gần. Khoảng cách {sl_price - entry_price:.5f} < yêu cầu {min_distance_price:.5f}"
 
             if tp_price > 0:
-                if order_type == mt5.ORDER_TYPE_BUY and tp_price - entry_price < min_distance_price:
+                if order_type == self.mt5.ORDER_TYPE_BUY and tp_price - entry_price < min_distance_price:
                     return False, f"TP quá gần. Khoảng cách {tp_price - entry_price:.5f} < yêu cầu {min_distance_price:.5f}"
-                if order_type == mt5.ORDER_TYPE_SELL and entry_price - tp_price < min_distance_price:
+                if order_type == self.mt5.ORDER_TYPE_SELL and entry_price - tp_price < min_distance_price:
                     return False, f"TP quá gần. Khoảng cách {entry_price - tp_price:.5f} < yêu cầu {min_distance_price:.5f}"
             
             return True, "Hợp lệ"
@@ -285,8 +439,8 @@ class ExnessConnector:
         Lấy thông tin chi tiết về thị trường của một symbol để gỡ lỗi.
         """
         try:
-            symbol_info = mt5.symbol_info(symbol)
-            tick = mt5.symbol_info_tick(symbol)
+            symbol_info = self._mt5_call("symbol_info", self.mt5.symbol_info, symbol)
+            tick = self._mt5_call("symbol_info_tick", self.mt5.symbol_info_tick, symbol)
             
             if not symbol_info or not tick:
                 return {"status": "error", "message": "Không lấy được dữ liệu thị trường"}
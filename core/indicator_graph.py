@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/indicator_graph.py
+
+import time
+import logging
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from core.metrics import METRICS
+from signals.atr import calculate_atr
+from signals.swing_point import get_last_swing_points
+from signals.adx import get_adx_value
+from signals.ema import check_trend_ema
+from signals.supertrend import get_supertrend_direction
+
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# ĐỒ THỊ TÍNH CHỈ BÁO (CHẠY SONG SONG BẰNG THREAD POOL)
+# ------------------------------------------------------------------------------
+# Trước đây: mỗi nến tính lần lượt chỉ báo H1 (ADX, EMA, Supertrend) -> M15 (ATR, Swing)
+# -> TSL tính lại ATR/Swing/ADX lần nữa.
+# Bây giờ: mỗi chỉ báo là 1 "nút" (tên, hàm, các nút phụ thuộc). Nút có đủ đầu vào được
+# chạy ngay trên thread pool (numpy/pandas nhả GIL ở phần tính toán nặng); nút phụ thuộc
+# (ví dụ ATR -> Supertrend, ATR -> hệ số ATR động) chạy khi nút trước xong.
+# Mỗi nút được đo thời gian (timings) để báo cáo / đưa lên metrics.
+# Nhiều symbol / nhiều khung: thêm nút với tiền tố riêng (prefix) vào CÙNG 1 đồ thị.
+# ==============================================================================
+
+_EXECUTORS: Dict[int, ThreadPoolExecutor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def get_indicator_executor(max_workers: int) -> Optional[ThreadPoolExecutor]:
+    """Thread pool dùng chung (tạo 1 lần theo số luồng). max_workers <= 1 -> None (chạy tuần tự)."""
+    max_workers = int(max_workers or 0)
+    if max_workers <= 1:
+        return None
+    with _EXECUTORS_LOCK:
+        executor = _EXECUTORS.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Indicator")
+            _EXECUTORS[max_workers] = executor
+        return executor
+
+
+class IndicatorGraph:
+    """
+    Đồ thị phụ thuộc giữa các chỉ báo.
+    add(name, fn, deps): fn nhận kết quả các nút 'deps' (theo thứ tự) làm tham số.
+    Nút phụ thuộc phải được thêm SAU các nút nó cần -> đồ thị luôn không có vòng.
+    """
+    def __init__(self):
+        self._nodes: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, float] = {} # Giây / nút (lần chạy gần nhất)
+        self.wall_time = 0.0
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> "IndicatorGraph":
+        if name in self._nodes:
+            raise ValueError(f"Nút chỉ báo '{name}' đã tồn tại.")
+        missing = [dep for dep in deps if dep not in self._nodes]
+        if missing:
+            raise ValueError(f"Nút chỉ báo '{name}' phụ thuộc nút chưa khai báo: {missing}")
+        self._nodes[name] = (fn, tuple(deps))
+        return self
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def _call(self, name: str, results: Dict[str, Any]) -> Any:
+        fn, deps = self._nodes[name]
+        start = time.perf_counter()
+        try:
+            return fn(*(results[dep] for dep in deps))
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def run(self, executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, Any]:
+        """
+        Tính mọi nút, trả về {tên nút: kết quả}.
+        executor None -> tuần tự theo thứ tự thêm. Nút lỗi -> hủy các nút chưa chạy và ném lại lỗi.
+        """
+        self.timings = {}
+        results: Dict[str, Any] = {}
+        start = time.perf_counter()
+        try:
+            if executor is None:
+                for name in self._nodes:
+                    results[name] = self._call(name, results)
+                return results
+
+            waiting = {name: set(deps) for name, (_, deps) in self._nodes.items()}
+            pending = {}
+
+            def _submit_ready():
+                for name in [n for n, deps in waiting.items() if not deps]:
+                    del waiting[name]
+                    pending[executor.submit(self._call, name, results)] = name
+
+            _submit_ready()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for other in pending:
+                            other.cancel()
+                        raise
+                    for deps in waiting.values():
+                        deps.discard(name)
+                _submit_ready()
+            return results
+        finally:
+            self.wall_time = time.perf_counter() - start
+
+    def describe_timings(self) -> str:
+        """Chuỗi báo cáo: thời gian từng nút (chậm nhất trước) + tổng / thời gian thực."""
+        parts = [f"{name} {seconds * 1000:.1f}ms"
+                 for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1])]
+        total = sum(self.timings.values())
+        return f"{' | '.join(parts)} (tổng {total * 1000:.1f}ms, thực tế {self.wall_time * 1000:.1f}ms)"
+
+# ==============================================================================
+# CHỈ BÁO CỦA CHIẾN LƯỢC CHO 1 VÒNG LIVE (CÙNG CỬA SỔ NẾN -> GIÁ TRỊ GIỐNG HỆT CÁCH TÍNH CŨ)
+# ==============================================================================
+
+def add_strategy_nodes(graph: IndicatorGraph, data_h1: pd.DataFrame, data_m15: pd.DataFrame,
+                       params: "StrategyParams", prefix: str = "") -> IndicatorGraph:
+    """Thêm các nút chỉ báo của chiến lược cho 1 cặp cửa sổ H1/M15 (prefix: phân biệt symbol)."""
+    graph.add(f"{prefix}m15.atr", lambda: calculate_atr(data_m15, params.atr_period))
+    graph.add(f"{prefix}m15.swing", lambda: get_last_swing_points(data_m15, params))
+    graph.add(f"{prefix}h1.adx", lambda: get_adx_value(data_h1, params))
+    graph.add(f"{prefix}h1.ema_trend", lambda: check_trend_ema(data_h1, params))
+    graph.add(f"{prefix}h1.st_atr", lambda: calculate_atr(data_h1, params.ST_ATR_PERIOD))
+    graph.add(f"{prefix}h1.supertrend", lambda atr: get_supertrend_direction(data_h1, params, atr=atr),
+              deps=(f"{prefix}h1.st_atr",))
+    return graph
+
+
+def strategy_indicator_key(params: "StrategyParams", h1_bars: int, m15_bars: int) -> Tuple[Any, ...]:
+    """
+    (MỚI) Khóa các tham số mà add_strategy_nodes đọc (+ độ dài cửa sổ nến):
+    2 bộ tham số cùng khóa -> cùng giá trị chỉ báo -> chỉ cần tính 1 lần.
+    """
+    return (params.atr_period, params.swing_period, params.ADX_PERIOD, params.TREND_EMA_PERIOD,
+            params.ST_ATR_PERIOD, params.ST_MULTIPLIER, h1_bars, m15_bars)
+
+
+def snapshot_from_results(results: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Kết quả đồ thị -> dict 'precomputed' (cùng định dạng Backtest truyền cho get_signal / TradeManager)."""
+    atr_series = results[f"{prefix}m15.atr"]
+    swing_high, swing_low = results[f"{prefix}m15.swing"]
+    return {
+        "atr": atr_series.iloc[-1],
+        "atr_series": atr_series, # (Cho hệ số ATR động - không tính lại ATR)
+        "swing_high": swing_high,
+        "swing_low": swing_low,
+        "trend_adx": results[f"{prefix}h1.adx"],
+        "trend_ema": results[f"{prefix}h1.ema_trend"],
+        "trend_st": results[f"{prefix}h1.supertrend"],
+    }
+
+
+def compute_indicator_snapshot(data_h1: pd.DataFrame, data_m15: pd.DataFrame, params: "StrategyParams",
+                               executor: Optional[ThreadPoolExecutor] = None) -> Optional[Dict[str, Any]]:
+    """
+    Tính 1 lần mọi chỉ báo của vòng hiện tại (song song nếu có executor).
+    Lỗi (thiếu dữ liệu...) -> None: TradeManager tự tính như cũ (và tự báo lỗi).
+    """
+    graph = add_strategy_nodes(IndicatorGraph(), data_h1, data_m15, params)
+    try:
+        snapshot = snapshot_from_results(graph.run(executor))
+    except Exception as e:
+        logger.debug(f"[Indicators] Không tính trước được chỉ báo ({e}). Tính trực tiếp.")
+        return None
+    finally:
+        _report_timings(graph)
+    return snapshot
+
+
+def _report_timings(graph: IndicatorGraph):
+    for name, seconds in graph.timings.items():
+        METRICS.observe("indicator_node_seconds", seconds, {"node": name})
+    METRICS.observe("indicator_graph_seconds", graph.wall_time)
+    logger.debug(f"[Indicators] {graph.describe_timings()}")
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/live_bars.py
+
+import os
+import json
+import logging
+import pandas as pd
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# BỘ ĐỆM NẾN LIVE + CHECKPOINT (KHỞI ĐỘNG LẠI NHANH)
+# ------------------------------------------------------------------------------
+# Trước đây: mỗi vòng Luồng 1 tải lại NUM_H1_BARS / NUM_M15_BARS nến của từng khung.
+# Bây giờ: giữ các nến ĐÃ ĐÓNG của mỗi khung trong RAM + ghi checkpoint ra file
+# (cạnh trades_state.json). Mỗi vòng chỉ tải "phần thiếu": vài nến mới nhất,
+# nối vào bộ đệm khi nến cũ nhất tải về trùng nến cuối trong bộ đệm (cả thời gian lẫn giá đóng).
+# Không trùng (mất kết nối lâu, sàn sửa lịch sử...) -> tải lại đủ cửa sổ như cũ.
+#
+# Cửa sổ trả về GIỐNG HỆT get_historical_data(count): (count - 1) nến đã đóng cuối + nến cuối
+# cùng tải về (nến đang chạy). Mọi chỉ báo của chiến lược là hàm của ĐÚNG cửa sổ này
+# (giống backtest) -> sau khi khởi động lại, giá trị chỉ báo trùng khớp với lúc chạy liên tục.
+# ==============================================================================
+
+CHECKPOINT_VERSION = 1
+_GAP_FETCH_START = 3 # Số nến tải thử đầu tiên (nến cuối trong bộ đệm + nến vừa đóng + nến đang chạy)
+_PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+
+def read_checkpoint(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Đọc file checkpoint nến (không có / lỗi -> None). Dùng để đưa vào meta của file ghi MT5."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class LiveBarBuffer:
+    """
+    Bộ đệm nến đã đóng theo khung (windows: {khung: số nến cửa sổ}).
+    path: File checkpoint (None = không lưu).
+    """
+    def __init__(self, connector, symbol: str, windows: Dict[str, int], path: Optional[str] = None):
+        self.connector = connector
+        self.symbol = symbol
+        self.windows = {tf.lower(): int(count) for tf, count in windows.items()}
+        self.path = path
+        self._closed: Dict[str, pd.DataFrame] = {}
+        self.stats = {"full_fetches": 0, "gap_fetches": 0, "bars_fetched": 0}
+
+    # ==========================================================
+    # CHECKPOINT
+    # ==========================================================
+    def to_dict(self) -> Dict[str, Any]:
+        """Checkpoint dạng JSON: nến đã đóng + nến đã xử lý cuối cùng của từng khung."""
+        timeframes = {}
+        for tf, df in self._closed.items():
+            timeframes[tf] = {
+                "last_bar_time": int(df.index[-1].timestamp()) if not df.empty else None,
+                "time": [int(t.timestamp()) for t in df.index],
+                "volume_dtype": str(df['volume'].dtype),
+                **{col: df[col].tolist() for col in df.columns},
+            }
+        return {"version": CHECKPOINT_VERSION, "symbol": self.symbol, "windows": self.windows, "timeframes": timeframes}
+
+    def restore(self, checkpoint: Optional[Dict[str, Any]]) -> bool:
+        """Nạp checkpoint (bỏ qua nếu khác phiên bản / symbol / cửa sổ)."""
+        if not checkpoint or checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("symbol") != self.symbol:
+            return False
+        self._closed = {}
+        for tf, data in checkpoint.get("timeframes", {}).items():
+            if checkpoint.get("windows", {}).get(tf) != self.windows.get(tf) or not data["time"]:
+                continue
+            index = pd.to_datetime(data["time"], unit='s')
+            index.name = 'timestamp'
+            df = pd.DataFrame({col: data[col] for col in _PRICE_COLUMNS}, index=index, dtype='float64')
+            df['volume'] = pd.Series(data["volume"], index=index).astype(data["volume_dtype"])
+            self._closed[tf] = df
+        return bool(self._closed)
+
+    def load(self) -> bool:
+        """Đọc checkpoint từ file (nếu có)."""
+        checkpoint = read_checkpoint(self.path)
+        if checkpoint is None:
+            return False
+        try:
+            restored = self.restore(checkpoint)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"[LiveBars] Checkpoint nến bị lỗi ({e}). Tải lại toàn bộ cửa sổ.")
+            return False
+        if restored:
+            last = {tf: str(df.index[-1]) for tf, df in self._closed.items()}
+            logger.info(f"[LiveBars] Đã nạp checkpoint nến (nến đã đóng cuối: {last}). Chỉ tải phần thiếu.")
+        return restored
+
+    def save(self):
+        """Ghi checkpoint (ghi file tạm rồi đổi tên - không hỏng file khi tắt đột ngột)."""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"[LiveBars] Không ghi được checkpoint nến: {e}")
+
+    # ==========================================================
+    # LẤY CỬA SỔ NẾN
+    # ==========================================================
+    def _fetch(self, tf: str, count: int) -> Optional[pd.DataFrame]:
+        df = self.connector.get_historical_data(self.symbol, tf, count)
+        if df is not None:
+            self.stats["bars_fetched"] += len(df)
+        return df
+
+    def _fetch_gap(self, tf: str, closed: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """Tải số nến tăng dần tới khi nến cũ nhất tải về <= nến cuối trong bộ đệm. None = cần tải lại đủ."""
+        count = self.windows[tf]
+        last_time, last_close = closed.index[-1], closed['close'].iloc[-1]
+        n = _GAP_FETCH_START
+        while n < count:
+            df = self._fetch(tf, n)
+            if df is None or df.empty:
+                return None
+            if df.index[0] <= last_time:
+                if last_time not in df.index or df.at[last_time, 'close'] != last_close:
+                    return None # (Lịch sử trên sàn khác bộ đệm)
+                self.stats["gap_fetches"] += 1
+                return df
+            n *= 4
+        return None
+
+    def get(self, tf: str) -> Optional[pd.DataFrame]:
+        """Cửa sổ nến của khung 'tf' (giống get_historical_data(symbol, tf, windows[tf]))."""
+        tf = tf.lower()
+        count = self.windows[tf]
+        closed = self._closed.get(tf)
+
+        fetched = self._fetch_gap(tf, closed) if closed is not None and not closed.empty else None
+        if fetched is None:
+            fetched = self._fetch(tf, count)
+            if fetched is None or fetched.empty:
+                return None
+            self.stats["full_fetches"] += 1
+            closed = None
+
+        # Nến cuối tải về có thể đang chạy -> không đưa vào bộ đệm (lần sau tải lại)
+        keep = max(count - 1, 0)
+        if closed is None:
+            closed = fetched.iloc[max(0, len(fetched) - 1 - keep):-1] if keep else fetched.iloc[:0]
+            changed = True
+        else:
+            new_closed = fetched.iloc[:-1]
+            new_closed = new_closed[new_closed.index > closed.index[-1]]
+            changed = not new_closed.empty
+            if changed:
+                closed = pd.concat([closed, new_closed]).iloc[-keep:]
+        self._closed[tf] = closed
+        if changed:
+            self.save()
+        return pd.concat([closed, fetched.iloc[-1:]]) if not closed.empty else fetched.iloc[-1:]
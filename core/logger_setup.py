@@ -1,18 +1,40 @@
 # -*- coding: utf-8 -*-
 # core/logger_setup.py
 
+import atexit
 import logging
 import os
+import queue
 # Đổi từ RotatingFileHandler sang TimedRotatingFileHandler
-from logging.handlers import TimedRotatingFileHandler 
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 
-def setup_logging():
+# (MỚI) Hàng đợi log (khi use_queue=True) - ghi file/màn hình trên luồng riêng
+_log_queue = None
+_log_listener = None
+
+def get_log_queue_depth() -> int:
+    """Số bản ghi log đang chờ ghi (0 nếu không dùng hàng đợi)."""
+    return _log_queue.qsize() if _log_queue is not None else 0
+
+def _stop_log_listener():
+    """Ghi nốt log còn trong hàng đợi (gọi khi thoát chương trình)."""
+    global _log_queue, _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_queue, _log_listener = None, None
+
+atexit.register(_stop_log_listener)
+
+def setup_logging(use_queue: bool = False):
     """
     Thiết lập hệ thống ghi log chuyên nghiệp cho toàn bộ bot.
     - Hiển thị log INFO trở lên ra màn hình.
     - Ghi log DEBUG trở lên vào file (TỰ ĐỘNG XOAY VÒNG HÀNG NGÀY).
     - Ghi log ERROR trở lên vào file (TỰ ĐỘNG XOAY VÒNG HÀNG NGÀY).
+    - (MỚI) use_queue=True: Các luồng chỉ đẩy log vào hàng đợi, 1 luồng nền ghi ra handler
+      (luồng giao dịch không phải chờ ghi file).
     """
+    global _log_queue, _log_listener
     
     # Xác định thư mục log
     CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -27,6 +49,7 @@ def setup_logging():
     # Dọn dẹp các handler cũ để tránh ghi log lặp lại
     if logger.hasHandlers():
         logger.handlers.clear()
+    _stop_log_listener()
         
     # --- Handler 1: Hiển thị ra màn hình (Console) ---
     stream_handler = logging.StreamHandler()
@@ -70,9 +93,16 @@ def setup_logging():
     error_handler.setFormatter(file_formatter)
     
     # Thêm các handler vào logger
-    logger.addHandler(stream_handler)
-    logger.addHandler(info_handler)
-    logger.addHandler(error_handler)
+    if use_queue:
+        _log_queue = queue.SimpleQueue()
+        _log_listener = QueueListener(_log_queue, stream_handler, info_handler, error_handler,
+                                      respect_handler_level=True)
+        _log_listener.start()
+        logger.addHandler(QueueHandler(_log_queue))
+    else:
+        logger.addHandler(stream_handler)
+        logger.addHandler(info_handler)
+        logger.addHandler(error_handler)
     
     # Ngăn không cho log lan truyền lên root logger
     logger.propagate = False
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/metrics.py
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Callable, Tuple
+
+logger = logging.getLogger("ExnessBot")
+
+METRIC_PREFIX = "exnessbot_"
+
+# Khóa 1 metric: (tên, ((nhãn, giá trị), ...))
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+def _make_key(name: str, labels: Optional[Dict[str, Any]]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items())) if labels else ()
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in labels)
+    return "{" + inner + "}"
+
+# ==============================================================================
+# KHO METRIC (GHI NHANH - ĐỌC KHI SCRAPE)
+# ==============================================================================
+
+class MetricsRegistry:
+    """
+    Kho metric dùng chung cho cả bot (counter / gauge / summary).
+    - Ghi: chỉ vài thao tác dict dưới 1 lock riêng (micro giây) -> không làm chậm các luồng.
+    - Gauge dạng hàm (gauge_fn): chỉ được tính khi có request /metrics.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._summaries: Dict[MetricKey, list] = {} # [count, sum, max, last]
+        self._gauge_fns: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        """Mô tả metric (dòng # HELP)."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, Any]] = None):
+        key = _make_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        key = _make_key(name, labels)
+        with self._lock:
+            self._gauges[key] = float(value)
+
+    def gauge_fn(self, name: str, fn: Callable[[], float]):
+        """Đăng ký gauge tính lười (ví dụ: số lệnh đang mở, độ dài hàng đợi log)."""
+        self._gauge_fns[name] = fn
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        """Ghi 1 quan sát (thời gian, độ trễ...) vào summary."""
+        key = _make_key(name, labels)
+        with self._lock:
+            entry = self._summaries.get(key)
+            if entry is None:
+                self._summaries[key] = [1, value, value, value]
+            else:
+                entry[0] += 1
+                entry[1] += value
+                if value > entry[2]:
+                    entry[2] = value
+                entry[3] = value
+
+    @contextmanager
+    def timed(self, name: str, labels: Optional[Dict[str, Any]] = None):
+        """Đo thời gian 1 khối lệnh (giây)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    # ==========================================================
+    # XUẤT DẠNG TEXT (PROMETHEUS)
+    # ==========================================================
+    def render(self) -> str:
+        """Xuất toàn bộ metric theo định dạng text của Prometheus."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {key: list(entry) for key, entry in self._summaries.items()}
+
+        for name, fn in list(self._gauge_fns.items()):
+            try:
+                gauges[(name, ())] = float(fn())
+            except Exception as e:
+                logger.debug(f"[Metrics] Lỗi tính gauge {name}: {e}")
+
+        lines = []
+        def _emit(kind: str, series: Dict[MetricKey, Any], render_one: Callable):
+            seen = set()
+            for (name, labels), value in sorted(series.items()):
+                full_name = METRIC_PREFIX + name
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {full_name} {self._help[name]}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                render_one(full_name, _format_labels(labels), value)
+
+        _emit("counter", counters, lambda n, l, v: lines.append(f"{n}_total{l} {v:.10g}"))
+        _emit("gauge", gauges, lambda n, l, v: lines.append(f"{n}{l} {v:.10g}"))
+
+        def _summary(n, l, v):
+            count, total, max_value, last = v
+            lines.append(f"{n}_count{l} {count}")
+            lines.append(f"{n}_sum{l} {total:.10g}")
+            lines.append(f"{n}_max{l} {max_value:.10g}")
+            lines.append(f"{n}_last{l} {last:.10g}")
+        _emit("summary", summaries, _summary)
+
+        return "\n".join(lines) + "\n"
+
+
+# Kho metric toàn cục (giống logger "ExnessBot": module nào cũng ghi được)
+METRICS = MetricsRegistry()
+
+# ==============================================================================
+# HTTP ENDPOINT (LOCALHOST)
+# ==============================================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = METRICS
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Không ghi log mỗi lần scrape
+        pass
+
+def start_metrics_server(port: int, host: str = "127.0.0.1",
+                         registry: MetricsRegistry = METRICS) -> Optional[ThreadingHTTPServer]:
+    """
+    Chạy endpoint /metrics trên luồng nền (daemon).
+    Trả về server (để shutdown) hoặc None nếu không mở được cổng.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error(f"[Metrics] Không mở được cổng {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"[Metrics] Endpoint: http://{host}:{port}/metrics")
+    return server
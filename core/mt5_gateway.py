@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/mt5_gateway.py
+
+import time
+import queue
+import logging
+import itertools
+import threading
+from dataclasses import dataclass
+from concurrent.futures import CancelledError, Future, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.metrics import METRICS
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# CỔNG MT5 (1 LUỒNG DUY NHẤT GỌI MT5 + HÀNG ĐỢI ƯU TIÊN)
+# ------------------------------------------------------------------------------
+# Gói MetaTrader5 là client IPC toàn cục, KHÔNG an toàn đa luồng, nhưng Luồng 1 (Signal/TSL)
+# và Luồng 2 (Reconcile) cùng gọi vào ExnessConnector.
+# Bây giờ: mọi lời gọi MT5 (ExnessConnector._mt5_call) được gửi thành 1 yêu cầu vào hàng đợi
+# và chạy TUẦN TỰ trên 1 luồng "MT5Gateway" sở hữu kết nối; bên gọi nhận Future.
+# - Ưu tiên: lệnh (order_send) > truy vấn nhẹ (tick, positions, account...) > tải nến (copy_rates).
+#   Cùng mức ưu tiên -> đến trước chạy trước.
+# - Timeout từng yêu cầu = thời gian tối đa CHỜ TRONG HÀNG ĐỢI. Quá hạn mà chưa chạy -> hủy
+#   (không bao giờ gửi 1 lệnh đã cũ); đã bắt đầu chạy -> chờ tới khi xong (không mất kết quả lệnh).
+# - Metrics: mt5_queue_depth (gauge), mt5_queue_wait_seconds (theo lời gọi), mt5_queue_timeouts.
+# ==============================================================================
+
+PRIORITY_ORDER = 0 # Gửi / sửa / đóng lệnh
+PRIORITY_QUERY = 1 # Truy vấn nhẹ (tick, positions, account, symbol_info...)
+PRIORITY_BULK = 2  # Tải nến (copy_rates_*)
+
+PRIORITY_NAMES = {PRIORITY_ORDER: "ORDER", PRIORITY_QUERY: "QUERY", PRIORITY_BULK: "BULK"}
+
+# Mức ưu tiên theo tên lời gọi MT5 (không có trong bảng -> QUERY)
+CALL_PRIORITIES = {
+    "order_send": PRIORITY_ORDER,
+    "order_check": PRIORITY_ORDER,
+    "copy_rates_from_pos": PRIORITY_BULK,
+    "copy_rates_from": PRIORITY_BULK,
+    "copy_rates_range": PRIORITY_BULK,
+    "copy_ticks_from": PRIORITY_BULK,
+    "copy_ticks_range": PRIORITY_BULK,
+}
+
+
+class GatewayStopped(RuntimeError):
+    """Cổng MT5 chưa chạy hoặc đã dừng (lúc tắt bot) - lời gọi không được thực hiện."""
+
+
+@dataclass
+class MT5Request:
+    """1 yêu cầu trong hàng đợi (xếp theo (priority, seq) -> ưu tiên rồi tới thứ tự gửi)."""
+    priority: int
+    seq: int
+    name: str
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    future: Future
+    enqueued: float # perf_counter lúc gửi
+    deadline: Optional[float] # perf_counter; None = chờ không giới hạn
+
+
+class MT5Gateway:
+    """Luồng duy nhất thực thi lời gọi MT5. submit() -> Future; call() -> chờ kết quả (có timeout hàng đợi)."""
+    _STOP = None # Phần tử dừng luồng
+
+    def __init__(self, timeouts: Optional[Dict[int, Optional[float]]] = None):
+        self.timeouts = dict(timeouts or {})
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._state_lock = threading.Lock() # Kiểm tra _stopped + đưa vào hàng đợi là 1 bước (không lọt sau STOP)
+        self._cancel_lock = threading.Lock() # Bên gọi và luồng cổng cùng có thể hủy 1 yêu cầu quá hạn
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["MT5Gateway"]:
+        """Tạo + khởi chạy cổng MT5 theo config (MT5_GATEWAY = False -> None, gọi MT5 trực tiếp như cũ)."""
+        if not config.get("MT5_GATEWAY", True):
+            return None
+        gateway = cls({
+            PRIORITY_ORDER: config.get("MT5_GATEWAY_TIMEOUT_ORDER", 5.0),
+            PRIORITY_QUERY: config.get("MT5_GATEWAY_TIMEOUT_QUERY", 10.0),
+            PRIORITY_BULK: config.get("MT5_GATEWAY_TIMEOUT_BULK", 30.0),
+        })
+        gateway.start()
+        return gateway
+
+    # ==========================================================
+    # VÒNG ĐỜI
+    # ==========================================================
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="MT5Gateway", daemon=True)
+        self._thread.start()
+        METRICS.gauge_fn("mt5_queue_depth", self.depth)
+        logger.info("[MT5Gateway] Đã khởi chạy luồng gọi MT5 duy nhất (hàng đợi ưu tiên).")
+
+    def stop(self, timeout: float = 5.0):
+        """Dừng sau khi chạy hết các yêu cầu đã nhận (yêu cầu gửi sau khi dừng -> GatewayStopped)."""
+        with self._state_lock:
+            if self._thread is None or self._stopped:
+                return
+            self._stopped = True
+            self._queue.put((float("inf"), next(self._seq), self._STOP))
+        self._thread.join(timeout)
+
+    def depth(self) -> int:
+        """Số yêu cầu đang chờ trong hàng đợi."""
+        return self._queue.qsize()
+
+    # ==========================================================
+    # GỬI YÊU CẦU
+    # ==========================================================
+    def submit(self, name: str, fn: Callable[..., Any], *args, priority: Optional[int] = None,
+               timeout: Optional[float] = None) -> Future:
+        """
+        Đưa 1 lời gọi vào hàng đợi. priority None -> theo CALL_PRIORITIES; timeout None -> theo mức ưu tiên
+        (timeout <= 0 -> chờ không giới hạn).
+        """
+        return self._enqueue(name, fn, args, priority, timeout)[0]
+
+    def call(self, name: str, fn: Callable[..., Any], *args, priority: Optional[int] = None,
+             timeout: Optional[float] = None) -> Any:
+        """
+        submit() rồi chờ kết quả. Quá hạn khi còn trong hàng đợi -> hủy + TimeoutError.
+        Đã bắt đầu chạy -> chờ tới khi xong (kết quả lệnh không bao giờ bị bỏ).
+        """
+        future, deadline = self._enqueue(name, fn, args, priority, timeout)
+        try:
+            return future.result(timeout=None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        # (FuturesTimeoutError: Python < 3.11 khác TimeoutError có sẵn; luồng cổng hủy trước -> CancelledError)
+        except (FuturesTimeoutError, CancelledError):
+            if self._cancel_expired(future, name):
+                raise TimeoutError(f"[MT5Gateway] '{name}' chờ quá lâu trong hàng đợi ({self.depth()} yêu cầu đang chờ).")
+            return future.result()
+
+    def _cancel_expired(self, future: Future, name: str) -> bool:
+        """
+        Hủy yêu cầu quá hạn còn trong hàng đợi. True nếu đã bị hủy (bởi lần gọi này hoặc trước đó),
+        False nếu đã bắt đầu chạy. mt5_queue_timeouts chỉ đếm 1 lần dù bên gọi và luồng cổng cùng hủy
+        (Future.cancel() trả True cả khi đã bị hủy từ trước).
+        """
+        with self._cancel_lock:
+            if future.cancelled():
+                return True
+            if not future.cancel():
+                return False
+        METRICS.inc("mt5_queue_timeouts", labels={"call": name})
+        return True
+
+    def _enqueue(self, name: str, fn: Callable[..., Any], args: Tuple[Any, ...], priority: Optional[int],
+                 timeout: Optional[float]) -> Tuple[Future, Optional[float]]:
+        future: Future = Future()
+        if threading.current_thread() is self._thread:
+            # Gọi lồng từ chính luồng cổng -> chạy luôn (tránh tự khóa)
+            future.set_running_or_notify_cancel()
+            self._execute_into(future, fn, args)
+            return future, None
+        priority = CALL_PRIORITIES.get(name, PRIORITY_QUERY) if priority is None else priority
+        if timeout is None:
+            timeout = self.timeouts.get(priority)
+        with self._state_lock:
+            # Cùng khóa với stop(): yêu cầu đã vào hàng đợi luôn đứng trước STOP -> luôn được chạy
+            if self._thread is None or self._stopped:
+                raise GatewayStopped("[MT5Gateway] Cổng MT5 chưa chạy hoặc đã dừng.")
+            now = time.perf_counter()
+            deadline = now + timeout if timeout and timeout > 0 else None
+            request = MT5Request(priority, next(self._seq), name, fn, args, future, now, deadline)
+            self._queue.put((priority, request.seq, request))
+        return future, deadline
+
+    # ==========================================================
+    # LUỒNG THỰC THI
+    # ==========================================================
+    @staticmethod
+    def _execute_into(future: Future, fn: Callable[..., Any], args: Tuple[Any, ...]):
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _run(self):
+        while True:
+            _, _, request = self._queue.get()
+            if request is self._STOP:
+                break
+            METRICS.observe("mt5_queue_wait_seconds", time.perf_counter() - request.enqueued,
+                            {"call": request.name, "priority": PRIORITY_NAMES.get(request.priority, request.priority)})
+            if request.deadline is not None and time.perf_counter() > request.deadline:
+                # Quá hạn khi còn trong hàng đợi -> không chạy (bên gọi nhận TimeoutError)
+                if self._cancel_expired(request.future, request.name):
+                    continue
+            if not request.future.set_running_or_notify_cancel():
+                continue # Bên gọi đã hủy
+            self._execute_into(request.future, request.fn, request.args)
+        logger.info("[MT5Gateway] Luồng gọi MT5 đã dừng.")
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/mt5_recorder.py
+
+import gzip
+import time
+import pickle
+import logging
+import threading
+from collections import deque, namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.clock import VirtualClock, ScaledClock
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# GHI / PHÁT LẠI MT5 (RECORD & REPLAY)
+# ------------------------------------------------------------------------------
+# - RecordingBackend: Bọc module MetaTrader5, ghi mọi request/response
+#   (nến, tick, lệnh đang mở, kết quả order_send...) vào 1 file nhị phân nén.
+# - ReplayBackend: Đọc file ghi và trả lại đúng các response đó (giống API module
+#   MetaTrader5) -> tái hiện lỗi production (positions_get rỗng khi mất kết nối,
+#   retcode lạ...) và đo hiệu năng các luồng LIVE mà không cần MT5.
+#
+# Định dạng file: luồng gzip gồm các object pickle nối tiếp nhau:
+#   1. Header: {"format", "version", "created", "constants", "meta"}
+#   2. Mỗi lời gọi: (t, name, args, kwargs, result, error)
+#      t = giờ máy (epoch giây) lúc nhận response, error = lỗi ngoại lệ (nếu có).
+# ==============================================================================
+
+RECORD_FORMAT = "mt5rec"
+RECORD_VERSION = 1
+
+# Các hàm MT5 được ghi / phát lại (hằng số TIMEFRAME_*, ORDER_* lưu trong header)
+RECORDED_CALLS = (
+    "initialize", "shutdown", "last_error", "account_info", "symbol_info", "symbol_info_tick",
+    "copy_rates_from_pos", "positions_get", "order_calc_profit", "order_send",
+)
+
+# Số bản ghi giữa 2 lần flush (order_send luôn flush ngay)
+FLUSH_EVERY = 200
+
+# Lỗi trả về khi file ghi không còn response cho lời gọi (giống MT5 mất kết nối)
+REPLAY_NO_DATA_ERROR = (-10004, "Replay: không còn dữ liệu ghi cho lời gọi này")
+
+# Kết quả dạng namedtuple của MT5 (TradePosition, Tick, ...) lưu dưới dạng trung tính
+_Packed = namedtuple("_Packed", ["type_name", "fields", "values"])
+_Record = namedtuple("_Record", ["t", "name", "args", "kwargs", "result", "error"])
+
+
+def _pack(obj: Any) -> Any:
+    """Chuyển response MT5 về dạng pickle được (không phụ thuộc module MetaTrader5)."""
+    if hasattr(obj, "_asdict"):
+        data = obj._asdict()
+        return _Packed(type(obj).__name__, tuple(data.keys()), tuple(_pack(v) for v in data.values()))
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_pack(v) for v in obj)
+    if isinstance(obj, dict):
+        return {k: _pack(v) for k, v in obj.items()}
+    return obj  # Số, chuỗi, None, mảng numpy (copy_rates_*)
+
+
+_NAMEDTUPLE_TYPES: Dict[Tuple[str, Tuple[str, ...]], type] = {}
+
+def _unpack(obj: Any) -> Any:
+    """Ngược lại của _pack: dựng lại namedtuple cùng tên / cùng field."""
+    if isinstance(obj, _Packed):
+        key = (obj.type_name, obj.fields)
+        cls = _NAMEDTUPLE_TYPES.get(key)
+        if cls is None:
+            cls = _NAMEDTUPLE_TYPES[key] = namedtuple(obj.type_name, obj.fields)
+        return cls(*(_unpack(v) for v in obj.values))
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_unpack(v) for v in obj)
+    if isinstance(obj, dict):
+        return {k: _unpack(v) for k, v in obj.items()}
+    return obj
+
+
+def _call_key(name: str, args: tuple, kwargs: dict) -> tuple:
+    """
+    Khóa tra cứu response khi phát lại.
+    order_send / order_calc_profit: tham số chứa giá tính từ response trước -> chỉ khóa theo
+    loại lệnh (so sánh request riêng). Các hàm khác: khóa theo đầy đủ tham số.
+    """
+    if name == "order_send":
+        request = args[0] if args else kwargs.get("request", {})
+        return (name, request.get("action"), request.get("position"))
+    if name == "order_calc_profit":
+        return (name,) + tuple(args[:2])
+    return (name,) + tuple(args) + tuple(sorted(kwargs.items()))
+
+
+def read_recording(path: str) -> Tuple[Dict[str, Any], List[_Record]]:
+    """Đọc file ghi -> (header, danh sách bản ghi). File bị cắt ngang (bot tắt đột ngột) vẫn đọc được phần đầu."""
+    records: List[_Record] = []
+    with gzip.open(path, "rb") as f:
+        header = pickle.load(f)
+        if not isinstance(header, dict) or header.get("format") != RECORD_FORMAT:
+            raise ValueError(f"File '{path}' không phải file ghi MT5.")
+        while True:
+            try:
+                records.append(_Record(*pickle.load(f)))
+            except EOFError:
+                break
+            except (OSError, pickle.UnpicklingError) as e:
+                logger.warning(f"[MT5 Replay] File ghi bị cắt ngang sau {len(records)} bản ghi ({e}).")
+                break
+    return header, records
+
+
+class RecordingBackend:
+    """
+    Bọc module MetaTrader5 (hoặc backend tương đương): gọi thật rồi ghi request/response.
+    Dùng chung 1 instance cho mọi ExnessConnector (an toàn đa luồng).
+    """
+    def __init__(self, path: str, inner=None, meta: Optional[Dict[str, Any]] = None):
+        if inner is None:
+            from core.exness_connector import mt5 as inner
+        if inner is None:
+            raise ImportError("Chưa cài 'MetaTrader5' - không có gì để ghi.")
+        self._inner = inner
+        self.path = path
+        self.records = 0
+        self._lock = threading.Lock()
+        self._fh = gzip.open(path, "wb", compresslevel=6)
+
+        constants = {}
+        for attr in dir(inner):
+            value = getattr(inner, attr, None)
+            if attr.isupper() and isinstance(value, int):
+                constants[attr] = value
+        header = {"format": RECORD_FORMAT, "version": RECORD_VERSION, "created": time.time(),
+                  "constants": constants, "meta": meta or {}}
+        pickle.dump(header, self._fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self._fh.flush()
+        logger.info(f"[MT5 Record] Đang ghi mọi lời gọi MT5 vào: {path}")
+
+    def __getattr__(self, name: str):
+        value = getattr(self._inner, name)
+        if name not in RECORDED_CALLS:
+            return value  # Hằng số và các hàm không ghi
+
+        def _recorded(*args, **kwargs):
+            try:
+                result = value(*args, **kwargs)
+            except Exception as e:
+                self._write(name, args, kwargs, None, repr(e))
+                raise
+            self._write(name, args, kwargs, result, None)
+            return result
+
+        setattr(self, name, _recorded)  # Lần sau không qua __getattr__
+        return _recorded
+
+    def _write(self, name: str, args: tuple, kwargs: dict, result: Any, error: Optional[str]):
+        payload = pickle.dumps((time.time(), name, _pack(args), _pack(kwargs), _pack(result), error),
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._fh is None:
+                return
+            self._fh.write(payload)
+            self.records += 1
+            if name == "order_send" or self.records % FLUSH_EVERY == 0:
+                self._fh.flush()
+
+    def close(self):
+        """Đóng file ghi (gọi khi tắt bot)."""
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+                logger.info(f"[MT5 Record] Đã ghi {self.records} lời gọi vào {self.path}")
+
+
+class ReplayBackend:
+    """
+    Phát lại file ghi MT5 với API giống module MetaTrader5.
+    - Response được tra theo (tên hàm, tham số); với mỗi khóa, trả response MỚI NHẤT
+      đã ghi trước giờ hiện tại của 'clock' (lời gọi dày hơn / thưa hơn lúc ghi vẫn đúng thời điểm).
+      Nếu response kế tiếp ở tương lai -> clock.sleep() tới lúc đó.
+    - speed = 0: đồng hồ ảo (nhanh nhất, tất định). speed = 1: đúng nhịp gốc. speed = 10: nhanh gấp 10.
+    - Request order_send khác bản ghi -> ghi vào 'diffs' (kiểm thử hồi quy).
+    """
+    def __init__(self, path: str, speed: float = 0.0):
+        self.path = path
+        self.header, records = read_recording(path)
+        if not records:
+            raise ValueError(f"File ghi '{path}' không có lời gọi nào.")
+        self.meta: Dict[str, Any] = self.header.get("meta", {})
+        for attr, value in self.header.get("constants", {}).items():
+            setattr(self, attr, value)
+
+        self.start_ts = records[0].t
+        self.end_ts = records[-1].t
+        self.total_records = len(records)
+        self.clock = ScaledClock(self.start_ts, speed) if speed and speed > 0 else VirtualClock(self.start_ts)
+
+        self._by_key: Dict[tuple, deque] = {}
+        self._by_name: Dict[str, deque] = {}
+        for rec in records:
+            self._by_key.setdefault(_call_key(rec.name, rec.args, rec.kwargs), deque()).append(rec)
+            self._by_name.setdefault(rec.name, deque()).append(rec)
+
+        self._lock = threading.Lock()
+        self._last_error = (1, "Success")
+        self.diffs: List[Dict[str, Any]] = []
+        self.stats = {"served": 0, "skipped": 0, "fallback": 0, "missing": 0, "errors": 0}
+        logger.info(f"[MT5 Replay] Đã tải {len(records)} lời gọi "
+                    f"({(self.end_ts - self.start_ts) / 3600:.1f} giờ ghi) từ {path}")
+
+    @property
+    def exhausted(self) -> bool:
+        """Đã phát hết khoảng thời gian ghi."""
+        return self.clock.time() > self.end_ts
+
+    def _next_record(self, name: str, args: tuple, kwargs: dict) -> Optional[_Record]:
+        queue = self._by_key.get(_call_key(name, args, kwargs))
+        if not queue:
+            # Tham số khác lúc ghi (code đã đổi) -> lấy response kế tiếp cùng tên hàm
+            queue = self._by_name.get(name)
+            if not queue:
+                self.stats["missing"] += 1
+                return None
+            self.stats["fallback"] += 1
+
+        now = self.clock.time()
+        # Bỏ các response đã "cũ" (có response mới hơn trước giờ hiện tại); cùng mốc giờ -> theo thứ tự ghi
+        while len(queue) > 1 and queue[1].t < now:
+            queue.popleft()
+            self.stats["skipped"] += 1
+        return queue.popleft()
+
+    def _serve(self, name: str, *args, **kwargs) -> Any:
+        packed_args, packed_kwargs = _pack(args), _pack(kwargs)
+        with self._lock:
+            rec = self._next_record(name, packed_args, packed_kwargs)
+            if rec is None:
+                self._last_error = REPLAY_NO_DATA_ERROR
+                return None
+            self.stats["served"] += 1
+            self._last_error = (1, "Success")
+            if name == "order_send" and (rec.args, rec.kwargs) != (packed_args, packed_kwargs):
+                self.diffs.append({"t": rec.t, "name": name, "recorded": _unpack(rec.args),
+                                   "actual": args})
+                logger.warning(f"[MT5 Replay] Request {name} khác bản ghi: "
+                               f"ghi={_unpack(rec.args)} | chạy={args}")
+            # Response ở tương lai -> chờ tới lúc đó. Đồng hồ ảo: dời giờ ngay trong lock (tất định).
+            wait = rec.t - self.clock.time()
+            if wait > 0 and isinstance(self.clock, VirtualClock):
+                self.clock.advance_to(rec.t)
+                wait = 0.0
+        if wait > 0:
+            self.clock.sleep(wait) # Chờ thật NGOÀI lock -> luồng khác vẫn được phục vụ đúng nhịp gốc
+        if rec.error:
+            self.stats["errors"] += 1
+            raise RuntimeError(f"[MT5 Replay] Lỗi đã ghi: {rec.error}")
+        return _unpack(rec.result)
+
+    # --- API giống module MetaTrader5 ---
+    def initialize(self, *args, **kwargs): return self._serve("initialize", *args, **kwargs)
+    def shutdown(self, *args, **kwargs): return self._serve("shutdown", *args, **kwargs)
+    def account_info(self, *args, **kwargs): return self._serve("account_info", *args, **kwargs)
+    def symbol_info(self, *args, **kwargs): return self._serve("symbol_info", *args, **kwargs)
+    def symbol_info_tick(self, *args, **kwargs): return self._serve("symbol_info_tick", *args, **kwargs)
+    def copy_rates_from_pos(self, *args, **kwargs): return self._serve("copy_rates_from_pos", *args, **kwargs)
+    def positions_get(self, *args, **kwargs): return self._serve("positions_get", *args, **kwargs)
+    def order_calc_profit(self, *args, **kwargs): return self._serve("order_calc_profit", *args, **kwargs)
+    def order_send(self, *args, **kwargs): return self._serve("order_send", *args, **kwargs)
+
+    def last_error(self, *args, **kwargs):
+        # Lỗi do chính replay gây ra (hết dữ liệu) ưu tiên hơn bản ghi
+        if self._last_error == REPLAY_NO_DATA_ERROR:
+            return self._last_error
+        result = self._serve("last_error", *args, **kwargs)
+        return result if result is not None else self._last_error
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/mtf_data.py
+
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# DỮ LIỆU ĐA KHUNG "CĂN CHỈNH" (ALIGNED MULTI-TIMEFRAME)
+# ------------------------------------------------------------------------------
+# Trước đây: concat các cột H1 (đã shift 1) vào MỌI dòng M15 rồi ffill
+#   -> dữ liệu H1 bị nhân 4 lần (M1: 60 lần), DataFrame rộng, lẫn kiểu dữ liệu.
+# Bây giờ: mỗi khung giữ dữ liệu của riêng nó ĐÚNG 1 LẦN + 1 mảng int32
+#   trend_idx[i] = vị trí nến Trend ĐÃ ĐÓNG gần nhất tại nến Entry thứ i.
+# Đọc giá trị Trend cho nến Entry bất kỳ: trend.iloc[trend_idx[i]] - O(1).
+#
+# (MỚI) CHẾ ĐỘ GỌN (compact=True, BACKTEST_COMPACT_DTYPES) cho lịch sử dài:
+# - Giá OHLC: float32 (4 byte thay vì 8). Volume: uint32. Thời gian: DatetimeIndex
+#   (bản chất là int64 epoch ns, không có object Python nào).
+# - Giới hạn sai số: float32 có 24 bit định trị -> sai số làm tròn tương đối <= 2^-24
+#   (~6e-8), tuyệt đối <= giá * 6e-8 (ETH 3000 -> 0.00018; BTC 100000 -> 0.0061).
+#   Hai mức giá khác nhau 1 tick vẫn phân biệt được khi giá / tick < 2^24
+#   (tick 0.01 -> giá < 167,772; tick 0.001 -> giá < 16,777).
+#   Volume: số nguyên 0..4,294,967,295 (tick volume làm tròn, bị chặn trong khoảng này).
+# - Chỉ báo luôn TÍNH bằng float64 (từ giá float32), chỉ LƯU dạng float32.
+#   Cửa sổ nến đưa vào chiến lược được đổi lại float64 (entry_window / trend_window).
+# - Quyết định giao dịch chỉ có thể đổi khi 1 phép so sánh nằm sát ngưỡng trong phạm vi
+#   sai số trên -> kiểm tra bằng backtest.run_compact_parity_check().
+# ==============================================================================
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+_UINT32_MAX = np.iinfo(np.uint32).max
+
+
+def _to_storage(df: pd.DataFrame, compact: bool) -> pd.DataFrame:
+    """Chuyển OHLCV về kiểu lưu trữ: float64 (mặc định) hoặc float32 + uint32 (gọn)."""
+    if not compact:
+        return df[OHLCV_COLUMNS].astype(np.float64)
+    volume = np.clip(np.rint(df['volume'].to_numpy(dtype=np.float64)), 0, _UINT32_MAX)
+    out = df[PRICE_COLUMNS].astype(np.float32)
+    out['volume'] = volume.astype(np.uint32)
+    return out
+
+
+def as_float64(frame: pd.DataFrame) -> pd.DataFrame:
+    """Cửa sổ dữ liệu dạng float64 cho các hàm signals/ (không copy nếu đã là float64)."""
+    if all(dtype == np.float64 for dtype in frame.dtypes):
+        return frame
+    return frame.astype(np.float64)
+
+
+class AlignedMTF:
+    """
+    Cặp khung (Entry, Trend) đã căn chỉnh thời gian.
+    - entry: DataFrame OHLCV khung vào lệnh (chỉ các nến đã có nến Trend đóng trước đó).
+    - trend: DataFrame OHLCV khung xu hướng (mỗi nến 1 dòng).
+    - trend_idx: int32[len(entry)] - vị trí (iloc) nến Trend đã đóng gần nhất.
+    - compact: True nếu giá lưu float32 / volume uint32.
+    """
+    def __init__(self, entry: pd.DataFrame, trend: pd.DataFrame, trend_idx: np.ndarray):
+        self.entry = entry
+        self.trend = trend
+        self.trend_idx = trend_idx
+        self.compact = entry['close'].dtype == np.float32
+
+    @classmethod
+    def build(cls, df_trend: pd.DataFrame, df_entry: pd.DataFrame, compact: bool = False) -> "AlignedMTF":
+        """
+        Căn chỉnh 2 khung (SỬA LỖI LOOKAHEAD BIAS, giống cách shift(1) + ffill cũ):
+        tại nến Entry mở lúc t, nến Trend chứa t CHƯA đóng -> dùng nến Trend ngay trước nó.
+        Bỏ các nến Entry đầu tiên chưa có nến Trend nào đã đóng.
+        """
+        entry = _to_storage(df_entry, compact)
+        trend = _to_storage(df_trend, compact)
+
+        # Nến Trend mở gần nhất <= t (đang chạy), lùi thêm 1 nến -> nến đã đóng
+        pos = np.searchsorted(trend.index.values, entry.index.values, side="right") - 2
+        valid = pos >= 0
+        if not valid.all():
+            entry = entry[valid]
+            pos = pos[valid]
+        return cls(entry, trend, pos.astype(np.int32))
+
+    def __len__(self) -> int:
+        return len(self.entry)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.entry) == 0
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """Thời gian các nến Entry."""
+        return self.entry.index
+
+    def prefix_digest(self, end: int) -> str:
+        """
+        (MỚI) Hash phần dữ liệu mà 'end' nến Entry đầu tiên nhìn thấy: nến Entry, map Entry -> Trend
+        và các nến Trend đã đóng tới đó. Không đổi khi chỉ NỐI THÊM nến mới vào cuối dữ liệu.
+        """
+        end = max(0, min(int(end), len(self.entry)))
+        trend_end = int(self.trend_idx[end - 1]) + 1 if end else 0
+        h = hashlib.sha256()
+        for frame, rows in ((self.entry, end), (self.trend, trend_end)):
+            h.update(np.ascontiguousarray(frame.index.asi8[:rows]).tobytes())
+            for col in OHLCV_COLUMNS:
+                h.update(np.ascontiguousarray(frame[col].to_numpy()[:rows]).tobytes())
+        h.update(np.ascontiguousarray(self.trend_idx[:end]).tobytes())
+        return h.hexdigest()[:16]
+
+    def stable_length(self) -> int:
+        """
+        (MỚI) Số nến Entry đầu tiên có map Entry -> Trend KHÔNG đổi khi nối thêm nến Trend mới:
+        nến Entry mở sau nến Trend cuối cùng đang tạm dùng nến Trend cũ hơn (nến Trend chứa nó chưa có).
+        """
+        if self.trend.empty:
+            return 0
+        return int(np.searchsorted(self.entry.index.values, self.trend.index.values[-1], side="right"))
+
+    def entry_window(self, i: int, length: int) -> pd.DataFrame:
+        """Nến Entry thứ i và 'length' nến trước nó (float64; view nếu không ở chế độ gọn)."""
+        return as_float64(self.entry.iloc[max(0, i - length): i + 1])
+
+    def trend_window(self, i: int, length: int) -> pd.DataFrame:
+        """'length' nến Trend đã đóng cuối cùng tính tới nến Entry thứ i (float64; view nếu không ở chế độ gọn)."""
+        j = int(self.trend_idx[i])
+        return as_float64(self.trend.iloc[max(0, j - length + 1): j + 1])
+
+    def trend_values(self, column: str) -> np.ndarray:
+        """Giá trị cột Trend cho TỪNG nến Entry (mảng mới, chỉ tạo khi cần)."""
+        return self.trend[column].to_numpy()[self.trend_idx]
+
+    @property
+    def nbytes(self) -> int:
+        """Bộ nhớ dữ liệu (byte)."""
+        return (int(self.entry.memory_usage(index=True).sum()) + int(self.trend.memory_usage(index=True).sum())
+                + self.trend_idx.nbytes)
+
+    def synced_nbytes(self) -> int:
+        """Bộ nhớ ước tính nếu dùng cách cũ (10 cột float64 M15 + H1 trên mọi nến Entry)."""
+        return len(self.entry) * len(OHLCV_COLUMNS) * 2 * 8 + self.entry.index.nbytes
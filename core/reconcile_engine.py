@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/reconcile_engine.py
+
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple, FrozenSet
+
+logger = logging.getLogger("ExnessBot")
+
+# Dấu vân tay 1 lệnh: (ticket, volume, sl)
+PositionKey = Tuple[int, float, float]
+
+class ReconcileEngine:
+    """
+    Bộ đối chiếu "hướng sự kiện" cho Luồng 2 (Reconcile).
+    - Mỗi vòng chỉ gọi positions_get 1 lần, lập "dấu vân tay" (ticket, volume, SL)
+      của các lệnh thuộc bot. Nếu dấu vân tay KHÔNG đổi (và danh sách lệnh bot quản lý
+      cũng không đổi) -> bỏ qua toàn bộ xử lý.
+    - Chu kỳ thích ứng: chạy nhanh (LOOP_SLEEP_SECONDS) khi có lệnh,
+      giãn dần tới RECONCILE_IDLE_SECONDS khi không có lệnh.
+    - Khi thay đổi: tính delta (mở mới / đã đóng / bị sửa) và gửi cho TradeManager.
+    """
+    def __init__(self, trade_manager, connector, config: Dict[str, Any]):
+        self.tm = trade_manager
+        self.connector = connector
+        self.magic = trade_manager.MAGIC_NUMBER
+
+        self.fast_interval = float(config["LOOP_SLEEP_SECONDS"])
+        self.idle_interval = float(config.get("RECONCILE_IDLE_SECONDS", 60))
+        self.backoff_factor = float(config.get("RECONCILE_BACKOFF_FACTOR", 2.0))
+        self._current_interval = self.fast_interval
+
+        self._last_positions: Dict[int, PositionKey] = {}
+        self._last_fingerprint: Optional[FrozenSet[PositionKey]] = None
+        self._last_managed: Optional[FrozenSet[int]] = None
+
+        # Đánh thức sớm (ví dụ: Luồng 1 vừa mở lệnh mới)
+        self._wake_event = threading.Event()
+        self.tm.on_trade_opened = self.wake
+
+        # Thống kê
+        self.polls = 0
+        self.skipped = 0
+
+    def wake(self):
+        """Đánh thức vòng đối chiếu ngay lập tức (và quay về chu kỳ nhanh)."""
+        self._current_interval = self.fast_interval
+        self._wake_event.set()
+
+    # ==========================================================
+    # 1 VÒNG ĐỐI CHIẾU
+    # ==========================================================
+    def poll_once(self) -> Optional[Dict[str, list]]:
+        """
+        Gọi positions_get 1 lần. Trả về delta nếu có thay đổi, None nếu không.
+        """
+        self.polls += 1
+        # Snapshot ticket bot quản lý TRƯỚC khi hỏi sàn (không xóa nhầm lệnh vừa mở)
+        managed = self.tm.get_managed_tickets()
+        positions = self.connector.get_all_open_positions()
+        if positions is None:
+            # Không biết trạng thái sàn (MT5 lỗi / quá hạn hàng đợi) != tài khoản rỗng -> không đụng vào state
+            logger.warning("[LIVE][RECONCILE] Không lấy được danh sách lệnh trên sàn. Bỏ qua đợt đối chiếu này.")
+            return None
+
+        current = {
+            p.ticket: (p.ticket, float(p.volume), float(p.sl))
+            for p in positions if p.magic == self.magic
+        }
+        fingerprint = frozenset(current.values())
+
+        if fingerprint == self._last_fingerprint and managed == self._last_managed:
+            self.skipped += 1
+            return None
+
+        # Danh sách rỗng trong khi bot còn quản lý lệnh -> có thể do mất kết nối
+        if managed and not current:
+            if not self.connector.connect():
+                logger.warning("[LIVE][RECONCILE] CẢNH BÁO: Mất kết nối. Bỏ qua đợt đối chiếu này.")
+                return None
+
+        old = self._last_positions
+        delta = {
+            "opened": [t for t in current if t not in old],
+            "closed": [t for t in old if t not in current],
+            "modified": [t for t in current if t in old and current[t] != old[t]],
+        }
+
+        self.tm.apply_position_delta(set(current), delta, managed)
+
+        self._last_positions = current
+        self._last_fingerprint = fingerprint
+        self._last_managed = self.tm.get_managed_tickets()
+        return delta
+
+    def next_interval(self) -> float:
+        """Chu kỳ nghỉ tiếp theo: nhanh khi có lệnh, giãn dần khi không có lệnh."""
+        if self._last_positions or self.tm.get_managed_tickets():
+            self._current_interval = self.fast_interval
+        else:
+            self._current_interval = min(self.idle_interval, self._current_interval * self.backoff_factor)
+        return self._current_interval
+
+    def wait(self, timeout: float):
+        """Ngủ tối đa 'timeout' giây (thức dậy sớm nếu được wake())."""
+        self._wake_event.wait(timeout)
+        self._wake_event.clear()
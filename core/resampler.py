@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/resampler.py
+
+import os
+import re
+import logging
+import pandas as pd
+from typing import Optional, Dict, Any, List
+
+from core.cache_manager import DiskCache, hash_file, hash_files, make_key
+from core.data_quality import apply_quality_policy
+
+logger = logging.getLogger("ExnessBot")
+
+# "Kim tự tháp" các khung thời gian chuẩn (phút) - mỗi tầng dựng từ tầng nhỏ hơn gần nhất
+PYRAMID_LEVELS = [1, 5, 15, 30, 60, 240, 1440]
+
+OHLCV_AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+def parse_timeframe_to_minutes(tf_str: str) -> int:
+    """Helper: Chuyển đổi '1H', '15M', '1D' sang số phút."""
+    tf_str = tf_str.lower()
+    match = re.match(r"(\d+)([mhd])", tf_str)
+    if not match:
+        raise ValueError(f"Khung thời gian không hợp lệ: {tf_str}")
+    value, unit = int(match.group(1)), match.group(2)
+    if unit == 'm': return value
+    elif unit == 'h': return value * 60
+    elif unit == 'd': return value * 24 * 60
+    return 0
+
+# ==============================================================================
+# RESAMPLE 1 TẦNG
+# ==============================================================================
+
+def resample_ohlcv(df: pd.DataFrame, target_minutes: int, coverage_end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Gộp nến khung nhỏ thành khung lớn (timestamp = thời điểm MỞ nến, giống MT5).
+    - Bỏ các "xô" (bucket) rỗng (cuối tuần, mất dữ liệu).
+    - CHỈ giữ nến đã ĐÓNG: nến cuối bị loại nếu dữ liệu gốc chưa phủ hết chu kỳ
+      (coverage_end = thời điểm đóng của nến gốc cuối cùng).
+    """
+    if df.empty:
+        return df.copy()
+
+    resampled = df.resample(f"{target_minutes}min", label='left', closed='left').agg(OHLCV_AGG)
+    resampled = resampled.dropna(subset=['open'])
+
+    if coverage_end is not None and not resampled.empty:
+        last_bar_close = resampled.index[-1] + pd.Timedelta(minutes=target_minutes)
+        if last_bar_close > coverage_end:
+            # Nến cuối chưa đóng -> bỏ (tránh Lookahead / nến dở dang)
+            resampled = resampled.iloc[:-1]
+
+    resampled.index.name = df.index.name
+    return resampled
+
+# ==============================================================================
+# KIM TỰ THÁP (PYRAMID)
+# ==============================================================================
+
+def _build_chain(base_minutes: int, target_minutes: int) -> List[int]:
+    """
+    Chuỗi các tầng trung gian từ base -> target (mỗi tầng chia hết tầng sau).
+    Ví dụ: 15 -> 1440 = [30, 60, 240, 1440].
+    """
+    if target_minutes % base_minutes != 0:
+        raise ValueError(f"Không thể dựng khung {target_minutes}m từ khung gốc {base_minutes}m (không chia hết).")
+    chain = []
+    current = base_minutes
+    for level in PYRAMID_LEVELS:
+        if current < level < target_minutes and level % current == 0 and target_minutes % level == 0:
+            chain.append(level)
+            current = level
+    chain.append(target_minutes)
+    return chain
+
+def get_timeframe_data(base_df: pd.DataFrame, base_tf: str, target_tf: str,
+                       cache: Optional[DiskCache] = None, base_fp: str = "") -> pd.DataFrame:
+    """
+    Lấy dữ liệu khung 'target_tf' dựng từ dữ liệu gốc 'base_tf'.
+    Mỗi tầng trung gian được cache riêng (theo hash file gốc) để dùng lại.
+    """
+    base_minutes = parse_timeframe_to_minutes(base_tf)
+    target_minutes = parse_timeframe_to_minutes(target_tf)
+    if target_minutes == base_minutes:
+        return base_df
+    if target_minutes < base_minutes:
+        raise ValueError(f"Khung '{target_tf}' nhỏ hơn khung gốc '{base_tf}'.")
+
+    coverage_end = base_df.index[-1] + pd.Timedelta(minutes=base_minutes) if not base_df.empty else None
+
+    current_df = base_df
+    for level in _build_chain(base_minutes, target_minutes):
+        source_df = current_df
+        if cache is None:
+            current_df = resample_ohlcv(source_df, level, coverage_end)
+        else:
+            key = make_key(base_fp, base_minutes, level)
+            current_df = cache.get_or_compute(key, lambda: resample_ohlcv(source_df, level, coverage_end))
+    return current_df
+
+def get_resample_cache(config: Dict[str, Any]) -> Optional[DiskCache]:
+    """Cache các tầng đã dựng (mất hiệu lực khi code resampler thay đổi)."""
+    if not config.get("USE_BACKTEST_CACHE", False):
+        return None
+    return DiskCache(
+        config.get("CACHE_DIR", os.path.join("data", "cache")),
+        hash_file(os.path.abspath(__file__))[:12],
+        config.get("CACHE_MAX_SIZE_MB", 512),
+        namespace="resampled",
+    )
+
+def get_base_data_path(config: Dict[str, Any]) -> str:
+    """Đường dẫn file CSV của khung thời gian gốc."""
+    return os.path.join(config["DATA_DIR"], f"{config['SYMBOL']}_{config['BASE_TIMEFRAME']}.csv")
+
+def load_timeframes(config: Dict[str, Any], timeframes: List[str]) -> Dict[str, pd.DataFrame]:
+    """
+    Tải file CSV khung gốc 1 lần và dựng tất cả khung cần thiết (Trend, Entry...).
+    Raise FileNotFoundError nếu chưa tải dữ liệu gốc,
+    ValueError nếu dữ liệu gốc bị từ chối (DATA_QUALITY_MODE = "REFUSE").
+    """
+    base_tf = config["BASE_TIMEFRAME"]
+    base_path = get_base_data_path(config)
+    base_df = pd.read_csv(base_path, index_col='timestamp', parse_dates=True)
+    base_df = apply_quality_policy(base_df, base_path, parse_timeframe_to_minutes(base_tf), config)
+    if base_df is None:
+        raise ValueError(f"Dữ liệu gốc {os.path.basename(base_path)} không đạt kiểm tra chất lượng.")
+
+    cache = get_resample_cache(config)
+    base_fp = make_key(hash_files([base_path]), config.get("DATA_QUALITY_MODE", "WARN")) if cache is not None else ""
+
+    frames = {}
+    for tf in timeframes:
+        frames[tf] = get_timeframe_data(base_df, base_tf, tf, cache, base_fp)
+        logger.debug(f"[Resample] {base_tf} -> {tf}: {len(frames[tf])} nến.")
+    return frames
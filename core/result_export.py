@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/result_export.py
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger("ExnessBot")
+
+# pyarrow là tùy chọn: không có thì lưu CSV nén (.csv.gz)
+try:
+    import pyarrow # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Kiểu dữ liệu cố định cho bảng lệnh (giữ nguyên giữa các lần chạy / sweep)
+TRADE_FLOAT_COLUMNS = ["entry_price", "lot_size", "initial_sl_price", "current_sl",
+                       "initial_risk_usd", "initial_1R_usd", "close_price", "pnl_usd",
+                       "mae_price", "mfe_price", "mae_r", "mfe_r"]
+TRADE_TIME_COLUMNS = ["entry_time", "close_time"]
+TRADE_CATEGORY_COLUMNS = {
+    "type": ["BUY", "SELL"],
+    "close_reason": ["SL/TSL Hit", "Emergency Exit"],
+}
+
+SIGNAL_CODES = {None: 0, "BUY": 1, "SELL": -1}
+ADX_STATES = ["WEAK", "GREY", "STRONG"]
+
+# ==============================================================================
+# BẢNG LỆNH (CÓ KIỂU)
+# ==============================================================================
+
+def to_typed_trades(results_df: pd.DataFrame) -> pd.DataFrame:
+    """Ép kiểu bảng lệnh: timestamp, float64, category (type / close_reason), bool."""
+    df = results_df.copy()
+    for col in TRADE_TIME_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in TRADE_FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(np.float64)
+    for col, categories in TRADE_CATEGORY_COLUMNS.items():
+        if col in df.columns:
+            extra = [c for c in pd.unique(df[col].dropna()) if c not in categories]
+            df[col] = pd.Categorical(df[col], categories=categories + sorted(extra))
+    if "is_BE_hit" in df.columns:
+        df["is_BE_hit"] = df["is_BE_hit"].astype(bool)
+    return df
+
+# ==============================================================================
+# GHI / ĐỌC BẢNG (PARQUET HOẶC CSV NÉN)
+# ==============================================================================
+
+def get_table_path(path: str) -> str:
+    """Đường dẫn thực tế: .parquet (có pyarrow) hoặc .csv.gz (dự phòng)."""
+    base = path[:-len(".parquet")] if path.endswith(".parquet") else os.path.splitext(path)[0]
+    return f"{base}.parquet" if HAS_PYARROW else f"{base}.csv.gz"
+
+def write_table(df: pd.DataFrame, path: str, compression: str = "zstd") -> str:
+    """Ghi bảng dạng cột (Parquet + nén). Trả về đường dẫn đã ghi."""
+    out_path = get_table_path(path)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    if HAS_PYARROW:
+        df.to_parquet(out_path, engine="pyarrow", compression=compression, index=False)
+    else:
+        df.to_csv(out_path, index=False, compression="gzip")
+    return out_path
+
+def read_table(path: str) -> pd.DataFrame:
+    """Đọc bảng đã ghi bởi write_table (tự nhận .parquet / .csv.gz)."""
+    in_path = get_table_path(path)
+    if in_path.endswith(".parquet"):
+        return pd.read_parquet(in_path, engine="pyarrow")
+    return pd.read_csv(in_path, compression="gzip")
+
+# ==============================================================================
+# TRACE TỪNG NẾN (BACKTEST)
+# ==============================================================================
+
+class BarTraceRecorder:
+    """
+    Ghi trạng thái từng nến trong vòng lặp backtest vào các mảng numpy cấp phát sẵn
+    (không tạo dict/DataFrame mỗi nến): tín hiệu, trạng thái ADX, số lệnh mở,
+    SL lệnh BUY/SELL gần nhất, vốn (đã chốt) và equity (kể cả lãi/lỗ thả nổi).
+    """
+    def __init__(self, timestamps: pd.DatetimeIndex, start_index: int):
+        size = max(0, len(timestamps) - start_index)
+        self.timestamps = timestamps[start_index:]
+        self.start_index = start_index
+        self.signal = np.zeros(size, dtype=np.int8)
+        self.adx_state = np.full(size, -1, dtype=np.int8)
+        self.num_open = np.zeros(size, dtype=np.int16)
+        self.sl_buy = np.full(size, np.nan, dtype=np.float64)
+        self.sl_sell = np.full(size, np.nan, dtype=np.float64)
+        self.capital = np.full(size, np.nan, dtype=np.float64)
+        self.equity = np.full(size, np.nan, dtype=np.float64)
+
+    def record(self, i: int, trade_manager, close_price: float, signal: Optional[str], adx_state: Optional[str]):
+        """Ghi trạng thái SAU khi xử lý nến i."""
+        k = i - self.start_index
+        self.signal[k] = SIGNAL_CODES.get(signal, 0)
+        if adx_state is not None:
+            self.adx_state[k] = ADX_STATES.index(adx_state)
+
+        open_trades = trade_manager.open_trades_sim
+        self.num_open[k] = len(open_trades)
+        floating = 0.0
+        for trade in open_trades:
+            if trade.type == "BUY":
+                self.sl_buy[k] = trade.current_sl
+                floating += (close_price - trade.entry_price) * trade.lot_size
+            else:
+                self.sl_sell[k] = trade.current_sl
+                floating += (trade.entry_price - close_price) * trade.lot_size
+        self.capital[k] = trade_manager.sim_capital
+        self.equity[k] = trade_manager.sim_capital + floating * trade_manager.params.CONTRACT_SIZE
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "timestamp": self.timestamps,
+            "signal": pd.Categorical.from_codes(self.signal + 1, ["SELL", "NONE", "BUY"]),
+            "adx_state": pd.Categorical.from_codes(self.adx_state, ADX_STATES),
+            "num_open": self.num_open,
+            "sl_buy": self.sl_buy,
+            "sl_sell": self.sl_sell,
+            "capital": self.capital,
+            "equity": self.equity,
+        })
+
+# ==============================================================================
+# XUẤT KẾT QUẢ BACKTEST
+# ==============================================================================
+
+def export_backtest_outputs(results_df: pd.DataFrame, config: Dict[str, Any],
+                            trace: Optional[BarTraceRecorder] = None):
+    """
+    Ghi bảng lệnh (có kiểu) và trace từng nến (nếu có) dạng Parquet nén.
+    Tên file lấy từ RESULTS_TABLE_FILE / BAR_TRACE_FILE trong OUTPUT_DIR.
+    """
+    if not HAS_PYARROW:
+        logger.warning("[Export] Chưa cài 'pyarrow' -> lưu dạng CSV nén (.csv.gz) thay cho Parquet.")
+    output_dir = config["OUTPUT_DIR"]
+    compression = config.get("EXPORT_COMPRESSION", "zstd")
+
+    if results_df is not None and not results_df.empty:
+        path = write_table(to_typed_trades(results_df),
+                           os.path.join(output_dir, config.get("RESULTS_TABLE_FILE", "backtest_results.parquet")),
+                           compression)
+        logger.info(f"[Export] Bảng lệnh ({len(results_df)} lệnh): {path}")
+
+    if trace is not None:
+        path = write_table(trace.to_frame(),
+                           os.path.join(output_dir, config.get("BAR_TRACE_FILE", "backtest_trace.parquet")),
+                           compression)
+        logger.info(f"[Export] Trace từng nến ({len(trace.signal)} nến): {path}")
@@ -3,8 +3,9 @@
 
 import logging
 import pandas as pd
-from typing import Dict, Any, Optional, Callable, Tuple
+from typing import Dict, Any, Optional, Callable, Tuple, Union
 from core.exness_connector import ExnessConnector
+from core.strategy_params import StrategyParams, as_strategy_params
 from signals.adx import get_adx_value
 
 logger = logging.getLogger("ExnessBot")
@@ -15,21 +16,22 @@ class RiskManager:
     (NÂNG CẤP: ADX Grey Zone & Max Loss SL)
     """
     def __init__(self, 
-                 config: Dict[str, Any], 
+                 config: Union[Dict[str, Any], StrategyParams], 
                  mode: str, 
                  get_capital_callback: Callable[[], float], 
                  connector: Optional[ExnessConnector] = None):
         
         self.config = config
+        self.params = as_strategy_params(config) # (MỚI) Tham số đã biên dịch (đọc bằng thuộc tính)
         self.mode = mode
         self.get_capital_callback = get_capital_callback
         self.connector = connector
 
-        self.SYMBOL = self.config["SYMBOL"]
-        self.CONTRACT_SIZE = self.config["CONTRACT_SIZE"]
-        self.RISK_MANAGEMENT_MODE = self.config["RISK_MANAGEMENT_MODE"]
-        self.fixed_lot = self.config["fixed_lot"]
-        self.RISK_PERCENT_PER_TRADE = self.config["RISK_PERCENT_PER_TRADE"]
+        self.SYMBOL = self.params.SYMBOL
+        self.CONTRACT_SIZE = self.params.CONTRACT_SIZE
+        self.RISK_MANAGEMENT_MODE = self.params.RISK_MANAGEMENT_MODE
+        self.fixed_lot = self.params.fixed_lot
+        self.RISK_PERCENT_PER_TRADE = self.params.RISK_PERCENT_PER_TRADE
         
     def _get_risk_amount(self) -> float:
         capital = self.get_capital_callback()
@@ -65,13 +67,13 @@ class RiskManager:
         order_type = 0 if signal == "BUY" else 1
 
         # --- (NÂNG CẤP) Đọc Config Vùng Xám & Max Loss ---
-        USE_ADX_GREY_ZONE = self.config.get("USE_ADX_GREY_ZONE", False)
-        ADX_WEAK = self.config.get("ADX_WEAK", 18)
-        ADX_STRONG = self.config.get("ADX_STRONG", 23)
-        ADX_MIN_LEVEL = self.config.get("ADX_MIN_LEVEL", 20)
+        USE_ADX_GREY_ZONE = self.params.USE_ADX_GREY_ZONE
+        ADX_WEAK = self.params.ADX_WEAK
+        ADX_STRONG = self.params.ADX_STRONG
+        ADX_MIN_LEVEL = self.params.ADX_MIN_LEVEL
 
-        USE_MAX_USD_SL = self.config.get("USE_MAX_USD_SL_FOR_FIXED_LOT", False)
-        MAX_USD_LOSS = self.config.get("MAX_USD_LOSS_PER_TRADE", 300.0)
+        USE_MAX_USD_SL = self.params.USE_MAX_USD_SL_FOR_FIXED_LOT
+        MAX_USD_LOSS = self.params.MAX_USD_LOSS_PER_TRADE
 
         # --- BƯỚC 1: Xác định chiến lược (FIXED hay PERCENT) ---
         use_fixed_lot_strategy = False
@@ -81,7 +83,7 @@ class RiskManager:
         
         elif self.RISK_MANAGEMENT_MODE == "DYNAMIC":
             try:
-                trend_adx_h1 = get_adx_value(data_h1, self.config)
+                trend_adx_h1 = get_adx_value(data_h1, self.params)
             except Exception as e:
                 logger.error(f"[RiskManager] Lỗi tính ADX cho DYNAMIC: {e}")
                 return None, 0.0, initial_sl_price
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/shadow.py
+
+import os
+import re
+import time
+import pickle
+import logging
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from core.trade_manager import TradeManager
+from core.strategy_params import StrategyParams, FIELD_NAMES
+from core.mtf_data import AlignedMTF
+from core.indicator_graph import (
+    IndicatorGraph, add_strategy_nodes, snapshot_from_results, strategy_indicator_key, _report_timings
+)
+from core.metrics import METRICS
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# CHIẾN LƯỢC "BÓNG" (SHADOW) - CHẠY GIẤY NHIỀU BIẾN THỂ CONFIG TRÊN CÙNG 1 NGUỒN NẾN
+# ------------------------------------------------------------------------------
+# Bot thật (primary) giao dịch LIVE như cũ. Mỗi biến thể trong SHADOW_STRATEGIES
+# ({tên: {KEY: giá trị ghi đè}}) là 1 TradeManager chế độ "backtest" (SimTrade):
+# - Dùng chung cửa sổ nến của bot thật (không thêm kết nối MT5 / lời gọi tải nến).
+# - Chỉ xét các nến ĐÃ ĐÓNG (bỏ nến đang chạy) với map M15 -> H1 giống hệt backtest,
+#   theo thứ tự của vòng lặp backtest: cập nhật SL/TSL -> cooldown -> tín hiệu -> mở lệnh.
+# - Chỉ báo: mỗi bộ tham số chỉ báo khác nhau (strategy_indicator_key) tính 1 lần / nến
+#   trong 1 đồ thị chung, các biến thể cùng khóa dùng chung kết quả.
+# - Kết quả riêng từng biến thể: SHADOW_DIR/<tên>/state.pkl (trạng thái engine, khởi động lại
+#   chạy tiếp) + trades.csv (lệnh đã đóng).
+# - Chạy SAU logic của bot thật trong cùng vòng Luồng 1 -> không làm trễ lệnh thật.
+#   Chi phí mỗi biến thể: 1 lần cập nhật SimTrade + phần chỉ báo chưa trùng (metrics shadow_cycle_seconds).
+# Biến thể không được đổi SYMBOL / khung thời gian, và không cần cửa sổ nến dài hơn bot thật.
+# ==============================================================================
+
+SHADOW_STATE_VERSION = 1
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+_FEED_KEYS = ("SYMBOL", "trend_timeframe", "entry_timeframe")
+
+
+class ShadowStrategy:
+    """1 biến thể config chạy giấy (TradeManager backtest) + file kết quả riêng."""
+    def __init__(self, name: str, params: StrategyParams, store_dir: str):
+        self.name = name
+        self.params = params
+        self.store_dir = store_dir
+        self.state_path = os.path.join(store_dir, "state.pkl")
+        self.trades_path = os.path.join(store_dir, "trades.csv")
+        self.tm = TradeManager(config=params, mode="backtest", initial_capital=params.BACKTEST_INITIAL_CAPITAL)
+        self.last_bar: Optional[pd.Timestamp] = None
+        self._saved_closed = 0
+        self._dirty = False
+
+    @property
+    def indicator_key(self):
+        return strategy_indicator_key(self.params, self.params.NUM_H1_BARS, self.params.NUM_M15_BARS)
+
+    def load(self) -> bool:
+        """Nạp trạng thái lần chạy trước (cùng tham số). Khác tham số / lỗi -> bắt đầu lại từ vốn đầu."""
+        if not os.path.exists(self.state_path):
+            return False
+        try:
+            with open(self.state_path, "rb") as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"[Shadow:{self.name}] File trạng thái lỗi ({e}). Bắt đầu lại.")
+            return False
+        if saved.get("version") != SHADOW_STATE_VERSION or saved.get("params_digest") != self.params.digest:
+            logger.warning(f"[Shadow:{self.name}] Tham số đã đổi so với lần chạy trước. Bắt đầu lại từ vốn đầu.")
+            return False
+        self.tm.restore_backtest_state(saved["state"])
+        self.last_bar = saved["last_bar"]
+        self._saved_closed = len(self.tm.closed_trades_sim)
+        logger.info(f"[Shadow:{self.name}] Chạy tiếp từ nến {self.last_bar} "
+                    f"({self._saved_closed} lệnh đã đóng, vốn ${self.tm.sim_capital:,.2f}).")
+        return True
+
+    def on_bar(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame, precomputed: Optional[Dict[str, Any]]):
+        """1 nến đã đóng (nến cuối của data_m15) - giống 1 bước vòng lặp backtest."""
+        closed_before, open_before = len(self.tm.closed_trades_sim), len(self.tm.open_trades_sim)
+        self.tm.update_all_trades(data_h1, data_m15, precomputed)
+        self.tm.check_and_open_new_trade(data_h1, data_m15, precomputed)
+        self.last_bar = data_m15.index[-1]
+        self._dirty = True
+
+        if (len(self.tm.closed_trades_sim), len(self.tm.open_trades_sim)) != (closed_before, open_before):
+            logger.info(f"[Shadow:{self.name}] {self.last_bar}: {len(self.tm.open_trades_sim)} lệnh mở | "
+                        f"{len(self.tm.closed_trades_sim)} lệnh đã đóng | Vốn ${self.tm.sim_capital:,.2f}")
+
+    def save(self):
+        """Ghi trạng thái (file tạm rồi đổi tên) + bảng lệnh đã đóng (chỉ khi có lệnh đóng mới)."""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": SHADOW_STATE_VERSION, "params_digest": self.params.digest,
+                             "last_bar": self.last_bar, "state": self.tm.get_backtest_state()},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.state_path)
+            if len(self.tm.closed_trades_sim) != self._saved_closed:
+                self.tm.get_backtest_results_df().to_csv(self.trades_path, index=False)
+                self._saved_closed = len(self.tm.closed_trades_sim)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"[Shadow:{self.name}] Không ghi được kết quả: {e}")
+
+
+class ShadowRunner:
+    """Giữ các ShadowStrategy và chạy chúng trên cửa sổ nến của bot thật mỗi vòng Luồng 1."""
+    def __init__(self, shadows: List[ShadowStrategy]):
+        self.shadows = shadows
+
+    def __len__(self) -> int:
+        return len(self.shadows)
+
+    @classmethod
+    def from_config(cls, config_dict: Dict[str, Any]) -> Optional["ShadowRunner"]:
+        """Dựng từ SHADOW_STRATEGIES. Biến thể sai (tên / tham số / đổi nguồn nến) bị bỏ qua kèm log lỗi. Không có -> None."""
+        variants = config_dict.get("SHADOW_STRATEGIES") or {}
+        max_instances = int(config_dict.get("SHADOW_MAX_INSTANCES", 8))
+        if len(variants) > max_instances:
+            logger.warning(f"[Shadow] {len(variants)} biến thể > SHADOW_MAX_INSTANCES ({max_instances}). "
+                           f"Chỉ chạy {max_instances} biến thể đầu.")
+        root = config_dict.get("SHADOW_DIR", os.path.join("data", "shadow"))
+
+        shadows = []
+        for name, overrides in list(variants.items())[:max_instances]:
+            overrides = dict(overrides or {})
+            try:
+                if not _NAME_PATTERN.match(str(name)):
+                    raise ValueError("tên chỉ được gồm chữ, số, '_' và '-'")
+                unknown = sorted(key for key in overrides if key not in FIELD_NAMES)
+                if unknown:
+                    raise ValueError(f"không phải tham số chiến lược: {unknown}")
+                changed_feed = [key for key in _FEED_KEYS if key in overrides and overrides[key] != config_dict.get(key)]
+                if changed_feed:
+                    raise ValueError(f"không được đổi nguồn nến dùng chung: {changed_feed}")
+                params = StrategyParams.from_config(config_dict, overrides)
+                if params.NUM_H1_BARS > config_dict["NUM_H1_BARS"] or params.NUM_M15_BARS > config_dict["NUM_M15_BARS"]:
+                    raise ValueError("cửa sổ nến (NUM_H1_BARS / NUM_M15_BARS) dài hơn bot thật")
+                shadow = ShadowStrategy(str(name), params, os.path.join(root, str(name)))
+            except (ValueError, TypeError) as e:
+                logger.error(f"[Shadow:{name}] Bỏ qua biến thể: {e}")
+                continue
+            shadow.load()
+            shadows.append(shadow)
+
+        if not shadows:
+            return None
+        keys = {shadow.indicator_key for shadow in shadows}
+        logger.info(f"[Shadow] Chạy giấy {len(shadows)} biến thể ({len(keys)} bộ chỉ báo khác nhau): "
+                    f"{', '.join(shadow.name for shadow in shadows)}")
+        return cls(shadows)
+
+    def run_cycle(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame,
+                  executor: Optional[ThreadPoolExecutor] = None):
+        """
+        Xử lý các nến M15 đã đóng mà mỗi biến thể chưa xét (lần đầu: chỉ nến vừa đóng;
+        bị lỡ vòng: các nến còn trong cửa sổ, theo thứ tự thời gian).
+        data_h1 / data_m15: cửa sổ của bot thật (nến cuối là nến đang chạy).
+        """
+        if len(data_m15) < 2:
+            return
+        # Nến H1 đang chạy vẫn giữ lại để map nến M15 -> nến H1 ĐÃ ĐÓNG trước nó (như backtest)
+        data = AlignedMTF.build(data_h1, data_m15.iloc[:-1])
+        if data.empty:
+            return
+        index = data.index
+
+        pending: Dict[int, List[ShadowStrategy]] = {}
+        for shadow in self.shadows:
+            start = len(index) - 1 if shadow.last_bar is None else int(index.searchsorted(shadow.last_bar, side="right"))
+            for i in range(start, len(index)):
+                pending.setdefault(i, []).append(shadow)
+
+        cycle_start = time.perf_counter()
+        spent = {shadow.name: 0.0 for shadow in self.shadows}
+        for i in sorted(pending):
+            shadows = pending[i]
+            # 1 đồ thị / nến: mỗi bộ chỉ báo khác nhau là 1 nhóm nút (prefix), tính song song
+            windows, prefixes = {}, {}
+            graph = IndicatorGraph()
+            for shadow in shadows:
+                key = shadow.indicator_key
+                if key not in prefixes:
+                    h1 = data.trend_window(i, shadow.params.NUM_H1_BARS)
+                    m15 = data.entry_window(i, shadow.params.NUM_M15_BARS)
+                    prefixes[key] = f"s{len(prefixes)}."
+                    windows[key] = (h1, m15)
+                    add_strategy_nodes(graph, h1, m15, shadow.params, prefixes[key])
+            try:
+                results = graph.run(executor)
+                snapshots = {key: snapshot_from_results(results, prefix) for key, prefix in prefixes.items()}
+            except Exception as e:
+                logger.debug(f"[Shadow] Không tính trước được chỉ báo nến {index[i]} ({e}). Tính trực tiếp.")
+                snapshots = {}
+            finally:
+                _report_timings(graph)
+
+            share = graph.wall_time / len(shadows)
+            for shadow in shadows:
+                start = time.perf_counter()
+                key = shadow.indicator_key
+                try:
+                    shadow.on_bar(*windows[key], snapshots.get(key))
+                except Exception as e:
+                    logger.error(f"[Shadow:{shadow.name}] Lỗi nến {index[i]}: {e}", exc_info=False)
+                    shadow.last_bar = index[i]
+                spent[shadow.name] += time.perf_counter() - start + share
+
+        for shadow in self.shadows:
+            shadow.save()
+            METRICS.observe("shadow_cycle_seconds", spent[shadow.name], {"strategy": shadow.name})
+        logger.debug(f"[Shadow] Xong {len(pending)} nến cho {len(self.shadows)} biến thể trong "
+                     f"{(time.perf_counter() - cycle_start) * 1000:.1f}ms.")
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/shared_data.py
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger("ExnessBot")
+
+# Tên các vùng nhớ do process hiện tại tạo ra (process này chịu trách nhiệm xóa)
+_OWNED_NAMES = set()
+
+# ==============================================================================
+# DỮ LIỆU DÙNG CHUNG GIỮA CÁC PROCESS (ZERO-COPY)
+# ------------------------------------------------------------------------------
+# Process chính tải dữ liệu + tính chỉ báo 1 lần, "xuất bản" các mảng numpy vào
+# shared memory. Worker chỉ nhận 1 "handle" nhỏ (dict, pickle vài trăm byte) và
+# gắn (attach) trực tiếp vào vùng nhớ đó -> không copy, không pickle DataFrame.
+# ==============================================================================
+
+def _publish_array(array: np.ndarray, blocks: List[shared_memory.SharedMemory]) -> Dict[str, Any]:
+    """Copy 1 mảng vào shared memory MỚI (1 lần duy nhất). Trả về mô tả mảng."""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    blocks.append(shm)
+    _OWNED_NAMES.add(shm.name)
+    return {"shm": shm.name, "shape": array.shape, "dtype": array.dtype.str}
+
+def _attach_array(spec: Dict[str, Any], blocks: List[shared_memory.SharedMemory]) -> np.ndarray:
+    """Gắn vào mảng đã xuất bản (zero-copy, chỉ đọc)."""
+    shm = shared_memory.SharedMemory(name=spec["shm"])
+    # Worker không sở hữu vùng nhớ: bỏ đăng ký để resource_tracker không xóa khi worker thoát.
+    # Chỉ POSIX mới đăng ký với resource_tracker (Windows: vùng nhớ tự giải phóng khi đóng handle cuối,
+    # gọi unregister ở đó còn làm hỏng initializer của worker).
+    if os.name == "posix" and shm.name not in _OWNED_NAMES:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    blocks.append(shm)
+    array = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+    array.flags.writeable = False
+    return array
+
+
+def _publish_frame(frame: pd.DataFrame, blocks: List[shared_memory.SharedMemory]) -> Dict[str, Any]:
+    """
+    Xuất bản 1 DataFrame số: các cột CÙNG KIỂU lưu thành 1 khối 2D (giữ nguyên kiểu,
+    ví dụ float32 + uint32 của chế độ gọn) + index thời gian (int64 ns).
+    """
+    groups: Dict[str, List[str]] = {}
+    for col, dtype in frame.dtypes.items():
+        groups.setdefault(np.dtype(dtype).str, []).append(col)
+    return {
+        "columns": list(frame.columns),
+        "index_name": frame.index.name,
+        "index": _publish_array(frame.index.to_numpy(dtype="datetime64[ns]").view(np.int64), blocks),
+        "groups": [{"columns": cols, "values": _publish_array(frame[cols].to_numpy(), blocks)}
+                   for cols in groups.values()],
+    }
+
+def _attach_frame(spec: Dict[str, Any], blocks: List[shared_memory.SharedMemory]) -> pd.DataFrame:
+    """Gắn vào DataFrame đã xuất bản (zero-copy, chỉ đọc)."""
+    index_ns = _attach_array(spec["index"], blocks)
+    index = pd.DatetimeIndex(index_ns.view("datetime64[ns]"), name=spec["index_name"])
+    parts = [pd.DataFrame(_attach_array(group["values"], blocks), index=index, columns=group["columns"], copy=False)
+             for group in spec["groups"]]
+    frame = parts[0] if len(parts) == 1 else pd.concat(parts, axis=1)
+    return frame[spec["columns"]] if list(frame.columns) != spec["columns"] else frame
+
+
+class SharedDataset:
+    """
+    Bộ dữ liệu backtest trong shared memory:
+    - frames: Các DataFrame theo tên (ví dụ "entry", "trend"), mỗi frame lưu thành 1 khối 2D.
+    - arrays: Các mảng numpy (chỉ báo đã tính trước, map căn chỉnh khung...).
+    - meta: Thông tin nhỏ kèm theo (data fingerprint, chữ ký tham số chỉ báo...).
+
+    Process chính: SharedDataset.publish(...) -> truyền dataset.handle cho worker.
+    Worker: SharedDataset.attach(handle).
+    Process chính gọi close() khi xong (giải phóng vùng nhớ).
+    """
+    def __init__(self, frames: Dict[str, pd.DataFrame], arrays: Dict[str, np.ndarray], meta: Dict[str, Any],
+                 handle: Dict[str, Any], blocks: List[shared_memory.SharedMemory]):
+        self.frames = frames
+        self.arrays = arrays
+        self.meta = meta
+        self.handle = handle
+        self._blocks = blocks # Các vùng nhớ đang gắn (đóng khi close)
+        self._owned_blocks: List[shared_memory.SharedMemory] = [] # Vùng nhớ do process này tạo (xóa khi close)
+
+    @classmethod
+    def publish(cls, frames: Dict[str, pd.DataFrame], arrays: Optional[Dict[str, np.ndarray]] = None,
+                meta: Optional[Dict[str, Any]] = None) -> "SharedDataset":
+        """Xuất bản các DataFrame + mảng numpy vào shared memory."""
+        blocks: List[shared_memory.SharedMemory] = []
+        arrays = arrays or {}
+        try:
+            handle = {
+                "frames": {name: _publish_frame(frame, blocks) for name, frame in frames.items()},
+                "arrays": {name: _publish_array(arr, blocks) for name, arr in arrays.items()},
+                "meta": dict(meta or {}),
+            }
+        except Exception:
+            for shm in blocks:
+                _OWNED_NAMES.discard(shm.name)
+                shm.close()
+                shm.unlink()
+            raise
+        total_mb = sum(shm.size for shm in blocks) / (1024 * 1024)
+        num_rows = sum(len(frame) for frame in frames.values())
+        logger.info(f"[SharedData] Đã xuất bản {num_rows} nến ({len(frames)} khung) + {len(arrays)} mảng ({total_mb:.1f} MB).")
+        dataset = cls.attach(handle)
+        dataset._owned_blocks = blocks
+        return dataset
+
+    @classmethod
+    def attach(cls, handle: Dict[str, Any]) -> "SharedDataset":
+        """Gắn vào dữ liệu đã xuất bản (dùng trong worker)."""
+        blocks: List[shared_memory.SharedMemory] = []
+        frames = {name: _attach_frame(spec, blocks) for name, spec in handle["frames"].items()}
+        arrays = {name: _attach_array(spec, blocks) for name, spec in handle["arrays"].items()}
+        return cls(frames, arrays, handle["meta"], handle, blocks)
+
+    def close(self):
+        """Đóng vùng nhớ. Process tạo ra dữ liệu (publish) xóa luôn vùng nhớ."""
+        self.frames = {}
+        self.arrays = {}
+        for shm in self._blocks + self._owned_blocks:
+            try:
+                shm.close()
+            except BufferError:
+                pass # Còn view đang dùng -> hệ điều hành giải phóng khi process thoát
+        for shm in self._owned_blocks:
+            _OWNED_NAMES.discard(shm.name)
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = []
+        self._owned_blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
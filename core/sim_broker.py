@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/sim_broker.py
+
+import logging
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from typing import Dict, Any, Optional, List
+
+from core.resampler import parse_timeframe_to_minutes
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# SÀN GIẢ LẬP (THAY THẾ MODULE MetaTrader5 KHI REPLAY)
+# ------------------------------------------------------------------------------
+# SimBroker có cùng tên hàm / hằng số / kiểu trả về với module MetaTrader5 mà
+# ExnessConnector dùng -> ExnessConnector(backend=SimBroker(...)) chạy NGUYÊN VẸN
+# code LIVE (tính lot, validate lệnh, gửi lệnh, dời SL...) trên dữ liệu nến đã lưu.
+# Giờ "server" lấy từ VirtualClock (cùng trục thời gian với timestamp nến).
+# ==============================================================================
+
+SimTick = namedtuple("SimTick", "time bid ask last volume time_msc")
+SimSymbolInfo = namedtuple("SimSymbolInfo", "name point digits spread volume_min volume_max volume_step "
+                                             "trade_stops_level trade_contract_size")
+SimAccountInfo = namedtuple("SimAccountInfo", "login server currency balance equity profit margin_free")
+SimPosition = namedtuple("SimPosition", "ticket time type magic symbol volume price_open sl tp "
+                                        "price_current profit comment")
+SimTradeResult = namedtuple("SimTradeResult", "retcode order deal volume price bid ask comment")
+
+RATES_DTYPE = np.dtype([("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+                        ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8")])
+
+class SimBroker:
+    """
+    Sàn giả lập dựng trên nến đã lưu (mỗi khung 1 DataFrame open/high/low/close/volume).
+    - copy_rates_from_pos: Trả về các nến đã mở tới giờ ảo hiện tại. Giống MT5, vị trí 0 là
+      nến ĐANG CHẠY (chỉ biết giá mở cửa); REPLAY_INCLUDE_FORMING_BAR = False -> chỉ trả nến đã đóng.
+    - Giá hiện tại: giá mở của nến đang chạy (= thời điểm vừa đóng nến trước).
+    - SL được kiểm tra theo high/low của từng nến khung nhỏ nhất đã đóng (khớp tại đúng giá SL,
+      giống backtest.py) mỗi khi bot gọi sàn.
+    """
+    # --- Hằng số giống module MetaTrader5 ---
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    TRADE_ACTION_DEAL, TRADE_ACTION_SLTP = 1, 6
+    ORDER_TIME_GTC, ORDER_FILLING_FOK, ORDER_FILLING_IOC = 0, 0, 1
+    TRADE_RETCODE_DONE, TRADE_RETCODE_INVALID_VOLUME, TRADE_RETCODE_INVALID_STOPS = 10009, 10014, 10016
+    TRADE_RETCODE_POSITION_CLOSED = 10036
+    TradeResult = SimTradeResult
+
+    _TIMEFRAME_MINUTES = {1: 1, 5: 5, 15: 15, 30: 30, 16385: 60, 16388: 240, 16408: 1440}
+
+    def __init__(self, config: Dict[str, Any], frames: Dict[str, pd.DataFrame], clock,
+                 initial_balance: Optional[float] = None):
+        self.clock = clock
+        self.symbol = config["SYMBOL"]
+        self.contract_size = config["CONTRACT_SIZE"]
+        self.include_forming_bar = config.get("REPLAY_INCLUDE_FORMING_BAR", True)
+        self.balance = float(initial_balance if initial_balance is not None else config["BACKTEST_INITIAL_CAPITAL"])
+        self._symbol_info = SimSymbolInfo(
+            name=self.symbol, point=config.get("REPLAY_POINT", 0.01), digits=2,
+            spread=int(config.get("REPLAY_SPREAD_POINTS", 0)),
+            volume_min=config.get("REPLAY_VOLUME_MIN", 0.01), volume_max=config.get("REPLAY_VOLUME_MAX", 100.0),
+            volume_step=config.get("REPLAY_VOLUME_STEP", 0.01), trade_stops_level=0,
+            trade_contract_size=self.contract_size,
+        )
+
+        # Nến theo số phút của khung -> (mảng thời gian mở (epoch giây), mảng OHLCV)
+        self._bars: Dict[int, Dict[str, np.ndarray]] = {}
+        for tf, df in frames.items():
+            minutes = parse_timeframe_to_minutes(tf)
+            self._bars[minutes] = {
+                "time": df.index.to_numpy(dtype="datetime64[s]").astype(np.int64),
+                "open": df["open"].to_numpy(dtype=np.float64),
+                "high": df["high"].to_numpy(dtype=np.float64),
+                "low": df["low"].to_numpy(dtype=np.float64),
+                "close": df["close"].to_numpy(dtype=np.float64),
+                "volume": df["volume"].to_numpy(dtype=np.float64),
+            }
+        # Khung nhỏ nhất: dùng cho giá hiện tại + kiểm tra SL
+        self._base_minutes = min(self._bars)
+        self._base_step = self._base_minutes * 60
+        self._next_sl_bar = 0 # Nến khung nhỏ nhất tiếp theo cần kiểm tra SL
+
+        self._positions: Dict[int, SimPosition] = {}
+        self._position_meta: Dict[int, Dict[str, Any]] = {}
+        self._next_ticket = 1
+        self._last_error = (1, "Success")
+        self.closed_trades: List[Dict[str, Any]] = []
+        self.stats = {"orders": 0, "modifies": 0, "rejected": 0, "sl_hits": 0}
+
+    # ==========================================================
+    # KẾT NỐI / TÀI KHOẢN
+    # ==========================================================
+    def initialize(self, *args, **kwargs) -> bool:
+        return True
+
+    def shutdown(self):
+        pass
+
+    def last_error(self):
+        return self._last_error
+
+    def account_info(self) -> SimAccountInfo:
+        self._sync()
+        profit = sum(self._profit(p, self._price(p.type, closing=True)) for p in self._positions.values())
+        return SimAccountInfo(login=0, server="SimBroker", currency="USD", balance=self.balance,
+                              equity=self.balance + profit, profit=profit, margin_free=self.balance + profit)
+
+    def symbol_info(self, symbol: str) -> Optional[SimSymbolInfo]:
+        return self._symbol_info if symbol == self.symbol else None
+
+    # ==========================================================
+    # GIÁ / NẾN
+    # ==========================================================
+    def _last_open_index(self, minutes: int) -> int:
+        """Vị trí nến MỚI NHẤT đã mở tại giờ ảo hiện tại (-1 nếu chưa có)."""
+        return int(np.searchsorted(self._bars[minutes]["time"], self.clock.time(), side="right")) - 1
+
+    def _current_price(self) -> float:
+        bars = self._bars[self._base_minutes]
+        i = self._last_open_index(self._base_minutes)
+        if i < 0:
+            return float(bars["open"][0])
+        if bars["time"][i] + self._base_step <= self.clock.time():
+            return float(bars["close"][i]) # Nến cuối đã đóng (hết dữ liệu / nghỉ giao dịch)
+        return float(bars["open"][i])
+
+    def symbol_info_tick(self, symbol: str) -> Optional[SimTick]:
+        if symbol != self.symbol:
+            return None
+        self._sync()
+        bid = self._current_price()
+        ask = bid + self._symbol_info.spread * self._symbol_info.point
+        now = self.clock.time()
+        return SimTick(time=int(now), bid=bid, ask=ask, last=bid, volume=0, time_msc=int(now * 1000))
+
+    def copy_rates_from_pos(self, symbol: str, timeframe: int, start_pos: int, count: int) -> Optional[np.ndarray]:
+        minutes = self._TIMEFRAME_MINUTES.get(timeframe)
+        if symbol != self.symbol or minutes not in self._bars:
+            self._last_error = (-2, f"Không có dữ liệu {symbol} khung {timeframe}")
+            return None
+        bars = self._bars[minutes]
+        end = self._last_open_index(minutes) + 1
+        if end <= 0:
+            return None
+        forming = bars["time"][end - 1] + minutes * 60 > self.clock.time()
+        if forming and not self.include_forming_bar and count > 1:
+            # Chỉ bỏ nến đang chạy khỏi yêu cầu tải dữ liệu; hỏi "nến hiện tại" (count=1,
+            # CandleScheduler) vẫn thấy nến mới mở như trên MT5
+            end -= 1
+        end -= start_pos
+        begin = max(0, end - count)
+        if end <= begin:
+            return None
+
+        rates = np.zeros(end - begin, dtype=RATES_DTYPE)
+        rates["time"] = bars["time"][begin:end]
+        for col in ("open", "high", "low", "close"):
+            rates[col] = bars[col][begin:end]
+        rates["tick_volume"] = bars["volume"][begin:end]
+        rates["spread"] = self._symbol_info.spread
+        if forming and self.include_forming_bar and start_pos == 0:
+            # Nến đang chạy: mới biết giá mở cửa
+            last = rates[-1]
+            last["high"] = last["low"] = last["close"] = last["open"]
+            last["tick_volume"] = 1
+        return rates
+
+    # ==========================================================
+    # LỆNH
+    # ==========================================================
+    def _price(self, order_type: int, closing: bool = False) -> float:
+        """Giá khớp: mua ở ASK, bán ở BID (đóng lệnh BUY = bán)."""
+        bid = self._current_price()
+        ask = bid + self._symbol_info.spread * self._symbol_info.point
+        is_buy = (order_type == self.ORDER_TYPE_BUY) != closing
+        return ask if is_buy else bid
+
+    def _profit(self, position: SimPosition, price: float) -> float:
+        return self.order_calc_profit(position.type, position.symbol, position.volume, position.price_open, price)
+
+    def order_calc_profit(self, order_type: int, symbol: str, volume: float,
+                          price_open: float, price_close: float) -> float:
+        direction = 1.0 if order_type == self.ORDER_TYPE_BUY else -1.0
+        return direction * (price_close - price_open) * volume * self.contract_size
+
+    def positions_get(self, *args, **kwargs) -> tuple:
+        self._sync()
+        result = []
+        for p in self._positions.values():
+            price = self._price(p.type, closing=True)
+            result.append(p._replace(price_current=price, profit=self._profit(p, price)))
+        return tuple(result)
+
+    def _reject(self, retcode: int, comment: str) -> SimTradeResult:
+        self.stats["rejected"] += 1
+        self._last_error = (retcode, comment)
+        return SimTradeResult(retcode=retcode, order=0, deal=0, volume=0.0, price=0.0, bid=0.0, ask=0.0, comment=comment)
+
+    def order_send(self, request: Dict[str, Any]) -> SimTradeResult:
+        self._sync()
+        action = request.get("action")
+        if action == self.TRADE_ACTION_SLTP:
+            return self._modify(request)
+        if action == self.TRADE_ACTION_DEAL and request.get("position"):
+            return self._close(request)
+        if action == self.TRADE_ACTION_DEAL:
+            return self._open(request)
+        return self._reject(10013, f"Action không hỗ trợ: {action}")
+
+    def _open(self, request: Dict[str, Any]) -> SimTradeResult:
+        info = self._symbol_info
+        volume = float(request["volume"])
+        if volume < info.volume_min or volume > info.volume_max:
+            return self._reject(self.TRADE_RETCODE_INVALID_VOLUME, f"Volume {volume} không hợp lệ")
+        order_type = request["type"]
+        price = self._price(order_type)
+        sl = float(request.get("sl", 0.0) or 0.0)
+        if sl and ((order_type == self.ORDER_TYPE_BUY and sl >= price) or
+                   (order_type == self.ORDER_TYPE_SELL and sl <= price)):
+            return self._reject(self.TRADE_RETCODE_INVALID_STOPS, f"SL {sl} sai phía so với giá {price}")
+
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._positions[ticket] = SimPosition(
+            ticket=ticket, time=int(self.clock.time()), type=order_type, magic=request.get("magic", 0),
+            symbol=request["symbol"], volume=volume, price_open=price, sl=sl, tp=float(request.get("tp", 0.0) or 0.0),
+            price_current=price, profit=0.0, comment=request.get("comment", ""))
+        self._position_meta[ticket] = {"initial_sl": sl}
+        self.stats["orders"] += 1
+        return SimTradeResult(retcode=self.TRADE_RETCODE_DONE, order=ticket, deal=ticket, volume=volume,
+                              price=price, bid=self._current_price(), ask=price, comment="Request executed")
+
+    def _close(self, request: Dict[str, Any]) -> SimTradeResult:
+        position = self._positions.get(request["position"])
+        if position is None:
+            return self._reject(self.TRADE_RETCODE_POSITION_CLOSED, f"Lệnh #{request['position']} không tồn tại")
+        volume = min(float(request.get("volume", position.volume)), position.volume)
+        price = self._price(position.type, closing=True)
+        self._settle(position, volume, price, request.get("comment", "close"))
+        return SimTradeResult(retcode=self.TRADE_RETCODE_DONE, order=position.ticket, deal=position.ticket,
+                              volume=volume, price=price, bid=price, ask=price, comment="Request executed")
+
+    def _modify(self, request: Dict[str, Any]) -> SimTradeResult:
+        position = self._positions.get(request["position"])
+        if position is None:
+            return self._reject(self.TRADE_RETCODE_POSITION_CLOSED, f"Lệnh #{request['position']} không tồn tại")
+        sl = float(request.get("sl", 0.0) or 0.0)
+        price = self._price(position.type, closing=True)
+        if sl and ((position.type == self.ORDER_TYPE_BUY and sl >= price) or
+                   (position.type == self.ORDER_TYPE_SELL and sl <= price)):
+            return self._reject(self.TRADE_RETCODE_INVALID_STOPS, f"SL {sl} sai phía so với giá {price}")
+        self._positions[position.ticket] = position._replace(sl=sl, tp=float(request.get("tp", 0.0) or 0.0))
+        self.stats["modifies"] += 1
+        return SimTradeResult(retcode=self.TRADE_RETCODE_DONE, order=position.ticket, deal=0, volume=position.volume,
+                              price=price, bid=price, ask=price, comment="Request executed")
+
+    def _settle(self, position: SimPosition, volume: float, price: float, reason: str, close_ts: Optional[float] = None):
+        """Đóng (1 phần) lệnh tại 'price', cộng lãi/lỗ vào balance và ghi lịch sử."""
+        pnl = self.order_calc_profit(position.type, position.symbol, volume, position.price_open, price)
+        self.balance += pnl
+        self.closed_trades.append({
+            "ticket": position.ticket,
+            "entry_time": pd.Timestamp(position.time, unit="s"),
+            "entry_price": position.price_open,
+            "type": "BUY" if position.type == self.ORDER_TYPE_BUY else "SELL",
+            "lot_size": volume,
+            "initial_sl_price": self._position_meta[position.ticket]["initial_sl"],
+            "current_sl": position.sl,
+            "close_time": pd.Timestamp(close_ts if close_ts is not None else self.clock.time(), unit="s"),
+            "close_price": price,
+            "close_reason": reason,
+            "pnl_usd": pnl,
+        })
+        remaining = round(position.volume - volume, 8)
+        if remaining > 0:
+            self._positions[position.ticket] = position._replace(volume=remaining)
+        else:
+            del self._positions[position.ticket]
+            del self._position_meta[position.ticket]
+
+    # ==========================================================
+    # KIỂM TRA SL THEO NẾN ĐÃ ĐÓNG
+    # ==========================================================
+    def _sync(self):
+        """Khớp SL cho mọi nến (khung nhỏ nhất) đã đóng tới giờ ảo hiện tại."""
+        bars = self._bars[self._base_minutes]
+        now = self.clock.time()
+        n = len(bars["time"])
+        while self._next_sl_bar < n and bars["time"][self._next_sl_bar] + self._base_step <= now:
+            i = self._next_sl_bar
+            self._next_sl_bar += 1
+            if not self._positions:
+                continue
+            bar_open, close_ts = bars["time"][i], bars["time"][i] + self._base_step
+            for position in list(self._positions.values()):
+                if not position.sl or position.time > bar_open:
+                    continue # Lệnh mở sau khi nến này bắt đầu
+                if position.type == self.ORDER_TYPE_BUY and bars["low"][i] <= position.sl:
+                    self._settle(position, position.volume, position.sl, "SL/TSL Hit", close_ts)
+                    self.stats["sl_hits"] += 1
+                elif position.type == self.ORDER_TYPE_SELL and bars["high"][i] >= position.sl:
+                    self._settle(position, position.volume, position.sl, "SL/TSL Hit", close_ts)
+                    self.stats["sl_hits"] += 1
+
+    def get_results_df(self) -> pd.DataFrame:
+        """Lịch sử lệnh đã đóng (cùng cột với kết quả backtest.py + ticket)."""
+        return pd.DataFrame(self.closed_trades)
@@ -3,7 +3,7 @@
 
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # Xác định đường dẫn tới file trạng thái
 # Giả định file này nằm trong thư mục core/, thư mục data/ nằm cùng cấp với core/
@@ -11,11 +11,13 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 STATE_FILE_PATH = os.path.join(PROJECT_ROOT, "data", "trades_state.json")
 
-def load_state() -> Dict[str, Any]:
+def load_state(path: Optional[str] = None) -> Dict[str, Any]:
     """
     Tải trạng thái của bot từ file JSON.
     Nếu file không tồn tại hoặc bị lỗi, trả về một trạng thái mặc định.
+    (MỚI) path: File trạng thái khác (ví dụ replay.py) - mặc định STATE_FILE_PATH.
     """
+    path = path or STATE_FILE_PATH
     default_state = {
         "active_trades": [],   # Danh sách các lệnh đang được bot quản lý
         "trade_history": [],   # Lịch sử các lệnh đã đóng
@@ -23,12 +25,12 @@ def load_state() -> Dict[str, Any]:
         "last_trade_close_time": None # (MỚI) Thêm để theo dõi Cooldown
     }
     
-    if not os.path.exists(STATE_FILE_PATH):
+    if not os.path.exists(path):
         print("[INFO] Không tìm thấy file trạng thái, sẽ tạo file mới.")
         return default_state
         
     try:
-        with open(STATE_FILE_PATH, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             state = json.load(f)
             # Đảm bảo các key cơ bản luôn tồn tại
             for key, value in default_state.items():
@@ -39,15 +41,16 @@ def load_state() -> Dict[str, Any]:
         print("[WARNING] File trạng thái bị lỗi hoặc không đọc được. Bắt đầu với trạng thái mới.")
         return default_state
 
-def save_state(state_data: Dict[str, Any]):
+def save_state(state_data: Dict[str, Any], path: Optional[str] = None):
     """
     Lưu trạng thái hiện tại của bot vào file JSON.
     """
+    path = path or STATE_FILE_PATH
     try:
         # Tạo thư mục data nếu chưa có
-        os.makedirs(os.path.dirname(STATE_FILE_PATH), exist_ok=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         
-        with open(STATE_FILE_PATH, "w", encoding="utf-8") as f:
+        with open(path, "w", encoding="utf-8") as f:
             json.dump(state_data, f, indent=4, ensure_ascii=False)
         # print("[DEBUG] Đã lưu trạng thái bot thành công.") # Có thể bật để gỡ lỗi
     except Exception as e:
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Tên file: core/strategy_params.py
+
+import json
+import hashlib
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Mapping, Optional, Union
+
+# ==============================================================================
+# THAM SỐ CHIẾN LƯỢC "ĐÃ BIÊN DỊCH" (STRATEGY PARAMS)
+# ------------------------------------------------------------------------------
+# Trước đây: get_signal / TradeManager / RiskManager đọc config_dict["..."] / .get("...", mặc định)
+# ở MỌI nến (tra dict theo chuỗi + giá trị mặc định rải rác ở nhiều file).
+# Bây giờ: dựng 1 lần từ config.py (+ ghi đè khi quét tham số) thành dataclass frozen + __slots__:
+# - Ép kiểu + kiểm tra hợp lệ ngay khi dựng (lỗi -> ValueError liệt kê mọi tham số sai).
+# - Đọc bằng thuộc tính (params.ADX_WEAK) - không tra dict.
+# - Hashable (dùng làm key dict) + .digest ổn định giữa các process (key cache / kết quả quét tham số).
+# - Vẫn đọc được kiểu dict (params["ADX_WEAK"], params.get(...)) cho code cũ.
+# Tên trường = tên key trong config.py; mặc định = giá trị trong config.py.
+# ==============================================================================
+
+RISK_MODES = ("FIXED_LOT", "RISK_PERCENT", "DYNAMIC")
+ENTRY_MODES = ("BREAKOUT", "PULLBACK", "DYNAMIC")
+TSL_MODES = ("STATIC", "DYNAMIC", "AGGRESSIVE")
+PULLBACK_PATTERNS = ("ENGULFING",)
+
+
+@dataclass(frozen=True, slots=True)
+class StrategyParams:
+    # === Dữ liệu ===
+    NUM_H1_BARS: int = 70
+    NUM_M15_BARS: int = 70
+
+    # === Giao dịch chung ===
+    SYMBOL: str = "ETHUSD"
+    CONTRACT_SIZE: float = 1.0
+    max_trade: int = 1
+    trend_timeframe: str = "1H"
+    entry_timeframe: str = "15M"
+    ALLOW_LONG_TRADES: bool = True
+    ALLOW_SHORT_TRADES: bool = True
+
+    # === Vốn & rủi ro ===
+    BACKTEST_INITIAL_CAPITAL: float = 1000.0
+    BACKTEST_ENTRY_SLIPPAGE: float = 0.0
+    RISK_MANAGEMENT_MODE: str = "FIXED_LOT"
+    fixed_lot: float = 5.0
+    RISK_PERCENT_PER_TRADE: float = 2.0
+    USE_MAX_USD_SL_FOR_FIXED_LOT: bool = False
+    MAX_USD_LOSS_PER_TRADE: float = 300.0
+
+    # === Lọc Trend (1H) ===
+    USE_TREND_FILTER: bool = True
+    USE_SUPERTREND_FILTER: bool = True
+    USE_EMA_TREND_FILTER: bool = True
+    USE_ADX_FILTER: bool = True
+    ADX_MIN_LEVEL: float = 20.0
+    USE_ADX_GREY_ZONE: bool = False
+    ADX_WEAK: float = 18.0
+    ADX_STRONG: float = 23.0
+
+    # === Lọc Entry (15M) ===
+    ENTRY_LOGIC_MODE: str = "DYNAMIC"
+    PULLBACK_CANDLE_PATTERN: str = "ENGULFING"
+    USE_CANDLE_FILTER: bool = True
+    min_body_percent: float = 50.0
+    USE_VOLUME_FILTER: bool = True
+    volume_ma_period: int = 20
+    volume_sd_multiplier: float = 0.5
+
+    # === Quản lý lệnh (SL/TSL/Exit) ===
+    COOLDOWN_MINUTES: float = 1.0
+    USE_EMERGENCY_EXIT: bool = True
+    sl_atr_multiplier: float = 0.2
+    isMoveToBE_Enabled: bool = True
+    tsl_trigger_R: float = 1.0
+    be_atr_buffer: float = 0.8
+    TSL_LOGIC_MODE: str = "DYNAMIC"
+    trail_atr_buffer: float = 0.2
+    USE_DYNAMIC_ATR_BUFFER: bool = False
+    DYN_ATR_MA_PERIOD: int = 50
+    DYN_ATR_MIN_CAP_RATIO: float = 0.75
+    DYN_ATR_MAX_CAP_RATIO: float = 2.0
+
+    # === Chỉ báo ===
+    atr_period: int = 14
+    swing_period: int = 5
+    ST_ATR_PERIOD: int = 10
+    ST_MULTIPLIER: float = 3.0
+    DI_PERIOD: int = 14
+    ADX_PERIOD: int = 14
+    TREND_EMA_PERIOD: int = 50
+    ENTRY_EMA_PERIOD: int = 21
+
+    # Hash ổn định (sha256 của mọi trường) - tự tính, không so sánh
+    digest: str = field(init=False, repr=False, compare=False, default="")
+
+    def __post_init__(self):
+        errors = []
+        for f in _FIELDS:
+            value = getattr(self, f.name)
+            try:
+                object.__setattr__(self, f.name, _coerce(value, f.type))
+            except (TypeError, ValueError):
+                errors.append(f"{f.name}={value!r} (cần kiểu {f.type.__name__})")
+        if not errors:
+            errors = self._check_ranges()
+        if errors:
+            raise ValueError("Tham số chiến lược không hợp lệ: " + "; ".join(errors))
+        payload = json.dumps(self.to_dict(), sort_keys=True)
+        object.__setattr__(self, "digest", hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16])
+
+    def _check_ranges(self) -> list:
+        errors = []
+        def check(ok: bool, message: str):
+            if not ok:
+                errors.append(message)
+
+        for name in ("atr_period", "swing_period", "ST_ATR_PERIOD", "DI_PERIOD", "ADX_PERIOD",
+                     "TREND_EMA_PERIOD", "ENTRY_EMA_PERIOD", "volume_ma_period", "DYN_ATR_MA_PERIOD", "max_trade"):
+            check(getattr(self, name) >= 1, f"{name} phải >= 1")
+        check(self.NUM_H1_BARS >= 2 and self.NUM_M15_BARS >= 2, "NUM_H1_BARS / NUM_M15_BARS phải >= 2")
+        check(self.CONTRACT_SIZE > 0, "CONTRACT_SIZE phải > 0")
+        check(self.fixed_lot > 0, "fixed_lot phải > 0")
+        check(0 < self.RISK_PERCENT_PER_TRADE <= 100, "RISK_PERCENT_PER_TRADE phải trong (0, 100]")
+        check(0 <= self.min_body_percent <= 100, "min_body_percent phải trong [0, 100]")
+        check(self.ADX_WEAK <= self.ADX_STRONG, "ADX_WEAK phải <= ADX_STRONG")
+        check(0 < self.DYN_ATR_MIN_CAP_RATIO <= self.DYN_ATR_MAX_CAP_RATIO,
+              "cần 0 < DYN_ATR_MIN_CAP_RATIO <= DYN_ATR_MAX_CAP_RATIO")
+        check(self.COOLDOWN_MINUTES >= 0, "COOLDOWN_MINUTES phải >= 0")
+        check(self.RISK_MANAGEMENT_MODE in RISK_MODES, f"RISK_MANAGEMENT_MODE phải thuộc {RISK_MODES}")
+        check(self.ENTRY_LOGIC_MODE in ENTRY_MODES, f"ENTRY_LOGIC_MODE phải thuộc {ENTRY_MODES}")
+        check(self.TSL_LOGIC_MODE in TSL_MODES, f"TSL_LOGIC_MODE phải thuộc {TSL_MODES}")
+        check(self.PULLBACK_CANDLE_PATTERN in PULLBACK_PATTERNS, f"PULLBACK_CANDLE_PATTERN phải thuộc {PULLBACK_PATTERNS}")
+        return errors
+
+    @classmethod
+    def from_config(cls, source: Optional[Mapping[str, Any]] = None,
+                    overrides: Optional[Mapping[str, Any]] = None) -> "StrategyParams":
+        """Dựng từ dict config (mặc định: module config.py) + ghi đè. Các key không phải tham số chiến lược bị bỏ qua."""
+        if source is None:
+            import config
+            source = {key: getattr(config, key) for key in dir(config) if not key.startswith('__')}
+        merged = dict(source, **(overrides or {}))
+        return cls(**{name: merged[name] for name in FIELD_NAMES if name in merged})
+
+    def replace(self, **changes) -> "StrategyParams":
+        """Bản sao với vài tham số khác (được kiểm tra lại)."""
+        return dataclasses.replace(self, **changes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    # --- Đọc kiểu dict (tương thích code cũ nhận config_dict) ---
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _FIELD_SET else default
+
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELD_SET
+
+    def keys(self) -> Iterator[str]:
+        return iter(FIELD_NAMES)
+
+
+_FIELDS = tuple(f for f in dataclasses.fields(StrategyParams) if f.init)
+FIELD_NAMES = tuple(f.name for f in _FIELDS)
+_FIELD_SET = frozenset(FIELD_NAMES)
+
+
+def _coerce(value: Any, kind: type) -> Any:
+    """Ép kiểu chặt: bool chỉ nhận bool; int nhận số nguyên (kể cả 20.0); float nhận int/float."""
+    if kind is bool:
+        if isinstance(value, bool) or type(value).__name__ == "bool_":
+            return bool(value)
+        raise TypeError(value)
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if kind is int:
+        as_float = float(value)
+        if not as_float.is_integer():
+            raise ValueError(value)
+        return int(as_float)
+    if kind is float:
+        return float(value)
+    if not isinstance(value, str):
+        raise TypeError(value)
+    return value
+
+
+def as_strategy_params(config: Union[StrategyParams, Mapping[str, Any]]) -> StrategyParams:
+    """StrategyParams giữ nguyên; dict config -> dựng (1 lần ở đầu mỗi lần chạy, KHÔNG gọi trong vòng lặp nến)."""
+    if isinstance(config, StrategyParams):
+        return config
+    return StrategyParams.from_config(config)
@@ -1,16 +1,22 @@
 # -*- coding: utf-8 -*-
 # Tên file: core/trade_manager.py
 
+import copy
 import logging
+import time
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Set, FrozenSet, Union
 import threading
 
 # --- Import các file "Cốt lõi" ---
 from core.exness_connector import ExnessConnector
 from core.storage_manager import load_state, save_state
 from core.risk_manager import RiskManager 
+from core.metrics import METRICS
+from core.clock import SYSTEM_CLOCK
+from core.strategy_params import StrategyParams, as_strategy_params
 
 # --- Import các file "Cảm biến" ---
 # (NÂNG CẤP 1) Import hàm mới
@@ -53,48 +59,63 @@ class SimTrade:
 
 class TradeManager:
     
-    def __init__(self, config: Dict[str, Any], mode="live", initial_capital=10000.0):
+    def __init__(self, config: Union[Dict[str, Any], StrategyParams], mode="live", initial_capital=10000.0,
+                 connector: Optional[ExnessConnector] = None, clock=None, state_path: Optional[str] = None):
         """
         Khởi tạo Trade Manager.
         (NÂNG CẤP: Gộp 1, 2, 3)
+        (MỚI) connector / clock / state_path: Dùng khi replay (SimBroker + VirtualClock + file trạng thái riêng).
+        Mặc định: tự kết nối MT5, giờ máy thật, data/trades_state.json.
+        (MỚI) config: dict config hoặc StrategyParams - luôn "biên dịch" 1 lần thành self.params
+        (ValueError nếu tham số sai). Mọi chỗ đọc tham số dùng self.params.<TÊN>.
         """
         self.config = config
+        self.params = as_strategy_params(config)
         self.mode = mode
+        self.clock = clock or SYSTEM_CLOCK
+        self.state_path = state_path
         logger.info(f"TradeManager đã khởi tạo ở chế độ: [{self.mode.upper()}]")
 
         self.lock = threading.Lock()
+        # (MỚI) Lock chỉ giữ trong thời gian NGẮN (chụp snapshot / ghi kết quả), không giữ khi gọi sàn.
+        # Thống kê thời gian chờ lock (giây) để theo dõi tranh chấp giữa các luồng.
+        self.lock_stats = {"acquisitions": 0, "wait_total": 0.0, "wait_max": 0.0}
+        self._pending_opens = 0 # Số lệnh đang gửi lên sàn (đã "giữ chỗ" trong max_trade)
+
+        # (MỚI) Hook gọi sau khi mở lệnh LIVE thành công (ReconcileEngine dùng để thức dậy sớm)
+        self.on_trade_opened: Optional[Callable[[], None]] = None
 
         # --- Đọc Config (Chỉ đọc các config liên quan đến TradeManager) ---
-        self.SYMBOL = self.config["SYMBOL"]
-        self.max_trade = self.config["max_trade"]
+        self.SYMBOL = self.params.SYMBOL
+        self.max_trade = self.params.max_trade
         
         # SL/TSL Config (Gốc - Dùng làm fallback)
-        self.atr_period = self.config.get("atr_period", 14)
-        self.swing_period = self.config.get("swing_period", 5)
-        self.sl_atr_multiplier = self.config.get("sl_atr_multiplier", 0.2)
-        self.tsl_trigger_R = self.config.get("tsl_trigger_R", 1.0)
-        self.isMoveToBE_Enabled = self.config.get("isMoveToBE_Enabled", True)
-        self.be_atr_buffer = self.config.get("be_atr_buffer", 0.8)
-        self.trail_atr_buffer = self.config.get("trail_atr_buffer", 0.2)
+        self.atr_period = self.params.atr_period
+        self.swing_period = self.params.swing_period
+        self.sl_atr_multiplier = self.params.sl_atr_multiplier
+        self.tsl_trigger_R = self.params.tsl_trigger_R
+        self.isMoveToBE_Enabled = self.params.isMoveToBE_Enabled
+        self.be_atr_buffer = self.params.be_atr_buffer
+        self.trail_atr_buffer = self.params.trail_atr_buffer
         
         self.MAGIC_NUMBER = 12345 
         
         # --- (THÊM) Đọc Config Nâng cấp ---
-        self.USE_DYNAMIC_ATR_BUFFER = self.config.get("USE_DYNAMIC_ATR_BUFFER", False)
-        self.USE_ADX_GREY_ZONE = self.config.get("USE_ADX_GREY_ZONE", False)
-        self.ADX_WEAK = self.config.get("ADX_WEAK", 18)
-        self.ADX_STRONG = self.config.get("ADX_STRONG", 23)
-        self.ADX_MIN_LEVEL = self.config.get("ADX_MIN_LEVEL", 20)
+        self.USE_DYNAMIC_ATR_BUFFER = self.params.USE_DYNAMIC_ATR_BUFFER
+        self.USE_ADX_GREY_ZONE = self.params.USE_ADX_GREY_ZONE
+        self.ADX_WEAK = self.params.ADX_WEAK
+        self.ADX_STRONG = self.params.ADX_STRONG
+        self.ADX_MIN_LEVEL = self.params.ADX_MIN_LEVEL
         # --- (HẾT THÊM) ---
 
         # Cấu hình theo Mode
         if self.mode == "live":
-            self.connector = ExnessConnector()
+            self.connector = connector or ExnessConnector()
             if not self.connector.connect():
                 logger.critical("LỖI NGHIÊM TRỌNG: Không thể kết nối MT5 ở chế độ LIVE.")
                 raise ConnectionError("Không thể khởi tạo TradeManager ở chế độ LIVE.")
             
-            self.state = load_state()
+            self.state = load_state(self.state_path)
             self.managed_trades = self.state.get("active_trades", [])
             self.last_trade_close_time_str = self.state.get("last_trade_close_time", None)
             logger.info(f"[LIVE] Đang quản lý {len(self.managed_trades)} lệnh (tải từ JSON).")
@@ -104,72 +125,103 @@ class TradeManager:
             self.open_trades_sim: List[SimTrade] = []
             self.closed_trades_sim: List[SimTrade] = []
             self.sim_capital = initial_capital
+            self.entry_slippage = self.params.BACKTEST_ENTRY_SLIPPAGE
             self.equity_curve = [self.sim_capital]
             self.last_trade_close_time_str = None
             logger.info(f"[BACKTEST] Khởi tạo với vốn $ {initial_capital:,.2f}")
 
         self.risk_manager = RiskManager(
-            self.config,
+            self.params,
             self.mode,
             self._get_current_capital, 
             self.connector              
         )
 
     # ==========================================================
-    # HÀM MỚI: ĐỐI CHIẾU TRẠNG THÁI (LUỒNG NHANH)
+    # LOCK NGẮN + THỐNG KÊ CHỜ LOCK
     # ==========================================================
-    def reconcile_live_trades(self):
-        """(Hàm cho Luồng 2 - Nhanh 5s)"""
+    @contextmanager
+    def _locked(self):
+        """Giữ self.lock (chỉ dùng cho đoạn đọc/ghi state ngắn) và ghi lại thời gian chờ."""
+        start = time.perf_counter()
+        self.lock.acquire()
+        try:
+            waited = time.perf_counter() - start
+            self.lock_stats["acquisitions"] += 1
+            self.lock_stats["wait_total"] += waited
+            if waited > self.lock_stats["wait_max"]:
+                self.lock_stats["wait_max"] = waited
+            yield
+        finally:
+            self.lock.release()
+
+    def get_lock_stats(self) -> Dict[str, float]:
+        """Thống kê chờ lock: số lần lấy, tổng/max/trung bình thời gian chờ (giây)."""
+        with self._locked():
+            stats = dict(self.lock_stats)
+        stats["wait_avg"] = stats["wait_total"] / stats["acquisitions"] if stats["acquisitions"] else 0.0
+        return stats
+
+    def get_managed_tickets(self) -> FrozenSet[int]:
+        """(LIVE) Tập ticket bot đang quản lý (dùng cho ReconcileEngine)."""
+        if self.mode != "live":
+            return frozenset()
+        with self._locked():
+            return frozenset(trade["ticket"] for trade in self.managed_trades)
+
+    def apply_position_delta(self, open_tickets: Set[int], delta: Dict[str, list],
+                             checked_tickets: Optional[FrozenSet[int]] = None):
+        """
+        (Hàm cho Luồng 2 - ReconcileEngine) Nhận delta lệnh trên sàn.
+        Xóa khỏi quản lý các lệnh không còn trên sàn.
+        checked_tickets: Ticket bot quản lý TRƯỚC khi hỏi sàn - chỉ các lệnh này mới bị xóa
+        (lệnh vừa mở trong lúc hỏi sàn không có trong open_tickets nhưng vẫn còn sống).
+        """
         if self.mode != "live":
             return
 
-        with self.lock:
-            try:
-                positions_on_exness = self.connector.get_all_open_positions()
-                
-                if len(self.managed_trades) > 0 and len(positions_on_exness) == 0:
-                    if not self.connector.connect():
-                        logger.warning("[LIVE][RECONCILE] CẢNH BÁO: Mất kết nối. Bỏ qua đợt đối chiếu này.")
-                        return
-                
-                exness_positions_map = {
-                    p.ticket: p for p in positions_on_exness 
-                    if p.magic == self.MAGIC_NUMBER
-                }
-                
-                managed_trades_copy = list(self.managed_trades)
-                state_changed = False
-                
-                for trade in managed_trades_copy:
-                    if trade["ticket"] not in exness_positions_map:
-                        logger.warning(f"[LIVE][RECONCILE] Lệnh {trade['ticket']} không còn trên sàn. Xóa khỏi quản lý.")
-                        self.managed_trades.remove(trade)
-                        state_changed = True
-                        self.last_trade_close_time_str = datetime.now().isoformat()
-
-                if state_changed:
-                    self._save_state()
-            
-            except Exception as e:
-                logger.error(f"[LIVE] Lỗi khi reconcile lệnh: {e}")
+        with self._locked():
+            state_changed = False
+            for trade in list(self.managed_trades):
+                if checked_tickets is not None and trade["ticket"] not in checked_tickets:
+                    continue
+                if trade["ticket"] not in open_tickets:
+                    logger.warning(f"[LIVE][RECONCILE] Lệnh {trade['ticket']} không còn trên sàn. Xóa khỏi quản lý.")
+                    self.managed_trades.remove(trade)
+                    state_changed = True
+                    self.last_trade_close_time_str = self.clock.now().isoformat()
+
+            managed_tickets = {trade["ticket"] for trade in self.managed_trades}
+            for ticket in delta.get("opened", []):
+                if ticket not in managed_tickets:
+                    logger.warning(f"[LIVE][RECONCILE] Phát hiện lệnh #{ticket} (cùng Magic) không có trong state.")
+            for ticket in delta.get("modified", []):
+                logger.debug(f"[LIVE][RECONCILE] Lệnh #{ticket} thay đổi volume/SL trên sàn.")
+
+            if state_changed:
+                self._save_state()
 
     # ==========================================================
     # LUỒNG LOGIC CHÍNH
     # ==========================================================
 
-    def check_and_open_new_trade(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame):
-        """(Hàm cho Luồng 1 - Signal)"""
+    def check_and_open_new_trade(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame,
+                                 precomputed: Optional[Dict[str, Any]] = None):
+        """
+        (Hàm cho Luồng 1 - Signal)
+        (MỚI) precomputed: Chỉ báo đã tính 1 lần cho vòng này (đồ thị chỉ báo, xem core/indicator_graph.py).
+        """
         
         # --- KIỂM TRA COOLDOWN ---
         if self.last_trade_close_time_str:
             try:
                 last_close_time = datetime.fromisoformat(self.last_trade_close_time_str)
-                cooldown_minutes = self.config.get("COOLDOWN_MINUTES", 60) 
+                cooldown_minutes = self.params.COOLDOWN_MINUTES 
                 cooldown_delta = timedelta(minutes=cooldown_minutes)
                 
                 current_time = None
                 if self.mode == "live":
-                    current_time = datetime.now()
+                    current_time = self.clock.now()
                 else: 
                     current_time = data_m15.index[-1].to_pydatetime() 
                 
@@ -187,106 +239,153 @@ class TradeManager:
         if self._get_open_trade_count() >= self.max_trade:
             return
 
-        signal = get_signal(data_h1, data_m15, self.config) 
+        signal = get_signal(data_h1, data_m15, self.params, precomputed) 
 
         if signal:
             try:
-                self.open_trade(signal, data_h1, data_m15)
+                self.open_trade(signal, data_h1, data_m15, precomputed)
             except Exception as e:
                 logger.error(f"[{self.mode.upper()}] Lỗi khi thực thi open_trade ({signal}): {e}", exc_info=True)
 
     
-    def open_trade(self, signal: str, data_h1: pd.DataFrame, data_m15: pd.DataFrame):
-        """(Hàm nội bộ) Thực thi logic mở lệnh."""
-        
-        with self.lock:
+    def open_trade(self, signal: str, data_h1: pd.DataFrame, data_m15: pd.DataFrame,
+                   precomputed: Optional[Dict[str, Any]] = None):
+        """
+        (Hàm nội bộ) Thực thi logic mở lệnh.
+        (MỚI) precomputed: ATR/Swing đã tính sẵn cho nến hiện tại (Backtest + cache).
+        (MỚI) Lock chỉ giữ lúc "giữ chỗ" max_trade và lúc ghi lệnh mới vào state;
+        tính SL/Lot và gửi lệnh lên sàn chạy KHÔNG giữ lock.
+        """
+        if self.mode != "live":
             if self._get_open_trade_count() >= self.max_trade:
                 logger.warning(f"[{self.mode.upper()}] Bỏ qua tín hiệu {signal} do race condition, đã đủ lệnh.")
                 return
+            self._execute_open_trade(signal, data_h1, data_m15, precomputed)
+            return
+
+        with self._locked():
+            if len(self.managed_trades) + self._pending_opens >= self.max_trade:
+                logger.warning(f"[{self.mode.upper()}] Bỏ qua tín hiệu {signal} do race condition, đã đủ lệnh.")
+                return
+            self._pending_opens += 1
+        try:
+            self._execute_open_trade(signal, data_h1, data_m15, precomputed)
+        finally:
+            with self._locked():
+                self._pending_opens -= 1
+
+    def _execute_open_trade(self, signal: str, data_h1: pd.DataFrame, data_m15: pd.DataFrame,
+                            precomputed: Optional[Dict[str, Any]] = None):
+        """Helper: Tính SL/Lot và mở lệnh (gọi từ open_trade, KHÔNG giữ lock)."""
+        logger.info(f"[{self.mode.upper()}] Nhận tín hiệu {signal}. Bắt đầu tính SL & Lot...")
+
+        try:
+            if precomputed and "atr" in precomputed:
+                current_atr = precomputed["atr"]
+                last_high, last_low = precomputed["swing_high"], precomputed["swing_low"]
+            else:
+                current_atr = calculate_atr(data_m15, self.atr_period).iloc[-1]
+                last_high, last_low = get_last_swing_points(data_m15, self.params)
             
-            logger.info(f"[{self.mode.upper()}] Nhận tín hiệu {signal}. Bắt đầu tính SL & Lot...")
+            if pd.isna(current_atr) or last_high is None or last_low is None:
+                logger.error("Thiếu dữ liệu (ATR/Swing) để tính SL. Bỏ qua lệnh.")
+                return
+        except Exception as e:
+            logger.error(f"Lỗi lấy dữ liệu (ATR/Swing): {e}")
+            return
 
+        # --- (NÂNG CẤP 1) Lấy Hệ số SL Động ---
+        sl_atr_mult = self.sl_atr_multiplier # Mặc định
+        if self.USE_DYNAMIC_ATR_BUFFER:
             try:
-                current_atr = calculate_atr(data_m15, self.atr_period).iloc[-1]
-                last_high, last_low = get_last_swing_points(data_m15, self.config)
-                
-                if pd.isna(current_atr) or last_high is None or last_low is None:
-                    logger.error("Thiếu dữ liệu (ATR/Swing) để tính SL. Bỏ qua lệnh.")
-                    return
+                sl_atr_mult = get_dynamic_atr_buffer(current_atr, data_m15, self.params, "SL",
+                                                     (precomputed or {}).get("atr_series"))
             except Exception as e:
-                logger.error(f"Lỗi lấy dữ liệu (ATR/Swing): {e}")
-                return
+                logger.error(f"Lỗi get_dynamic_atr_buffer (SL): {e}. Dùng hệ số cố định.")
+                sl_atr_mult = self.sl_atr_multiplier
+        # --- (HẾT NÂNG CẤP 1) ---
+
+        # Tính SL ban đầu (Kỹ thuật)
+        initial_sl_price = 0.0
+        if signal == "BUY":
+            initial_sl_price = last_low - (sl_atr_mult * current_atr)
+        else: # SELL
+            initial_sl_price = last_high + (sl_atr_mult * current_atr)
+
+        sim_entry_price = data_m15['close'].iloc[-1] 
+        
+        # (NÂNG CẤP 2) Gọi RiskManager (Đã bao gồm logic Max Loss SL)
+        lot_size, initial_risk_usd, adjusted_sl_price = self.risk_manager.calculate_lot_size_for_trade(
+            signal, data_h1, initial_sl_price, sim_entry_price
+        )
+        
+        if lot_size is None or lot_size <= 0:
+            logger.error(f"[{self.mode.upper()}] Tính toán Lot size thất bại hoặc bằng 0. Bỏ qua lệnh.")
+            return
 
-            # --- (NÂNG CẤP 1) Lấy Hệ số SL Động ---
-            sl_atr_mult = self.sl_atr_multiplier # Mặc định
-            if self.USE_DYNAMIC_ATR_BUFFER:
-                try:
-                    sl_atr_mult = get_dynamic_atr_buffer(current_atr, data_m15, self.config, "SL")
-                except Exception as e:
-                    logger.error(f"Lỗi get_dynamic_atr_buffer (SL): {e}. Dùng hệ số cố định.")
-                    sl_atr_mult = self.sl_atr_multiplier
-            # --- (HẾT NÂNG CẤP 1) ---
-
-            # Tính SL ban đầu (Kỹ thuật)
-            initial_sl_price = 0.0
-            if signal == "BUY":
-                initial_sl_price = last_low - (sl_atr_mult * current_atr)
-            else: # SELL
-                initial_sl_price = last_high + (sl_atr_mult * current_atr)
-
-            sim_entry_price = data_m15['close'].iloc[-1] 
-            
-            # (NÂNG CẤP 2) Gọi RiskManager (Đã bao gồm logic Max Loss SL)
-            lot_size, initial_risk_usd, adjusted_sl_price = self.risk_manager.calculate_lot_size_for_trade(
-                signal, data_h1, initial_sl_price, sim_entry_price
+        if self.mode == "live":
+            order_type = 0 if signal == "BUY" else 1
+            result = self.connector.place_order(
+                symbol=self.SYMBOL, order_type=order_type, lot_size=lot_size,
+                sl_price=adjusted_sl_price, tp_price=0.0, # (NÂNG CẤP 2) Dùng SL đã điều chỉnh
+                magic_number=self.MAGIC_NUMBER, comment="finalplan_bot_v3",
+                reference_price=sim_entry_price # (MỚI) Đo trượt giá so với giá đóng nến (giá backtest dùng)
             )
             
-            if lot_size is None or lot_size <= 0:
-                logger.error(f"[{self.mode.upper()}] Tính toán Lot size thất bại hoặc bằng 0. Bỏ qua lệnh.")
-                return
-
-            if self.mode == "live":
-                order_type = 0 if signal == "BUY" else 1
-                result = self.connector.place_order(
-                    symbol=self.SYMBOL, order_type=order_type, lot_size=lot_size,
-                    sl_price=adjusted_sl_price, tp_price=0.0, # (NÂNG CẤP 2) Dùng SL đã điều chỉnh
-                    magic_number=self.MAGIC_NUMBER, comment="finalplan_bot_v3"
-                )
+            if result and result.retcode == 10009: # DONE
+                live_1R_usd = abs(self.connector.calculate_profit(
+                    self.SYMBOL, "LONG" if signal=="BUY" else "SELL", 
+                    lot_size, result.price, adjusted_sl_price 
+                ))
                 
-                if result and result.retcode == 10009: # DONE
-                    live_1R_usd = abs(self.connector.calculate_profit(
-                        self.SYMBOL, "LONG" if signal=="BUY" else "SELL", 
-                        lot_size, result.price, adjusted_sl_price 
-                    ))
-                    
-                    new_trade_state = {
-                        "ticket": result.order, "symbol": self.SYMBOL, "type": signal,
-                        "entry_price": result.price, 
-                        "initial_sl": adjusted_sl_price, # (NÂNG CẤP 2) Lưu SL thực tế
-                        "current_sl": adjusted_sl_price, # (NÂNG CẤP 2) Lưu SL thực tế
-                        "lot_size": lot_size,
-                        "magic": self.MAGIC_NUMBER, "initial_1R_usd": live_1R_usd,
-                        "is_BE_hit": False
-                    }
+                new_trade_state = {
+                    "ticket": result.order, "symbol": self.SYMBOL, "type": signal,
+                    "entry_price": result.price, 
+                    "initial_sl": adjusted_sl_price, # (NÂNG CẤP 2) Lưu SL thực tế
+                    "current_sl": adjusted_sl_price, # (NÂNG CẤP 2) Lưu SL thực tế
+                    "lot_size": lot_size,
+                    "magic": self.MAGIC_NUMBER, "initial_1R_usd": live_1R_usd,
+                    "is_BE_hit": False
+                }
+                with self._locked():
                     self.managed_trades.append(new_trade_state)
                     self._save_state()
-                    logger.info(f"+++ [LIVE] MỞ LỆNH {signal} thành công. Ticket: {result.order}")
-                else:
-                    logger.error(f"--- [LIVE] MỞ LỆNH {signal} thất bại. Retcode: {result.retcode if result else 'N/A'}")
-
-            else: # "backtest"
-                # (NÂNG CẤP 2) Backtest dùng SL đã điều chỉnh (từ RiskManager)
-                trade = SimTrade(data_m15.index[-1], sim_entry_price, signal,
-                                 lot_size, adjusted_sl_price, initial_risk_usd)
-                self.open_trades_sim.append(trade)
-                logger.info(f"+++ [BACKTEST] MỞ LỆNH {signal} @ {sim_entry_price:.5f}")
-            
-    def update_all_trades(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame):
-        """(Hàm cho Luồng 1 - Signal) Quản lý TSL."""
+                logger.info(f"+++ [LIVE] MỞ LỆNH {signal} thành công. Ticket: {result.order}")
+                if self.on_trade_opened:
+                    self.on_trade_opened()
+            else:
+                logger.error(f"--- [LIVE] MỞ LỆNH {signal} thất bại. Retcode: {result.retcode if result else 'N/A'}")
+
+        else: # "backtest"
+            # (MỚI) Mô hình chi phí: giá khớp = giá đóng nến + trượt giá bất lợi (đo từ LIVE, xem execution_report.py).
+            # Lot/rủi ro vẫn tính theo giá đóng nến - giống LIVE.
+            fill_price = sim_entry_price + (self.entry_slippage if signal == "BUY" else -self.entry_slippage)
+
+            # (NÂNG CẤP 2) Backtest dùng SL đã điều chỉnh (từ RiskManager)
+            trade = SimTrade(data_m15.index[-1], fill_price, signal,
+                             lot_size, adjusted_sl_price, initial_risk_usd)
+            self.open_trades_sim.append(trade)
+            logger.info(f"+++ [BACKTEST] MỞ LỆNH {signal} @ {fill_price:.5f}")
+        
+    def update_all_trades(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame,
+                          precomputed: Optional[Dict[str, Any]] = None):
+        """
+        (Hàm cho Luồng 1 - Signal) Quản lý TSL.
+        (MỚI) precomputed: ATR/Swing/ADX/EMA/Supertrend đã tính sẵn (Backtest + cache).
+        """
+        # (TỐI ƯU) Backtest: Không có lệnh mở -> không cần tính chỉ báo TSL
+        if self.mode == "backtest" and not self.open_trades_sim:
+            return
+
         try:
-            current_atr = calculate_atr(data_m15, self.atr_period).iloc[-1]
-            last_high, last_low = get_last_swing_points(data_m15, self.config)
-            trend_adx_h1 = get_adx_value(data_h1, self.config) 
+            if precomputed and "atr" in precomputed:
+                current_atr = precomputed["atr"]
+                last_high, last_low = precomputed["swing_high"], precomputed["swing_low"]
+                trend_adx_h1 = precomputed["trend_adx"]
+            else:
+                current_atr = calculate_atr(data_m15, self.atr_period).iloc[-1]
+                last_high, last_low = get_last_swing_points(data_m15, self.params)
+                trend_adx_h1 = get_adx_value(data_h1, self.params) 
             
             if pd.isna(current_atr) or last_high is None or last_low is None or pd.isna(trend_adx_h1):
                 logger.warning("Thiếu dữ liệu (ATR/Swing/ADX) cho TSL. Bỏ qua.")
@@ -297,199 +396,230 @@ class TradeManager:
             
         if self.mode == "live":
             # (THAY ĐỔI) Truyền data_m15 cho Nâng cấp 1
-            self._live_update_tsl(data_h1, data_m15, current_atr, last_high, last_low, trend_adx_h1)
+            self._live_update_tsl(data_h1, data_m15, current_atr, last_high, last_low, trend_adx_h1, precomputed)
         else:
             current_candle = data_m15.iloc[-1]
             # (THAY ĐỔI) Truyền data_m15 cho Nâng cấp 1
-            self._backtest_update_tsl(data_h1, data_m15, current_atr, last_high, last_low, trend_adx_h1, current_candle)
+            self._backtest_update_tsl(data_h1, data_m15, current_atr, last_high, last_low, trend_adx_h1, current_candle, precomputed)
 
     # ==========================================================
     # CÁC HÀM RIÊNG CỦA MODE "LIVE"
     # ==========================================================
 
-    def _live_update_tsl(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame, current_atr, last_high, last_low, trend_adx_h1):
-        """Logic TSL 3 chế độ cho chế độ LIVE."""
+    def _live_update_tsl(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame, current_atr, last_high, last_low, trend_adx_h1,
+                         precomputed: Optional[Dict[str, Any]] = None):
+        """
+        Logic TSL 3 chế độ cho chế độ LIVE.
+        (MỚI) Chia 3 pha để Luồng 1 và Luồng 2 không phải chờ nhau:
+        1. Snapshot (lock ngắn): Chụp bản sao các lệnh đang quản lý.
+        2. Tính toán + gọi sàn (KHÔNG giữ lock): positions_get, modify/close.
+        3. Commit (lock ngắn): Ghi kết quả vào state (bỏ qua lệnh đã bị Luồng 2 xóa).
+        """
+        precomputed = precomputed or {}
         
-        with self.lock:
-            # 1. ĐỐI CHIẾU TRƯỚC
-            try:
-                positions_on_exness = self.connector.get_all_open_positions()
-                
-                if len(self.managed_trades) > 0 and len(positions_on_exness) == 0:
-                    if not self.connector.connect():
-                        logger.warning("[LIVE][TSL] Mất kết nối khi update TSL. Bỏ qua vòng này.")
-                        return
-
-                exness_positions_map = {
-                    p.ticket: p for p in positions_on_exness 
-                    if p.magic == self.MAGIC_NUMBER
-                }
-                
-                managed_trades_copy = list(self.managed_trades)
-                state_changed = False
-                
-                for trade in managed_trades_copy:
-                    if trade["ticket"] not in exness_positions_map:
-                        self.managed_trades.remove(trade)
-                        state_changed = True
-                        self.last_trade_close_time_str = datetime.now().isoformat()
+        # --- PHA 1: SNAPSHOT ---
+        with self._locked():
+            trades_snapshot = [dict(trade) for trade in self.managed_trades]
+        if not trades_snapshot:
+            return
+        checked_tickets = frozenset(trade["ticket"] for trade in trades_snapshot)
 
-                if state_changed: self._save_state()
-            
-            except Exception as e:
-                logger.error(f"[LIVE] Lỗi đối chiếu TSL: {e}")
-                return 
-
-            # --- (NÂNG CẤP 3) Xác định Trạng thái ADX ---
-            adx_state = "STRONG" # Mặc định
-            if self.USE_ADX_GREY_ZONE:
-                if trend_adx_h1 < self.ADX_WEAK: adx_state = "WEAK"
-                elif trend_adx_h1 < self.ADX_STRONG: adx_state = "GREY"
-            else: # Dùng logic gốc
-                if trend_adx_h1 < self.ADX_MIN_LEVEL: adx_state = "WEAK"
-            # --- (HẾT NÂNG CẤP 3) ---
-
-            # 2. XỬ LÝ TSL & EMERGENCY EXIT
-            managed_trades_copy = list(self.managed_trades) 
+        # 1. ĐỐI CHIẾU TRƯỚC
+        try:
+            positions_on_exness = self.connector.get_all_open_positions()
+            if positions_on_exness is None:
+                logger.warning("[LIVE][TSL] Không lấy được danh sách lệnh trên sàn. Bỏ qua vòng này.")
+                return
             
-            for trade in managed_trades_copy:
-                current_position = exness_positions_map.get(trade["ticket"])
-                if not current_position: continue 
+            if len(positions_on_exness) == 0:
+                if not self.connector.connect():
+                    logger.warning("[LIVE][TSL] Mất kết nối khi update TSL. Bỏ qua vòng này.")
+                    return
 
-                # --- EMERGENCY EXIT ---
-                if self.config["USE_EMERGENCY_EXIT"]:
-                    try:
-                        trend_ema_h1 = check_trend_ema(data_h1, self.config)
-                        trend_st_h1 = get_supertrend_direction(data_h1, self.config)
-                        
-                        is_trend_broken = False
-                        if trade["type"] == "BUY" and (trend_ema_h1 == "DOWN" or trend_st_h1 == "DOWN"):
-                            is_trend_broken = True
-                        elif trade["type"] == "SELL" and (trend_ema_h1 == "UP" or trend_st_h1 == "UP"):
-                            is_trend_broken = True
-                            
-                        # (NÂNG CẤP 3) Chỉ thoát khi ADX mạnh
-                        is_reversal_confirmed = (adx_state == "STRONG")
-                        
-                        if is_trend_broken and is_reversal_confirmed:
-                            logger.warning(f"[LIVE][EMERGENCY EXIT] Đóng lệnh {trade['ticket']}")
-                            if self.connector.close_position(current_position, comment="emergency_exit_h1"):
-                                self.last_trade_close_time_str = datetime.now().isoformat()
-                            self.managed_trades.remove(trade)
-                            self._save_state()
-                            continue 
-                            
-                    except Exception as e:
-                        logger.error(f"[LIVE] Lỗi Emergency Exit: {e}")
-                        
-                # --- Bước 1: BE ---
-                if not trade["is_BE_hit"] and self.isMoveToBE_Enabled:
-                    live_profit_usd = current_position.profit
-                    target_profit_usd = trade["initial_1R_usd"] * self.tsl_trigger_R
+            exness_positions_map = {
+                p.ticket: p for p in positions_on_exness 
+                if p.magic == self.MAGIC_NUMBER
+            }
+            self.apply_position_delta(set(exness_positions_map), {}, checked_tickets)
+        
+        except Exception as e:
+            logger.error(f"[LIVE] Lỗi đối chiếu TSL: {e}")
+            return 
+
+        # --- (NÂNG CẤP 3) Xác định Trạng thái ADX ---
+        adx_state = self.get_adx_state(trend_adx_h1)
+
+        # Kết quả chờ commit: ticket -> các trường cần cập nhật / ticket đã đóng
+        sl_updates: Dict[int, Dict[str, Any]] = {}
+        closed_tickets: Set[int] = set()
+        close_time_str: Optional[str] = None
+
+        # 2. XỬ LÝ TSL & EMERGENCY EXIT (trên snapshot)
+        for trade in trades_snapshot:
+            current_position = exness_positions_map.get(trade["ticket"])
+            if not current_position: continue 
+
+            # --- EMERGENCY EXIT ---
+            if self.params.USE_EMERGENCY_EXIT:
+                try:
+                    trend_ema_h1 = precomputed["trend_ema"] if "trend_ema" in precomputed else check_trend_ema(data_h1, self.params)
+                    trend_st_h1 = precomputed["trend_st"] if "trend_st" in precomputed else get_supertrend_direction(data_h1, self.params)
                     
-                    if live_profit_usd >= target_profit_usd:
+                    is_trend_broken = False
+                    if trade["type"] == "BUY" and (trend_ema_h1 == "DOWN" or trend_st_h1 == "DOWN"):
+                        is_trend_broken = True
+                    elif trade["type"] == "SELL" and (trend_ema_h1 == "UP" or trend_st_h1 == "UP"):
+                        is_trend_broken = True
                         
-                        # (NÂNG CẤP 1) Lấy Hệ số BE Động
-                        be_atr_buf = self.be_atr_buffer
-                        if self.USE_DYNAMIC_ATR_BUFFER:
-                            try:
-                                be_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.config, "BE")
-                            except Exception as e:
-                                logger.error(f"Lỗi get_dynamic_atr_buffer (BE): {e}. Dùng hệ số cố định.")
+                    # (NÂNG CẤP 3) Chỉ thoát khi ADX mạnh
+                    is_reversal_confirmed = (adx_state == "STRONG")
+                    
+                    if is_trend_broken and is_reversal_confirmed:
+                        logger.warning(f"[LIVE][EMERGENCY EXIT] Đóng lệnh {trade['ticket']}")
+                        if self.connector.close_position(current_position, comment="emergency_exit_h1"):
+                            close_time_str = self.clock.now().isoformat()
+                        closed_tickets.add(trade["ticket"])
+                        continue 
                         
-                        new_sl = 0.0
-                        if trade["type"] == "BUY":
-                            new_sl = trade["entry_price"] + (be_atr_buf * current_atr)
-                        else: # SELL
-                            new_sl = trade["entry_price"] - (be_atr_buf * current_atr)
-
-                        if (trade["type"] == "BUY" and new_sl > trade["current_sl"]) or \
-                           (trade["type"] == "SELL" and new_sl < trade["current_sl"]):
-                            
-                            if self.connector.modify_position(trade["ticket"], new_sl, 0.0):
-                                logger.info(f"[LIVE] TSL (BE): Dời SL lệnh {trade['ticket']} về {new_sl:.5f}")
-                                trade["current_sl"] = new_sl
-                                trade["is_BE_hit"] = True
-                                self._save_state()
-
-                # --- Bước 2: Trailing (Logic 3 chế độ) ---
-                if trade["is_BE_hit"] or not self.isMoveToBE_Enabled:
+                except Exception as e:
+                    logger.error(f"[LIVE] Lỗi Emergency Exit: {e}")
                     
-                    # (NÂNG CẤP 1) Lấy Hệ số TSL Động
-                    trail_atr_buf = self.trail_atr_buffer
+            # --- Bước 1: BE ---
+            if not trade["is_BE_hit"] and self.isMoveToBE_Enabled:
+                live_profit_usd = current_position.profit
+                target_profit_usd = trade["initial_1R_usd"] * self.tsl_trigger_R
+                
+                if live_profit_usd >= target_profit_usd:
+                    
+                    # (NÂNG CẤP 1) Lấy Hệ số BE Động
+                    be_atr_buf = self.be_atr_buffer
                     if self.USE_DYNAMIC_ATR_BUFFER:
                         try:
-                            trail_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.config, "TSL")
+                            be_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.params, "BE", precomputed.get("atr_series"))
                         except Exception as e:
-                            logger.error(f"Lỗi get_dynamic_atr_buffer (TSL): {e}. Dùng hệ số cố định.")
-
-                    new_sl = 0.0
+                            logger.error(f"Lỗi get_dynamic_atr_buffer (BE): {e}. Dùng hệ số cố định.")
                     
-                    # (NÂNG CẤP 3) Dùng adx_state
-                    is_trending = (adx_state == "STRONG")
-                    tsl_mode = self.config.get("TSL_LOGIC_MODE", "STATIC")
-
+                    new_sl = 0.0
                     if trade["type"] == "BUY":
-                        if tsl_mode == "DYNAMIC":
-                            if not is_trending: # Sideways hoặc Grey Zone -> Chốt ngắn (Bám ĐỈNH)
-                                new_sl = last_high - (trail_atr_buf * current_atr)
-                            else: # Trending -> Gồng lãi (Bám ĐÁY)
-                                new_sl = last_low - (trail_atr_buf * current_atr)
-                        elif tsl_mode == "AGGRESSIVE":
-                            new_sl = last_high - (trail_atr_buf * current_atr)
-                        else: # STATIC
-                            new_sl = last_low - (trail_atr_buf * current_atr)
-                    
+                        new_sl = trade["entry_price"] + (be_atr_buf * current_atr)
                     else: # SELL
-                        if tsl_mode == "DYNAMIC":
-                            if not is_trending: # Sideways hoặc Grey Zone -> Chốt ngắn (Bám ĐÁY)
-                                new_sl = last_low + (trail_atr_buf * current_atr)
-                            else: # Trending -> Gồng lãi (Bám ĐỈNH)
-                                new_sl = last_high + (trail_atr_buf * current_atr)
-                        elif tsl_mode == "AGGRESSIVE":
-                            new_sl = last_low + (trail_atr_buf * current_atr)
-                        else: # STATIC
-                            new_sl = last_high + (trail_atr_buf * current_atr)
-                    
+                        new_sl = trade["entry_price"] - (be_atr_buf * current_atr)
+
                     if (trade["type"] == "BUY" and new_sl > trade["current_sl"]) or \
                        (trade["type"] == "SELL" and new_sl < trade["current_sl"]):
                         
                         if self.connector.modify_position(trade["ticket"], new_sl, 0.0):
-                            logger.info(f"[LIVE] TSL (SWING): Dời SL lệnh {trade['ticket']} về {new_sl:.5f}")
+                            logger.info(f"[LIVE] TSL (BE): Dời SL lệnh {trade['ticket']} về {new_sl:.5f}")
                             trade["current_sl"] = new_sl
-                            self._save_state()
+                            trade["is_BE_hit"] = True
+                            sl_updates[trade["ticket"]] = {"current_sl": new_sl, "is_BE_hit": True}
+
+            # --- Bước 2: Trailing (Logic 3 chế độ) ---
+            if trade["is_BE_hit"] or not self.isMoveToBE_Enabled:
+                
+                # (NÂNG CẤP 1) Lấy Hệ số TSL Động
+                trail_atr_buf = self.trail_atr_buffer
+                if self.USE_DYNAMIC_ATR_BUFFER:
+                    try:
+                        trail_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.params, "TSL", precomputed.get("atr_series"))
+                    except Exception as e:
+                        logger.error(f"Lỗi get_dynamic_atr_buffer (TSL): {e}. Dùng hệ số cố định.")
+
+                new_sl = 0.0
+                
+                # (NÂNG CẤP 3) Dùng adx_state
+                is_trending = (adx_state == "STRONG")
+                tsl_mode = self.params.TSL_LOGIC_MODE
+
+                if trade["type"] == "BUY":
+                    if tsl_mode == "DYNAMIC":
+                        if not is_trending: # Sideways hoặc Grey Zone -> Chốt ngắn (Bám ĐỈNH)
+                            new_sl = last_high - (trail_atr_buf * current_atr)
+                        else: # Trending -> Gồng lãi (Bám ĐÁY)
+                            new_sl = last_low - (trail_atr_buf * current_atr)
+                    elif tsl_mode == "AGGRESSIVE":
+                        new_sl = last_high - (trail_atr_buf * current_atr)
+                    else: # STATIC
+                        new_sl = last_low - (trail_atr_buf * current_atr)
+                
+                else: # SELL
+                    if tsl_mode == "DYNAMIC":
+                        if not is_trending: # Sideways hoặc Grey Zone -> Chốt ngắn (Bám ĐÁY)
+                            new_sl = last_low + (trail_atr_buf * current_atr)
+                        else: # Trending -> Gồng lãi (Bám ĐỈNH)
+                            new_sl = last_high + (trail_atr_buf * current_atr)
+                    elif tsl_mode == "AGGRESSIVE":
+                        new_sl = last_low + (trail_atr_buf * current_atr)
+                    else: # STATIC
+                        new_sl = last_high + (trail_atr_buf * current_atr)
+                
+                if (trade["type"] == "BUY" and new_sl > trade["current_sl"]) or \
+                   (trade["type"] == "SELL" and new_sl < trade["current_sl"]):
+                    
+                    if self.connector.modify_position(trade["ticket"], new_sl, 0.0):
+                        logger.info(f"[LIVE] TSL (SWING): Dời SL lệnh {trade['ticket']} về {new_sl:.5f}")
+                        trade["current_sl"] = new_sl
+                        sl_updates.setdefault(trade["ticket"], {})["current_sl"] = new_sl
+
+        # --- PHA 3: COMMIT ---
+        if sl_updates or closed_tickets:
+            self._commit_tsl_results(sl_updates, closed_tickets, close_time_str)
+
+    def _commit_tsl_results(self, sl_updates: Dict[int, Dict[str, Any]], closed_tickets: Set[int],
+                            close_time_str: Optional[str] = None):
+        """
+        Helper (LIVE): Ghi kết quả TSL vào state (lock ngắn, 1 lần lưu file).
+        close_time_str: Thời điểm đóng lệnh (Emergency Exit) -> mốc cooldown.
+        """
+        with self._locked():
+            if close_time_str is not None:
+                self.last_trade_close_time_str = close_time_str
+            for trade in list(self.managed_trades):
+                ticket = trade["ticket"]
+                if ticket in closed_tickets:
+                    self.managed_trades.remove(trade)
+                elif ticket in sl_updates:
+                    trade.update(sl_updates[ticket])
+            self._save_state()
+
+    def get_adx_state(self, trend_adx_h1: float) -> str:
+        """(NÂNG CẤP 3) Trạng thái ADX: "STRONG" / "GREY" / "WEAK"."""
+        adx_state = "STRONG" # Mặc định
+        if self.USE_ADX_GREY_ZONE:
+            if trend_adx_h1 < self.ADX_WEAK: adx_state = "WEAK"
+            elif trend_adx_h1 < self.ADX_STRONG: adx_state = "GREY"
+        else: # Dùng logic gốc
+            if trend_adx_h1 < self.ADX_MIN_LEVEL: adx_state = "WEAK"
+        return adx_state
 
     def _save_state(self):
         """Helper (LIVE): Lưu trạng thái vào JSON."""
         if self.mode == "live":
             self.state["active_trades"] = self.managed_trades
             self.state["last_trade_close_time"] = self.last_trade_close_time_str
-            save_state(self.state)
+            with METRICS.timed("state_save_seconds"):
+                save_state(self.state, self.state_path)
 
     # ==========================================================
     # CÁC HÀM RIÊNG CỦA MODE "BACKTEST"
     # ==========================================================
 
-    def _backtest_update_tsl(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame, current_atr, last_high, last_low, trend_adx_h1, current_candle):
+    def _backtest_update_tsl(self, data_h1: pd.DataFrame, data_m15: pd.DataFrame, current_atr, last_high, last_low, trend_adx_h1, current_candle,
+                             precomputed: Optional[Dict[str, Any]] = None):
         """Logic TSL 3 chế độ cho BACKTEST."""
+        precomputed = precomputed or {}
         
         # --- (NÂNG CẤP 3) Xác định Trạng thái ADX ---
-        adx_state = "STRONG" # Mặc định
-        if self.USE_ADX_GREY_ZONE:
-            if trend_adx_h1 < self.ADX_WEAK: adx_state = "WEAK"
-            elif trend_adx_h1 < self.ADX_STRONG: adx_state = "GREY"
-        else: # Dùng logic gốc
-            if trend_adx_h1 < self.ADX_MIN_LEVEL: adx_state = "WEAK"
-        # --- (HẾT NÂNG CẤP 3) ---
+        adx_state = self.get_adx_state(trend_adx_h1)
         
         for i in range(len(self.open_trades_sim) - 1, -1, -1):
             trade = self.open_trades_sim[i]
             
             # --- EMERGENCY EXIT ---
-            if self.config["USE_EMERGENCY_EXIT"]:
+            if self.params.USE_EMERGENCY_EXIT:
                 try:
-                    trend_ema_h1 = check_trend_ema(data_h1, self.config)
-                    trend_st_h1 = get_supertrend_direction(data_h1, self.config)
+                    trend_ema_h1 = precomputed["trend_ema"] if "trend_ema" in precomputed else check_trend_ema(data_h1, self.params)
+                    trend_st_h1 = precomputed["trend_st"] if "trend_st" in precomputed else get_supertrend_direction(data_h1, self.params)
                     
                     is_trend_broken = False
                     if trade.type == "BUY" and (trend_ema_h1 == "DOWN" or trend_st_h1 == "DOWN"):
@@ -524,9 +654,9 @@ class TradeManager:
             if not trade.is_BE_hit and self.isMoveToBE_Enabled:
                 current_profit = 0.0
                 if trade.type == "BUY":
-                    current_profit = (current_candle.high - trade.entry_price) * trade.lot_size * self.config["CONTRACT_SIZE"]
+                    current_profit = (current_candle.high - trade.entry_price) * trade.lot_size * self.params.CONTRACT_SIZE
                 else: # SELL
-                    current_profit = (trade.entry_price - current_candle.low) * trade.lot_size * self.config["CONTRACT_SIZE"]
+                    current_profit = (trade.entry_price - current_candle.low) * trade.lot_size * self.params.CONTRACT_SIZE
                 
                 target_profit_usd = trade.initial_1R_usd * self.tsl_trigger_R
                 
@@ -536,7 +666,7 @@ class TradeManager:
                     be_atr_buf = self.be_atr_buffer
                     if self.USE_DYNAMIC_ATR_BUFFER:
                         try:
-                            be_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.config, "BE")
+                            be_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.params, "BE", precomputed.get("atr_series"))
                         except Exception as e:
                             logger.error(f"Lỗi get_dynamic_atr_buffer (BE): {e}. Dùng hệ số cố định.")
 
@@ -558,7 +688,7 @@ class TradeManager:
                 trail_atr_buf = self.trail_atr_buffer
                 if self.USE_DYNAMIC_ATR_BUFFER:
                     try:
-                        trail_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.config, "TSL")
+                        trail_atr_buf = get_dynamic_atr_buffer(current_atr, data_m15, self.params, "TSL", precomputed.get("atr_series"))
                     except Exception as e:
                         logger.error(f"Lỗi get_dynamic_atr_buffer (TSL): {e}. Dùng hệ số cố định.")
                 
@@ -566,7 +696,7 @@ class TradeManager:
                 
                 # (NÂNG CẤP 3) Dùng adx_state
                 is_trending = (adx_state == "STRONG")
-                tsl_mode = self.config.get("TSL_LOGIC_MODE", "STATIC")
+                tsl_mode = self.params.TSL_LOGIC_MODE
 
                 if trade.type == "BUY":
                     if tsl_mode == "DYNAMIC":
@@ -597,7 +727,7 @@ class TradeManager:
     def _sim_close_trade(self, trade: SimTrade, close_time, close_price, reason: str):
         """Helper (BACKTEST): Đóng lệnh."""
         pnl_per_unit = (close_price - trade.entry_price) if trade.type == "BUY" else (trade.entry_price - close_price)
-        trade.pnl_usd = pnl_per_unit * trade.lot_size * self.config["CONTRACT_SIZE"]
+        trade.pnl_usd = pnl_per_unit * trade.lot_size * self.params.CONTRACT_SIZE
         
         trade.close_time = close_time
         trade.close_price = close_price
@@ -614,6 +744,24 @@ class TradeManager:
 
         logger.info(f"--- [BACKTEST] ĐÓNG LỆNH {trade.type} ({reason}). PnL: ${trade.pnl_usd:,.2f}")
         
+    def get_backtest_state(self) -> Dict[str, Any]:
+        """(MỚI) Bản sao trạng thái engine BACKTEST (lệnh mở/đã đóng, vốn, equity, cooldown) - để chạy tiếp trên nến mới."""
+        return copy.deepcopy({
+            "open_trades": self.open_trades_sim,
+            "closed_trades": self.closed_trades_sim,
+            "capital": self.sim_capital,
+            "equity_curve": self.equity_curve,
+            "last_trade_close_time": self.last_trade_close_time_str,
+        })
+
+    def restore_backtest_state(self, state: Dict[str, Any]):
+        """(MỚI) Nạp lại trạng thái từ get_backtest_state() (checkpoint của lần chạy trước)."""
+        self.open_trades_sim = list(state["open_trades"])
+        self.closed_trades_sim = list(state["closed_trades"])
+        self.sim_capital = state["capital"]
+        self.equity_curve = list(state["equity_curve"])
+        self.last_trade_close_time_str = state["last_trade_close_time"]
+
     def get_backtest_results_df(self) -> pd.DataFrame:
         """Helper (BACKTEST): Xuất kết quả."""
         if self.mode != "backtest": return pd.DataFrame()
@@ -624,8 +772,8 @@ class TradeManager:
     def _get_open_trade_count(self) -> int:
         """Helper: Đếm số lệnh đang mở."""
         if self.mode == "live":
-            with self.lock:
-                return len(self.managed_trades)
+            with self._locked():
+                return len(self.managed_trades) + self._pending_opens
         else:
             return len(self.open_trades_sim)
 
@@ -637,10 +785,10 @@ class TradeManager:
         if self.mode == "live":
             try:
                 info = self.connector.get_account_info()
-                balance = info.get('balance', self.config["BACKTEST_INITIAL_CAPITAL"])
+                balance = info.get('balance', self.params.BACKTEST_INITIAL_CAPITAL)
                 return balance
             except Exception as e:
                 logger.warning(f"[TradeManager] Không thể lấy balance live, dùng vốn default: {e}")
-                return self.config.get("BACKTEST_INITIAL_CAPITAL", 10000.0)
+                return self.params.BACKTEST_INITIAL_CAPITAL
         else: 
             return self.sim_capital
\ No newline at end of file
@@ -9,6 +9,7 @@ import logging
 
 # Import các file "Giữ nguyên"
 from core.exness_connector import ExnessConnector
+from core.data_quality import build_report
 # Import file config
 import config
 
@@ -55,6 +56,9 @@ def _download_single_timeframe(
         # Lưu file
         df.to_csv(output_path, index=True, index_label='timestamp')
         logger.info(f"✅ Đã lưu thành công {len(df)} nến {timeframe} vào: {output_path}")
+
+        # (MỚI) Quét chất lượng dữ liệu 1 lần, lưu báo cáo cạnh file CSV
+        build_report(output_path, df, minutes_per_candle)
         return True
 
     except ValueError as e:
@@ -67,15 +71,22 @@ def _download_single_timeframe(
 def download_all_data():
     """
     Hàm chính (Code lại): Tải CẢ HAI khung thời gian (Trend và Entry).
+    (MỚI) Nếu USE_RESAMPLED_TIMEFRAMES: Chỉ tải 1 khung gốc (BASE_TIMEFRAME),
+    các khung lớn hơn được dựng lại khi backtest (core/resampler.py).
     """
-    logger.info("--- Bắt đầu quá trình tải dữ liệu (H1 & M15) ---")
-    
     # Đọc từ config
     SYMBOL = config.SYMBOL
     TREND_TIMEFRAME = config.trend_timeframe
     ENTRY_TIMEFRAME = config.entry_timeframe
     MONTHS_TO_DOWNLOAD = config.MONTHS_TO_DOWNLOAD
     DATA_DIR = config.DATA_DIR
+    USE_RESAMPLED = getattr(config, "USE_RESAMPLED_TIMEFRAMES", False)
+    BASE_TIMEFRAME = getattr(config, "BASE_TIMEFRAME", ENTRY_TIMEFRAME)
+
+    if USE_RESAMPLED:
+        logger.info(f"--- Bắt đầu quá trình tải dữ liệu (Khung gốc {BASE_TIMEFRAME}) ---")
+    else:
+        logger.info("--- Bắt đầu quá trình tải dữ liệu (H1 & M15) ---")
     
     os.makedirs(DATA_DIR, exist_ok=True) # Tạo thư mục /data nếu chưa có
     
@@ -91,6 +102,20 @@ def download_all_data():
 
     logger.info("✅ Kết nối thành công!")
 
+    if USE_RESAMPLED:
+        # Bước 2: Chỉ tải khung gốc
+        path_base = os.path.join(DATA_DIR, f"{SYMBOL}_{BASE_TIMEFRAME}.csv")
+        success_base = _download_single_timeframe(
+            connector, SYMBOL, BASE_TIMEFRAME, path_base, MONTHS_TO_DOWNLOAD
+        )
+        connector.shutdown()
+
+        if success_base:
+            logger.info(f"--- HOÀN TẤT: Đã tải khung gốc {BASE_TIMEFRAME}. Khung {TREND_TIMEFRAME}/{ENTRY_TIMEFRAME} sẽ được dựng từ file này. ---")
+        else:
+            logger.error(f"--- LỖI: Không tải được khung gốc {BASE_TIMEFRAME}. Vui lòng kiểm tra log. ---")
+        return
+
     # Bước 2: Tải H1
     success_h1 = _download_single_timeframe(
         connector, SYMBOL, TREND_TIMEFRAME, path_h1, MONTHS_TO_DOWNLOAD
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Tên file: execution_report.py
+
+import os
+import logging
+import pandas as pd
+from typing import Optional, Dict, Any
+
+from core.execution_log import load_execution_log, summarize_execution, suggest_cost_model
+
+# Import file config
+import config
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# BÁO CÁO CHẤT LƯỢNG KHỚP LỆNH (từ nhật ký EXECUTION_LOG_FILE của bot LIVE)
+# ==============================================================================
+
+def run_execution_report(config_dict: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+    """
+    Tổng hợp trượt giá / spread / độ trễ theo (action, side), lưu CSV vào OUTPUT_DIR
+    và in tham số chi phí đề xuất cho backtest (BACKTEST_ENTRY_SLIPPAGE).
+    """
+    config_dict = config_dict or {key: getattr(config, key) for key in dir(config) if not key.startswith('__')}
+    log_path = config_dict.get("EXECUTION_LOG_FILE")
+    if not log_path or not os.path.exists(log_path):
+        logger.critical(f"LỖI: Không tìm thấy nhật ký khớp lệnh '{log_path}'. Bật EXECUTION_LOG_FILE và chạy 'main.py' trước.")
+        return None
+
+    df = load_execution_log(log_path)
+    summary = summarize_execution(df)
+    if summary.empty:
+        logger.warning("[Execution] Nhật ký khớp lệnh rỗng.")
+        return summary
+
+    logger.info(f"--- CHẤT LƯỢNG KHỚP LỆNH ({len(df)} lệnh, {df['time'].min():%Y-%m-%d} -> {df['time'].max():%Y-%m-%d}) ---")
+    for row in summary.itertuples(index=False):
+        side = "-" if pd.isna(row.side) else row.side
+        logger.info(f"  {row.action:<6} {side:<4} | {row.filled}/{row.orders} khớp ({row.fill_rate * 100:.1f}%) | "
+                    f"Spread TB {row.spread_mean:.5f} | Trượt giá TB {row.slippage_mean:.5f} (P95 {row.slippage_p95:.5f}) | "
+                    f"So với giá nến TB {row.slippage_vs_ref_mean:.5f} | Độ trễ P50 {row.latency_ms_p50:.1f} ms, P95 {row.latency_ms_p95:.1f} ms")
+
+    for key, value in suggest_cost_model(df).items():
+        logger.info(f"  Đề xuất cho backtest: {key} = {value:.5f} (hiện tại: {config_dict.get(key)})")
+
+    os.makedirs(config_dict["OUTPUT_DIR"], exist_ok=True)
+    output_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("EXECUTION_REPORT_FILE", "execution_report.csv"))
+    summary.to_csv(output_path, index=False)
+    logger.info(f"Đã lưu báo cáo khớp lệnh vào: {output_path}")
+    return summary
+
+
+if __name__ == "__main__":
+    from core.logger_setup import setup_logging
+    setup_logging()
+    run_execution_report()
@@ -7,8 +7,7 @@ import os
 import time
 import pandas as pd
 import threading
-from datetime import datetime, timedelta
-import re
+from typing import Optional
 
 # --- Cài đặt sys.path ---
 try:
@@ -20,102 +19,106 @@ except Exception as e:
     sys.exit(1)
 
 # --- Import các file "Cốt lõi" ---
-from core.logger_setup import setup_logging
+from core.logger_setup import setup_logging, get_log_queue_depth
 from core.trade_manager import TradeManager 
 from core.exness_connector import ExnessConnector 
+from core.reconcile_engine import ReconcileEngine
+from core.candle_scheduler import CandleScheduler
+from core.metrics import METRICS, start_metrics_server
+from core.mt5_recorder import RecordingBackend
+from core.execution_log import ExecutionLog
+from core.storage_manager import load_state, STATE_FILE_PATH
+from core.live_bars import LiveBarBuffer, read_checkpoint
+from core.indicator_graph import compute_indicator_snapshot, get_indicator_executor
+from core.shadow import ShadowRunner
+from core.mt5_gateway import MT5Gateway
 
 # --- Import file Config ---
 import config
 
-# --- Cài đặt Logger ---
-setup_logging()
+# --- Cài đặt Logger --- (setup_logging gọi khi chạy file này; replay.py import main không bị ghi đè log)
 logger = logging.getLogger("ExnessBot")
 
+def make_bar_buffer(connector: ExnessConnector, config_dict: dict, path: Optional[str] = None) -> LiveBarBuffer:
+    """(MỚI) Bộ đệm nến cho Luồng 1 (cửa sổ NUM_H1_BARS / NUM_M15_BARS như khi tải trực tiếp)."""
+    return LiveBarBuffer(connector, config_dict["SYMBOL"], {
+        config_dict["trend_timeframe"]: config_dict["NUM_H1_BARS"],
+        config_dict["entry_timeframe"]: config_dict["NUM_M15_BARS"],
+    }, path)
+
 # ==============================================================================
-# HÀM HELPER - ĐỒNG HỒ ĐỒNG BỘ
+# TASK 1: LUỒNG TÍN HIỆU & TSL (CHẬM - ĐỒNG BỘ VỚI NẾN)
 # ==============================================================================
-
-def _parse_timeframe_to_minutes(tf_str: str) -> int:
-    """Helper: Chuyển đổi 'H1', 'M15' sang số phút."""
-    tf_str = tf_str.lower()
-    match = re.match(r"(\d+)([mhd])", tf_str)
-    if not match:
-        raise ValueError(f"Khung thời gian không hợp lệ: {tf_str}")
-    value, unit = int(match.group(1)), match.group(2)
-    if unit == 'm': return value
-    elif unit == 'h': return value * 60
-    elif unit == 'd': return value * 24 * 60
-    return 0
-
-def _get_sleep_time_to_next_candle(timeframe_str: str) -> int:
+def run_signal_cycle(tm: TradeManager, connector: ExnessConnector, config_dict: dict,
+                     bars: Optional[LiveBarBuffer] = None, shadows: Optional[ShadowRunner] = None) -> bool:
     """
-    Tính toán số giây ngủ "thông minh" để chờ nến tiếp theo đóng.
+    1 vòng xử lý của Luồng 1 sau khi nến đóng: tải dữ liệu -> mở lệnh mới -> dời SL.
+    (MỚI) Tách riêng để replay.py chạy đúng code này trên sàn giả lập.
+    (MỚI) bars: Bộ đệm nến (chỉ tải phần thiếu, checkpoint để khởi động lại nhanh) - cùng cửa sổ nến.
+    (MỚI) shadows: Các biến thể config chạy giấy trên cùng cửa sổ nến (chạy SAU logic của bot thật).
+    Trả về False nếu không có dữ liệu.
     """
-    try:
-        minutes = _parse_timeframe_to_minutes(timeframe_str)
-        if minutes == 0: return 60 # Dự phòng
-        
-        now = datetime.now()
-        
-        # Đặt 1 giây đệm để đảm bảo nến đã đóng
-        next_run = now.replace(second=1, microsecond=0)
-        
-        # Làm tròn phút lên mốc tiếp theo (ví dụ: M15)
-        minute_to_round = (now.minute // minutes) * minutes + minutes
-        
-        if minute_to_round >= 60:
-            next_run = next_run.replace(minute=0, hour=now.hour + 1)
-            # Xử lý qua ngày
-            if next_run.hour == 0:
-                next_run += timedelta(days=1)
-        else:
-            next_run = next_run.replace(minute=minute_to_round)
-            
-        sleep_seconds = (next_run - now).total_seconds()
-        
-        # Đảm bảo ngủ ít nhất 1 giây
-        return max(1, int(sleep_seconds))
-        
-    except Exception as e:
-        logger.error(f"Lỗi _get_sleep_time_to_next_candle: {e}. Dùng 60s mặc định.")
-        return 60
+    # 2. Lấy dữ liệu
+    if bars is not None:
+        data_h1 = bars.get(config_dict["trend_timeframe"])
+        data_m15 = bars.get(config_dict["entry_timeframe"])
+    else:
+        data_h1 = connector.get_historical_data(config_dict["SYMBOL"], config_dict["trend_timeframe"].lower(), config_dict["NUM_H1_BARS"])
+        data_m15 = connector.get_historical_data(config_dict["SYMBOL"], config_dict["entry_timeframe"].lower(), config_dict["NUM_M15_BARS"])
 
-# ==============================================================================
-# TASK 1: LUỒNG TÍN HIỆU & TSL (CHẬM - ĐỒNG BỘ VỚI NẾN)
-# ==============================================================================
-def signal_task(tm: TradeManager, connector: ExnessConnector, config_dict: dict):
+    if data_h1 is None or data_m15 is None or data_h1.empty or data_m15.empty:
+        logger.warning("[Luồng 1] Không có dữ liệu, bỏ qua vòng lặp này.")
+        return False
+
+    # (MỚI) Tính mọi chỉ báo 1 lần (song song trên thread pool), dùng chung cho tín hiệu + TSL
+    executor = get_indicator_executor(config_dict.get("INDICATOR_WORKERS", 1))
+    precomputed = compute_indicator_snapshot(data_h1, data_m15, tm.params, executor)
+
+    # 3. Logic chính
+    # A. Kiểm tra và Mở lệnh MỚI
+    tm.check_and_open_new_trade(data_h1, data_m15, precomputed)
+    
+    # B. Cập nhật TSL (Dời SL) cho các lệnh CŨ
+    tm.update_all_trades(data_h1, data_m15, precomputed)
+
+    # C. (MỚI) Chạy giấy các biến thể config (không gọi thêm MT5)
+    if shadows is not None:
+        try:
+            shadows.run_cycle(data_h1, data_m15, executor)
+        except Exception as e:
+            logger.error(f"[Shadow] Lỗi vòng chạy giấy: {e}", exc_info=True)
+    return True
+
+def signal_task(tm: TradeManager, connector: ExnessConnector, config_dict: dict,
+                bars: Optional[LiveBarBuffer] = None, shadows: Optional[ShadowRunner] = None):
     """
     Luồng này chịu trách nhiệm cho mọi tính toán nặng:
     1. Tải dữ liệu
     2. Tìm tín hiệu vào lệnh
     3. Dời SL (Trailing Stop)
     Chỉ chạy khi đóng nến (ví dụ: mỗi 15 phút).
+    (MỚI) Dùng CandleScheduler: hẹn giờ theo giờ server, chờ tới khi nến mới xuất hiện.
     """
     logger.info("[Luồng 1 - Signal/TSL] Bắt đầu... Đồng bộ với nến.")
+    entry_tf = config_dict["entry_timeframe"]
+    scheduler = CandleScheduler(connector, config_dict, [entry_tf, config_dict["trend_timeframe"]])
     while True:
         try:
             # 1. Đồng bộ với nến (Ngủ cho đến khi nến đóng)
-            entry_tf = config_dict["entry_timeframe"]
-            sleep_sec = _get_sleep_time_to_next_candle(entry_tf)
-            logger.info(f"[Luồng 1] Đã đồng bộ. Ngủ {sleep_sec}s chờ nến {entry_tf} đóng.")
-            time.sleep(sleep_sec)
+            closed_tfs = scheduler.wait_for_next_close()
+            if entry_tf not in closed_tfs:
+                continue
+            loop_start = time.perf_counter()
             
             logger.info(f"[Luồng 1] Thức dậy. Đang tải dữ liệu nến sạch...")
             
-            # 2. Lấy dữ liệu
-            data_h1 = connector.get_historical_data(config_dict["SYMBOL"], config_dict["trend_timeframe"].lower(), config_dict["NUM_H1_BARS"])
-            data_m15 = connector.get_historical_data(config_dict["SYMBOL"], config_dict["entry_timeframe"].lower(), config_dict["NUM_M15_BARS"])
-
-            if data_h1 is None or data_m15 is None or data_h1.empty or data_m15.empty:
-                logger.warning("[Luồng 1] Không có dữ liệu, bỏ qua vòng lặp này.")
+            # 2-3. Tải dữ liệu + Logic chính
+            if not run_signal_cycle(tm, connector, config_dict, bars, shadows):
                 continue
 
-            # 3. Logic chính
-            # A. Kiểm tra và Mở lệnh MỚI
-            tm.check_and_open_new_trade(data_h1, data_m15)
-            
-            # B. Cập nhật TSL (Dời SL) cho các lệnh CŨ
-            tm.update_all_trades(data_h1, data_m15)
+            lateness = scheduler.record_lateness(scheduler.last_close_ts)
+            logger.debug(f"[Luồng 1] Xét tín hiệu xong sau khi nến đóng {lateness:.2f}s.")
+            METRICS.observe("signal_loop_seconds", time.perf_counter() - loop_start)
             
         except Exception as e:
             logger.critical(f"[Luồng 1] Lỗi nghiêm trọng: {e}", exc_info=True)
@@ -127,29 +130,64 @@ def signal_task(tm: TradeManager, connector: ExnessConnector, config_dict: dict)
 def reconcile_task(tm: TradeManager, connector: ExnessConnector, config_dict: dict):
     """
     (ĐÃ SỬA TÊN HÀM)
-    Luồng này chạy rất nhanh (ví dụ 5s/lần).
+    Luồng này chạy rất nhanh (ví dụ 5s/lần) khi có lệnh, giãn dần khi không có lệnh.
     Nhiệm vụ duy nhất: Đối chiếu (Reconcile) xem lệnh trên Exness còn sống hay chết.
     Không tải dữ liệu, không tính toán TSL.
+    (MỚI) Dùng ReconcileEngine: chỉ xử lý khi "dấu vân tay" danh sách lệnh thay đổi.
     """
-    sleep_interval = config_dict["LOOP_SLEEP_SECONDS"]
-    logger.info(f"[Luồng 2 - Reconcile] Bắt đầu... Chạy mỗi {sleep_interval} giây.")
+    engine = ReconcileEngine(tm, connector, config_dict)
+    logger.info(f"[Luồng 2 - Reconcile] Bắt đầu... Chu kỳ {engine.fast_interval}s (có lệnh) - "
+                f"tối đa {engine.idle_interval}s (không có lệnh).")
     while True:
         try:
             start_time = time.time()
             
             # Gọi hàm nhẹ nhàng để đối chiếu danh sách lệnh
-            tm.reconcile_live_trades()
+            delta = engine.poll_once()
+            if delta and (delta["opened"] or delta["closed"]):
+                logger.info(f"[Luồng 2] Thay đổi lệnh: Mới {delta['opened']} | Đóng {delta['closed']}")
 
-            # Ngủ đúng thời gian quy định (trừ đi thời gian thực thi)
+            # Ngủ theo chu kỳ thích ứng (trừ đi thời gian thực thi)
             elapsed = time.time() - start_time
-            sleep_time = max(0, sleep_interval - elapsed)
+            METRICS.observe("reconcile_loop_seconds", elapsed)
+            sleep_time = max(0, engine.next_interval() - elapsed)
             
             if sleep_time > 0:
-                time.sleep(sleep_time)
+                engine.wait(sleep_time)
             
         except Exception as e:
             logger.error(f"[Luồng 2 - Reconcile] Lỗi: {e}", exc_info=False)
-            time.sleep(sleep_interval)
+            time.sleep(engine.fast_interval)
+
+# ==============================================================================
+# METRICS (ENDPOINT LOCALHOST)
+# ==============================================================================
+def _start_live_metrics(tm: TradeManager, config_dict: dict):
+    """Đăng ký các gauge của bot và mở endpoint /metrics (nếu METRICS_ENABLED)."""
+    if not config_dict.get("METRICS_ENABLED", False):
+        return None
+
+    METRICS.describe("signal_loop_seconds", "Thời gian 1 vòng Luồng 1 (tải dữ liệu + tín hiệu + TSL).")
+    METRICS.describe("signal_candle_lag_seconds", "Độ trễ từ lúc nến đóng đến lúc xét tín hiệu xong.")
+    METRICS.describe("reconcile_loop_seconds", "Thời gian 1 vòng đối chiếu (Luồng 2).")
+    METRICS.describe("mt5_call_seconds", "Độ trễ từng lời gọi MT5.")
+    METRICS.describe("mt5_call_errors", "Số lời gọi MT5 lỗi (ngoại lệ / trả về None).")
+    METRICS.describe("state_save_seconds", "Thời gian lưu file trạng thái.")
+    METRICS.describe("indicator_node_seconds", "Thời gian tính từng chỉ báo (nút của đồ thị chỉ báo).")
+    METRICS.describe("indicator_graph_seconds", "Thời gian thực tính toàn bộ chỉ báo 1 vòng (song song).")
+    METRICS.describe("mt5_queue_depth", "Số lời gọi MT5 đang chờ trong hàng đợi của cổng MT5.")
+    METRICS.describe("mt5_queue_wait_seconds", "Thời gian chờ trong hàng đợi cổng MT5 trước khi được gọi.")
+    METRICS.describe("mt5_queue_timeouts", "Số lời gọi MT5 bị hủy do chờ quá hạn trong hàng đợi.")
+    METRICS.describe("shadow_cycle_seconds", "Thời gian 1 vòng chạy giấy của từng biến thể config (SHADOW_STRATEGIES).")
+
+    # Gauge tính lười (chỉ đọc khi scrape, không khóa luồng giao dịch)
+    METRICS.gauge_fn("open_trades", lambda: len(tm.managed_trades))
+    METRICS.gauge_fn("log_queue_depth", get_log_queue_depth)
+    METRICS.gauge_fn("lock_wait_seconds_total", lambda: tm.lock_stats["wait_total"])
+    METRICS.gauge_fn("lock_wait_seconds_max", lambda: tm.lock_stats["wait_max"])
+    METRICS.gauge_fn("lock_acquisitions", lambda: tm.lock_stats["acquisitions"])
+
+    return start_metrics_server(config_dict.get("METRICS_PORT", 9108), config_dict.get("METRICS_HOST", "127.0.0.1"))
 
 # ==============================================================================
 # HÀM CHẠY CHÍNH
@@ -167,22 +205,52 @@ def run_live_bot():
                        if not key.startswith('__')}
         # === [HẾT SỬA LỖI] ===
         
+        # (MỚI) Checkpoint nến LIVE (cạnh trades_state.json) - khởi động lại chỉ tải phần thiếu
+        bars_path = None
+        if config_dict.get("LIVE_BARS_STATE_FILE"):
+            bars_path = os.path.join(os.path.dirname(STATE_FILE_PATH), config_dict["LIVE_BARS_STATE_FILE"])
+
+        # (MỚI) Ghi mọi request/response MT5 ra file (phát lại offline bằng replay.py)
+        recorder = None
+        if config_dict.get("MT5_RECORD_FILE"):
+            recorder = RecordingBackend(config_dict["MT5_RECORD_FILE"],
+                                        meta={"state": load_state(), "bars": read_checkpoint(bars_path)})
+
+        # (MỚI) Nhật ký chất lượng khớp lệnh (trượt giá, spread, độ trễ) - dùng chung cho 2 kết nối
+        execution_log = None
+        if config_dict.get("EXECUTION_LOG_FILE"):
+            execution_log = ExecutionLog(config_dict["EXECUTION_LOG_FILE"])
+
+        # (MỚI) Cổng MT5: 1 luồng duy nhất gọi MT5 cho mọi connector (lệnh được ưu tiên hơn tải nến)
+        gateway = MT5Gateway.from_config(config_dict)
+
         # Khởi tạo TradeManager với config_dict
-        trade_manager = TradeManager(config=config_dict, mode="live")
+        trade_manager = TradeManager(config=config_dict, mode="live",
+                                     connector=ExnessConnector(backend=recorder, execution_log=execution_log, gateway=gateway))
         
         # Tạo 1 kết nối duy nhất cho cả 2 luồng
-        data_connector = ExnessConnector()
+        data_connector = ExnessConnector(backend=recorder, execution_log=execution_log, gateway=gateway)
         if not data_connector.connect():
             raise ConnectionError("Không thể tạo data_connector chính.")
+
+        bars = None
+        if bars_path:
+            bars = make_bar_buffer(data_connector, config_dict, bars_path)
+            bars.load()
+
+        # (MỚI) Các biến thể config chạy giấy trên cùng nguồn nến (SHADOW_STRATEGIES)
+        shadows = ShadowRunner.from_config(config_dict)
             
     except Exception as e:
         logger.critical(f"Lỗi nghiêm trọng khi khởi tạo: {e}", exc_info=True)
         logger.critical("Bot không thể chạy. Vui lòng kiểm tra kết nối MT5.")
         return # Dừng
 
+    metrics_server = _start_live_metrics(trade_manager, config_dict)
+
     # Khởi chạy 2 Luồng
     # Luồng 1: Signal + TSL (Chậm, nặng)
-    thread1 = threading.Thread(target=signal_task, args=(trade_manager, data_connector, config_dict), daemon=True)
+    thread1 = threading.Thread(target=signal_task, args=(trade_manager, data_connector, config_dict, bars, shadows), daemon=True)
     
     # Luồng 2: Reconcile (Nhanh, nhẹ)
     thread2 = threading.Thread(target=reconcile_task, args=(trade_manager, data_connector, config_dict), daemon=True)
@@ -199,8 +267,17 @@ def run_live_bot():
     except KeyboardInterrupt:
         logger.info("Phát hiện Ctrl+C. Đang tắt bot...")
         data_connector.shutdown()
+        if gateway:
+            gateway.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        if recorder:
+            recorder.close()
+        if execution_log:
+            execution_log.close()
         logger.info("Đã đóng kết nối MT5. Tạm biệt.")
 
 
 if __name__ == "__main__":
+    setup_logging(use_queue=getattr(config, "LOG_USE_QUEUE", False))
     run_live_bot()
\ No newline at end of file
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# Tên file: monte_carlo.py
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Import file config
+import config
+
+logger = logging.getLogger("ExnessBot")
+
+# Các phân vị được báo cáo
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# ==============================================================================
+# HÀM HELPER - CHUẨN BỊ DỮ LIỆU LỆNH
+# ==============================================================================
+
+def _load_trade_outcomes(results_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trích xuất PnL (USD) và R-multiple của từng lệnh (theo thứ tự đóng lệnh).
+    R = pnl_usd / initial_1R_usd (lệnh có 1R = 0 bị bỏ qua khi tính R).
+    """
+    df = results_df.sort_values("close_time") if "close_time" in results_df.columns else results_df
+    pnl = df["pnl_usd"].to_numpy(dtype=np.float64)
+    risk = df["initial_1R_usd"].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_multiples = np.where(risk > 0, pnl / risk, 0.0)
+    return pnl, r_multiples
+
+def _sample_paths(values: np.ndarray, num_paths: int, mode: str, rng: np.random.Generator) -> np.ndarray:
+    """
+    Tạo ma trận (num_paths x num_trades) bằng 1 lệnh numpy.
+    - "BOOTSTRAP": Lấy mẫu CÓ hoàn lại (số lệnh giữ nguyên).
+    - "SHUFFLE": Hoán vị thứ tự lệnh (cùng tập lệnh, khác thứ tự).
+    """
+    n = len(values)
+    if mode == "SHUFFLE":
+        return rng.permuted(np.broadcast_to(values, (num_paths, n)), axis=1)
+    return values[rng.integers(0, n, size=(num_paths, n))]
+
+def _simulate_batch(pnl: np.ndarray, r_multiples: np.ndarray, num_paths: int, params: Dict[str, Any],
+                    seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """
+    Mô phỏng 1 lô (batch) đường vốn.
+    - "FIXED_LOT": Vốn = vốn đầu + cộng dồn PnL (USD).
+    - "RISK_PERCENT": Mỗi lệnh rủi ro X% vốn hiện tại -> vốn nhân (1 + R * X%).
+    Trả về: vốn cuối, drawdown tối đa (%), cờ "cháy" (ruin) cho từng đường.
+    """
+    rng = np.random.default_rng(seed)
+    capital = params["initial_capital"]
+    ruin_level = capital * (1.0 - params["ruin_drawdown_percent"] / 100.0)
+
+    if params["sizing_mode"] == "RISK_PERCENT":
+        risk_fraction = params["risk_percent"] / 100.0
+        samples = _sample_paths(r_multiples, num_paths, params["mode"], rng)
+        growth = np.maximum(1.0 + samples * risk_fraction, 0.0) # Không thể âm vốn
+        equity = capital * np.cumprod(growth, axis=1)
+    else:
+        samples = _sample_paths(pnl, num_paths, params["mode"], rng)
+        equity = capital + np.cumsum(samples, axis=1)
+
+    # Đỉnh vốn (tính cả vốn ban đầu) -> drawdown theo %
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), capital)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = np.where(peak > 0, (peak - equity) / peak, 1.0)
+
+    return {
+        "terminal_equity": equity[:, -1],
+        "max_drawdown_pct": drawdown.max(axis=1) * 100.0,
+        "is_ruined": (equity <= ruin_level).any(axis=1),
+    }
+
+def _simulate_shard(pnl: np.ndarray, r_multiples: np.ndarray, num_paths: int, params: Dict[str, Any],
+                    seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Chạy 1 phần (shard) theo từng lô nhỏ để giới hạn bộ nhớ (dùng cho ProcessPool)."""
+    batch_size = max(1, params["batch_size"])
+    num_batches = (num_paths + batch_size - 1) // batch_size
+    parts = []
+    for b, batch_seed in enumerate(seed.spawn(num_batches)):
+        size = min(batch_size, num_paths - b * batch_size)
+        parts.append(_simulate_batch(pnl, r_multiples, size, params, batch_seed))
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+# ==============================================================================
+# HÀM CHÍNH
+# ==============================================================================
+
+def run_monte_carlo(results_df: pd.DataFrame, config_dict: Optional[Dict[str, Any]] = None,
+                    num_paths: Optional[int] = None, num_workers: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Phân tích Monte Carlo (Bootstrap / Shuffle) trên danh sách lệnh backtest.
+    Trả về dict báo cáo (phân vị vốn cuối, drawdown tối đa, xác suất cháy tài khoản).
+    """
+    config_dict = config_dict or {key: getattr(config, key) for key in dir(config) if not key.startswith('__')}
+
+    if results_df is None or results_df.empty:
+        logger.warning("[Monte Carlo] Không có lệnh nào để phân tích.")
+        return None
+
+    pnl, r_multiples = _load_trade_outcomes(results_df)
+
+    sizing_mode = config_dict.get("RISK_MANAGEMENT_MODE", "FIXED_LOT")
+    if sizing_mode not in ("FIXED_LOT", "RISK_PERCENT"):
+        # DYNAMIC: Không tách được lệnh nào dùng Fixed/Percent -> dùng PnL thực tế (cộng dồn)
+        sizing_mode = "FIXED_LOT"
+
+    params = {
+        "mode": config_dict.get("MC_MODE", "BOOTSTRAP"),
+        "sizing_mode": sizing_mode,
+        "initial_capital": config_dict.get("BACKTEST_INITIAL_CAPITAL", 1000.0),
+        "risk_percent": config_dict.get("RISK_PERCENT_PER_TRADE", 2.0),
+        "ruin_drawdown_percent": config_dict.get("MC_RUIN_DRAWDOWN_PERCENT", 50.0),
+        "batch_size": config_dict.get("MC_BATCH_SIZE", 20000),
+    }
+    num_paths = num_paths or config_dict.get("MC_NUM_PATHS", 10000)
+    num_workers = num_workers or config_dict.get("MC_NUM_WORKERS", 1)
+
+    logger.info(f"[Monte Carlo] {num_paths:,} đường | {len(pnl)} lệnh | Chế độ: {params['mode']} | "
+                f"QLV: {sizing_mode} | Workers: {num_workers}")
+
+    # Chia shard (mỗi shard có seed độc lập -> kết quả tái lập được)
+    root_seed = np.random.SeedSequence(config_dict.get("MC_SEED", 42))
+    num_workers = max(1, min(num_workers, num_paths))
+    shard_sizes = [num_paths // num_workers + (1 if k < num_paths % num_workers else 0) for k in range(num_workers)]
+    shard_seeds = root_seed.spawn(num_workers)
+
+    if num_workers == 1:
+        shards = [_simulate_shard(pnl, r_multiples, shard_sizes[0], params, shard_seeds[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(_simulate_shard, pnl, r_multiples, size, params, seed)
+                       for size, seed in zip(shard_sizes, shard_seeds)]
+            shards = [f.result() for f in futures]
+
+    terminal = np.concatenate([s["terminal_equity"] for s in shards])
+    max_dd = np.concatenate([s["max_drawdown_pct"] for s in shards])
+    ruined = np.concatenate([s["is_ruined"] for s in shards])
+
+    report = {
+        "num_paths": int(num_paths),
+        "num_trades": int(len(pnl)),
+        "mode": params["mode"],
+        "sizing_mode": sizing_mode,
+        "terminal_equity": dict(zip(PERCENTILES, np.percentile(terminal, PERCENTILES))),
+        "max_drawdown_pct": dict(zip(PERCENTILES, np.percentile(max_dd, PERCENTILES))),
+        "prob_loss": float(np.mean(terminal < params["initial_capital"])),
+        "risk_of_ruin": float(np.mean(ruined)),
+    }
+    _log_report(report, params)
+    return report
+
+def _log_report(report: Dict[str, Any], params: Dict[str, Any]):
+    """Helper: In báo cáo ra log."""
+    logger.info("--- KẾT QUẢ MONTE CARLO ---")
+    for p in PERCENTILES:
+        logger.info(f"  P{p:<2}: Vốn cuối $ {report['terminal_equity'][p]:,.2f} | "
+                    f"Max DD {report['max_drawdown_pct'][p]:.2f}%")
+    logger.info(f"  Xác suất lỗ (vốn cuối < vốn đầu): {report['prob_loss'] * 100:.2f}%")
+    logger.info(f"  Risk of Ruin (sụt >= {params['ruin_drawdown_percent']}%): {report['risk_of_ruin'] * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    from core.logger_setup import setup_logging
+    setup_logging()
+
+    results_path = os.path.join(config.OUTPUT_DIR, config.RESULTS_CSV_FILE)
+    try:
+        results = pd.read_csv(results_path)
+    except FileNotFoundError:
+        logger.critical(f"LỖI: Không tìm thấy {results_path}. Vui lòng chạy 'backtest.py' trước.")
+    else:
+        run_monte_carlo(results)
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+# Tên file: optimize.py
+
+import os
+import json
+import math
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from backtest import run_backtest, _build_config_dict, publish_shared_dataset
+from core.shared_data import SharedDataset
+from core.strategy_params import StrategyParams
+
+logger = logging.getLogger("ExnessBot")
+
+# Các cặp tham số phải tăng dần (ví dụ ADX_WEAK < ADX_STRONG)
+ORDERED_PARAMS = [("ADX_WEAK", "ADX_STRONG"), ("DYN_ATR_MIN_CAP_RATIO", "DYN_ATR_MAX_CAP_RATIO")]
+
+# ==============================================================================
+# HÀM HELPER - KHÔNG GIAN THAM SỐ & LẤY MẪU
+# ==============================================================================
+
+def _is_valid(params: Dict[str, Any]) -> bool:
+    """Kiểm tra ràng buộc thứ tự giữa các tham số."""
+    for low_key, high_key in ORDERED_PARAMS:
+        if low_key in params and high_key in params and params[low_key] >= params[high_key]:
+            return False
+    return True
+
+def _from_unit(space: Dict[str, tuple], unit: Dict[str, float]) -> Dict[str, Any]:
+    """Chuyển giá trị chuẩn hóa [0, 1] sang giá trị thật (làm tròn tham số "int")."""
+    params = {}
+    for name, (kind, low, high) in space.items():
+        value = low + unit[name] * (high - low)
+        params[name] = int(round(value)) if kind == "int" else float(value)
+    return params
+
+def _to_unit(space: Dict[str, tuple], params: Dict[str, Any]) -> Dict[str, float]:
+    return {name: (params[name] - low) / (high - low) if high > low else 0.5
+            for name, (kind, low, high) in space.items()}
+
+def _sample_random(space: Dict[str, tuple], rng: np.random.Generator) -> Dict[str, Any]:
+    """Lấy mẫu ngẫu nhiên đều (thử lại nếu vi phạm ràng buộc)."""
+    for _ in range(100):
+        params = _from_unit(space, {name: rng.random() for name in space})
+        if _is_valid(params):
+            return params
+    return params
+
+def _parzen_log_density(x: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Mật độ Parzen (tổng Gaussian quanh các điểm quan sát + 1 thành phần đều làm "tiên nghiệm")
+    trên đoạn [0, 1]. Trả về log mật độ tại các điểm x.
+    """
+    n = len(centers)
+    bandwidth = max(0.05, 1.0 / (n + 1) ** 0.5 * 0.5)
+    z = (x[:, None] - centers[None, :]) / bandwidth
+    gauss = np.exp(-0.5 * z * z) / (bandwidth * math.sqrt(2 * math.pi))
+    density = (gauss.sum(axis=1) + 1.0) / (n + 1) # +1: thành phần đều trên [0, 1]
+    return np.log(density)
+
+def _sample_tpe(space: Dict[str, tuple], history: List[Tuple[Dict[str, Any], float]],
+                rng: np.random.Generator, gamma: float, num_candidates: int = 24) -> Dict[str, Any]:
+    """
+    Lấy mẫu kiểu TPE (Tree-structured Parzen Estimator, độc lập từng tham số):
+    - Chia lịch sử thành nhóm TỐT (top gamma theo điểm) và nhóm XẤU.
+    - Sinh ứng viên quanh các điểm TỐT, chọn ứng viên có l(x) / g(x) lớn nhất.
+    """
+    ordered = sorted(history, key=lambda item: item[1], reverse=True)
+    num_good = max(1, int(math.ceil(gamma * len(ordered))))
+    good = [_to_unit(space, p) for p, _ in ordered[:num_good]]
+    bad = [_to_unit(space, p) for p, _ in ordered[num_good:]]
+
+    for _ in range(100):
+        unit = {}
+        for name in space:
+            good_c = np.array([g[name] for g in good])
+            bad_c = np.array([b[name] for b in bad]) if bad else np.array([])
+            bandwidth = max(0.05, 1.0 / (len(good_c) + 1) ** 0.5 * 0.5)
+            picks = rng.choice(good_c, size=num_candidates)
+            cand = np.clip(picks + rng.normal(0.0, bandwidth, size=num_candidates), 0.0, 1.0)
+            score = _parzen_log_density(cand, good_c) - _parzen_log_density(cand, bad_c)
+            unit[name] = float(cand[int(np.argmax(score))])
+        params = _from_unit(space, unit)
+        if _is_valid(params):
+            return params
+    return _sample_random(space, rng)
+
+# ==============================================================================
+# HÀM HELPER - ĐÁNH GIÁ 1 ỨNG VIÊN (CHẠY TRONG PROCESS POOL)
+# ==============================================================================
+
+def _score_results(results_df: Optional[pd.DataFrame], objective: str, min_trades: int,
+                   initial_capital: float) -> Tuple[Optional[float], Dict[str, Any]]:
+    """
+    Điểm của 1 lần backtest (càng lớn càng tốt). None = không đủ lệnh để đánh giá.
+    - "PNL": Tổng PnL (USD).
+    - "PROFIT_FACTOR": Tổng lãi / Tổng lỗ.
+    - "PNL_DD": Tổng PnL / Max Drawdown (USD).
+    """
+    if results_df is None or results_df.empty:
+        return None, {"num_trades": 0, "pnl": 0.0}
+    pnl = results_df["pnl_usd"].to_numpy(dtype=np.float64)
+    stats = {"num_trades": int(len(pnl)), "pnl": float(pnl.sum())}
+    if len(pnl) < min_trades:
+        return None, stats
+
+    if objective == "PROFIT_FACTOR":
+        gross_loss = -pnl[pnl < 0].sum()
+        score = pnl[pnl > 0].sum() / gross_loss if gross_loss > 0 else float(pnl.sum() > 0) * 100.0
+    elif objective == "PNL_DD":
+        equity = initial_capital + np.cumsum(pnl)
+        max_dd = float(np.max(np.maximum.accumulate(np.maximum(equity, initial_capital)) - equity))
+        score = pnl.sum() / max(max_dd, 1.0)
+    else: # "PNL"
+        score = pnl.sum()
+    return float(score), stats
+
+# Dữ liệu dùng chung của process con (gắn 1 lần khi khởi động worker)
+_WORKER_DATASET: Optional[SharedDataset] = None
+
+def _init_worker(dataset_handle: Optional[Dict[str, Any]] = None):
+    """
+    Process con: chỉ ghi log cảnh báo trở lên (tránh log từng lệnh của hàng trăm lần chạy).
+    (MỚI) Gắn vào dữ liệu + chỉ báo trong shared memory (zero-copy) nếu có.
+    """
+    global _WORKER_DATASET
+    logging.getLogger("ExnessBot").setLevel(logging.WARNING)
+    if dataset_handle is not None:
+        try:
+            _WORKER_DATASET = SharedDataset.attach(dataset_handle)
+        except Exception as e:
+            _WORKER_DATASET = None
+            logger.warning(f"[Optimize] Không gắn được dữ liệu dùng chung ({e}). Worker tự tải dữ liệu.")
+
+def _evaluate(params: Dict[str, Any], fraction: float, opt_settings: Dict[str, Any]) -> Tuple[Optional[float], Dict[str, Any]]:
+    """Chạy backtest với 'params' trên 'fraction' đầu lịch sử và chấm điểm."""
+    overrides = dict(params)
+    overrides["BACKTEST_DATA_FRACTION"] = fraction
+    overrides["BACKTEST_EXPORT_RESULTS"] = False
+    results_df = run_backtest(overrides, dataset=_WORKER_DATASET)
+    min_trades = max(1, int(math.ceil(opt_settings["min_trades"] * fraction)))
+    return _score_results(results_df, opt_settings["objective"], min_trades, opt_settings["initial_capital"])
+
+# ==============================================================================
+# STUDY (FILE JSONL - TIẾP TỤC ĐƯỢC KHI BỊ NGẮT)
+# ==============================================================================
+
+class Study:
+    """
+    Lưu mọi sự kiện của quá trình tối ưu vào file JSONL (mỗi dòng 1 sự kiện):
+    - "study": Thông tin đầu file (phương pháp, không gian tham số, các nấc dữ liệu).
+    - "start" / "rung" / "pruned" / "complete": Vòng đời của từng trial.
+    Chạy lại với cùng file -> đọc lại toàn bộ và tiếp tục từ chỗ dừng.
+    (MỚI) base_params: Tham số gốc - mỗi "start" ghi kèm params_digest (hash bộ tham số ĐẦY ĐỦ của trial,
+    trùng key cache kết quả backtest) để đối chiếu kết quả giữa các study.
+    """
+    def __init__(self, path: str, header: Dict[str, Any], base_params: Optional[StrategyParams] = None):
+        self.path = path
+        self.base_params = base_params
+        self.trials: Dict[int, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            self._load(header)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._append({"event": "study", "created": datetime.now().isoformat(), **header})
+
+    def _load(self, header: Dict[str, Any]):
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("[Optimize] Bỏ qua 1 dòng hỏng trong file study (bị ngắt khi đang ghi).")
+        saved = records[0] if records and records[0].get("event") == "study" else {}
+        for key in ("method", "space", "rungs", "objective"):
+            if json.dumps(saved.get(key), sort_keys=True) != json.dumps(header[key], sort_keys=True):
+                raise ValueError(f"File study {self.path} khác cấu hình hiện tại ('{key}'). "
+                                 f"Đổi OPT_STUDY_FILE hoặc xóa file cũ để bắt đầu lại.")
+        for rec in records[1:]:
+            trial_id = rec.get("trial")
+            if rec["event"] == "start":
+                self.trials[trial_id] = {"params": rec["params"], "scores": {}, "stats": {}, "state": "RUNNING"}
+            elif rec["event"] == "rung":
+                self.trials[trial_id]["scores"][rec["rung"]] = rec["score"]
+                self.trials[trial_id]["stats"][rec["rung"]] = rec["stats"]
+            elif rec["event"] in ("pruned", "complete"):
+                self.trials[trial_id]["state"] = rec["event"].upper()
+        logger.info(f"[Optimize] Tiếp tục study {os.path.basename(self.path)}: {len(self.trials)} trial đã có.")
+
+    def _append(self, record: Dict[str, Any]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def new_trial(self, params: Dict[str, Any]) -> int:
+        trial_id = len(self.trials)
+        self.trials[trial_id] = {"params": params, "scores": {}, "stats": {}, "state": "RUNNING"}
+        record = {"event": "start", "trial": trial_id, "params": params}
+        if self.base_params is not None:
+            try:
+                record["params_digest"] = self.base_params.replace(**params).digest
+            except (TypeError, ValueError):
+                record["params_digest"] = None # (Bộ tham số không hợp lệ - backtest sẽ báo lỗi)
+        self._append(record)
+        return trial_id
+
+    def report(self, trial_id: int, rung: int, fraction: float, score: Optional[float], stats: Dict[str, Any]):
+        self.trials[trial_id]["scores"][rung] = score
+        self.trials[trial_id]["stats"][rung] = stats
+        self._append({"event": "rung", "trial": trial_id, "rung": rung, "fraction": fraction,
+                      "score": score, "stats": stats})
+
+    def finish(self, trial_id: int, state: str):
+        self.trials[trial_id]["state"] = state
+        self._append({"event": state.lower(), "trial": trial_id})
+
+    def rung_scores(self, rung: int, exclude: Optional[int] = None) -> List[float]:
+        """Điểm của mọi trial tại 1 nấc (None -> -inf)."""
+        return [(-math.inf if t["scores"][rung] is None else t["scores"][rung])
+                for tid, t in self.trials.items() if rung in t["scores"] and tid != exclude]
+
+    def history(self, last_rung: int) -> List[Tuple[Dict[str, Any], float]]:
+        """(params, điểm) cho TPE: trial hoàn tất dùng điểm cuối, trial bị cắt xếp cuối bảng."""
+        items = []
+        for t in self.trials.values():
+            if t["state"] == "COMPLETE" and t["scores"].get(last_rung) is not None:
+                items.append((t["params"], t["scores"][last_rung]))
+            elif t["state"] == "PRUNED":
+                items.append((t["params"], -math.inf))
+        return items
+
+# ==============================================================================
+# CÁC CHIẾN LƯỢC TÌM KIẾM
+# ==============================================================================
+
+def _run_async(study: Study, executor: ProcessPoolExecutor, settings: Dict[str, Any], rng: np.random.Generator):
+    """
+    RANDOM / TPE + cắt sớm (median pruning):
+    Mỗi trial chạy lần lượt các nấc dữ liệu; sau mỗi nấc, nếu điểm thấp hơn trung vị
+    các trial khác tại cùng nấc -> dừng trial đó (không chạy nấc dài hơn).
+    """
+    rungs = settings["rungs"]
+    last_rung = len(rungs) - 1
+    pending = {}
+
+    def _submit(trial_id: int, rung: int):
+        future = executor.submit(_evaluate, study.trials[trial_id]["params"], rungs[rung], settings)
+        pending[future] = (trial_id, rung)
+
+    # Tiếp tục các trial dở dang
+    for trial_id, trial in study.trials.items():
+        if trial["state"] == "RUNNING":
+            _submit(trial_id, len(trial["scores"]))
+
+    while True:
+        while len(pending) < settings["num_workers"] and len(study.trials) < settings["num_trials"]:
+            history = study.history(last_rung)
+            if settings["method"] == "TPE" and len(history) >= settings["tpe_startup"]:
+                params = _sample_tpe(settings["space"], history, rng, settings["tpe_gamma"])
+            else:
+                params = _sample_random(settings["space"], rng)
+            _submit(study.new_trial(params), 0)
+        if not pending:
+            break
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            trial_id, rung = pending.pop(future)
+            try:
+                score, stats = future.result()
+            except Exception as e:
+                logger.error(f"[Optimize] Trial {trial_id} lỗi ở nấc {rung}: {e}")
+                score, stats = None, {"error": str(e)}
+            study.report(trial_id, rung, rungs[rung], score, stats)
+
+            if rung == last_rung:
+                study.finish(trial_id, "COMPLETE")
+                logger.info(f"[Optimize] Trial {trial_id} hoàn tất: điểm {score} | {stats}")
+                continue
+            others = study.rung_scores(rung, exclude=trial_id)
+            value = -math.inf if score is None else score
+            if len(others) >= settings["prune_min_trials"] and value < float(np.median(others)):
+                study.finish(trial_id, "PRUNED")
+                logger.info(f"[Optimize] Trial {trial_id} bị cắt ở nấc {rung} ({rungs[rung]:.0%} dữ liệu): điểm {score}")
+            else:
+                _submit(trial_id, rung + 1)
+
+def _run_halving(study: Study, executor: ProcessPoolExecutor, settings: Dict[str, Any], rng: np.random.Generator):
+    """
+    Successive Halving: Đánh giá toàn bộ ứng viên ở nấc dữ liệu ngắn nhất,
+    giữ lại 1/REDUCTION_FACTOR tốt nhất cho nấc tiếp theo, lặp tới nấc cuối.
+    """
+    rungs = settings["rungs"]
+    eta = max(2, settings["reduction_factor"])
+    while len(study.trials) < settings["num_trials"]:
+        study.new_trial(_sample_random(settings["space"], rng))
+
+    survivors = [tid for tid, t in study.trials.items() if t["state"] != "PRUNED"]
+    for rung, fraction in enumerate(rungs):
+        todo = [tid for tid in survivors if rung not in study.trials[tid]["scores"]]
+        futures = {executor.submit(_evaluate, study.trials[tid]["params"], fraction, settings): tid for tid in todo}
+        for future in futures:
+            tid = futures[future]
+            try:
+                score, stats = future.result()
+            except Exception as e:
+                logger.error(f"[Optimize] Trial {tid} lỗi ở nấc {rung}: {e}")
+                score, stats = None, {"error": str(e)}
+            study.report(tid, rung, fraction, score, stats)
+
+        def _value(tid):
+            score = study.trials[tid]["scores"][rung]
+            return -math.inf if score is None else score
+        ranked = sorted(survivors, key=_value, reverse=True)
+
+        if rung == len(rungs) - 1:
+            for tid in ranked:
+                if study.trials[tid]["state"] == "RUNNING":
+                    study.finish(tid, "COMPLETE")
+            break
+
+        keep = max(1, len(ranked) // eta)
+        for tid in ranked[keep:]:
+            study.finish(tid, "PRUNED")
+        survivors = ranked[:keep]
+        logger.info(f"[Optimize] Nấc {rung} ({fraction:.0%} dữ liệu): giữ {keep}/{len(ranked)} ứng viên.")
+
+# ==============================================================================
+# HÀM CHÍNH
+# ==============================================================================
+
+def run_optimization(config_dict: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Tối ưu tham số chiến lược (OPT_SEARCH_SPACE) bằng RANDOM / TPE / HALVING.
+    Trả về trial tốt nhất {"params", "score", "stats"} (hoặc None).
+    """
+    config_dict = config_dict or _build_config_dict()
+    space = {name: tuple(spec) for name, spec in config_dict["OPT_SEARCH_SPACE"].items()}
+    settings = {
+        "method": config_dict.get("OPT_METHOD", "TPE"),
+        "space": space,
+        "rungs": list(config_dict.get("OPT_RUNG_FRACTIONS", [0.25, 0.5, 1.0])),
+        "num_trials": config_dict.get("OPT_NUM_TRIALS", 60),
+        "num_workers": max(1, config_dict.get("OPT_NUM_WORKERS", 1)),
+        "reduction_factor": config_dict.get("OPT_REDUCTION_FACTOR", 3),
+        "prune_min_trials": config_dict.get("OPT_PRUNE_MIN_TRIALS", 5),
+        "tpe_startup": config_dict.get("OPT_TPE_STARTUP_TRIALS", 10),
+        "tpe_gamma": config_dict.get("OPT_TPE_GAMMA", 0.25),
+        "objective": config_dict.get("OPT_OBJECTIVE", "PNL"),
+        "min_trades": config_dict.get("OPT_MIN_TRADES", 10),
+        "initial_capital": config_dict.get("BACKTEST_INITIAL_CAPITAL", 1000.0),
+    }
+
+    study_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("OPT_STUDY_FILE", "optimize_study.jsonl"))
+    header = {"method": settings["method"], "space": {k: list(v) for k, v in space.items()}, "rungs": settings["rungs"],
+              "objective": settings["objective"]}
+    try:
+        study = Study(study_path, header, StrategyParams.from_config(config_dict))
+    except ValueError as e:
+        logger.critical(f"[Optimize] {e}")
+        return None
+
+    # Seed phụ thuộc số trial đã có -> chạy tiếp không lặp lại đúng các mẫu cũ
+    rng = np.random.default_rng([config_dict.get("OPT_SEED", 42), len(study.trials)])
+    logger.info(f"[Optimize] Phương pháp: {settings['method']} | {settings['num_trials']} trial | "
+                f"Nấc dữ liệu: {settings['rungs']} | Workers: {settings['num_workers']} | Study: {study_path}")
+
+    # (MỚI) Tải dữ liệu + tính chỉ báo 1 lần, chia sẻ cho mọi worker qua shared memory
+    dataset = publish_shared_dataset(config_dict) if config_dict.get("OPT_SHARED_MEMORY", True) else None
+    try:
+        with ProcessPoolExecutor(max_workers=settings["num_workers"], initializer=_init_worker,
+                                 initargs=(dataset.handle if dataset is not None else None,)) as executor:
+            if settings["method"] == "HALVING":
+                _run_halving(study, executor, settings, rng)
+            else:
+                _run_async(study, executor, settings, rng)
+    finally:
+        if dataset is not None:
+            dataset.close()
+
+    last_rung = len(settings["rungs"]) - 1
+    completed = [(tid, t) for tid, t in study.trials.items()
+                 if t["state"] == "COMPLETE" and t["scores"].get(last_rung) is not None]
+    if not completed:
+        logger.warning("[Optimize] Không có trial nào hoàn tất với đủ số lệnh.")
+        return None
+
+    completed.sort(key=lambda item: item[1]["scores"][last_rung], reverse=True)
+    logger.info("--- TOP TRIAL ---")
+    for tid, t in completed[:5]:
+        logger.info(f"  #{tid}: điểm {t['scores'][last_rung]:.4f} | {t['stats'][last_rung]} | {t['params']}")
+    pruned = sum(1 for t in study.trials.values() if t["state"] == "PRUNED")
+    logger.info(f"[Optimize] Hoàn tất {len(completed)} trial, cắt sớm {pruned} trial.")
+
+    best_id, best = completed[0]
+    return {"trial": best_id, "params": best["params"], "score": best["scores"][last_rung],
+            "stats": best["stats"][last_rung]}
+
+
+if __name__ == "__main__":
+    from core.logger_setup import setup_logging
+    setup_logging()
+    run_optimization()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# Tên file: replay.py
+
+import os
+import time
+import logging
+import pandas as pd
+from typing import Optional, Dict, Any
+
+# Import các file "Cốt lõi"
+from core.clock import VirtualClock
+from core.sim_broker import SimBroker
+from core.mt5_recorder import ReplayBackend
+from core.storage_manager import save_state
+from core.exness_connector import ExnessConnector
+from core.trade_manager import TradeManager
+from core.reconcile_engine import ReconcileEngine
+from core.candle_scheduler import CandleScheduler
+from core.resampler import parse_timeframe_to_minutes
+
+# Code LIVE thật (Luồng 1) + tiện ích backtest
+from main import run_signal_cycle, make_bar_buffer
+from backtest import run_backtest, _build_config_dict, _load_frames
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# REPLAY: CHẠY LẠI CODE LIVE TRÊN DỮ LIỆU ĐÃ LƯU (ĐỒNG HỒ ẢO)
+# ------------------------------------------------------------------------------
+# Chạy ĐÚNG các hàm của chế độ LIVE (CandleScheduler, run_signal_cycle ->
+# check_and_open_new_trade / update_all_trades, ReconcileEngine -> apply_position_delta,
+# ExnessConnector: tính lot, validate, gửi lệnh, dời SL) trên SimBroker + VirtualClock.
+# Không ngủ thật -> nhiều tuần LIVE chạy trong vài giây, sau đó so với kết quả backtest.py.
+# ==============================================================================
+
+def _get_replay_window(config_dict: Dict[str, Any], df_h1: pd.DataFrame, df_m15: pd.DataFrame):
+    """Mốc bắt đầu / kết thúc (epoch giây): bắt đầu khi đủ nến lịch sử cho cả 2 khung."""
+    entry_step = parse_timeframe_to_minutes(config_dict["entry_timeframe"]) * 60
+    start = max(df_m15.index[min(config_dict["NUM_M15_BARS"], len(df_m15) - 1)],
+                df_h1.index[min(config_dict["NUM_H1_BARS"], len(df_h1) - 1)])
+    end = df_m15.index[-1] + pd.Timedelta(seconds=entry_step)
+    if config_dict.get("REPLAY_START"):
+        start = max(start, pd.Timestamp(config_dict["REPLAY_START"]))
+    if config_dict.get("REPLAY_END"):
+        end = min(end, pd.Timestamp(config_dict["REPLAY_END"]))
+    return start.value / 1e9, end.value / 1e9
+
+def _poll_reconcile(engine: ReconcileEngine, stats: Dict[str, int]):
+    """1 vòng Luồng 2 (đối chiếu) tại giờ ảo hiện tại."""
+    delta = engine.poll_once()
+    stats["reconcile_polls"] += 1
+    if delta and (delta["opened"] or delta["closed"]):
+        logger.info(f"[Replay][Luồng 2] Thay đổi lệnh: Mới {delta['opened']} | Đóng {delta['closed']}")
+
+def _run_live_cycles(trade_manager: TradeManager, connector: ExnessConnector, config_dict: Dict[str, Any],
+                     clock, end_ts: float, bars=None) -> Dict[str, Any]:
+    """
+    Vòng lặp LIVE (1 luồng) theo đồng hồ 'clock' tới mốc end_ts:
+    chờ nến đóng -> đối chiếu -> Luồng 1 (run_signal_cycle) -> đối chiếu.
+    (MỚI) bars: Bộ đệm nến của Luồng 1 (giống main.py khi bật LIVE_BARS_STATE_FILE).
+    Trả về thống kê (số nến, số vòng đối chiếu, thời gian xử lý).
+    """
+    entry_tf, trend_tf = config_dict["entry_timeframe"], config_dict["trend_timeframe"]
+    engine = ReconcileEngine(trade_manager, connector, config_dict)
+    scheduler = CandleScheduler(connector, config_dict, [entry_tf, trend_tf], clock=clock)
+
+    # Log từng nến của code LIVE rất nhiều -> chỉ giữ cảnh báo trở lên trong lúc replay
+    previous_level = logger.level
+    logger.setLevel(getattr(logging, config_dict.get("REPLAY_LOG_LEVEL", "WARNING")))
+    stats = {"candles": 0, "reconcile_polls": 0, "cycle_seconds_max": 0.0}
+    cycle_total = 0.0
+    wall_start = time.perf_counter()
+    try:
+        while clock.time() < end_ts:
+            closed_tfs = scheduler.wait_for_next_close()
+            if entry_tf not in closed_tfs or clock.time() >= end_ts:
+                continue
+            stats["candles"] += 1
+            cycle_start = time.perf_counter()
+
+            # Luồng 2 phát hiện lệnh chạm SL trong nến vừa đóng (trên MT5 thật: chỉ vài giây sau khi chạm)
+            _poll_reconcile(engine, stats)
+            # Luồng 1: tải dữ liệu -> mở lệnh mới -> dời SL (đúng code LIVE)
+            run_signal_cycle(trade_manager, connector, config_dict, bars)
+            # Luồng 2 thấy lệnh mới / SL mới. Sàn chỉ đổi trạng thái quanh mốc đóng nến
+            # -> các vòng đối chiếu còn lại tới nến sau cho kết quả giống hệt, bỏ qua.
+            _poll_reconcile(engine, stats)
+
+            cycle = time.perf_counter() - cycle_start
+            cycle_total += cycle
+            stats["cycle_seconds_max"] = max(stats["cycle_seconds_max"], cycle)
+    finally:
+        logger.setLevel(previous_level)
+    stats["wall_seconds"] = time.perf_counter() - wall_start
+    stats["cycle_seconds_mean"] = cycle_total / stats["candles"] if stats["candles"] else 0.0
+    return stats
+
+def compare_with_backtest(replay_df: pd.DataFrame, backtest_df: pd.DataFrame, entry_step: int) -> pd.DataFrame:
+    """
+    Ghép lệnh replay với lệnh backtest theo (nến tín hiệu, chiều lệnh).
+    Backtest ghi entry_time = giờ MỞ của nến tín hiệu; replay khớp lệnh lúc nến đó ĐÓNG.
+    """
+    cols = ["signal_bar", "type", "entry_price", "close_time", "close_price", "close_reason", "pnl_usd"]
+    def _prepare(df: pd.DataFrame, shift: int) -> pd.DataFrame:
+        if df is None or df.empty:
+            return pd.DataFrame(columns=cols)
+        out = df.copy()
+        out["signal_bar"] = pd.to_datetime(out["entry_time"]) - pd.Timedelta(seconds=shift)
+        return out[cols]
+    return pd.merge(_prepare(replay_df, entry_step), _prepare(backtest_df, 0),
+                    on=["signal_bar", "type"], how="outer", suffixes=("_replay", "_backtest"), indicator=True)
+
+def _log_comparison(merged: pd.DataFrame, entry_step: int):
+    """Helper: In tóm tắt so sánh replay (LIVE) với backtest."""
+    both = merged[merged["_merge"] == "both"]
+    only_replay = int((merged["_merge"] == "left_only").sum())
+    only_backtest = int((merged["_merge"] == "right_only").sum())
+    logger.info("--- SO SÁNH REPLAY (LIVE) VỚI BACKTEST ---")
+    logger.info(f"  Lệnh khớp: {len(both)} | Chỉ có ở LIVE: {only_replay} | Chỉ có ở Backtest: {only_backtest}")
+    logger.info(f"  PnL LIVE: $ {merged['pnl_usd_replay'].sum():,.2f} | PnL Backtest: $ {merged['pnl_usd_backtest'].sum():,.2f}")
+    if not both.empty:
+        entry_diff = (both["entry_price_replay"] - both["entry_price_backtest"]).abs().mean()
+        # (Backtest ghi giờ MỞ của nến đóng lệnh, replay ghi lúc nến đó ĐÓNG)
+        same_exit = (pd.to_datetime(both["close_time_replay"]) - pd.Timedelta(seconds=entry_step)
+                     == pd.to_datetime(both["close_time_backtest"])).mean()
+        logger.info(f"  Lệnh khớp: lệch giá vào TB {entry_diff:.5f} | "
+                    f"lệch PnL $ {(both['pnl_usd_replay'] - both['pnl_usd_backtest']).sum():,.2f} | "
+                    f"cùng thời điểm đóng {same_exit * 100:.1f}%")
+
+# ==============================================================================
+# HÀM CHÍNH
+# ==============================================================================
+
+def run_replay(config_overrides: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+    """
+    Chạy lại bot LIVE trên dữ liệu nến đã lưu với đồng hồ ảo.
+    Trả về DataFrame lệnh đã đóng trên sàn giả lập (hoặc None nếu lỗi).
+    """
+    config_dict = _build_config_dict(config_overrides)
+    logger.info("--- BẮT ĐẦU REPLAY (Code LIVE + Sàn giả lập + Đồng hồ ảo) ---")
+
+    try:
+        frames = _load_frames(config_dict)
+    except FileNotFoundError:
+        logger.critical("LỖI: Không tìm thấy file data. Vui lòng chạy 'download_data.py' trước.")
+        return None
+    if frames is None:
+        return None
+    df_h1, df_m15 = frames
+    trend_tf, entry_tf = config_dict["trend_timeframe"], config_dict["entry_timeframe"]
+    entry_step = parse_timeframe_to_minutes(entry_tf) * 60
+
+    start_ts, end_ts = _get_replay_window(config_dict, df_h1, df_m15)
+    clock = VirtualClock(start_ts)
+    broker = SimBroker(config_dict, {trend_tf: df_h1, entry_tf: df_m15}, clock)
+
+    # File trạng thái riêng (không đụng tới data/trades_state.json của bot thật)
+    os.makedirs(config_dict["OUTPUT_DIR"], exist_ok=True)
+    state_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("REPLAY_STATE_FILE", "replay_state.json"))
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+    connector = ExnessConnector(backend=broker)
+    if not connector.connect():
+        return None
+    trade_manager = TradeManager(config=config_dict, mode="live", connector=connector,
+                                 clock=clock, state_path=state_path)
+    # Bộ đệm nến như LIVE (không ghi checkpoint - replay luôn bắt đầu "lạnh")
+    bars = make_bar_buffer(connector, config_dict) if config_dict.get("LIVE_BARS_STATE_FILE") else None
+
+    stats = _run_live_cycles(trade_manager, connector, config_dict, clock, end_ts, bars)
+    wall = stats["wall_seconds"]
+
+    results_df = broker.get_results_df()
+    simulated_days = (clock.time() - start_ts) / 86400
+    logger.info(f"--- HOÀN TẤT REPLAY: {stats['candles']} nến ({simulated_days:.1f} ngày) trong {wall:.1f}s | "
+                f"{stats['reconcile_polls']} vòng đối chiếu | Sàn: {broker.stats} ---")
+    logger.info(f"Vốn cuối (sàn giả lập): $ {broker.balance:,.2f} | Lệnh đã đóng: {len(results_df)} | "
+                f"Lệnh còn mở: {len(broker.positions_get())}")
+
+    output_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("REPLAY_RESULTS_FILE", "replay_results.csv"))
+    results_df.to_csv(output_path, index=False)
+    logger.info(f"Đã lưu kết quả Replay vào: {output_path}")
+
+    # So sánh với backtest.py trên cùng dữ liệu (dùng cache kết quả nếu có)
+    if config_dict.get("REPLAY_COMPARE_BACKTEST", True):
+        backtest_overrides = dict(config_overrides or {})
+        backtest_overrides["BACKTEST_EXPORT_RESULTS"] = False
+        backtest_df = run_backtest(backtest_overrides)
+        if backtest_df is not None:
+            if not backtest_df.empty: # Chỉ so trong cửa sổ replay
+                entry_times = pd.to_datetime(backtest_df["entry_time"])
+                backtest_df = backtest_df[(entry_times >= pd.Timestamp(start_ts, unit="s"))
+                                          & (entry_times < pd.Timestamp(end_ts, unit="s"))]
+            merged = compare_with_backtest(results_df, backtest_df, entry_step)
+            _log_comparison(merged, entry_step)
+            compare_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("REPLAY_COMPARE_FILE", "replay_vs_backtest.csv"))
+            merged.to_csv(compare_path, index=False)
+            logger.info(f"Đã lưu bảng so sánh vào: {compare_path}")
+
+    return results_df
+
+def run_recording_replay(config_overrides: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    (MỚI) Phát lại file ghi MT5 (MT5_RECORD_FILE lúc chạy LIVE) qua đúng code LIVE.
+    REPLAY_RECORDING_SPEED: 0 = nhanh nhất (đồng hồ ảo, tất định), 1 = nhịp gốc, >1 = nén thời gian.
+    Trả về thống kê (thời gian mỗi vòng, response đã phát, request order_send khác bản ghi).
+    """
+    config_dict = _build_config_dict(config_overrides)
+    path = config_dict.get("REPLAY_RECORDING_FILE")
+    if not path or not os.path.exists(path):
+        logger.critical(f"LỖI: Không tìm thấy file ghi MT5 '{path}' (REPLAY_RECORDING_FILE).")
+        return None
+    backend = ReplayBackend(path, speed=config_dict.get("REPLAY_RECORDING_SPEED", 0))
+    logger.info("--- BẮT ĐẦU PHÁT LẠI FILE GHI MT5 (Code LIVE) ---")
+
+    # Trạng thái bot lúc bắt đầu ghi -> file trạng thái riêng của replay
+    os.makedirs(config_dict["OUTPUT_DIR"], exist_ok=True)
+    state_path = os.path.join(config_dict["OUTPUT_DIR"], config_dict.get("REPLAY_STATE_FILE", "replay_state.json"))
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    if backend.meta.get("state"):
+        save_state(backend.meta["state"], state_path)
+
+    connector = ExnessConnector(backend=backend)
+    if not connector.connect():
+        return None
+    trade_manager = TradeManager(config=config_dict, mode="live", connector=connector,
+                                 clock=backend.clock, state_path=state_path)
+    # Bộ đệm nến: nạp checkpoint lúc bắt đầu ghi -> lời gọi tải nến giống hệt bản ghi
+    bars = None
+    if config_dict.get("LIVE_BARS_STATE_FILE"):
+        bars = make_bar_buffer(connector, config_dict)
+        bars.restore(backend.meta.get("bars"))
+    stats = _run_live_cycles(trade_manager, connector, config_dict, backend.clock, backend.end_ts, bars)
+    stats.update(backend.stats)
+    stats["order_send_diffs"] = len(backend.diffs)
+
+    logger.info(f"--- HOÀN TẤT PHÁT LẠI: {stats['candles']} nến ({(backend.end_ts - backend.start_ts) / 3600:.1f} giờ ghi) "
+                f"trong {stats['wall_seconds']:.1f}s | 1 vòng: TB {stats['cycle_seconds_mean'] * 1000:.1f}ms, "
+                f"tối đa {stats['cycle_seconds_max'] * 1000:.1f}ms ---")
+    logger.info(f"Response đã phát: {backend.stats} | order_send khác bản ghi: {len(backend.diffs)}")
+    return stats
+
+
+if __name__ == "__main__":
+    from core.logger_setup import setup_logging
+    import config
+    setup_logging()
+    if getattr(config, "REPLAY_RECORDING_FILE", None):
+        run_recording_replay()
+    else:
+        run_replay()
@@ -3,14 +3,17 @@
 
 import pandas as pd
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 import pandas_ta as ta  # (MỚI) Import thư viện pandas-ta
 
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
+
 logger = logging.getLogger("ExnessBot")
 
 def get_adx_value(
     df_h1: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> float:
     """
     Tính toán giá trị ADX(14) cho nến cuối cùng.
@@ -18,7 +21,7 @@ def get_adx_value(
     
     Args:
         df_h1 (pd.DataFrame): DataFrame dữ liệu H1 (phải có 'high', 'low', 'close').
-        config (Dict[str, Any]): Đối tượng config.
+        config (StrategyParams): Tham số chiến lược (đã biên dịch).
 
     Returns:
         float: Giá trị ADX cuối cùng (ví dụ: 25.5). Trả về 0.0 nếu lỗi.
@@ -28,7 +31,7 @@ def get_adx_value(
     # (Lưu ý: Trong config, DI_PERIOD và ADX_PERIOD đều là 14.
     # Thư viện pandas_ta dùng 1 tham số 'length' cho cả hai,
     # nên ta chỉ cần lấy 1 giá trị là đủ)
-    period = config.get("ADX_PERIOD", 14) 
+    period = config.ADX_PERIOD 
     
     try:
         # Cần đủ dữ liệu (thư viện sẽ tự xử lý, nhưng check cơ bản)
@@ -3,9 +3,12 @@
 # (ĐÃ SỬA LỖI REGRESSION)
 
 import pandas as pd
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 import logging
 
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
+
 logger = logging.getLogger("ExnessBot")
 
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> Optional[pd.Series]:
@@ -43,35 +46,38 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> Optional[pd.Series]:
 def get_dynamic_atr_buffer(
     current_atr_value: float,
     df: pd.DataFrame, 
-    config: Dict[str, Any], 
-    mode: str
+    config: "StrategyParams", 
+    mode: str,
+    atr_series: Optional[pd.Series] = None
 ) -> float:
     """
     Tính toán hệ số nhân (multiplier) ATR động dựa trên biến động thị trường.
+    (MỚI) atr_series: ATR(atr_period) đã tính sẵn trên df (đồ thị chỉ báo) - không tính lại.
     """
     
     # 1. Lấy hệ số cơ sở (Base Multiplier)
     base_multiplier = 1.0
     if mode == "SL":
-        base_multiplier = config.get("sl_atr_multiplier", 0.2)
+        base_multiplier = config.sl_atr_multiplier
     elif mode == "BE":
-        base_multiplier = config.get("be_atr_buffer", 0.8)
+        base_multiplier = config.be_atr_buffer
     elif mode == "TSL":
-        base_multiplier = config.get("trail_atr_buffer", 0.2)
+        base_multiplier = config.trail_atr_buffer
     else:
         return base_multiplier # Fallback an toàn
 
     try:
         # 2. Lấy Config cho Logic Động
-        ma_period = config.get("DYN_ATR_MA_PERIOD", 50)
-        min_cap_ratio = config.get("DYN_ATR_MIN_CAP_RATIO", 0.75)
-        max_cap_ratio = config.get("DYN_ATR_MAX_CAP_RATIO", 2.0)
+        ma_period = config.DYN_ATR_MA_PERIOD
+        min_cap_ratio = config.DYN_ATR_MIN_CAP_RATIO
+        max_cap_ratio = config.DYN_ATR_MAX_CAP_RATIO
         
         # 3. Tính toán Tỷ lệ Biến động (Volatility Ratio)
-        atr_period = config.get("atr_period", 14)
+        atr_period = config.atr_period
         
         # (SỬA LỖI) Gọi hàm calculate_atr (đã sửa)
-        atr_series = calculate_atr(df, atr_period)
+        if atr_series is None:
+            atr_series = calculate_atr(df, atr_period)
         
         if atr_series is None or len(atr_series) < ma_period:
             return base_multiplier # Không đủ dữ liệu, dùng hệ số cố định
@@ -3,13 +3,16 @@
 
 import pandas as pd
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
 
 logger = logging.getLogger("ExnessBot")
 
 def get_candle_confirmation(
     df_m15: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> bool:
     """
     Kiểm tra xác nhận Nến (Logic GĐ 3 - finalplan.txt).
@@ -17,13 +20,13 @@ def get_candle_confirmation(
 
     Args:
         df_m15 (pd.DataFrame): DataFrame dữ liệu M15.
-        config (Dict[str, Any]): Đối tượng config.
+        config (StrategyParams): Tham số chiến lược (đã biên dịch).
 
     Trả về:
         bool: True nếu là nến mạnh, False nếu không.
     """
     
-    min_body_percent = config["min_body_percent"]
+    min_body_percent = config.min_body_percent
     
     try:
         if df_m15.empty:
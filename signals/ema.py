@@ -3,7 +3,10 @@
 
 import pandas as pd
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
 
 logger = logging.getLogger("ExnessBot")
 
@@ -24,13 +27,13 @@ def _calculate_ema(df: pd.DataFrame, period: int) -> Optional[pd.Series]:
 
 def check_trend_ema(
     df_h1: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> str:
     """
     Check GĐ 1: Giá H1 so với EMA 50.
     Trả về: "UP" (Giá > EMA), "DOWN" (Giá < EMA). 
     """
-    trend_ema_period = config["TREND_EMA_PERIOD"]
+    trend_ema_period = config.TREND_EMA_PERIOD
     ema_series = _calculate_ema(df_h1, trend_ema_period)
     
     # Nếu không tính được, mặc định là DOWN (an toàn)
@@ -51,13 +54,13 @@ def check_trend_ema(
 
 def check_entry_ema_breakout(
     df_m15: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> Optional[str]:
     """
     Check GĐ 2 (Breakout): Giá M15 CẮT (cross) EMA 21.
     Trả về: "BUY", "SELL", hoặc None.
     """
-    entry_ema_period = config["ENTRY_EMA_PERIOD"]
+    entry_ema_period = config.ENTRY_EMA_PERIOD
     ema_series = _calculate_ema(df_m15, entry_ema_period)
 
     # Cần ít nhất 2 nến để check "cắt"
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Tên file: signals/indicator_arrays.py
+
+import numpy as np
+import pandas as pd
+import logging
+from typing import Callable, Tuple, Any
+
+logger = logging.getLogger("ExnessBot")
+
+# ==============================================================================
+# CHỈ BÁO DẠNG MẢNG (VECTOR) - GIÁ TRỊ "NHƯ CHIẾN LƯỢC NHÌN THẤY" TẠI MỖI NẾN
+# ------------------------------------------------------------------------------
+# Backtest (và Live) tính chỉ báo trên một CỬA SỔ trượt (ví dụ 71 nến M15 cuối).
+# Các hàm dưới đây tính giá trị cuối cùng của cửa sổ cho MỌI nến cùng lúc,
+# cho kết quả TRÙNG KHỚP (bit-exact) với việc gọi hàm gốc trên từng cửa sổ.
+# ==============================================================================
+
+def _rolling_ewm_last(values: np.ndarray, first_values: np.ndarray, alpha: float, window: int) -> np.ndarray:
+    """
+    Helper: Giá trị cuối của ewm(alpha, adjust=False) trên từng cửa sổ 'window' phần tử.
+    Lặp theo VỊ TRÍ trong cửa sổ (window lần), mỗi lần xử lý mọi cửa sổ bằng numpy.
+    Công thức cập nhật giống hệt pandas (kể cả phép chia cho (old_wt + new_wt)).
+
+    Args:
+        values (np.ndarray): Dãy giá trị đầu vào.
+        first_values (np.ndarray): Giá trị dùng cho phần tử ĐẦU mỗi cửa sổ
+            (ATR dùng high-low vì close.shift() của nến đầu cửa sổ là NaN).
+        alpha (float): Hệ số làm mượt.
+        window (int): Độ dài cửa sổ.
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    if n == 0:
+        return out
+
+    old_wt = 1.0 - alpha
+    new_wt = alpha
+    denom = old_wt + new_wt
+
+    # Các nến đầu (chưa đủ cửa sổ): cửa sổ bắt đầu từ 0 -> ewm toàn bộ
+    head = min(window - 1, n)
+    if head > 0:
+        weighted = first_values[0]
+        out[0] = weighted
+        for k in range(1, head):
+            cur = values[k]
+            if weighted != cur:
+                weighted = (old_wt * weighted + new_wt * cur) / denom
+            out[k] = weighted
+
+    if n < window:
+        return out
+
+    # Các cửa sổ đầy đủ: start = 0..n-window
+    num_windows = n - window + 1
+    weighted = first_values[:num_windows].astype(np.float64).copy()
+    for k in range(1, window):
+        cur = values[k:k + num_windows]
+        updated = (old_wt * weighted + new_wt * cur) / denom
+        weighted = np.where(weighted != cur, updated, weighted)
+    out[window - 1:] = weighted
+    return out
+
+
+def rolling_ema_last(close: np.ndarray, period: int, window: int) -> np.ndarray:
+    """
+    EMA(span=period) cuối cùng của từng cửa sổ 'window' nến.
+    Tương đương: _calculate_ema(df.iloc[i-window+1 : i+1], period).iloc[-1]
+    (NaN nếu cửa sổ ngắn hơn 'period' - giống hàm gốc trả về None).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    alpha = 2.0 / (period + 1.0)
+    out = _rolling_ewm_last(close, close, alpha, window)
+    # Hàm gốc yêu cầu len(df) >= period
+    out[:max(0, period - 1)] = np.nan
+    return out
+
+
+def rolling_atr_last(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int, window: int) -> np.ndarray:
+    """
+    ATR(period) cuối cùng của từng cửa sổ 'window' nến.
+    Tương đương: calculate_atr(df.iloc[i-window+1 : i+1], period).iloc[-1]
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    high_low = high - low
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    high_close = np.abs(high - prev_close)
+    low_close = np.abs(low - prev_close)
+    # (Giống pd.concat(...).max(axis=1): bỏ qua NaN)
+    tr = np.fmax(np.fmax(high_low, high_close), low_close)
+
+    out = _rolling_ewm_last(tr, high_low, 1.0 / period, window)
+    # Hàm gốc yêu cầu len(df) >= period + 1
+    out[:period] = np.nan
+    return out
+
+
+def rolling_supertrend_last(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                            atr_period: int, multiplier: float, window: int) -> np.ndarray:
+    """
+    Hướng Supertrend của nến cuối trong từng cửa sổ 'window' nến (1 = UP, -1 = DOWN).
+    Tương đương: get_supertrend_direction(df.iloc[i-window+1 : i+1], config)
+    (ATR bên trong được tính lại TỪ ĐẦU mỗi cửa sổ, giống hàm gốc).
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    size = len(close)
+    out = np.full(size, -1, dtype=np.int8)
+    if size == 0:
+        return out
+
+    high_low = high - low
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    tr = np.fmax(np.fmax(high_low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    hl2 = (high + low) / 2
+
+    alpha = 1.0 / atr_period
+    old_wt = 1.0 - alpha
+    new_wt = alpha
+    denom = old_wt + new_wt
+
+    def _run(starts: np.ndarray, steps: int, record_all: bool) -> np.ndarray:
+        atr = high_low[starts].astype(np.float64).copy()
+        band = np.zeros(len(starts))
+        direction = np.ones(len(starts), dtype=bool)
+        history = np.empty((steps, len(starts)), dtype=bool) if record_all else None
+        if record_all:
+            history[0] = direction
+        for k in range(1, steps):
+            pos = starts + k
+            cur = tr[pos]
+            atr = np.where(atr != cur, (old_wt * atr + new_wt * cur) / denom, atr)
+            upper_band = hl2[pos] + (multiplier * atr)
+            lower_band = hl2[pos] - (multiplier * atr)
+            direction = close[pos - 1] > band
+            band = np.where(direction, np.maximum(lower_band, band), np.minimum(upper_band, band))
+            if record_all:
+                history[k] = direction
+        return history if record_all else direction
+
+    # Các nến đầu: cửa sổ bắt đầu từ 0 -> 1 lượt chạy, ghi lại mọi bước
+    head = min(window - 1, size)
+    if head > 0:
+        out[:head] = np.where(_run(np.array([0]), head, True)[:, 0], 1, -1)
+
+    if size >= window:
+        starts = np.arange(size - window + 1)
+        out[window - 1:] = np.where(_run(starts, window, False), 1, -1)
+
+    # Hàm gốc trả về "DOWN" khi không tính được ATR (len < atr_period + 1)
+    out[:atr_period] = -1
+    return out
+
+
+def rolling_swing_points(high: np.ndarray, low: np.ndarray, swing_period: int, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Swing High / Swing Low GẦN NHẤT trong từng cửa sổ 'window' nến.
+    Tương đương: get_last_swing_points(df.iloc[i-window+1 : i+1], config)
+    Trả về 2 mảng (NaN = không tìm thấy, tương ứng None của hàm gốc).
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    size = len(high)
+    n = (swing_period - 1) // 2
+    span = 2 * n + 1
+
+    swing_high = np.full(size, np.nan)
+    swing_low = np.full(size, np.nan)
+    if size < span:
+        return swing_high, swing_low
+
+    # 1. Đánh dấu nến trung tâm là đỉnh/đáy DUY NHẤT trong (2n+1) nến
+    is_sh = np.zeros(size, dtype=bool)
+    is_sl = np.zeros(size, dtype=bool)
+    win_h = np.lib.stride_tricks.sliding_window_view(high, span)
+    win_l = np.lib.stride_tricks.sliding_window_view(low, span)
+    center_h = high[n:size - n]
+    center_l = low[n:size - n]
+    is_sh[n:size - n] = (center_h == win_h.max(axis=1)) & ((win_h == center_h[:, None]).sum(axis=1) == 1)
+    is_sl[n:size - n] = (center_l == win_l.min(axis=1)) & ((win_l == center_l[:, None]).sum(axis=1) == 1)
+
+    # 2. Vị trí swing gần nhất <= t
+    idx = np.arange(size)
+    last_sh = np.maximum.accumulate(np.where(is_sh, idx, -1))
+    last_sl = np.maximum.accumulate(np.where(is_sl, idx, -1))
+
+    # 3. Tại nến i: trung tâm hợp lệ nằm trong [start + n, i - n]
+    bars = idx[span - 1:]
+    start = np.maximum(0, bars - window + 1)
+    enough = (bars - start + 1) >= swing_period
+    c_h = last_sh[bars - n]
+    c_l = last_sl[bars - n]
+    ok_h = enough & (c_h >= start + n)
+    ok_l = enough & (c_l >= start + n)
+    swing_high[bars[ok_h]] = high[c_h[ok_h]]
+    swing_low[bars[ok_l]] = low[c_l[ok_l]]
+
+    return swing_high, swing_low
+
+
+def entry_candidate_mask(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                         entry_mode: str, ema_period: int, window: int, rel_tol: float = 1e-9) -> np.ndarray:
+    """
+    (MỚI) Nến "ứng viên" - nến DUY NHẤT có thể cho tín hiệu vào lệnh (điều kiện thô của bước Entry M15):
+    - BREAKOUT: Giá đóng cắt EMA(ENTRY_EMA_PERIOD) của cửa sổ 'window' nến (như check_entry_ema_breakout).
+    - PULLBACK: Cặp nến nhấn chìm (ENGULFING, chưa xét chạm EMA).
+    - DYNAMIC: Hợp của 2 điều kiện trên (chưa xét ADX).
+    Luôn là TẬP CHA của các nến get_signal trả về BUY/SELL (so sánh EMA có dung sai rel_tol),
+    nên bỏ qua nến không phải ứng viên không làm đổi kết quả.
+    """
+    open_ = np.asarray(open_, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    size = len(close)
+    mask = np.zeros(size, dtype=bool)
+    if size < 2:
+        return mask
+
+    if entry_mode in ("BREAKOUT", "DYNAMIC"):
+        # EMA nến cuối (cửa sổ 'window' nến) và EMA nến áp chót CỦA CÙNG CỬA SỔ ('window' - 1 nến kết thúc ở i - 1)
+        ema_last = rolling_ema_last(close, ema_period, window)
+        ema_prev = np.empty(size)
+        ema_prev[0] = np.nan
+        ema_prev[1:] = rolling_ema_last(close, ema_period, max(1, window - 1))[:-1]
+        tol = rel_tol * np.abs(close)
+        prev_close = np.empty(size)
+        prev_close[0] = np.nan
+        prev_close[1:] = close[:-1]
+        d_prev = prev_close - ema_prev
+        d_last = close - ema_last
+        tol_prev = np.empty(size)
+        tol_prev[0] = 0.0
+        tol_prev[1:] = tol[:-1]
+        mask |= ((d_prev <= tol_prev) & (d_last >= -tol)) | ((d_prev >= -tol_prev) & (d_last <= tol))
+        mask[:window] = True # (Các nến đầu: cửa sổ chưa đủ nến - không lọc)
+
+    if entry_mode in ("PULLBACK", "DYNAMIC"):
+        p_open, p_close = open_[:-1], close[:-1]
+        l_open, l_close = open_[1:], close[1:]
+        engulf_buy = (p_close < p_open) & (l_close > l_open) & (l_open < p_close) & (l_close > p_open)
+        engulf_sell = (p_close > p_open) & (l_close < l_open) & (l_open > p_close) & (l_close < p_open)
+        mask[1:] |= engulf_buy | engulf_sell
+
+    if entry_mode not in ("BREAKOUT", "PULLBACK", "DYNAMIC"):
+        mask[:] = True # (Chế độ lạ: không lọc)
+    return mask
+
+
+def rolling_apply_last(df: pd.DataFrame, window: int, fn: Callable[[pd.DataFrame], Any], start: int = 0) -> np.ndarray:
+    """
+    Dự phòng (chậm): Gọi trực tiếp hàm chỉ báo gốc trên từng cửa sổ (từ nến 'start').
+    Dùng cho chỉ báo không thể vector hóa chính xác (ADX của pandas_ta).
+    Kết quả nên được lưu vào cache (core/cache_manager.py) để không phải tính lại.
+    """
+    out = np.full(len(df), np.nan)
+    for i in range(max(0, start), len(df)):
+        value = fn(df.iloc[max(0, i - window + 1): i + 1])
+        if value is not None:
+            out[i] = value
+    return out
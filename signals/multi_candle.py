@@ -3,14 +3,17 @@
 
 import pandas as pd
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
 
 logger = logging.getLogger("ExnessBot")
 
 def get_pullback_confirmation(
     df_m15: pd.DataFrame, 
     ema_series_m15: pd.Series,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> Optional[str]:
     """
     Check GĐ 2+3 (Pullback): Tìm nến đảo chiều tại EMA 21.
@@ -18,13 +21,13 @@ def get_pullback_confirmation(
     Args:
         df_m15 (pd.DataFrame): DataFrame dữ liệu M15.
         ema_series_m15 (pd.Series): Dãy EMA 21 (đã được tính).
-        config (Dict[str, Any]): Đối tượng config.
+        config (StrategyParams): Tham số chiến lược (đã biên dịch).
 
     Returns:
         Optional[str]: "BUY", "SELL", hoặc None.
     """
     
-    pattern_name = config["PULLBACK_CANDLE_PATTERN"]
+    pattern_name = config.PULLBACK_CANDLE_PATTERN
     
     try:
         # Cần ít nhất 2 nến (cặp nến) và 2 giá trị EMA
@@ -3,7 +3,7 @@
 
 import pandas as pd
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 
 from signals.supertrend import get_supertrend_direction
 from signals.ema import check_trend_ema, check_entry_ema_breakout, _calculate_ema
@@ -12,52 +12,59 @@ from signals.candle import get_candle_confirmation
 from signals.multi_candle import get_pullback_confirmation
 from signals.volume import get_volume_confirmation
 
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
+
 logger = logging.getLogger("ExnessBot")
 
 def get_signal(
     df_h1: pd.DataFrame, 
     df_m15: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams",
+    precomputed: Optional[Dict[str, Any]] = None
 ) -> Optional[str]:
     """
     Hàm "Bộ não" tổng hợp.
     Thực thi logic 3 bước trong codeplan.txt.
     (NÂNG CẤP: ADX GREY ZONE)
+    (MỚI) precomputed: Giá trị chỉ báo H1 đã tính sẵn cho nến hiện tại
+    ("trend_adx", "trend_ema", "trend_st") - Backtest dùng cache, bỏ qua tính lại.
     """
+    precomputed = precomputed or {}
     
     # --- Đọc Config Cơ bản ---
-    ALLOW_LONG_TRADES = config["ALLOW_LONG_TRADES"]
-    ALLOW_SHORT_TRADES = config["ALLOW_SHORT_TRADES"]
+    ALLOW_LONG_TRADES = config.ALLOW_LONG_TRADES
+    ALLOW_SHORT_TRADES = config.ALLOW_SHORT_TRADES
     
-    USE_TREND_FILTER = config["USE_TREND_FILTER"]
-    USE_SUPERTREND_FILTER = config["USE_SUPERTREND_FILTER"]
-    USE_EMA_TREND_FILTER = config["USE_EMA_TREND_FILTER"]
+    USE_TREND_FILTER = config.USE_TREND_FILTER
+    USE_SUPERTREND_FILTER = config.USE_SUPERTREND_FILTER
+    USE_EMA_TREND_FILTER = config.USE_EMA_TREND_FILTER
     
-    ENTRY_LOGIC_MODE = config["ENTRY_LOGIC_MODE"]
+    ENTRY_LOGIC_MODE = config.ENTRY_LOGIC_MODE
     
-    USE_CANDLE_FILTER = config["USE_CANDLE_FILTER"]
-    USE_VOLUME_FILTER = config["USE_VOLUME_FILTER"]
+    USE_CANDLE_FILTER = config.USE_CANDLE_FILTER
+    USE_VOLUME_FILTER = config.USE_VOLUME_FILTER
 
     # --- Đọc Config ADX (Gốc & Nâng cấp) ---
-    USE_ADX_FILTER = config["USE_ADX_FILTER"]
-    ADX_MIN_LEVEL = config.get("ADX_MIN_LEVEL", 20)
+    USE_ADX_FILTER = config.USE_ADX_FILTER
+    ADX_MIN_LEVEL = config.ADX_MIN_LEVEL
     
     # (NÂNG CẤP) Đọc tham số Vùng Xám (với giá trị mặc định an toàn)
-    USE_ADX_GREY_ZONE = config.get("USE_ADX_GREY_ZONE", False)
-    ADX_WEAK = config.get("ADX_WEAK", 18)
-    ADX_STRONG = config.get("ADX_STRONG", 23)
+    USE_ADX_GREY_ZONE = config.USE_ADX_GREY_ZONE
+    ADX_WEAK = config.ADX_WEAK
+    ADX_STRONG = config.ADX_STRONG
 
     try:
         # --- BƯỚC 1: LỌC XU HƯỚNG (H1) ---
         final_trend = "SIDEWAYS"
         
-        trend_adx_h1 = get_adx_value(df_h1, config) 
+        trend_adx_h1 = precomputed["trend_adx"] if "trend_adx" in precomputed else get_adx_value(df_h1, config)
         
         if not USE_TREND_FILTER:
             final_trend = "ANY"
         else:
-            trend_ema_h1 = check_trend_ema(df_h1, config)
-            trend_st_h1 = get_supertrend_direction(df_h1, config)
+            trend_ema_h1 = precomputed["trend_ema"] if "trend_ema" in precomputed else check_trend_ema(df_h1, config)
+            trend_st_h1 = precomputed["trend_st"] if "trend_st" in precomputed else get_supertrend_direction(df_h1, config)
 
             is_long_biased = True
             is_short_biased = True
@@ -109,7 +116,7 @@ def get_signal(
                 # Logic Vùng Xám MỚI
                 if trend_adx_h1 < ADX_WEAK:
                     # 1. Dưới vùng xám (WEAK) -> Sideways -> Dùng PULLBACK
-                    ema_21_m15 = _calculate_ema(df_m15, config["ENTRY_EMA_PERIOD"])
+                    ema_21_m15 = _calculate_ema(df_m15, config.ENTRY_EMA_PERIOD)
                     if ema_21_m15 is not None:
                         entry_signal = get_pullback_confirmation(df_m15, ema_21_m15, config)
                 
@@ -127,7 +134,7 @@ def get_signal(
             else:
                 # Logic Gốc (Ngưỡng Cứng)
                 if trend_adx_h1 < ADX_MIN_LEVEL:
-                    ema_21_m15 = _calculate_ema(df_m15, config["ENTRY_EMA_PERIOD"])
+                    ema_21_m15 = _calculate_ema(df_m15, config.ENTRY_EMA_PERIOD)
                     if ema_21_m15 is not None:
                         entry_signal = get_pullback_confirmation(df_m15, ema_21_m15, config)
                 else:
@@ -149,7 +156,7 @@ def get_signal(
                     entry_signal = breakout_signal
 
         elif ENTRY_LOGIC_MODE == "PULLBACK":
-            ema_21_m15 = _calculate_ema(df_m15, config["ENTRY_EMA_PERIOD"])
+            ema_21_m15 = _calculate_ema(df_m15, config.ENTRY_EMA_PERIOD)
             if ema_21_m15 is not None:
                 entry_signal = get_pullback_confirmation(df_m15, ema_21_m15, config)
 
@@ -3,34 +3,40 @@
 
 import pandas as pd
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, TYPE_CHECKING
 # Import hàm ATR từ file chúng ta đã có
 from signals.atr import calculate_atr 
 
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
+
 logger = logging.getLogger("ExnessBot")
 
 def get_supertrend_direction(
     df_h1: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams",
+    atr: Optional[pd.Series] = None
 ) -> str:
     """
     Tính toán Supertrend và trả về hướng của nến cuối cùng.
     
     Args:
         df_h1 (pd.DataFrame): DataFrame dữ liệu H1.
-        config (Dict[str, Any]): Đối tượng config.
+        config (StrategyParams): Tham số chiến lược (đã biên dịch).
+        atr (pd.Series, optional): (MỚI) ATR(ST_ATR_PERIOD) đã tính sẵn trên df_h1 (đồ thị chỉ báo).
 
     Returns:
         str: "UP" (nếu Supertrend đang màu xanh), 
              "DOWN" (nếu Supertrend đang màu đỏ).
     """
     
-    atr_period = config["ST_ATR_PERIOD"]
-    multiplier = config["ST_MULTIPLIER"]
+    atr_period = config.ST_ATR_PERIOD
+    multiplier = config.ST_MULTIPLIER
     
     try:
         # 1. Tính ATR
-        atr = calculate_atr(df_h1, atr_period)
+        if atr is None:
+            atr = calculate_atr(df_h1, atr_period)
         if atr is None:
             logger.warning("Không thể tính ATR cho Supertrend.")
             return "DOWN" # Mặc định an toàn
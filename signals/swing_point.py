@@ -4,13 +4,16 @@
 import pandas as pd
 import numpy as np
 import logging
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
 
 logger = logging.getLogger("ExnessBot")
 
 def get_last_swing_points(
     df: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> Tuple[Optional[float], Optional[float]]:
     """
     Tìm giá Swing High và Swing Low GẦN NHẤT (mới nhất).
@@ -22,14 +25,14 @@ def get_last_swing_points(
 
     Args:
         df (pd.DataFrame): DataFrame dữ liệu.
-        config (Dict[str, Any]): Đối tượng config.
+        config (StrategyParams): Tham số chiến lược (đã biên dịch).
 
     Returns:
         Tuple[Optional[float], Optional[float]]: 
         (last_swing_high_price, last_swing_low_price)
     """
     
-    swing_period = config["swing_period"]
+    swing_period = config.swing_period
     
     last_swing_high_price: Optional[float] = None
     last_swing_low_price: Optional[float] = None
@@ -3,13 +3,16 @@
 
 import pandas as pd
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.strategy_params import StrategyParams
 
 logger = logging.getLogger("ExnessBot")
 
 def get_volume_confirmation(
     df_m15: pd.DataFrame,
-    config: Dict[str, Any]
+    config: "StrategyParams"
 ) -> bool:
     """
     Kiểm tra xác nhận Volume (Logic StdDev - finalplan.txt).
@@ -18,14 +21,14 @@ def get_volume_confirmation(
 
     Args:
         df_m15 (pd.DataFrame): DataFrame dữ liệu M15.
-        config (Dict[str, Any]): Đối tượng config.
+        config (StrategyParams): Tham số chiến lược (đã biên dịch).
 
     Trả về:
         bool: True nếu volume mạnh, False nếu không.
     """
     
-    volume_ma_period = config["volume_ma_period"]
-    volume_sd_multiplier = config["volume_sd_multiplier"]
+    volume_ma_period = config.volume_ma_period
+    volume_sd_multiplier = config.volume_sd_multiplier
     
     try:
         # Cần ít nhất (chu kỳ + 1 nến breakout) để tính toán
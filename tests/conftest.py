@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/conftest.py
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Chạy được cả bằng "pytest" lẫn "python -m pytest" từ thư mục gốc repo
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_synthetic_bars(days: int = 30, seed: int = 3) -> pd.DataFrame:
+    """Nến M15 giả lập: random walk có các pha xu hướng (để chiến lược có lệnh)."""
+    rng = np.random.default_rng(seed)
+    n = days * 96
+    drift = np.repeat(rng.choice([-0.6, 0.0, 0.6], size=n // 192 + 1), 192)[:n]
+    close = np.round(3000 + np.cumsum(drift + rng.normal(0, 3, n)), 2)
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.round(np.maximum(open_, close) + rng.uniform(0, 3, n), 2)
+    low = np.round(np.minimum(open_, close) - rng.uniform(0, 3, n), 2)
+    index = pd.date_range("2025-01-01", periods=n, freq="15min", name="timestamp")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close,
+                         "volume": rng.integers(100, 1000, n).astype(float)}, index=index)
+
+
+@pytest.fixture
+def synthetic_bars():
+    """make_synthetic_bars (dùng chung cho các test chạy backtest trên dữ liệu giả lập)."""
+    return make_synthetic_bars
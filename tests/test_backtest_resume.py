@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_backtest_resume.py
+
+import logging
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas_ta") # signals/ cần pandas_ta
+import backtest # noqa: E402
+
+
+@pytest.fixture
+def setup(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    base = {
+        "DATA_DIR": str(data_dir), "OUTPUT_DIR": str(tmp_path / "out"),
+        "USE_RESAMPLED_TIMEFRAMES": True, "BASE_TIMEFRAME": "15M", "DATA_QUALITY_MODE": "OFF",
+        "USE_BACKTEST_CACHE": True, "BACKTEST_EXPORT_RESULTS": False, "BACKTEST_TRACE": False,
+        "BACKTEST_STREAMING": False, "BACKTEST_DATA_FRACTION": 1.0,
+    }
+    path = data_dir / f"{backtest.config.SYMBOL}_15M.csv"
+    return base, path, tmp_path
+
+
+def _run(base, cache_dir, resume):
+    return backtest.run_backtest({**base, "CACHE_DIR": str(cache_dir), "BACKTEST_RESUME": resume})
+
+
+def test_resume_after_append_matches_full_run(setup, synthetic_bars, caplog):
+    base, path, tmp_path = setup
+    bars = synthetic_bars()
+    bars.to_csv(path)
+    full = _run(base, tmp_path / "cache_full", resume=False)
+    assert full is not None and len(full) > 0
+
+    for fraction in (0.4, 0.75):
+        cache_dir = tmp_path / f"cache_{fraction}"
+        bars.iloc[:int(len(bars) * fraction)].to_csv(path)
+        assert _run(base, cache_dir, resume=True) is not None
+
+        bars.to_csv(path)
+        caplog.clear()
+        with caplog.at_level(logging.INFO, logger="ExnessBot"):
+            resumed = _run(base, cache_dir, resume=True)
+        assert "[Checkpoint] Chạy tiếp" in caplog.text
+        pd.testing.assert_frame_equal(resumed.reset_index(drop=True), full.reset_index(drop=True))
+
+
+def test_modified_history_forces_full_rerun(setup, synthetic_bars, caplog):
+    base, path, tmp_path = setup
+    bars = synthetic_bars()
+    cache_dir = tmp_path / "cache"
+    bars.iloc[:len(bars) // 2].to_csv(path)
+    _run(base, cache_dir, resume=True)
+
+    modified = bars.copy()
+    modified.iloc[300, modified.columns.get_loc("close")] += 1.0
+    modified.to_csv(path)
+    with caplog.at_level(logging.INFO, logger="ExnessBot"):
+        rerun = _run(base, cache_dir, resume=True)
+    assert "Chạy lại toàn bộ" in caplog.text
+    assert "[Checkpoint] Chạy tiếp" not in caplog.text
+
+    fresh = _run(base, tmp_path / "cache_fresh", resume=False)
+    pd.testing.assert_frame_equal(rerun.reset_index(drop=True), fresh.reset_index(drop=True))
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_backtest_streaming.py
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas_ta") # signals/ cần pandas_ta
+import backtest # noqa: E402
+
+
+@pytest.mark.parametrize("chunk_bars", [500, 1237])
+def test_streaming_matches_in_ram(tmp_path, synthetic_bars, chunk_bars):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    synthetic_bars().to_csv(data_dir / f"{backtest.config.SYMBOL}_15M.csv")
+    base = {
+        "DATA_DIR": str(data_dir), "OUTPUT_DIR": str(tmp_path / "out"), "CACHE_DIR": str(tmp_path / "cache"),
+        "USE_RESAMPLED_TIMEFRAMES": True, "BASE_TIMEFRAME": "15M", "DATA_QUALITY_MODE": "OFF",
+        "USE_BACKTEST_CACHE": False, "BACKTEST_RESUME": False, "BACKTEST_EXPORT_RESULTS": False,
+        "BACKTEST_TRACE": False, "BACKTEST_DATA_FRACTION": 1.0,
+    }
+    in_ram = backtest.run_backtest({**base, "BACKTEST_STREAMING": False})
+    streamed = backtest.run_backtest({**base, "BACKTEST_STREAMING": True, "BACKTEST_CHUNK_BARS": chunk_bars})
+    assert in_ram is not None and len(in_ram) > 0
+
+    # Giống hệt cả dtype (cột thời gian cùng đơn vị) -> ghép / so sánh trực tiếp với kết quả trong RAM
+    assert streamed.dtypes.equals(in_ram.dtypes)
+    assert streamed.reset_index(drop=True).equals(in_ram.reset_index(drop=True))
+    pd.testing.assert_frame_equal(pd.concat([in_ram, streamed]).iloc[len(in_ram):].reset_index(drop=True),
+                                  in_ram.reset_index(drop=True))
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_cache_manager.py
+
+import os
+
+from core import cache_manager
+from core.cache_manager import PROJECT_ROOT, get_backtest_code_files
+
+
+def test_backtest_code_files_follow_core_imports():
+    files = {os.path.relpath(path, PROJECT_ROOT).replace(os.sep, "/") for path in get_backtest_code_files()}
+    # Trực tiếp từ backtest.py + gián tiếp (trade_manager -> risk_manager)
+    for name in ("backtest.py", "core/trade_manager.py", "core/risk_manager.py", "core/strategy_params.py",
+                 "core/resampler.py", "core/data_quality.py", "core/mtf_data.py", "core/excursion.py"):
+        assert name in files
+    assert not any(name.startswith("signals/") for name in files) # signals/ được hash riêng (glob)
+
+
+def test_new_core_import_changes_backtest_code_version(tmp_path, monkeypatch):
+    (tmp_path / "core").mkdir()
+    (tmp_path / "core" / "helper.py").write_text("X = 1\n")
+    (tmp_path / "core" / "used.py").write_text("from core import helper\n")
+    entry = tmp_path / "backtest.py"
+    entry.write_text("from core.used import something\n")
+    monkeypatch.setattr(cache_manager, "PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr(cache_manager, "BACKTEST_ENTRY_FILE", str(entry))
+
+    assert [os.path.basename(p) for p in get_backtest_code_files()] == ["backtest.py", "helper.py", "used.py"]
+    before = cache_manager.get_backtest_code_version()
+    (tmp_path / "core" / "helper.py").write_text("X = 20\n")
+    assert cache_manager.get_backtest_code_version() != before
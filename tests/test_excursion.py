@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_excursion.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.excursion import SparseTable, add_trade_excursions, summarize_excursions
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 17, 64, 257])
+def test_sparse_table_matches_brute_force(size):
+    rng = np.random.default_rng(size)
+    values = rng.normal(size=size)
+    lo = rng.integers(0, size, 500)
+    hi = np.array([rng.integers(a, size) for a in lo])
+    assert np.array_equal(SparseTable(values, np.minimum).query(lo, hi),
+                          [values[a:b + 1].min() for a, b in zip(lo, hi)])
+    assert np.array_equal(SparseTable(values, np.maximum).query(lo, hi),
+                          [values[a:b + 1].max() for a, b in zip(lo, hi)])
+
+
+def test_sparse_table_empty_query():
+    assert len(SparseTable(np.arange(5.0), np.minimum).query([], [])) == 0
+
+
+def _random_trades(rng, times, close, count):
+    rows = []
+    for _ in range(count):
+        entry = int(rng.integers(0, len(times) - 1))
+        exit_ = int(rng.integers(entry, min(len(times), entry + 60)))
+        side = "BUY" if rng.random() < 0.5 else "SELL"
+        entry_price = close[entry]
+        risk = float(rng.uniform(0.5, 3.0))
+        rows.append({
+            "entry_time": times[entry], "close_time": times[exit_], "type": side,
+            "entry_price": entry_price, "close_price": close[exit_] + rng.normal(0, 0.2),
+            "initial_sl_price": entry_price - risk if side == "BUY" else entry_price + risk,
+            "pnl_usd": float(rng.normal()),
+        })
+    return pd.DataFrame(rows)
+
+
+def _brute_force(trade, times, high, low):
+    """Lặp từng nến: [vào lệnh + 1, đóng lệnh - 1] + giá đóng lệnh (giống engine backtest)."""
+    entry = times.get_loc(trade.entry_time)
+    exit_ = times.get_loc(trade.close_time)
+    highest = max([trade.close_price] + list(high[entry + 1:exit_]))
+    lowest = min([trade.close_price] + list(low[entry + 1:exit_]))
+    if trade.type == "BUY":
+        mae, mfe = trade.entry_price - lowest, highest - trade.entry_price
+    else:
+        mae, mfe = highest - trade.entry_price, trade.entry_price - lowest
+    risk = abs(trade.entry_price - trade.initial_sl_price)
+    return max(mae, 0.0), max(mfe, 0.0), max(mae, 0.0) / risk, max(mfe, 0.0) / risk
+
+
+def test_add_trade_excursions_matches_brute_force():
+    rng = np.random.default_rng(7)
+    n = 2000
+    times = pd.date_range("2025-01-01", periods=n, freq="15min")
+    close = 3000 + np.cumsum(rng.normal(0, 2, n))
+    high = close + rng.uniform(0, 3, n)
+    low = close - rng.uniform(0, 3, n)
+    trades = _random_trades(rng, times, close, 300)
+
+    result = add_trade_excursions(trades, times.to_numpy(), high, low)
+    expected = np.array([_brute_force(t, times, high, low) for t in trades.itertuples(index=False)])
+    np.testing.assert_allclose(result[["mae_price", "mfe_price", "mae_r", "mfe_r"]].to_numpy(), expected)
+    assert (result[["mae_price", "mfe_price"]].to_numpy() >= 0).all()
+
+
+def test_add_trade_excursions_unknown_bar_is_nan():
+    times = pd.date_range("2025-01-01", periods=10, freq="15min")
+    values = np.arange(10.0)
+    trades = pd.DataFrame([{
+        "entry_time": times[2] + pd.Timedelta(minutes=1), "close_time": times[5], "type": "BUY",
+        "entry_price": 3.0, "close_price": 5.0, "initial_sl_price": 2.0, "pnl_usd": 1.0,
+    }])
+    result = add_trade_excursions(trades, times.to_numpy(), values + 0.5, values - 0.5)
+    assert result[["mae_price", "mfe_price", "mae_r", "mfe_r"]].isna().all(axis=None)
+
+
+def test_add_trade_excursions_empty():
+    columns = ["entry_time", "close_time", "type", "entry_price", "close_price", "initial_sl_price", "pnl_usd"]
+    result = add_trade_excursions(pd.DataFrame(columns=columns), np.array([], dtype="datetime64[ns]"),
+                                  np.array([]), np.array([]))
+    assert {"mae_price", "mfe_price", "mae_r", "mfe_r"} <= set(result.columns)
+    assert summarize_excursions(result).empty
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_exness_connector.py
+
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core.exness_connector import ExnessConnector, MT5_GATEWAY_ERROR
+from core.mt5_gateway import MT5Gateway
+
+
+class FakeMT5:
+    """Backend MT5 giả: last_error() là lỗi TOÀN CỤC của lời gọi gần nhất (giống module MetaTrader5)."""
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+    TRADE_RETCODE_DONE = 10009
+    TRADE_ACTION_DEAL, TRADE_ACTION_SLTP = 1, 6
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    ORDER_TIME_GTC, ORDER_FILLING_FOK = 0, 0
+
+    def __init__(self):
+        self.error = (1, "Success")
+        self.ticks = []
+        self.sent = []
+
+    def initialize(self):
+        return True
+
+    def account_info(self):
+        return SimpleNamespace(login=1, server="test")
+
+    def last_error(self):
+        return self.error
+
+    def positions_get(self, symbol=None):
+        return ()
+
+    def symbol_info(self, symbol):
+        return SimpleNamespace(volume_min=0.01, volume_max=100.0, volume_step=0.01, point=0.01,
+                               spread=10, trade_stops_level=0)
+
+    def symbol_info_tick(self, symbol):
+        tick = self.ticks.pop(0) if self.ticks else None
+        if tick is None:
+            self.error = (-1, f"no tick {symbol}")
+        return tick
+
+    def order_send(self, request):
+        self.sent.append(request)
+        return SimpleNamespace(retcode=self.TRADE_RETCODE_DONE, order=1, price=request["price"],
+                               volume=request["volume"], comment="done")
+
+
+@pytest.fixture
+def gateway():
+    gw = MT5Gateway()
+    gw.start()
+    yield gw
+    gw.stop()
+
+
+def _tick(bid=100.0, ask=100.2):
+    return SimpleNamespace(bid=bid, ask=ask, time=0, time_msc=0)
+
+
+def test_place_order_without_tick_returns_none(gateway):
+    mt5 = FakeMT5()
+    connector = ExnessConnector(backend=mt5, gateway=gateway)
+    connector.connect()
+    mt5.ticks = [_tick(), None] # Kiểm tra lệnh có tick, lúc đặt lệnh mất tick
+    assert connector.place_order("ETHUSD", mt5.ORDER_TYPE_BUY, 0.1, 90.0, 0.0, 1, "test") is None
+    assert mt5.sent == []
+
+
+def test_last_error_belongs_to_calling_thread(gateway):
+    mt5 = FakeMT5()
+    connector = ExnessConnector(backend=mt5, gateway=gateway)
+    errors = {}
+
+    def _worker(symbol):
+        for _ in range(50):
+            assert connector._mt5_call("symbol_info_tick", mt5.symbol_info_tick, symbol) is None
+            errors.setdefault(symbol, set()).add(connector._last_error())
+
+    threads = [threading.Thread(target=_worker, args=(symbol,)) for symbol in ("AAA", "BBB")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10.0)
+    assert errors == {"AAA": {(-1, "no tick AAA")}, "BBB": {(-1, "no tick BBB")}}
+
+
+def test_calls_after_gateway_stop_fail_quietly():
+    gw = MT5Gateway()
+    gw.start()
+    connector = ExnessConnector(backend=FakeMT5(), gateway=gw)
+    assert connector.connect()
+    gw.stop()
+    assert connector.get_all_open_positions() is None
+    assert connector.get_account_info() is None
+    assert connector._last_error()[0] == MT5_GATEWAY_ERROR
+
+
+def test_latency_excludes_queue_wait(gateway):
+    connector = ExnessConnector(backend=FakeMT5(), gateway=gateway)
+    release = threading.Event()
+    gateway.submit("busy", release.wait, 5.0) # Luồng cổng đang bận -> lời gọi sau phải chờ trong hàng đợi
+    threading.Timer(0.2, release.set).start()
+    connector._mt5_call("order_send", time.sleep, 0.05)
+    latency_ms, queue_ms = connector._last_timing_ms()
+    assert 40.0 <= latency_ms < 150.0
+    assert queue_ms >= 150.0
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_mt5_gateway.py
+
+import time
+import threading
+
+import pytest
+
+from core.metrics import METRICS, _make_key
+from core.mt5_gateway import (
+    MT5Gateway, GatewayStopped, PRIORITY_ORDER, PRIORITY_QUERY, PRIORITY_BULK
+)
+
+
+@pytest.fixture
+def gateway():
+    gw = MT5Gateway({PRIORITY_ORDER: 5.0, PRIORITY_QUERY: 5.0, PRIORITY_BULK: 5.0})
+    gw.start()
+    yield gw
+    gw.stop()
+
+
+def _block(gateway: MT5Gateway) -> threading.Event:
+    """Giữ luồng cổng bận cho tới khi set() Event trả về (để xếp hàng các yêu cầu phía sau)."""
+    started, release = threading.Event(), threading.Event()
+
+    def _wait():
+        started.set()
+        release.wait(5.0)
+
+    gateway.submit("block", _wait, priority=PRIORITY_ORDER, timeout=0)
+    assert started.wait(5.0)
+    return release
+
+
+def _timeouts(name: str) -> float:
+    return METRICS._counters.get(_make_key("mt5_queue_timeouts", {"call": name}), 0.0)
+
+
+def test_priority_order_then_fifo(gateway):
+    release = _block(gateway)
+    ran = []
+    futures = [
+        gateway.submit("copy_rates_from_pos", ran.append, "bulk-1"),
+        gateway.submit("positions_get", ran.append, "query-1"),
+        gateway.submit("copy_rates_from_pos", ran.append, "bulk-2"),
+        gateway.submit("order_send", ran.append, "order-1"),
+        gateway.submit("symbol_info_tick", ran.append, "query-2"),
+        gateway.submit("order_send", ran.append, "order-2"),
+    ]
+    release.set()
+    for future in futures:
+        future.result(5.0)
+    assert ran == ["order-1", "order-2", "query-1", "query-2", "bulk-1", "bulk-2"]
+
+
+def test_calls_run_on_single_gateway_thread(gateway):
+    names = set()
+    callers = [threading.Thread(target=lambda: names.add(gateway.call("positions_get", lambda: threading.current_thread().name)))
+               for _ in range(8)]
+    for t in callers:
+        t.start()
+    for t in callers:
+        t.join(5.0)
+    assert names == {"MT5Gateway"}
+
+
+def test_queue_timeout_cancels_without_running(gateway):
+    release = _block(gateway)
+    ran = []
+    before = _timeouts("order_send")
+    with pytest.raises(TimeoutError):
+        gateway.call("order_send", ran.append, "stale", timeout=0.05)
+    release.set()
+    gateway.call("positions_get", lambda: None) # Chờ luồng cổng xử lý hết hàng đợi
+    assert ran == [] # Lệnh đã quá hạn không bao giờ được gửi
+    assert _timeouts("order_send") - before == 1 # Đếm đúng 1 lần (bên gọi hoặc luồng cổng)
+
+
+def test_running_call_is_awaited_past_deadline(gateway):
+    # Đã bắt đầu chạy -> chờ tới khi xong dù quá timeout hàng đợi (không mất kết quả lệnh)
+    assert gateway.call("order_send", lambda: (time.sleep(0.2), "filled")[1], timeout=0.05) == "filled"
+
+
+def test_exception_propagates_to_caller(gateway):
+    def _fail():
+        raise ValueError("mt5 error")
+
+    with pytest.raises(ValueError, match="mt5 error"):
+        gateway.call("positions_get", _fail)
+
+
+def test_nested_call_from_gateway_thread_runs_inline(gateway):
+    assert gateway.call("positions_get", lambda: gateway.call("symbol_info_tick", lambda: 42)) == 42
+
+
+def test_call_after_stop_raises_gateway_stopped():
+    gw = MT5Gateway()
+    gw.start()
+    gw.stop()
+    with pytest.raises(GatewayStopped):
+        gw.call("positions_get", lambda: ())
+
+
+
+def test_call_racing_stop_is_served_not_stranded():
+    gw = MT5Gateway()
+    gw.start()
+    real_put = gw._queue.put
+    stopper = threading.Thread(target=gw.stop)
+
+    def _put_while_stopping(item, *args, **kwargs):
+        if item[2] is not gw._STOP and not stopper.is_alive():
+            # Đã qua bước kiểm tra _stopped nhưng chưa vào hàng đợi -> stop() chen vào đúng lúc này
+            stopper.start()
+            time.sleep(0.2)
+        return real_put(item, *args, **kwargs)
+
+    gw._queue.put = _put_while_stopping
+    result = {}
+    caller = threading.Thread(target=lambda: result.setdefault("value", gw.call("positions_get", lambda: "served", timeout=0)),
+                              daemon=True)
+    caller.start()
+    caller.join(3.0)
+    stopper.join(3.0)
+    assert not caller.is_alive() # timeout 0 (chờ không giới hạn) không được kẹt sau STOP
+    assert result == {"value": "served"}
+    with pytest.raises(GatewayStopped):
+        gw.call("positions_get", lambda: ())
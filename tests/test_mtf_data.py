@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_mtf_data.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.mtf_data import AlignedMTF
+
+_OHLCV = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+
+
+@pytest.fixture
+def frames(synthetic_bars):
+    """(Trend H1, Entry M15): H1 gộp từ chính các nến M15."""
+    entry = synthetic_bars(days=4)
+    return entry.resample("1h").agg(_OHLCV), entry
+
+
+def _truncate(trend, entry, entry_end, trend_lag=0):
+    """Dữ liệu 'lần chạy trước': entry_end nến Entry đầu + các nến Trend tới đó (trend_lag: H1 về trễ thêm vài nến)."""
+    entry = entry.iloc[:entry_end]
+    trend = trend[trend.index <= entry.index[-1]]
+    return trend.iloc[:len(trend) - trend_lag], entry
+
+
+def test_trend_idx_is_last_closed_trend_bar(frames):
+    trend, entry = frames
+    data = AlignedMTF.build(trend, entry)
+    for i, t in enumerate(data.index):
+        closed = np.flatnonzero(trend.index + pd.Timedelta(hours=1) <= t) # Nến H1 đã đóng tại lúc mở nến M15
+        assert data.trend_idx[i] == closed[-1]
+    assert data.index[0] == trend.index[0] + pd.Timedelta(hours=1) # Bỏ các nến M15 chưa có nến H1 nào đóng
+
+
+@pytest.mark.parametrize("trend_lag", [0, 2])
+@pytest.mark.parametrize("entry_end", [97, 150, 203, 288])
+def test_appending_keeps_stable_prefix(frames, entry_end, trend_lag):
+    trend, entry = frames
+    full = AlignedMTF.build(trend, entry)
+    before = AlignedMTF.build(*_truncate(trend, entry, entry_end, trend_lag))
+    stable = before.stable_length()
+    assert 0 < stable <= len(before)
+
+    # Map Entry -> Trend của phần ổn định không đổi khi nối thêm nến; digest phần đó cũng vậy
+    np.testing.assert_array_equal(before.trend_idx[:stable], full.trend_idx[:stable])
+    assert before.prefix_digest(stable) == full.prefix_digest(stable)
+    if trend_lag:
+        # H1 về trễ: các nến M15 sau phần ổn định đang tạm dùng nến H1 cũ -> map sẽ đổi
+        assert not np.array_equal(before.trend_idx[stable:], full.trend_idx[stable:len(before)])
+
+
+def test_prefix_digest_detects_history_changes(frames):
+    trend, entry = frames
+    data = AlignedMTF.build(trend, entry)
+    end = 200
+    digest = data.prefix_digest(end)
+    assert data.prefix_digest(end - 1) != digest
+
+    changed_entry = entry.copy()
+    changed_entry.loc[data.index[end - 1], "close"] += 0.01
+    assert AlignedMTF.build(trend, changed_entry).prefix_digest(end) != digest
+
+    changed_trend = trend.copy()
+    changed_trend.iloc[int(data.trend_idx[end - 1]), changed_trend.columns.get_loc("high")] += 0.01
+    assert AlignedMTF.build(changed_trend, entry).prefix_digest(end) != digest
+
+    # Nến sau 'end' (M15 và H1 chưa đóng tại đó) không thuộc phần đã xét
+    later_entry = entry.copy()
+    later_entry.loc[data.index[end], "close"] += 0.01
+    later_trend = trend.copy()
+    later_trend.iloc[int(data.trend_idx[end - 1]) + 2, later_trend.columns.get_loc("high")] += 0.01
+    assert AlignedMTF.build(later_trend, later_entry).prefix_digest(end) == digest
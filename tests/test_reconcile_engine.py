@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_reconcile_engine.py
+
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core.reconcile_engine import ReconcileEngine
+from core.exness_connector import ExnessConnector
+from core.mt5_gateway import MT5Gateway, PRIORITY_ORDER, PRIORITY_QUERY
+
+MAGIC = 12345
+
+
+def _position(ticket, volume=0.1, sl=100.0, magic=MAGIC):
+    return SimpleNamespace(ticket=ticket, volume=volume, sl=sl, magic=magic)
+
+
+class FakeTradeManager:
+    """Chỉ phần TradeManager mà ReconcileEngine dùng - ghi lại các delta nhận được."""
+    MAGIC_NUMBER = MAGIC
+
+    def __init__(self, tickets=()):
+        self.tickets = set(tickets)
+        self.on_trade_opened = None
+        self.calls = []
+
+    def get_managed_tickets(self):
+        return frozenset(self.tickets)
+
+    def apply_position_delta(self, open_tickets, delta, checked_tickets=None):
+        self.calls.append((set(open_tickets), delta, checked_tickets))
+        checked = self.tickets if checked_tickets is None else checked_tickets
+        self.tickets = {t for t in self.tickets if t in open_tickets or t not in checked}
+
+
+class FakeConnector:
+    def __init__(self, positions):
+        self.positions = positions
+        self.connect_result = True
+
+    def get_all_open_positions(self):
+        return self.positions
+
+    def connect(self):
+        return self.connect_result
+
+
+class FakeMT5:
+    """Backend MT5 tối thiểu cho ExnessConnector."""
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+    TRADE_RETCODE_DONE = 10009
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def initialize(self):
+        return True
+
+    def account_info(self):
+        return SimpleNamespace(login=1, server="test")
+
+    def positions_get(self):
+        return self.positions
+
+    def last_error(self):
+        return (1, "Success")
+
+
+def _engine(tm, connector):
+    return ReconcileEngine(tm, connector, {"LOOP_SLEEP_SECONDS": 1})
+
+
+def test_first_poll_reports_opened_positions():
+    tm = FakeTradeManager({1})
+    engine = _engine(tm, FakeConnector([_position(1), _position(2), _position(9, magic=1)]))
+    delta = engine.poll_once()
+    assert delta == {"opened": [1, 2], "closed": [], "modified": []}
+    assert tm.calls[0][0] == {1, 2} # Lệnh khác Magic bị bỏ qua
+
+
+def test_unchanged_fingerprint_is_skipped():
+    tm = FakeTradeManager({1})
+    engine = _engine(tm, FakeConnector([_position(1)]))
+    engine.poll_once()
+    assert engine.poll_once() is None
+    assert engine.skipped == 1
+    assert len(tm.calls) == 1
+
+
+def test_closed_and_modified_positions():
+    tm = FakeTradeManager({1, 2})
+    connector = FakeConnector([_position(1), _position(2)])
+    engine = _engine(tm, connector)
+    engine.poll_once()
+    connector.positions = [_position(1, sl=105.0)]
+    delta = engine.poll_once()
+    assert delta == {"opened": [], "closed": [2], "modified": [1]}
+    assert tm.tickets == {1}
+
+
+def test_unknown_positions_skip_cycle():
+    # positions None = không biết trạng thái sàn (khác tài khoản rỗng) -> không đụng vào lệnh đang quản lý
+    tm = FakeTradeManager({1, 2})
+    connector = FakeConnector(None)
+    engine = _engine(tm, connector)
+    assert engine.poll_once() is None
+    assert tm.calls == []
+    assert tm.tickets == {1, 2}
+
+    connector.positions = [_position(1), _position(2)]
+    assert engine.poll_once() == {"opened": [1, 2], "closed": [], "modified": []}
+
+
+def test_empty_account_with_lost_connection_skips_cycle():
+    tm = FakeTradeManager({1})
+    connector = FakeConnector([])
+    connector.connect_result = False
+    assert _engine(tm, connector).poll_once() is None
+    assert tm.calls == []
+
+
+def test_gateway_timeout_does_not_drop_managed_trades():
+    """positions_get quá hạn trong hàng đợi cổng MT5 -> bỏ qua vòng, không coi là 'sàn không còn lệnh'."""
+    gateway = MT5Gateway({PRIORITY_ORDER: 5.0, PRIORITY_QUERY: 0.05})
+    gateway.start()
+    try:
+        connector = ExnessConnector(backend=FakeMT5((_position(1),)), gateway=gateway)
+        assert connector.connect()
+        tm = FakeTradeManager({1})
+        engine = _engine(tm, connector)
+
+        started, release = threading.Event(), threading.Event()
+        gateway.submit("block", lambda: (started.set(), release.wait(5.0)), priority=PRIORITY_ORDER, timeout=0)
+        assert started.wait(5.0)
+        try:
+            assert connector.get_all_open_positions() is None
+            assert engine.poll_once() is None
+        finally:
+            release.set()
+        assert tm.calls == []
+        assert tm.tickets == {1}
+
+        assert engine.poll_once() == {"opened": [1], "closed": [], "modified": []}
+        assert tm.tickets == {1}
+    finally:
+        gateway.stop()
+
+# ==============================================================================
+# TradeManager.apply_position_delta (cần đủ thư viện của signals/, ví dụ pandas_ta)
+# ==============================================================================
+
+@pytest.fixture
+def live_trade_manager(tmp_path):
+    pytest.importorskip("pandas_ta")
+    import config
+    from core.trade_manager import TradeManager
+
+    config_dict = {key: getattr(config, key) for key in dir(config) if not key.startswith("__")}
+    tm = TradeManager(config=config_dict, mode="live", connector=FakeConnector([]),
+                      state_path=str(tmp_path / "state.json"))
+    tm.managed_trades = [{"ticket": 1}, {"ticket": 2}]
+    return tm
+
+
+def test_apply_position_delta_removes_closed_trades(live_trade_manager, tmp_path):
+    tm = live_trade_manager
+    tm.apply_position_delta({1}, {"closed": [2]}, frozenset({1, 2}))
+    assert [trade["ticket"] for trade in tm.managed_trades] == [1]
+    assert tm.last_trade_close_time_str is not None
+    saved = json.loads((tmp_path / "state.json").read_text(encoding="utf-8"))
+    assert [trade["ticket"] for trade in saved["active_trades"]] == [1]
+
+
+def test_apply_position_delta_keeps_trades_opened_during_poll(live_trade_manager):
+    # Lệnh #2 mở SAU khi chụp danh sách ticket (không có trong checked_tickets) -> không bị xóa nhầm
+    tm = live_trade_manager
+    tm.apply_position_delta({1}, {}, frozenset({1}))
+    assert [trade["ticket"] for trade in tm.managed_trades] == [1, 2]
+    assert tm.last_trade_close_time_str is None
+
+
+def test_engine_timeout_keeps_trade_manager_state(live_trade_manager):
+    tm = live_trade_manager
+    engine = _engine(tm, FakeConnector(None))
+    assert engine.poll_once() is None
+    assert [trade["ticket"] for trade in tm.managed_trades] == [1, 2]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_replay.py
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas_ta") # signals/ cần pandas_ta
+import config # noqa: E402
+import replay # noqa: E402
+from core.clock import VirtualClock # noqa: E402
+
+
+def test_replay_live_path_matches_backtest_entries(tmp_path, synthetic_bars):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    synthetic_bars(days=12).to_csv(data_dir / f"{config.SYMBOL}_15M.csv")
+    overrides = {
+        "DATA_DIR": str(data_dir), "OUTPUT_DIR": str(tmp_path / "out"), "CACHE_DIR": str(tmp_path / "cache"),
+        "USE_RESAMPLED_TIMEFRAMES": True, "BASE_TIMEFRAME": "15M", "DATA_QUALITY_MODE": "OFF",
+        "USE_BACKTEST_CACHE": False, "BACKTEST_RESUME": False, "BACKTEST_TRACE": False,
+        "BACKTEST_STREAMING": False, "BACKTEST_DATA_FRACTION": 1.0,
+        "REPLAY_INCLUDE_FORMING_BAR": False, # Chỉ nến đã đóng, như backtest -> cùng nến tín hiệu
+        "LIVE_BARS_STATE_FILE": None, "MT5_RECORD_FILE": None,
+    }
+    replayed = replay.run_replay(overrides)
+    assert replayed is not None and len(replayed) > 0
+
+    # Code LIVE (CandleScheduler -> run_signal_cycle -> ExnessConnector -> SimBroker) vào lệnh đúng nến tín hiệu,
+    # đúng giá của backtest. Lệch chỉ đến từ điểm thoát (sàn từ chối dời SL sai phía...): khi đó bên còn giữ lệnh
+    # (max_trade) bỏ qua tín hiệu mà bên kia đã vào.
+    compared = pd.read_csv(tmp_path / "out" / "replay_vs_backtest.csv", parse_dates=[
+        "signal_bar", "close_time_replay", "close_time_backtest"])
+    matched = compared[compared["_merge"] == "both"]
+    assert len(matched) >= 0.75 * len(compared)
+    assert (matched["entry_price_replay"] - matched["entry_price_backtest"]).abs().max() < 1e-9
+
+    for side, other in (("right_only", "replay"), ("left_only", "backtest")):
+        holders = compared[compared[f"close_time_{other}"].notna()]
+        for signal_bar in compared.loc[compared["_merge"] == side, "signal_bar"]:
+            still_open = (holders["signal_bar"] < signal_bar) & (holders[f"close_time_{other}"] > signal_bar)
+            assert still_open.any(), f"{signal_bar}: {other} không giữ lệnh nào mà vẫn bỏ lỡ tín hiệu"
+
+def test_virtual_clock_never_moves_backwards():
+    clock = VirtualClock(1000.0)
+    clock.sleep(15.0)
+    clock.advance_to(900.0)
+    assert clock.time() == 1015.0
+    clock.advance_to(2000.0)
+    assert clock.time() == 2000.0 and clock.now() == pd.Timestamp(2000, unit="s").to_pydatetime()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_shared_data.py
+
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import shared_data
+from core.shared_data import SharedDataset
+
+
+def _sample_frames():
+    index = pd.date_range("2025-01-01", periods=500, freq="15min", name="timestamp", unit="ns")
+    rng = np.random.default_rng(0)
+    entry = pd.DataFrame({
+        "open": rng.normal(size=500).astype(np.float32),
+        "close": rng.normal(size=500).astype(np.float32),
+        "volume": rng.integers(0, 1000, 500).astype(np.uint32),
+        "spread": rng.normal(size=500),
+    }, index=index)
+    trend = entry.iloc[::4].copy()
+    return {"entry": entry, "trend": trend}, {"trend_idx": np.arange(500, dtype=np.int32) // 4}
+
+
+def _worker_checksum(handle):
+    """Chạy trong process con (spawn): gắn vào vùng nhớ dùng chung và tính tổng kiểm tra."""
+    dataset = SharedDataset.attach(handle)
+    try:
+        return float(dataset.frames["entry"]["close"].sum()), int(dataset.arrays["trend_idx"].sum())
+    finally:
+        dataset.close()
+
+
+def test_publish_and_attach_roundtrip():
+    frames, arrays = _sample_frames()
+    with SharedDataset.publish(frames, arrays, {"data_fp": "abc"}) as owner:
+        attached = SharedDataset.attach(owner.handle)
+        try:
+            for name, frame in frames.items():
+                pd.testing.assert_frame_equal(attached.frames[name], frame, check_freq=False)
+            np.testing.assert_array_equal(attached.arrays["trend_idx"], arrays["trend_idx"])
+            assert attached.meta == {"data_fp": "abc"}
+            assert not attached.arrays["trend_idx"].flags.writeable
+            with pytest.raises(ValueError):
+                attached.arrays["trend_idx"][0] = 1
+        finally:
+            attached.close()
+
+
+def test_spawned_worker_attaches_without_unlinking():
+    frames, arrays = _sample_frames()
+    expected = (float(frames["entry"]["close"].sum()), int(arrays["trend_idx"].sum()))
+    with SharedDataset.publish(frames, arrays) as owner:
+        with multiprocessing.get_context("spawn").Pool(2) as pool:
+            results = pool.map(_worker_checksum, [owner.handle] * 4)
+        assert results == [expected] * 4
+        # Worker thoát không được xóa vùng nhớ của process chính
+        again = SharedDataset.attach(owner.handle)
+        assert float(again.frames["entry"]["close"].sum()) == expected[0]
+        again.close()
+
+
+def test_close_unlinks_owned_blocks():
+    frames, arrays = _sample_frames()
+    owner = SharedDataset.publish(frames, arrays)
+    handle = owner.handle
+    names = {spec["shm"] for spec in [handle["arrays"]["trend_idx"], handle["frames"]["entry"]["index"]]}
+    assert names <= shared_data._OWNED_NAMES
+    owner.close()
+    assert not names & shared_data._OWNED_NAMES
+    assert owner.frames == {} and owner.arrays == {}
+    with pytest.raises(FileNotFoundError):
+        SharedDataset.attach(handle)
+
+
+def test_attach_skips_resource_tracker_outside_posix(monkeypatch):
+    # Windows: không có resource_tracker cho shared memory -> không được gọi unregister (hỏng initializer worker)
+    block = shared_memory.SharedMemory(create=True, size=64)
+    try:
+        np.ndarray((8,), dtype=np.float64, buffer=block.buf)[:] = np.arange(8.0)
+        monkeypatch.setattr(shared_data, "os", SimpleNamespace(name="nt"))
+        monkeypatch.setattr(shared_data.resource_tracker, "unregister",
+                            lambda *args: pytest.fail("unregister() không được gọi ngoài POSIX"))
+        blocks = []
+        array = shared_data._attach_array({"shm": block.name, "shape": (8,), "dtype": "<f8"}, blocks)
+        np.testing.assert_array_equal(array, np.arange(8.0))
+        del array
+        for shm in blocks:
+            shm.close()
+    finally:
+        monkeypatch.undo() # (unlink() trên POSIX tự gọi unregister)
+        block.close()
+        block.unlink()
+
+
+def test_optimize_worker_falls_back_when_attach_fails(monkeypatch):
+    pytest.importorskip("pandas_ta")
+    import optimize
+
+    logger = logging.getLogger("ExnessBot")
+    monkeypatch.setattr(logger, "level", logger.level)
+    monkeypatch.setattr(optimize, "_WORKER_DATASET", None)
+    optimize._init_worker({"frames": {"entry": {"index": {"shm": "does-not-exist"}}}, "arrays": {}, "meta": {}})
+    assert optimize._WORKER_DATASET is None
+    optimize._init_worker({"bad": "handle"}) # KeyError -> vẫn không làm hỏng initializer
+    assert optimize._WORKER_DATASET is None
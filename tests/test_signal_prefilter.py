@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_signal_prefilter.py
+
+import logging
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas_ta") # signals/ cần pandas_ta
+from core.strategy_params import StrategyParams # noqa: E402
+from signals.indicator_arrays import entry_candidate_mask # noqa: E402
+from signals.signal_generator import get_signal # noqa: E402
+
+# Tắt mọi bộ lọc chỉ làm GIẢM tín hiệu -> tập tín hiệu lớn nhất (trường hợp khó nhất cho mặt nạ)
+_LOOSE = {"USE_TREND_FILTER": False, "USE_CANDLE_FILTER": False, "USE_VOLUME_FILTER": False,
+          "ALLOW_LONG_TRADES": True, "ALLOW_SHORT_TRADES": True, "USE_ADX_GREY_ZONE": False,
+          "NUM_M15_BARS": 40}
+
+
+def _gapped_bars(synthetic_bars, seed):
+    """Nến mẫu có khoảng trống giá mở cửa (nến giả lập mở đúng giá đóng nến trước -> không có nến nhấn chìm)."""
+    bars = synthetic_bars(days=8, seed=seed).copy()
+    rng = np.random.default_rng(seed + 100)
+    bars["open"] = np.round(bars["open"] + rng.normal(0, 2.0, len(bars)), 2)
+    bars["high"] = bars[["open", "high", "close"]].max(axis=1)
+    bars["low"] = bars[["open", "low", "close"]].min(axis=1)
+    return bars
+
+
+def _signal_bars(bars, params, adx_values):
+    """Vị trí các nến get_signal trả BUY/SELL (cùng cửa sổ M15 như vòng lặp backtest: nến i + NUM_M15_BARS nến trước)."""
+    length = params.NUM_M15_BARS
+    hits = set()
+    for i in range(len(bars)):
+        window = bars.iloc[max(0, i - length): i + 1]
+        # ADX H1 chỉ chọn nhánh DYNAMIC (thấp -> PULLBACK, cao -> BREAKOUT); nến H1 không được dùng khi tắt lọc xu hướng
+        if any(get_signal(window, window, params, {"trend_adx": adx}) for adx in adx_values):
+            hits.add(i)
+    return hits
+
+
+@pytest.mark.parametrize("mode", ["BREAKOUT", "PULLBACK", "DYNAMIC"])
+@pytest.mark.parametrize("seed", [3, 11])
+def test_candidate_mask_is_superset_of_signals(synthetic_bars, mode, seed):
+    logging.getLogger("ExnessBot").setLevel(logging.WARNING) # (get_signal log INFO mỗi tín hiệu)
+    bars = _gapped_bars(synthetic_bars, seed)
+    params = StrategyParams.from_config(None, dict(_LOOSE, ENTRY_LOGIC_MODE=mode))
+    adx_low, adx_high = params.ADX_MIN_LEVEL - 1.0, params.ADX_MIN_LEVEL + 1.0
+
+    mask = entry_candidate_mask(bars["open"].to_numpy(), bars["high"].to_numpy(), bars["low"].to_numpy(),
+                                bars["close"].to_numpy(), mode, params.ENTRY_EMA_PERIOD, params.NUM_M15_BARS + 1)
+    signals = _signal_bars(bars, params, (adx_low, adx_high) if mode == "DYNAMIC" else (adx_high,))
+
+    assert signals, "dữ liệu mẫu phải có tín hiệu"
+    missed = sorted(signals - set(np.flatnonzero(mask)))
+    assert not missed, f"mặt nạ bỏ sót nến có tín hiệu: {missed}"
+    assert mask[params.NUM_M15_BARS + 1:].mean() < 0.9 # Mặt nạ thật sự lọc bớt nến
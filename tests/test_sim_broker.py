@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Tên file: tests/test_sim_broker.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.clock import VirtualClock
+from core.sim_broker import SimBroker
+
+T0 = pd.Timestamp("2025-01-01")
+STEP = 15 * 60
+
+
+def _ts(bars: int) -> float:
+    """Epoch giây của mốc T0 + bars nến M15."""
+    return (T0 + pd.Timedelta(minutes=15 * bars)).value / 1e9
+
+
+@pytest.fixture
+def broker():
+    close = np.array([100.0, 101.0, 102.0, 101.0, 99.0, 98.0, 100.0, 103.0])
+    open_ = np.concatenate([[100.0], close[:-1]])
+    m15 = pd.DataFrame({"open": open_, "high": np.maximum(open_, close) + 0.5,
+                        "low": np.minimum(open_, close) - 0.5, "close": close, "volume": 10.0},
+                       index=pd.date_range(T0, periods=len(close), freq="15min"))
+    h1 = m15.resample("1h").agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+    config = {"SYMBOL": "ETHUSD", "CONTRACT_SIZE": 1.0, "BACKTEST_INITIAL_CAPITAL": 1000.0,
+              "REPLAY_SPREAD_POINTS": 10, "REPLAY_POINT": 0.01}
+    return SimBroker(config, {"1H": h1, "15M": m15}, VirtualClock(_ts(2) + 5)), m15
+
+
+def _buy(sim, sl, volume=1.0):
+    return sim.order_send({"action": sim.TRADE_ACTION_DEAL, "symbol": "ETHUSD", "type": sim.ORDER_TYPE_BUY,
+                           "volume": volume, "sl": sl, "tp": 0.0, "magic": 1, "comment": "t"})
+
+
+def test_rates_show_forming_bar_open_only(broker):
+    sim, m15 = broker
+    rates = sim.copy_rates_from_pos("ETHUSD", sim.TIMEFRAME_M15, 0, 10)
+    assert len(rates) == 3 # 2 nến đã đóng + nến đang chạy
+    forming = rates[-1]
+    assert forming["open"] == forming["high"] == forming["low"] == forming["close"] == m15["open"].iloc[2]
+    np.testing.assert_array_equal(rates["close"][:2], m15["close"].iloc[:2])
+
+    sim.include_forming_bar = False
+    assert len(sim.copy_rates_from_pos("ETHUSD", sim.TIMEFRAME_M15, 0, 10)) == 2
+    # Hỏi "nến hiện tại" (count=1) vẫn thấy nến mới mở như trên MT5
+    assert sim.copy_rates_from_pos("ETHUSD", sim.TIMEFRAME_M15, 0, 1)["time"][0] == int(_ts(2))
+    assert sim.copy_rates_from_pos("ETHUSD", sim.TIMEFRAME_H1, 0, 10) is None # Chưa có nến H1 nào đóng
+    assert sim.copy_rates_from_pos("OTHER", sim.TIMEFRAME_M15, 0, 10) is None
+
+
+def test_market_order_fills_at_forming_open_plus_spread(broker):
+    sim, m15 = broker
+    tick = sim.symbol_info_tick("ETHUSD")
+    assert tick.bid == m15["open"].iloc[2] and tick.ask == pytest.approx(tick.bid + 0.1)
+    result = _buy(sim, sl=95.0)
+    assert result.retcode == sim.TRADE_RETCODE_DONE and result.price == pytest.approx(tick.ask)
+    (position,) = sim.positions_get()
+    assert position.ticket == result.order and position.sl == 95.0
+
+
+def test_invalid_orders_are_rejected(broker):
+    sim, _ = broker
+    assert _buy(sim, sl=200.0).retcode == sim.TRADE_RETCODE_INVALID_STOPS # SL sai phía
+    assert _buy(sim, sl=95.0, volume=0.001).retcode == sim.TRADE_RETCODE_INVALID_VOLUME
+    close = {"action": sim.TRADE_ACTION_DEAL, "position": 99, "volume": 1.0, "type": sim.ORDER_TYPE_SELL}
+    assert sim.order_send(close).retcode == sim.TRADE_RETCODE_POSITION_CLOSED
+    assert sim.positions_get() == () and sim.stats["rejected"] == 3
+    assert sim.last_error()[0] == sim.TRADE_RETCODE_POSITION_CLOSED
+
+
+def test_sl_hit_settles_at_sl_on_bar_close(broker):
+    sim, m15 = broker
+    entry = _buy(sim, sl=99.0).price
+    # Nến 2, 3: low 100.5 > SL. Nến 4: low 98.5 <= SL -> khớp đúng giá SL lúc nến 4 đóng
+    sim.clock.advance_to(_ts(6))
+    assert sim.positions_get() == ()
+    (trade,) = sim.closed_trades
+    assert trade["close_price"] == 99.0 and trade["close_reason"] == "SL/TSL Hit"
+    assert trade["close_time"] == T0 + pd.Timedelta(minutes=15 * 5)
+    assert trade["pnl_usd"] == pytest.approx(99.0 - entry)
+    assert sim.balance == pytest.approx(1000.0 + 99.0 - entry) and sim.stats["sl_hits"] == 1
+
+
+def test_modify_and_partial_close(broker):
+    sim, _ = broker
+    ticket = _buy(sim, sl=95.0, volume=2.0).order
+    modify = {"action": sim.TRADE_ACTION_SLTP, "position": ticket, "sl": 97.0, "tp": 0.0}
+    assert sim.order_send(modify).retcode == sim.TRADE_RETCODE_DONE
+    assert sim.order_send(dict(modify, sl=150.0)).retcode == sim.TRADE_RETCODE_INVALID_STOPS
+
+    sim.clock.advance_to(_ts(3) + 5) # Giá hiện tại = giá mở nến 3 (102.0)
+    close = {"action": sim.TRADE_ACTION_DEAL, "position": ticket, "volume": 0.5, "type": sim.ORDER_TYPE_SELL,
+             "comment": "partial"}
+    assert sim.order_send(close).price == 102.0
+    (position,) = sim.positions_get()
+    assert position.volume == 1.5 and position.sl == 97.0
+    df = sim.get_results_df()
+    assert list(df["close_reason"]) == ["partial"] and df["lot_size"].iloc[0] == 0.5
+    assert sim.account_info().equity == pytest.approx(sim.balance + position.profit)